@@ -3,8 +3,9 @@ Tableau 元数据治理平台 - Flask 应用
 """
 from flask import Flask, g
 from flask_cors import CORS
+from sqlalchemy.orm import scoped_session
 from backend.config import Config
-from backend.models import get_engine, get_session
+from backend.models import get_engine, session_factory
 
 
 def create_app(config_class=Config):
@@ -18,21 +19,163 @@ def create_app(config_class=Config):
     # 创建数据库引擎和会话
     engine = get_engine(config_class.DATABASE_PATH)
     
+    # 只读请求 (GET/HEAD/OPTIONS) 使用 api 档位引擎：query_only，不参与写锁竞争
+    read_engine = get_engine(config_class.DATABASE_PATH, profile='api')
+    
     # 存储到 app 上下文
     app.engine = engine
+    app.read_engine = read_engine
+    
+    # 线程级会话注册表：请求内复用同一会话，请求结束时统一释放
+    # 引擎在首次请求时才建立连接；--preload 时 fork 出的 worker 会丢弃继承的连接池（见 models.get_engine）
+    app.db_sessions = scoped_session(session_factory(engine))
+    app.read_sessions = scoped_session(session_factory(read_engine))
+    
+    # 库文件被整体替换（如手工恢复备份）时释放连接池，新请求读取新文件
+    from backend.services.shadow_db import DatabaseGenerationWatcher
+    app.db_watcher = DatabaseGenerationWatcher(
+        engine, config_class.DATABASE_PATH, read_engine=read_engine
+    )
+    
+    # 多站点：每个站点一个分区库，请求通过 ?site= 或 X-Tableau-Site 选择
+    from backend.services.sites import SiteEngineRegistry, resolve_site
+    app.site_engines = SiteEngineRegistry(engine, app.db_watcher, read_engine)
+    
+    # 搜索联想前缀索引：启动时构建（--preload 时由各 worker 共享），同步代数变化后重建
+    from backend.services.suggest import SuggestRegistry
+    app.suggest = SuggestRegistry(app.site_engines)
+    app.suggest.warm()
+    
+    # 条件请求：ETag / Last-Modified 由同步代数与库文件签名生成，未变化时返回 304
+    from backend.services.conditional import NON_CONDITIONAL_ENDPOINTS, DataVersionTracker
+    app.data_versions = DataVersionTracker(app.site_engines)
+    
+    # 分页总数缓存（按筛选条件与数据版本，未筛选总数读取同步时的预计算值）
+    from backend.services.counts import CountCache
+    app.counts = CountCache()
+    
+    # 分面统计：无筛选读取同步时的直方图，有筛选由进程内位图索引计算
+    from backend.services.facets import FacetRegistry
+    app.facets = FacetRegistry(app.site_engines)
+    
+    # 重查询接口的响应缓存（独立 SQLite 文件，所有 worker 共享，按同步代数失效）
+    from backend.services.response_cache import CACHED_ENDPOINTS, ResponseCache, cache_key
+    from backend.services.shadow_db import sync_generation
+    app.response_cache = (
+        ResponseCache(config_class.RESPONSE_CACHE_PATH, config_class.RESPONSE_CACHE_MAX_MB * 1024 * 1024)
+        if config_class.RESPONSE_CACHE_ENABLED else None
+    )
     
     # 注册数据库会话
     @app.before_request
     def before_request():
+        from flask import g, request, jsonify
+        app.db_watcher.check()
+        read_only = request.method in ('GET', 'HEAD', 'OPTIONS')
+        g.primary_db_session = app.db_sessions()  # 默认站点库（同步任务表所在），始终可写
+        g.db_session = app.read_sessions() if read_only else g.primary_db_session
+        g.site = ""
+        site_arg = request.args.get('site') or request.headers.get('X-Tableau-Site')
+        if site_arg:
+            content_url = resolve_site(site_arg)
+            session = (
+                app.site_engines.session_for(content_url, read_only=read_only)
+                if content_url is not None else None
+            )
+            if session is None:
+                return jsonify({"error": f"站点不存在或尚未同步: {site_arg}"}), 404
+            if content_url:
+                g.db_session = session
+                g.site = content_url
+            else:
+                session.close()
+    
+    @app.before_request
+    def check_conditional_request():
+        from flask import g, request, Response
+        if request.method not in ('GET', 'HEAD') or request.blueprint != 'api' \
+                or request.endpoint in NON_CONDITIONAL_ENDPOINTS:
+            return None
+        try:
+            version = app.data_versions.version(g.site)
+        except Exception as e:
+            app.logger.warning(f"数据版本读取失败: {e}")
+            return None
+        if version is None:
+            return None
+        g.data_version = version
+        etag, last_modified = version
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+        if not_modified:
+            return Response(status=304)
+        return None
+    
+    @app.before_request
+    def serve_cached_response():
+        from flask import g, request, Response
+        if app.response_cache is None or request.method != 'GET' or request.endpoint not in CACHED_ENDPOINTS:
+            return None
+        try:
+            generation = sync_generation(g.db_session)
+            key = cache_key(g.site, request.endpoint, request.path, request.args)
+            cached = app.response_cache.get(key, generation)
+        except Exception as e:
+            app.logger.warning(f"响应缓存读取失败: {e}")
+            return None
+        app.response_cache.record(request.endpoint, hit=cached is not None)
+        if cached is not None:
+            g.cache_status = 'HIT'
+            return Response(cached[0], mimetype=cached[1])
+        g.cache_status = 'MISS'
+        g.cache_entry = (key, generation)
+        return None
+    
+    @app.after_request
+    def store_cached_response(response):
+        from flask import g, request
+        if app.response_cache is None:
+            return response
+        try:
+            if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+                # 编辑类写请求成功后，该站点的缓存全部作废
+                if response.status_code < 400:
+                    app.response_cache.invalidate(g.get('site', ''))
+            elif g.get('cache_entry') and response.status_code == 200 and response.is_json \
+                    and not response.direct_passthrough:
+                key, generation = g.cache_entry
+                app.response_cache.put(
+                    key, g.site, request.endpoint, generation, response.get_data(), response.mimetype
+                )
+        except Exception as e:
+            app.logger.warning(f"响应缓存写入失败: {e}")
+        if g.get('cache_status'):
+            response.headers['X-Cache'] = g.cache_status
+        return response
+    
+    @app.after_request
+    def add_validators(response):
         from flask import g
-        g.db_session = get_session(engine)
+        version = g.get('data_version')
+        if version is not None and response.status_code in (200, 304):
+            etag, last_modified = version
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            # 允许缓存但每次使用前重新验证
+            response.headers.setdefault('Cache-Control', 'no-cache')
+        return response
     
     @app.teardown_request
     def teardown_request(exception=None):
         from flask import g
         session = g.pop('db_session', None)
-        if session is not None:
-            session.close()
+        g.pop('primary_db_session', None)
+        if session is not None and g.get('site'):
+            session.close()  # 站点分区会话不在注册表中
+        app.read_sessions.remove()
+        app.db_sessions.remove()
     
     # 注册蓝图
     from .routes import api_bp
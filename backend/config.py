@@ -26,6 +26,20 @@ class Config:
     DATABASE_PATH = os.path.join(BASE_DIR, "data", "metadata.db")
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE_PATH}"
 
+    # SQLite 连接调优（建立连接时按档位执行 PRAGMA，见 models.get_engine）
+    # false 时使用 SQLite 默认设置（回滚日志、synchronous=FULL）
+    SQLITE_TUNING = os.environ.get("SQLITE_TUNING", "true").lower() == "true"
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    # 页缓存（KB）：API 连接与同步写入连接分别配置
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 65536))
+    SQLITE_SYNC_CACHE_SIZE_KB = int(os.environ.get("SQLITE_SYNC_CACHE_SIZE_KB", 262144))
+    SQLITE_MMAP_SIZE_MB = int(os.environ.get("SQLITE_MMAP_SIZE_MB", 256))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 30000))
+    # 每个引擎的连接池：常驻连接数与突发时的额外连接数（Web 端按 worker 线程数配置）
+    SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 4))
+    SQLITE_POOL_MAX_OVERFLOW = int(os.environ.get("SQLITE_POOL_MAX_OVERFLOW", 4))
+
     # Flask 配置
     SECRET_KEY = os.environ.get("SECRET_KEY") or os.urandom(24).hex()
     DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
@@ -40,3 +54,70 @@ class Config:
     TABLEAU_PASSWORD = os.environ.get("TABLEAU_PASSWORD", "")
     TABLEAU_PAT_NAME = os.environ.get("TABLEAU_PAT_NAME", "")
     TABLEAU_PAT_SECRET = os.environ.get("TABLEAU_PAT_SECRET", "")
+    # 多站点：逗号分隔的站点 contentUrl（default 表示默认站点），留空仅同步默认站点
+    TABLEAU_SITES = os.environ.get("TABLEAU_SITES", "")
+
+    # 同步配置
+    # 字段同步流式模式：按批次边拉取边入库，缓存有界并溢出到 SQLite 临时文件
+    SYNC_FIELDS_STREAMING = (
+        os.environ.get("SYNC_FIELDS_STREAMING", "false").lower() == "true"
+    )
+    # 流式模式下每个缓存在内存中保留的最大条目数
+    SYNC_CACHE_MAX_ITEMS = int(os.environ.get("SYNC_CACHE_MAX_ITEMS", 50000))
+
+    # 同步任务协调
+    # spawn: Web worker 按需拉起独立的同步执行进程；external: 由外部常驻进程（sync-runner 服务）执行
+    SYNC_RUNNER_MODE = os.environ.get("SYNC_RUNNER_MODE", "spawn").lower()
+    # 执行进程心跳间隔与超时（超时的运行中任务视为僵死并标记失败）
+    SYNC_JOB_HEARTBEAT_SECONDS = int(os.environ.get("SYNC_JOB_HEARTBEAT_SECONDS", 15))
+    SYNC_JOB_STALE_SECONDS = int(os.environ.get("SYNC_JOB_STALE_SECONDS", 300))
+    # 常驻执行进程轮询间隔
+    SYNC_RUNNER_POLL_SECONDS = int(os.environ.get("SYNC_RUNNER_POLL_SECONDS", 5))
+
+    # 同步调度（cron 5 段表达式：分 时 日 月 周；留空表示不调度）
+    # 由 python -m backend.sync_runner --schedule 或 SYNC_SCHEDULER_ENABLED=true 的常驻执行进程驱动
+    SYNC_SCHEDULER_ENABLED = (
+        os.environ.get("SYNC_SCHEDULER_ENABLED", "false").lower() == "true"
+    )
+    SYNC_SCHEDULE_FULL = os.environ.get("SYNC_SCHEDULE_FULL", "0 2 * * *")  # 凌晨全量
+    SYNC_SCHEDULE_INCREMENTAL = os.environ.get("SYNC_SCHEDULE_INCREMENTAL", "")
+    SYNC_SCHEDULE_USAGE = os.environ.get("SYNC_SCHEDULE_USAGE", "")
+    # 触发时间随机抖动上限（秒）
+    SYNC_SCHEDULE_JITTER_SECONDS = int(
+        os.environ.get("SYNC_SCHEDULE_JITTER_SECONDS", 300)
+    )
+
+    # 影子库同步：全量/增量同步写入独立的 SQLite 文件，完成后整库写回线上库（备份 API，单个写事务）
+    SYNC_SHADOW_BUILD = os.environ.get("SYNC_SHADOW_BUILD", "false").lower() == "true"
+    # 影子库是否以当前线上库为种子（false 时从空库重建，仅保留术语表、使用历史与同步日志）
+    SYNC_SHADOW_SEED = os.environ.get("SYNC_SHADOW_SEED", "true").lower() == "true"
+
+    # 多站点并发同步数（每个站点独立客户端与分区库）
+    SYNC_SITE_CONCURRENCY = int(os.environ.get("SYNC_SITE_CONCURRENCY", 4))
+
+    # 搜索联想：检查同步代数是否变化（变化后后台重建进程内前缀索引）的最小间隔（秒）
+    SUGGEST_CHECK_SECONDS = int(os.environ.get("SUGGEST_CHECK_SECONDS", 5))
+
+    # API 响应缓存：按 (站点, 路由, 参数, 同步代数) 缓存重查询接口的 JSON，独立 SQLite 文件供所有 worker 共享
+    RESPONSE_CACHE_ENABLED = (
+        os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    )
+    RESPONSE_CACHE_PATH = os.environ.get(
+        "RESPONSE_CACHE_PATH", os.path.join(BASE_DIR, "data", "response_cache.db")
+    )
+    # 缓存总大小上限（MB），超出后按最近访问时间淘汰
+    RESPONSE_CACHE_MAX_MB = int(os.environ.get("RESPONSE_CACHE_MAX_MB", 256))
+
+    # Webhook 定向刷新队列
+    # 共享令牌（?token= 或 X-Webhook-Token），留空表示不校验
+    WEBHOOK_TOKEN = os.environ.get("WEBHOOK_TOKEN", "")
+    # 资产最后一次事件后的静默期（秒），期间的重复事件合并为一次刷新
+    WEBHOOK_COALESCE_SECONDS = int(os.environ.get("WEBHOOK_COALESCE_SECONDS", 10))
+    # 两次定向刷新之间的最小间隔（秒）
+    WEBHOOK_REFRESH_INTERVAL_SECONDS = int(
+        os.environ.get("WEBHOOK_REFRESH_INTERVAL_SECONDS", 30)
+    )
+    # 待处理资产超过该数量时合并为一次增量同步
+    WEBHOOK_INCREMENTAL_THRESHOLD = int(
+        os.environ.get("WEBHOOK_INCREMENTAL_THRESHOLD", 50)
+    )
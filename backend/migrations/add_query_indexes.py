@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：补建热点查询索引
+为四表架构、原始字段表、资产关联表的连接/筛选列创建二级索引（定义见 models.QUERY_INDEXES），
+包括关联表的反向覆盖索引与已发布/嵌入式筛选的部分索引，完成后执行 ANALYZE
+
+执行方式：
+    python3 backend/migrations/add_query_indexes.py [db_path]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.config import Config
+from backend.models import QUERY_INDEXES, ensure_query_indexes, get_engine
+
+
+def migrate(db_path=None):
+    """补建缺失的索引，返回新建的索引名"""
+    db_path = db_path or Config.DATABASE_PATH
+    print(f"📦 连接数据库: {db_path}")
+    if not os.path.exists(db_path):
+        print("❌ 数据库文件不存在")
+        return []
+
+    engine = get_engine(db_path)
+    try:
+        created = ensure_query_indexes(engine)
+    finally:
+        engine.dispose()
+
+    for name in created:
+        print(f"✅ 创建索引 {name}")
+    print(f"\n📊 迁移完成: 新建 {len(created)}, 已存在 {len(QUERY_INDEXES) - len(created)}")
+    return created
+
+
+if __name__ == '__main__':
+    migrate(sys.argv[1] if len(sys.argv) > 1 else None)
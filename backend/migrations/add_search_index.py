@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：构建全文搜索索引
+同步结束时会自动重建；已有库在下一次同步前可手动执行本脚本，使 /api/search 立即使用 FTS5 索引
+
+执行方式：
+    python3 backend/migrations/add_search_index.py [db_path]
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.config import Config
+from backend.models import get_engine, get_session
+from backend.services.search_index import rebuild_search_index
+
+
+def migrate(db_path=None):
+    db_path = db_path or Config.DATABASE_PATH
+    print(f"📦 连接数据库: {db_path}")
+    if not os.path.exists(db_path):
+        print("❌ 数据库文件不存在")
+        return 0
+
+    engine = get_engine(db_path)
+    session = get_session(engine)
+    try:
+        count = rebuild_search_index(session)
+        session.commit()
+    finally:
+        session.close()
+        engine.dispose()
+    print(f"\n📊 迁移完成: 索引 {count} 条")
+    return count
+
+
+if __name__ == '__main__':
+    migrate(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -11,18 +11,19 @@ import hashlib
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, text
 from sqlalchemy.orm import sessionmaker
 from backend.config import Config
 from backend.models import (
     Base, UniqueRegularField, RegularField, 
     UniqueCalculatedField, CalculatedField,
     CalcFieldDependency, RegularFieldFullLineage, CalcFieldFullLineage,
-    regular_field_to_view, calc_field_to_view
+    RegularFieldCatalogStats, CalcFieldCatalogStats,
+    regular_field_to_view, calc_field_to_view, get_engine
 )
 
-def get_session():
-    engine = create_engine(f'sqlite:///{Config.DATABASE_PATH}', echo=False)
+def get_session(db_path=None):
+    engine = get_engine(db_path or Config.DATABASE_PATH, profile='sync')
     Session = sessionmaker(bind=engine)
     return Session(), engine
 
@@ -30,7 +31,8 @@ def cleanup_tables(session):
     print("🧹 清理旧表...")
     for t in ['regular_fields', 'unique_regular_fields', 'unique_calculated_fields', 
               'calculated_fields', 'regular_field_to_view', 'calc_field_to_view', 
-              'calc_field_dependencies', 'regular_field_full_lineage', 'calc_field_full_lineage']:
+              'calc_field_dependencies', 'regular_field_full_lineage', 'calc_field_full_lineage',
+              'unique_regular_field_stats', 'unique_calculated_field_stats']:
         try:
             session.execute(text(f'DROP TABLE IF EXISTS {t}'))
         except: pass
@@ -46,6 +48,8 @@ def create_tables(engine):
         CalcFieldDependency.__table__,
         RegularFieldFullLineage.__table__,
         CalcFieldFullLineage.__table__,
+        RegularFieldCatalogStats.__table__,
+        CalcFieldCatalogStats.__table__,
         regular_field_to_view,
         calc_field_to_view
     ])
@@ -58,6 +62,126 @@ def get_formula_hash(formula):
         return 'empty_' + generate_uuid()
     return hashlib.md5(formula.encode('utf-8')).hexdigest()
 
+def _chunked(ids, size=500):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+def _execute_scoped(session, sql, ids=None, scope=''):
+    """执行含 {scope} 占位的 SQL：ids 为 None 时作用于全表，否则按批限定到 ids（定向刷新）"""
+    if ids is None:
+        session.execute(text(sql.format(scope='')))
+        return
+    stmt = text(sql.format(scope=scope)).bindparams(bindparam('ids', expanding=True))
+    for chunk in _chunked(ids):
+        session.execute(stmt, {'ids': chunk})
+
+def _select_scoped(session, sql, ids):
+    """按批执行含 :ids 的查询并合并结果"""
+    stmt = text(sql).bindparams(bindparam('ids', expanding=True))
+    rows = []
+    for chunk in _chunked(ids):
+        rows.extend(session.execute(stmt, {'ids': chunk}).mappings().all())
+    return rows
+
+def _regular_dedup_key(row, inherited_col):
+    """原始字段去重键及其策略"""
+    if row['upstream_column_id']:
+        return f"col::{row['upstream_column_id']}", 'col'
+    if inherited_col:
+        return f"col::{inherited_col}", 'inherited'  # 继承！
+    if row['table_id']:
+        return f"table::{row['table_id']}::{row['name']}", 'table'
+    if row['datasource_id']:
+        return f"ds::{row['datasource_id']}::{row['name']}", 'ds'
+    return f"orphan::{row['id']}", None
+
+def _regular_unique_record(row, unique_id, inherited_col):
+    # 对于继承的，使用继承的 upstream_column_id
+    return {
+        'id': unique_id,
+        'name': row['name'],
+        'upstream_column_id': row['upstream_column_id'] or inherited_col,
+        'upstream_column_name': row['upstream_column_name'],
+        'table_id': row['table_id'],
+        'remote_type': row['remote_type'],
+        'description': row['description'],
+        'created_at': row['created_at']
+    }
+
+def _regular_instance_record(row, unique_id):
+    return {
+        'id': row['id'],
+        'unique_id': unique_id,
+        'name': row['name'],
+        'data_type': row['data_type'],
+        'remote_type': row['remote_type'],
+        'description': row['description'],
+        'table_id': row['table_id'],
+        'upstream_column_id': row['upstream_column_id'],
+        'upstream_column_name': row['upstream_column_name'],
+        'datasource_id': row['datasource_id'],
+        'workbook_id': row['workbook_id'],
+        'role': row['role'],
+        'aggregation': row['aggregation'],
+        'is_hidden': row['is_hidden'],
+        'folder_name': row['folder_name'],
+        'fully_qualified_name': row['fully_qualified_name'],
+        'caption': row['caption'],
+        'semantic_role': row['semantic_role'],
+        'default_format': row['default_format'],
+        'remote_field_id': row['remote_field_id'],
+        'remote_field_name': row['remote_field_name'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'usage_count': row['usage_count'],
+        'metric_usage_count': row['metric_usage_count']
+    }
+
+def _calc_dedup_key(row):
+    """计算字段去重键: (name, formula_hash) - 全局去重，忽略数据源差异
+
+    只要名字和公式一致，就视为同一个"标准指标"
+    """
+    formula = row['formula'] or ''
+    formula_hash = get_formula_hash(formula)
+    name_clean = (row['name'] or '').strip()
+    return f"{name_clean}::{formula_hash}", name_clean, formula, formula_hash
+
+def _calc_unique_record(row, unique_id, name_clean, formula, formula_hash):
+    return {
+        'id': unique_id,
+        'name': name_clean, # 使用清洗后的名称
+        'formula': formula,
+        'formula_hash': formula_hash,
+        'description': row['description'],
+        'complexity_score': 0,
+        'created_at': row['created_at']
+    }
+
+def _calc_instance_record(row, unique_id, formula, formula_hash):
+    return {
+        'id': row['id'],
+        'unique_id': unique_id,
+        'name': row['name'],
+        'data_type': row['data_type'],
+        'description': row['description'],
+        'formula': formula,
+        'formula_hash': formula_hash,
+        'complexity_score': 0,
+        'datasource_id': row['datasource_id'],
+        'workbook_id': row['workbook_id'],
+        'table_id': row['table_id'],
+        'role': row['role'],
+        'is_hidden': row['is_hidden'],
+        'folder_name': row['folder_name'],
+        'fully_qualified_name': row['fully_qualified_name'],
+        'caption': row['caption'],
+        'usage_count': row['usage_count'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at']
+    }
+
 def migrate_regular_fields(session):
     """原始字段去重：穿透继承策略"""
     print("\n[1/4] 迁移原始字段（穿透继承策略）...")
@@ -93,68 +217,18 @@ def migrate_regular_fields(session):
             inherited_col = canonical_map.get((row['datasource_id'], row['name']))
         
         # 确定去重键
-        if row['upstream_column_id']:
-            key = f"col::{row['upstream_column_id']}"
-            stats['col'] += 1
-        elif inherited_col:
-            key = f"col::{inherited_col}"  # 继承！
-            stats['inherited'] += 1
-        elif row['table_id']:
-            key = f"table::{row['table_id']}::{row['name']}"
-            stats['table'] += 1
-        elif row['datasource_id']:
-            key = f"ds::{row['datasource_id']}::{row['name']}"
-            stats['ds'] += 1
-        else:
-            key = f"orphan::{row['id']}"
+        key, strategy = _regular_dedup_key(row, inherited_col)
+        if strategy:
+            stats[strategy] += 1
         
         if key not in unique_map:
             unique_id = generate_uuid()
             unique_map[key] = unique_id
-            
-            # 对于继承的，使用继承的 upstream_column_id
-            actual_col_id = row['upstream_column_id'] or inherited_col
-            
-            new_unique_records.append({
-                'id': unique_id,
-                'name': row['name'],
-                'upstream_column_id': actual_col_id,
-                'upstream_column_name': row['upstream_column_name'],
-                'table_id': row['table_id'],
-                'remote_type': row['remote_type'],
-                'description': row['description'],
-                'created_at': row['created_at']
-            })
+            new_unique_records.append(_regular_unique_record(row, unique_id, inherited_col))
         else:
             unique_id = unique_map[key]
             
-        new_instance_records.append({
-            'id': row['id'],
-            'unique_id': unique_id,
-            'name': row['name'],
-            'data_type': row['data_type'],
-            'remote_type': row['remote_type'],
-            'description': row['description'],
-            'table_id': row['table_id'],
-            'upstream_column_id': row['upstream_column_id'],
-            'upstream_column_name': row['upstream_column_name'],
-            'datasource_id': row['datasource_id'],
-            'workbook_id': row['workbook_id'],
-            'role': row['role'],
-            'aggregation': row['aggregation'],
-            'is_hidden': row['is_hidden'],
-            'folder_name': row['folder_name'],
-            'fully_qualified_name': row['fully_qualified_name'],
-            'caption': row['caption'],
-            'semantic_role': row['semantic_role'],
-            'default_format': row['default_format'],
-            'remote_field_id': row['remote_field_id'],
-            'remote_field_name': row['remote_field_name'],
-            'created_at': row['created_at'],
-            'updated_at': row['updated_at'],
-            'usage_count': row['usage_count'],
-            'metric_usage_count': row['metric_usage_count']
-        })
+        new_instance_records.append(_regular_instance_record(row, unique_id))
     
     if new_unique_records:
         session.bulk_insert_mappings(UniqueRegularField, new_unique_records)
@@ -186,56 +260,18 @@ def migrate_calculated_fields(session):
     new_instance_records = []
     
     for row in rows:
-        formula = row['formula'] or ''
-        formula_hash = get_formula_hash(formula)
-        
-        # 穿透到发布式数据源
-        ds_id = row['datasource_id']
-        if ds_id and ds_id in ds_penetration:
-            ds_id = ds_penetration[ds_id]
-        
-        # 去重键: (name, formula_hash) - 全局去重，忽略数据源差异
-        # 只要名字和公式一致，就视为同一个"标准指标"
-        name_clean = (row['name'] or '').strip()
-        key = f"{name_clean}::{formula_hash}"
+        key, name_clean, formula, formula_hash = _calc_dedup_key(row)
         
         if key not in unique_map:
             unique_id = generate_uuid()
             unique_map[key] = unique_id
-            
-            new_unique_records.append({
-                'id': unique_id,
-                'name': name_clean, # 使用清洗后的名称
-                'formula': formula,
-                'formula_hash': formula_hash,
-                'description': row['description'],
-                'complexity_score': 0,
-                'created_at': row['created_at']
-            })
+            new_unique_records.append(
+                _calc_unique_record(row, unique_id, name_clean, formula, formula_hash)
+            )
         else:
             unique_id = unique_map[key]
             
-        new_instance_records.append({
-            'id': row['id'],
-            'unique_id': unique_id,
-            'name': row['name'],
-            'data_type': row['data_type'],
-            'description': row['description'],
-            'formula': formula,
-            'formula_hash': formula_hash,
-            'complexity_score': 0,
-            'datasource_id': row['datasource_id'],
-            'workbook_id': row['workbook_id'],
-            'table_id': row['table_id'],
-            'role': row['role'],
-            'is_hidden': row['is_hidden'],
-            'folder_name': row['folder_name'],
-            'fully_qualified_name': row['fully_qualified_name'],
-            'caption': row['caption'],
-            'usage_count': row['usage_count'],
-            'created_at': row['created_at'],
-            'updated_at': row['updated_at']
-        })
+        new_instance_records.append(_calc_instance_record(row, unique_id, formula, formula_hash))
         
     if new_unique_records:
         session.bulk_insert_mappings(UniqueCalculatedField, new_unique_records)
@@ -245,28 +281,31 @@ def migrate_calculated_fields(session):
     print(f"  ✅ 计算字段: {len(new_instance_records)} 实例 -> {len(new_unique_records)} 标准指标")
     return len(new_instance_records), len(new_unique_records)
 
-def migrate_relations(session):
-    print("\n[3/4] 迁移关联关系...")
+def migrate_relations(session, field_ids=None):
+    """迁移视图关联与依赖关系；field_ids 指定时仅迁移这些字段（定向刷新，调用方负责先清理）"""
+    if field_ids is None:
+        print("\n[3/4] 迁移关联关系...")
     
-    session.execute(text("""
-        INSERT INTO regular_field_to_view (field_id, view_id)
+    _execute_scoped(session, """
+        INSERT OR IGNORE INTO regular_field_to_view (field_id, view_id)
         SELECT fv.field_id, fv.view_id 
         FROM field_to_view fv
         JOIN fields f ON fv.field_id = f.id
-        WHERE f.is_calculated = 0 OR f.is_calculated IS NULL
-    """))
+        WHERE (f.is_calculated = 0 OR f.is_calculated IS NULL) {scope}
+    """, field_ids, "AND fv.field_id IN :ids")
     
-    session.execute(text("""
-        INSERT INTO calc_field_to_view (field_id, view_id)
+    _execute_scoped(session, """
+        INSERT OR IGNORE INTO calc_field_to_view (field_id, view_id)
         SELECT fv.field_id, fv.view_id 
         FROM field_to_view fv
         JOIN fields f ON fv.field_id = f.id
-        WHERE f.is_calculated = 1
-    """))
+        WHERE f.is_calculated = 1 {scope}
+    """, field_ids, "AND fv.field_id IN :ids")
     
-    print("  ✅ 视图关联迁移完成")
+    if field_ids is None:
+        print("  ✅ 视图关联迁移完成")
     
-    session.execute(text("""
+    _execute_scoped(session, """
         INSERT INTO calc_field_dependencies (
             source_field_id, 
             dependency_regular_field_id,
@@ -284,87 +323,98 @@ def migrate_relations(session):
             fd.dependency_type
         FROM field_dependencies fd
         LEFT JOIN fields dep ON fd.dependency_field_id = dep.id
-        WHERE fd.source_field_id IN (SELECT id FROM fields WHERE is_calculated = 1)
-    """))
+        WHERE fd.source_field_id IN (SELECT id FROM fields WHERE is_calculated = 1) {scope}
+    """, field_ids, "AND fd.source_field_id IN :ids")
     
-    print("  ✅ 依赖关系迁移完成")
+    if field_ids is None:
+        print("  ✅ 依赖关系迁移完成")
+
+def complexity_score(formula, dep_count):
+    """计算字段复杂度评分"""
+    score = 0
+    if formula:
+        # 1. Length Factor
+        score += len(formula) / 50.0
+        # 2. Structure Factor
+        score += formula.count('\n') * 0.5
+        # 3. Keywords
+        keywords = {
+            'FIXED': 5, 'INCLUDE': 4, 'EXCLUDE': 4, 'REGEXP': 3,
+            'CASE': 2, 'IF': 1, 'IIF': 1, 'ZN': 1, 'ISNULL': 1,
+            'DATE': 1, 'SPLIT': 2
+        }
+        upper_f = formula.upper()
+        for kw, weight in keywords.items():
+            score += upper_f.count(kw) * weight
+    
+    # 4. Dependency Factor
+    score += (dep_count or 0) * 2.0
+    return round(score, 1)
 
-def update_statistics(session):
-    """更新引用计数和依赖计数"""
-    print("\n[3.5/4] 更新统计信息...")
+def update_statistics(session, field_ids=None):
+    """更新引用计数和依赖计数；field_ids 指定时仅更新这些计算字段"""
+    if field_ids is None:
+        print("\n[3.5/4] 更新统计信息...")
     
     # 更新引用计数 (被多少个计算字段引用)
-    session.execute(text("""
+    _execute_scoped(session, """
         UPDATE calculated_fields SET reference_count = (
             SELECT COUNT(*) FROM calc_field_dependencies 
             WHERE calc_field_dependencies.dependency_calc_field_id = calculated_fields.id
-        )
-    """))
+        ) {scope}
+    """, field_ids, "WHERE calculated_fields.id IN :ids")
     
     # 更新依赖计数 (依赖了多少个字段)
-    session.execute(text("""
+    _execute_scoped(session, """
         UPDATE calculated_fields SET dependency_count = (
             SELECT COUNT(*) FROM calc_field_dependencies 
             WHERE calc_field_dependencies.source_field_id = calculated_fields.id
-        )
-    """))
+        ) {scope}
+    """, field_ids, "WHERE calculated_fields.id IN :ids")
 
-    print("  ... 计算复杂度评分 ...")
-    # Fetch all calculated fields
-    rows = session.execute(text("SELECT id, formula, dependency_count FROM calculated_fields")).fetchall()
+    if field_ids is None:
+        print("  ... 计算复杂度评分 ...")
+        rows = session.execute(text(
+            "SELECT id, formula, dependency_count FROM calculated_fields"
+        )).mappings().all()
+    else:
+        rows = _select_scoped(session, """
+            SELECT id, formula, dependency_count FROM calculated_fields WHERE id IN :ids
+        """, field_ids)
     
-    updates = []
-    for row in rows:
-        fid = row.id
-        formula = row.formula
-        dep_count = row.dependency_count or 0
-        
-        score = 0
-        if formula:
-            # 1. Length Factor
-            score += len(formula) / 50.0
-            # 2. Structure Factor
-            score += formula.count('\n') * 0.5
-            # 3. Keywords
-            keywords = {
-                'FIXED': 5, 'INCLUDE': 4, 'EXCLUDE': 4, 'REGEXP': 3,
-                'CASE': 2, 'IF': 1, 'IIF': 1, 'ZN': 1, 'ISNULL': 1,
-                'DATE': 1, 'SPLIT': 2
-            }
-            upper_f = formula.upper()
-            for kw, weight in keywords.items():
-                score += upper_f.count(kw) * weight
-        
-        # 4. Dependency Factor
-        score += dep_count * 2.0
-        
-        updates.append({'id': fid, 'score': round(score, 1)})
+    updates = [
+        {'id': row['id'], 'score': complexity_score(row['formula'], row['dependency_count'])}
+        for row in rows
+    ]
     
     if updates:
         session.execute(text("UPDATE calculated_fields SET complexity_score = :score WHERE id = :id"), updates)
         
-    print(f"  ✅ 统计信息更新完成 (更新了 {len(updates)} 个复杂度评分)")
+    if field_ids is None:
+        print(f"  ✅ 统计信息更新完成 (更新了 {len(updates)} 个复杂度评分)")
 
-def migrate_lineage(session):
-    print("\n[4/4] 迁移血缘数据...")
+def migrate_lineage(session, field_ids=None):
+    """迁移血缘数据；field_ids 指定时仅迁移这些字段（定向刷新，调用方负责先清理）"""
+    if field_ids is None:
+        print("\n[4/4] 迁移血缘数据...")
     
     # === 原始字段血缘：保持原有逻辑（基于数据源连接） ===
-    session.execute(text("""
+    _execute_scoped(session, """
         INSERT INTO regular_field_full_lineage (
             field_id, table_id, datasource_id, workbook_id, lineage_type, lineage_path
         )
         SELECT fl.field_id, fl.table_id, fl.datasource_id, fl.workbook_id, fl.lineage_type, fl.lineage_path
         FROM field_full_lineage fl
         JOIN fields f ON fl.field_id = f.id
-        WHERE f.is_calculated = 0 OR f.is_calculated IS NULL
-    """))
+        WHERE (f.is_calculated = 0 OR f.is_calculated IS NULL) {scope}
+    """, field_ids, "AND fl.field_id IN :ids")
     
     # === 计算字段血缘：修复逻辑 ===
     # 1. 工作簿血缘基于实例归属 (calculated_fields.workbook_id)
     # 2. 同时包含实际使用 (calc_field_to_view) 的工作簿
     
     # 步骤1：基于实例归属 (calculated_fields.workbook_id) 插入血缘
-    session.execute(text("""
+    _execute_scoped(session, """
         INSERT INTO calc_field_full_lineage (
             field_id, table_id, datasource_id, workbook_id, lineage_type, lineage_path
         )
@@ -376,12 +426,12 @@ def migrate_lineage(session):
             'direct' as lineage_type,
             'CalcField -> Workbook (ownership)' as lineage_path
         FROM calculated_fields cf
-        WHERE cf.workbook_id IS NOT NULL
-    """))
+        WHERE cf.workbook_id IS NOT NULL {scope}
+    """, field_ids, "AND cf.id IN :ids")
     
     # 步骤2：基于实际使用关系 (calc_field_to_view) 补充额外的工作簿血缘
     # （某些情况下，计算字段可能被其他工作簿的视图使用）
-    session.execute(text("""
+    _execute_scoped(session, """
         INSERT OR IGNORE INTO calc_field_full_lineage (
             field_id, table_id, datasource_id, workbook_id, lineage_type, lineage_path
         )
@@ -399,15 +449,15 @@ def migrate_lineage(session):
           AND NOT EXISTS (
               SELECT 1 FROM calc_field_full_lineage fl 
               WHERE fl.field_id = cf.id AND fl.workbook_id = v.workbook_id
-          )
-    """))
+          ) {scope}
+    """, field_ids, "AND cf.id IN :ids")
     
-    print("  ✅ 血缘数据迁移完成（计算字段血缘基于实际使用）")
-
-    print("\n[4.5/4] 补全所有权血缘 (Ownership Lineage)...")
+    if field_ids is None:
+        print("  ✅ 血缘数据迁移完成（计算字段血缘基于实际使用）")
+        print("\n[4.5/4] 补全所有权血缘 (Ownership Lineage)...")
     # 修复：对于没有使用的字段，也需要记录其归属的工作簿/数据源血缘
     # 这样在查询血缘时，即使 usage_count=0，也能看到它属于哪个工作簿
-    session.execute(text("""
+    _execute_scoped(session, """
         INSERT INTO regular_field_full_lineage (
             field_id, datasource_id, workbook_id, lineage_type, lineage_path
         )
@@ -418,9 +468,319 @@ def migrate_lineage(session):
           AND NOT EXISTS (
               SELECT 1 FROM regular_field_full_lineage fl 
               WHERE fl.field_id = rf.id AND fl.workbook_id = rf.workbook_id
-          )
-    """))
-    print("  ✅ 所有权血缘补全完成")
+          ) {scope}
+    """, field_ids, "AND rf.id IN :ids")
+    if field_ids is None:
+        print("  ✅ 所有权血缘补全完成")
+
+# 目录聚合：{scope} 限定标准字段/指标，{inner_scope} 限定聚合子查询中的实例
+_REGULAR_CATALOG_STATS_SQL = """
+    INSERT INTO unique_regular_field_stats (
+        unique_id, instance_count, total_usage, role, data_type, remote_type,
+        dedup_method, datasource_info, workbook_info
+    )
+    SELECT
+        urf.id,
+        COALESCE(fs.instance_count, 0),
+        COALESCE(fs.total_usage, 0),
+        fs.role,
+        fs.data_type,
+        fs.remote_type,
+        CASE
+            WHEN urf.table_id IS NULL THEN 'datasource'
+            WHEN t.is_embedded = 1 THEN 'embedded_table'
+            ELSE 'physical_table'
+        END,
+        fl.datasource_info,
+        fl.workbook_info
+    FROM unique_regular_fields urf
+    LEFT JOIN tables t ON urf.table_id = t.id
+    LEFT JOIN (
+        SELECT
+            rf.unique_id,
+            COUNT(DISTINCT rf.id) as instance_count,
+            COALESCE(SUM(rf.usage_count + rf.metric_usage_count), 0) as total_usage,
+            MAX(rf.role) as role,
+            MAX(rf.data_type) as data_type,
+            MAX(rf.remote_type) as remote_type
+        FROM regular_fields rf
+        WHERE 1 = 1 {inner_scope}
+        GROUP BY rf.unique_id
+    ) fs ON fs.unique_id = urf.id
+    LEFT JOIN (
+        SELECT
+            rf.unique_id,
+            GROUP_CONCAT(DISTINCT rfl.datasource_id || '|' || COALESCE(d.name, 'Unknown')) as datasource_info,
+            GROUP_CONCAT(DISTINCT rfl.workbook_id || '|' || COALESCE(w.name, 'Unknown')) as workbook_info
+        FROM regular_fields rf
+        JOIN regular_field_full_lineage rfl ON rf.id = rfl.field_id
+        LEFT JOIN datasources d ON rfl.datasource_id = d.id
+        LEFT JOIN workbooks w ON rfl.workbook_id = w.id
+        WHERE 1 = 1 {inner_scope}
+        GROUP BY rf.unique_id
+    ) fl ON fl.unique_id = urf.id
+    WHERE 1 = 1 {scope}
+"""
+
+_CALC_CATALOG_STATS_SQL = """
+    INSERT INTO unique_calculated_field_stats (
+        unique_id, instance_count, total_references, total_usage, role, data_type,
+        has_embedded, has_published, dedup_method, datasource_info, workbook_info
+    )
+    SELECT
+        ucf.id,
+        COALESCE(cs.instance_count, 1),
+        COALESCE(cs.total_references, 0),
+        COALESCE(cs.total_usage, 0),
+        cs.role,
+        cs.data_type,
+        COALESCE(cs.has_embedded, 0),
+        COALESCE(cs.has_published, 1),
+        CASE
+            WHEN cs.has_embedded = 1 AND cs.has_published = 1 THEN 'hash_mixed'
+            WHEN cs.has_embedded = 1 THEN 'hash_embedded'
+            ELSE 'hash_published'
+        END,
+        cl.datasource_info,
+        cl.workbook_info
+    FROM unique_calculated_fields ucf
+    LEFT JOIN (
+        SELECT
+            cf.unique_id,
+            COUNT(DISTINCT cf.id) as instance_count,
+            COALESCE(SUM(cf.reference_count), 0) as total_references,
+            COALESCE(SUM(cf.usage_count), 0) as total_usage,
+            MAX(cf.role) as role,
+            MAX(cf.data_type) as data_type,
+            MAX(CASE WHEN d.is_embedded = 1 THEN 1 ELSE 0 END) as has_embedded,
+            MAX(CASE WHEN d.id IS NOT NULL AND (d.is_embedded = 0 OR d.is_embedded IS NULL)
+                     THEN 1 ELSE 0 END) as has_published
+        FROM calculated_fields cf
+        LEFT JOIN datasources d ON cf.datasource_id = d.id
+        WHERE 1 = 1 {inner_scope}
+        GROUP BY cf.unique_id
+    ) cs ON cs.unique_id = ucf.id
+    LEFT JOIN (
+        SELECT
+            cf.unique_id,
+            GROUP_CONCAT(DISTINCT cfl.datasource_id || '|' || COALESCE(d.name, 'Unknown')) as datasource_info,
+            GROUP_CONCAT(DISTINCT cfl.workbook_id || '|' || COALESCE(w.name, 'Unknown')) as workbook_info
+        FROM calculated_fields cf
+        JOIN calc_field_full_lineage cfl ON cf.id = cfl.field_id
+        LEFT JOIN datasources d ON cfl.datasource_id = d.id
+        LEFT JOIN workbooks w ON cfl.workbook_id = w.id
+        WHERE 1 = 1 {inner_scope}
+        GROUP BY cf.unique_id
+    ) cl ON cl.unique_id = ucf.id
+    WHERE 1 = 1 {scope}
+"""
+
+def refresh_catalog_stats(session, regular_ids=None, calc_ids=None):
+    """物化字段/指标目录聚合（V5 迁移的最后一步）
+
+    两个参数均为 None 时全量重建；定向刷新时分别传入受影响的标准字段/指标 id
+    （含已删除的，其聚合行会被清理）。session 也可以是 Connection。
+    """
+    full = regular_ids is None and calc_ids is None
+    if full:
+        print("\n📚 物化目录聚合...")
+    for table, sql, ids, unique_column, instance_column in (
+        ('unique_regular_field_stats', _REGULAR_CATALOG_STATS_SQL, regular_ids, 'urf.id', 'rf.unique_id'),
+        ('unique_calculated_field_stats', _CALC_CATALOG_STATS_SQL, calc_ids, 'ucf.id', 'cf.unique_id'),
+    ):
+        if ids is None:
+            if not full:
+                continue
+            session.execute(text(f"DELETE FROM {table}"))
+            session.execute(text(sql.format(scope='', inner_scope='')))
+            continue
+        delete = text(f"DELETE FROM {table} WHERE unique_id IN :ids").bindparams(
+            bindparam('ids', expanding=True))
+        insert = text(sql.format(
+            scope=f"AND {unique_column} IN :ids",
+            inner_scope=f"AND {instance_column} IN :ids",
+        )).bindparams(bindparam('ids', expanding=True))
+        for chunk in _chunked(ids):
+            session.execute(delete, {'ids': chunk})
+            session.execute(insert, {'ids': chunk})
+    if full:
+        print("  ✅ 目录聚合物化完成")
+
+def ensure_catalog_stats(engine):
+    """已有库升级后目录聚合表为空时补建（init_db 调用），返回是否执行了重建"""
+    with engine.begin() as conn:
+        has_uniques = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'unique_regular_fields'"
+        )).first() and conn.execute(text("SELECT 1 FROM unique_regular_fields LIMIT 1")).first()
+        if not has_uniques:
+            return False
+        if conn.execute(text("SELECT 1 FROM unique_regular_field_stats LIMIT 1")).first():
+            return False
+        refresh_catalog_stats(conn)
+    return True
+
+def refresh_fields(session, field_ids, related_field_ids=(), view_ids=()):
+    """定向刷新：增量维护四表架构，不重建整表（单个工作簿/数据源刷新后调用）
+
+    参数:
+        field_ids: 需要重建实例的字段（fields 表中已删除的字段只做清理）
+        related_field_ids: 实例不变、但视图关联/引用统计/血缘可能变化的字段
+        view_ids: 需要重建字段关联的视图
+
+    去重归属沿用全量迁移的去重键：能在现有标准字段/指标中找到相同键时复用，否则新建。
+    四表尚未建立时返回 False，由调用方执行全量迁移。
+    """
+    exists = session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'regular_fields'"
+    )).first()
+    if not exists:
+        return False
+    
+    field_ids = list(dict.fromkeys(field_ids))
+    scope_ids = list(dict.fromkeys(field_ids + list(related_field_ids)))
+    
+    # 1. 清理旧实例、关联与血缘（记录旧的去重归属，稍后清理无实例的标准字段/指标）
+    old_regular_uniques = {r['unique_id'] for r in _select_scoped(
+        session, "SELECT unique_id FROM regular_fields WHERE id IN :ids", field_ids)}
+    old_calc_uniques = {r['unique_id'] for r in _select_scoped(
+        session, "SELECT unique_id FROM calculated_fields WHERE id IN :ids", field_ids)}
+    dependency_sql = """
+        SELECT DISTINCT dependency_calc_field_id FROM calc_field_dependencies
+        WHERE dependency_calc_field_id IS NOT NULL AND source_field_id IN :ids
+    """
+    # 依赖目标的被引用数也会变化（新旧依赖都要重算）
+    dependency_targets = [r['dependency_calc_field_id']
+                          for r in _select_scoped(session, dependency_sql, scope_ids)]
+    for table in ('regular_field_to_view', 'calc_field_to_view'):
+        _execute_scoped(session, f"DELETE FROM {table} WHERE 1 = 1 {{scope}}", list(view_ids),
+                        "AND view_id IN :ids")
+        _execute_scoped(session, f"DELETE FROM {table} WHERE 1 = 1 {{scope}}", scope_ids,
+                        "AND field_id IN :ids")
+    for table, column in (('calc_field_dependencies', 'source_field_id'),
+                          ('regular_field_full_lineage', 'field_id'),
+                          ('calc_field_full_lineage', 'field_id')):
+        _execute_scoped(session, f"DELETE FROM {table} WHERE 1 = 1 {{scope}}", scope_ids,
+                        f"AND {column} IN :ids")
+    for table in ('regular_fields', 'calculated_fields'):
+        _execute_scoped(session, f"DELETE FROM {table} WHERE 1 = 1 {{scope}}", field_ids,
+                        "AND id IN :ids")
+    
+    rows = _select_scoped(session, "SELECT * FROM fields WHERE id IN :ids", field_ids)
+    regular_rows = [r for r in rows if not r['is_calculated']]
+    calc_rows = [r for r in rows if r['is_calculated']]
+    
+    # 2. 原始字段：继承映射与现有标准字段按去重键查找
+    canonical_map = {}
+    ds_ids = {r['datasource_id'] for r in regular_rows if r['datasource_id']}
+    for r in _select_scoped(session, """
+        SELECT datasource_id, name, upstream_column_id FROM fields
+        WHERE upstream_column_id IS NOT NULL AND datasource_id IN :ids
+    """, ds_ids):
+        canonical_map.setdefault((r['datasource_id'], r['name']), r['upstream_column_id'])
+    
+    keyed = []
+    for row in regular_rows:
+        inherited_col = None
+        if row['datasource_id'] and row['name']:
+            inherited_col = canonical_map.get((row['datasource_id'], row['name']))
+        keyed.append((row, inherited_col, _regular_dedup_key(row, inherited_col)[0]))
+    
+    unique_map = {}
+    col_ids = {key[5:] for _, _, key in keyed if key.startswith('col::')}
+    for r in _select_scoped(session, """
+        SELECT id, upstream_column_id FROM unique_regular_fields WHERE upstream_column_id IN :ids
+    """, col_ids):
+        unique_map.setdefault(f"col::{r['upstream_column_id']}", r['id'])
+    table_ids = {row['table_id'] for row, _, key in keyed if key.startswith('table::')}
+    for r in _select_scoped(session, """
+        SELECT rf.table_id, rf.name, rf.unique_id FROM regular_fields rf
+        JOIN unique_regular_fields u ON u.id = rf.unique_id
+        WHERE u.upstream_column_id IS NULL AND rf.table_id IN :ids
+    """, table_ids):
+        unique_map.setdefault(f"table::{r['table_id']}::{r['name']}", r['unique_id'])
+    key_ds_ids = {row['datasource_id'] for row, _, key in keyed if key.startswith('ds::')}
+    for r in _select_scoped(session, """
+        SELECT rf.datasource_id, rf.name, rf.unique_id FROM regular_fields rf
+        JOIN unique_regular_fields u ON u.id = rf.unique_id
+        WHERE u.upstream_column_id IS NULL AND rf.table_id IS NULL AND rf.datasource_id IN :ids
+    """, key_ds_ids):
+        unique_map.setdefault(f"ds::{r['datasource_id']}::{r['name']}", r['unique_id'])
+    
+    new_unique_records, new_instance_records = [], []
+    for row, inherited_col, key in keyed:
+        if key not in unique_map:
+            unique_map[key] = generate_uuid()
+            new_unique_records.append(_regular_unique_record(row, unique_map[key], inherited_col))
+        new_instance_records.append(_regular_instance_record(row, unique_map[key]))
+    if new_unique_records:
+        session.bulk_insert_mappings(UniqueRegularField, new_unique_records)
+    if new_instance_records:
+        session.bulk_insert_mappings(RegularField, new_instance_records)
+    
+    # 3. 计算字段：按 (name, formula_hash) 查找现有标准指标
+    calc_keyed = [(row, _calc_dedup_key(row)) for row in calc_rows]
+    calc_unique_map = {}
+    hashes = {formula_hash for _, (_, _, _, formula_hash) in calc_keyed}
+    for r in _select_scoped(session, """
+        SELECT id, name, formula_hash FROM unique_calculated_fields WHERE formula_hash IN :ids
+    """, hashes):
+        calc_unique_map.setdefault(f"{r['name']}::{r['formula_hash']}", r['id'])
+    
+    new_unique_records, new_instance_records = [], []
+    for row, (key, name_clean, formula, formula_hash) in calc_keyed:
+        if key not in calc_unique_map:
+            calc_unique_map[key] = generate_uuid()
+            new_unique_records.append(
+                _calc_unique_record(row, calc_unique_map[key], name_clean, formula, formula_hash)
+            )
+        new_instance_records.append(
+            _calc_instance_record(row, calc_unique_map[key], formula, formula_hash)
+        )
+    if new_unique_records:
+        session.bulk_insert_mappings(UniqueCalculatedField, new_unique_records)
+    if new_instance_records:
+        session.bulk_insert_mappings(CalculatedField, new_instance_records)
+    
+    # 4. 清理已无实例的标准字段/指标
+    for table, instance_table, unique_ids in (
+        ('unique_regular_fields', 'regular_fields', old_regular_uniques),
+        ('unique_calculated_fields', 'calculated_fields', old_calc_uniques),
+    ):
+        _execute_scoped(session, f"""
+            DELETE FROM {table}
+            WHERE NOT EXISTS (SELECT 1 FROM {instance_table} i WHERE i.unique_id = {table}.id) {{scope}}
+        """, [u for u in unique_ids if u], f"AND {table}.id IN :ids")
+    
+    # 5. 关联字段的引用统计来自 fields 表（已由同步流程按范围更新）
+    _execute_scoped(session, """
+        UPDATE regular_fields SET
+            usage_count = (SELECT usage_count FROM fields WHERE fields.id = regular_fields.id),
+            metric_usage_count = (SELECT metric_usage_count FROM fields WHERE fields.id = regular_fields.id)
+        WHERE 1 = 1 {scope}
+    """, scope_ids, "AND regular_fields.id IN :ids")
+    _execute_scoped(session, """
+        UPDATE calculated_fields SET
+            usage_count = (SELECT usage_count FROM fields WHERE fields.id = calculated_fields.id)
+        WHERE 1 = 1 {scope}
+    """, scope_ids, "AND calculated_fields.id IN :ids")
+    
+    migrate_relations(session, scope_ids)
+    dependency_targets += [r['dependency_calc_field_id']
+                           for r in _select_scoped(session, dependency_sql, scope_ids)]
+    update_statistics(session, list(dict.fromkeys(scope_ids + dependency_targets)))
+    migrate_lineage(session, scope_ids)
+    
+    # 6. 目录聚合：新旧去重归属涉及的标准字段/指标（引用统计变化的依赖目标一并刷新）
+    regular_uniques = old_regular_uniques | {r['unique_id'] for r in _select_scoped(
+        session, "SELECT unique_id FROM regular_fields WHERE id IN :ids", scope_ids)}
+    calc_uniques = old_calc_uniques | {r['unique_id'] for r in _select_scoped(
+        session, "SELECT unique_id FROM calculated_fields WHERE id IN :ids",
+        list(dict.fromkeys(scope_ids + dependency_targets)))}
+    refresh_catalog_stats(session, [u for u in regular_uniques if u], [u for u in calc_uniques if u])
+    
+    print(f"  ✅ 四表增量刷新: {len(regular_rows)} 个原始字段, {len(calc_rows)} 个计算字段, "
+          f"关联字段 {len(scope_ids) - len(field_ids)} 个")
+    return True
 
 def verify_no_duplicates(session):
     """验证去重后无残留重复"""
@@ -458,10 +818,11 @@ def verify_no_duplicates(session):
     
     return result == 0 and result2 == 0
 
-def main():
+def main(db_path=None):
+    """执行迁移；db_path 为空时使用 Config.DATABASE_PATH（影子库同步时传入影子库路径）"""
     print("🚀 开始四表架构迁移 V5 (穿透继承策略)...")
     
-    session, engine = get_session()
+    session, engine = get_session(db_path)
     
     try:
         cleanup_tables(session)
@@ -472,6 +833,7 @@ def main():
         migrate_relations(session)
         update_statistics(session)
         migrate_lineage(session)
+        refresh_catalog_stats(session)
         
         session.commit()
         
@@ -492,6 +854,7 @@ def main():
         raise
     finally:
         session.close()
+        engine.dispose()
 
 if __name__ == "__main__":
     main()
@@ -2,10 +2,14 @@
 SQLAlchemy ORM 模型
 基于数据库设计文档创建 - 增强版（补全 Tableau Metadata API 字段）
 """
+import os
+import sqlite3
+import weakref
 from datetime import datetime
+from functools import partial
 from sqlalchemy import (
-    create_engine, Column, String, Integer, Float, Boolean, 
-    Text, DateTime, ForeignKey, Table
+    create_engine, event, Column, String, Integer, Float, Boolean, 
+    Text, DateTime, ForeignKey, Table, Index, text
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, backref
@@ -166,7 +170,8 @@ class Database(Base):
     # 关系
     tables = relationship('DBTable', back_populates='database')
     
-    def to_dict(self):
+    def to_dict(self, table_count=0):
+        """表数量由调用方聚合查询后传入，不读取 tables 集合（避免懒加载整个集合）"""
         return {
             'id': self.id,
             'luid': self.luid,
@@ -179,7 +184,7 @@ class Database(Base):
             'isCertified': self.is_certified,
             'certificationNote': self.certification_note,
             'platform': self.platform,
-            'tables': len(self.tables) if self.tables else 0,
+            'tables': table_count,
             'status': 'active',
             'createdAt': self.created_at.isoformat() if self.created_at else None,
             'updatedAt': self.updated_at.isoformat() if self.updated_at else None
@@ -212,7 +217,8 @@ class DBTable(Base):
     fields = relationship('Field', back_populates='table')
     datasources = relationship('Datasource', secondary=table_to_datasource, back_populates='tables')
     
-    def to_dict(self):
+    def to_dict(self, column_count=0, field_count=0, database_name=None):
+        """列数、字段数与数据库名由调用方聚合查询后传入，不读取 columns / fields / database 关系"""
         return {
             'id': self.id,
             'luid': self.luid,
@@ -220,7 +226,7 @@ class DBTable(Base):
             'fullName': self.full_name,
             'schema': self.schema,
             'databaseId': self.database_id,
-            'databaseName': self.database.name if self.database else None,
+            'databaseName': database_name,
             'connectionType': self.connection_type,
             'tableType': self.table_type,
             'description': self.description,
@@ -228,8 +234,8 @@ class DBTable(Base):
             'isCertified': self.is_certified,
             'certificationNote': self.certification_note,
             'projectName': self.project_name,
-            'columnCount': len(self.columns) if self.columns else 0,
-            'fieldCount': len(self.fields) if self.fields else 0,
+            'columnCount': column_count,
+            'fieldCount': field_count,
             'createdAt': self.created_at.isoformat() if self.created_at else None,
             'updatedAt': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -621,6 +627,56 @@ class CalcFieldFullLineage(Base):
     lineage_path = Column(Text)
 
 
+# ==================== 分表重构：目录聚合表（物化）====================
+
+class RegularFieldCatalogStats(Base):
+    """标准字段目录聚合（每个标准字段一行）
+
+    V5 迁移最后一步由 split_fields_table_v5.refresh_catalog_stats 生成，
+    字段目录接口直接按索引分页读取，不再在每次请求时聚合实例与血缘。
+    datasource_info / workbook_info 为 "id|name" 逗号拼接。
+    """
+    __tablename__ = 'unique_regular_field_stats'
+
+    unique_id = Column(String(255), ForeignKey('unique_regular_fields.id'), primary_key=True)
+    instance_count = Column(Integer, nullable=False, default=0)
+    total_usage = Column(Integer, nullable=False, default=0)
+    role = Column(String(50))
+    data_type = Column(String(100))
+    remote_type = Column(String(100))
+    dedup_method = Column(String(20))  # physical_table / embedded_table / datasource
+    datasource_info = Column(Text)
+    workbook_info = Column(Text)
+
+    __table_args__ = (
+        Index('ix_unique_regular_field_stats_usage', 'total_usage', 'unique_id'),
+        Index('ix_unique_regular_field_stats_instances', 'instance_count', 'unique_id'),
+    )
+
+
+class CalcFieldCatalogStats(Base):
+    """标准指标目录聚合（每个标准指标一行），生成方式同 RegularFieldCatalogStats"""
+    __tablename__ = 'unique_calculated_field_stats'
+
+    unique_id = Column(String(255), ForeignKey('unique_calculated_fields.id'), primary_key=True)
+    instance_count = Column(Integer, nullable=False, default=0)
+    total_references = Column(Integer, nullable=False, default=0)
+    total_usage = Column(Integer, nullable=False, default=0)
+    role = Column(String(50))
+    data_type = Column(String(100))
+    has_embedded = Column(Boolean, nullable=False, default=False)
+    has_published = Column(Boolean, nullable=False, default=True)
+    dedup_method = Column(String(20))  # hash_mixed / hash_embedded / hash_published
+    datasource_info = Column(Text)
+    workbook_info = Column(Text)
+
+    __table_args__ = (
+        Index('ix_unique_calculated_field_stats_usage', 'total_usage', 'unique_id'),
+        Index('ix_unique_calculated_field_stats_references', 'total_references', 'unique_id'),
+        Index('ix_unique_calculated_field_stats_instances', 'instance_count', 'unique_id'),
+    )
+
+
 class Datasource(Base):
     """数据源（增强版）"""
     __tablename__ = 'datasources'
@@ -771,7 +827,8 @@ class View(Base):
         backref='parent_dashboards'
     )
     
-    def to_dict(self):
+    def to_dict(self, workbook_name=None, contained_sheet_count=0, is_standalone=False):
+        """工作簿名与仪表盘/工作表关系统计由调用方聚合查询后传入，不读取 workbook 与仪表盘关系"""
         return {
             'id': self.id,
             'luid': self.luid,
@@ -781,9 +838,9 @@ class View(Base):
             'viewType': self.view_type,
             'index': self.index,
             'workbookId': self.workbook_id,
-            'workbookName': self.workbook.name if self.workbook else None,
-            'containedSheetCount': len(self.contained_sheets) if self.view_type == 'dashboard' else 0,
-            'isStandalone': (len(self.parent_dashboards) == 0) if self.view_type == 'sheet' else False,
+            'workbookName': workbook_name,
+            'containedSheetCount': contained_sheet_count if self.view_type == 'dashboard' else 0,
+            'isStandalone': is_standalone if self.view_type == 'sheet' else False,
             'totalViewCount': self.total_view_count or 0,
             'createdAt': self.created_at.isoformat() if self.created_at else None,
             'updatedAt': self.updated_at.isoformat() if self.updated_at else None
@@ -995,19 +1052,325 @@ class SyncLog(Base):
         }
 
 
+class SyncChange(Base):
+    """同步变更日志（CDC）：记录每次同步中新增/更新/删除的实体"""
+    __tablename__ = 'sync_changes'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sync_run_id = Column(Integer, index=True, nullable=False)  # 对应 sync_logs 中的运行级记录
+    entity_type = Column(String(50), nullable=False)  # workbook/datasource/field/view/...
+    entity_id = Column(String(255), nullable=False)
+    op = Column(String(10), nullable=False)  # insert/update/delete
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'runId': self.sync_run_id,
+            'entityType': self.entity_type,
+            'entityId': self.entity_id,
+            'op': self.op
+        }
+
+
+class SyncJob(Base):
+    """同步任务登记表（跨 worker 协调）
+
+    Web worker 只负责登记任务，由独立的同步执行进程 (backend/sync_runner.py) 领取执行。
+    部分唯一索引保证同一 lock_key 下同时只有一个排队/运行中的任务。
+    """
+    __tablename__ = 'sync_jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_type = Column(String(50), nullable=False, default='full')  # full/incremental/usage
+    lock_key = Column(String(50), nullable=False, default='sync')  # 互斥范围
+    status = Column(String(20), nullable=False, default='queued')  # queued/running/completed/failed
+    params = Column(Text)  # JSON 参数
+    requested_by = Column(String(100))  # api/cli/scheduler
+    requested_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # 执行进程心跳，用于识别僵死任务
+    runner_pid = Column(Integer)
+    current_stage = Column(String(50))
+    stage_index = Column(Integer, default=0)
+    stage_total = Column(Integer, default=0)
+    percent = Column(Float, default=0.0)
+    stage_progress = Column(Text)  # JSON: [{name, label, status, startedAt, completedAt, records}]
+    message = Column(Text)
+    error_message = Column(Text)
+    sync_run_id = Column(Integer)  # 对应 sync_logs 中的运行级记录
+
+    __table_args__ = (
+        Index(
+            'ux_sync_jobs_active', 'lock_key', unique=True,
+            sqlite_where=text("status IN ('queued', 'running')")
+        ),
+    )
+
+    def to_dict(self):
+        import json
+        return {
+            'id': self.id,
+            'jobType': self.job_type,
+            'status': self.status,
+            'params': json.loads(self.params) if self.params else {},
+            'requestedBy': self.requested_by,
+            'requestedAt': self.requested_at.isoformat() if self.requested_at else None,
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'completedAt': self.completed_at.isoformat() if self.completed_at else None,
+            'heartbeatAt': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'runnerPid': self.runner_pid,
+            'currentStage': self.current_stage,
+            'stageIndex': self.stage_index,
+            'stageTotal': self.stage_total,
+            'percent': round(self.percent or 0, 1),
+            'stages': json.loads(self.stage_progress) if self.stage_progress else [],
+            'message': self.message,
+            'errorMessage': self.error_message,
+            'syncRunId': self.sync_run_id
+        }
+
+
+class SyncRefreshRequest(Base):
+    """定向刷新队列：Tableau Webhook 事件按资产去重合并后落库，由同步执行进程限速消费
+
+    部分唯一索引保证同一站点的同一资产只有一条待处理记录，重复事件只累加计数。
+    """
+    __tablename__ = 'sync_refresh_queue'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    asset_type = Column(String(20), nullable=False)  # workbook/datasource
+    asset_luid = Column(String(255), nullable=False)  # Webhook 提供的 REST LUID
+    asset_name = Column(String(255))
+    site = Column(String(255), nullable=False, default='')  # 站点 contentUrl（默认站点为空）
+    event_type = Column(String(50))  # 最近一次事件类型，如 WorkbookUpdated
+    event_count = Column(Integer, default=1)  # 合并的事件数
+    status = Column(String(20), nullable=False, default='pending')  # pending/dispatched/failed（任务失败）
+    first_received_at = Column(DateTime, default=datetime.utcnow)
+    last_received_at = Column(DateTime, default=datetime.utcnow)
+    dispatched_at = Column(DateTime)
+    job_id = Column(Integer)  # 对应 sync_jobs 中的任务
+
+    __table_args__ = (
+        Index(
+            'ux_sync_refresh_queue_pending', 'asset_type', 'asset_luid', 'site', unique=True,
+            sqlite_where=text("status = 'pending'")
+        ),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'assetType': self.asset_type,
+            'assetLuid': self.asset_luid,
+            'assetName': self.asset_name,
+            'site': self.site,
+            'eventType': self.event_type,
+            'eventCount': self.event_count,
+            'status': self.status,
+            'firstReceivedAt': self.first_received_at.isoformat() if self.first_received_at else None,
+            'lastReceivedAt': self.last_received_at.isoformat() if self.last_received_at else None,
+            'dispatchedAt': self.dispatched_at.isoformat() if self.dispatched_at else None,
+            'jobId': self.job_id
+        }
+
+
+class SyncStageMetric(Base):
+    """同步阶段遥测：每次运行每个阶段的耗时、请求量、SQL 量与内存"""
+    __tablename__ = 'sync_stage_metrics'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sync_run_id = Column(Integer, index=True, nullable=False)  # 对应 sync_logs 中的运行级记录
+    stage = Column(String(50), nullable=False)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    wall_ms = Column(Float, default=0.0)  # 墙钟耗时（毫秒）
+    records = Column(Integer)  # 阶段返回的记录数
+    tableau_requests = Column(Integer, default=0)  # Tableau HTTP 请求数
+    tableau_bytes = Column(Integer, default=0)  # 下载字节数
+    graphql_errors = Column(Integer, default=0)  # GraphQL 响应中的 errors 条数
+    sql_statements = Column(Integer, default=0)  # 执行的 SQL 语句数
+    rows_written = Column(Integer, default=0)  # INSERT/UPDATE/DELETE 影响行数
+    peak_rss_mb = Column(Float)  # 阶段结束时的进程峰值内存（MB）
+
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'completedAt': self.completed_at.isoformat() if self.completed_at else None,
+            'wallMs': round(self.wall_ms or 0, 1),
+            'records': self.records,
+            'tableauRequests': self.tableau_requests,
+            'tableauBytes': self.tableau_bytes,
+            'graphqlErrors': self.graphql_errors,
+            'sqlStatements': self.sql_statements,
+            'rowsWritten': self.rows_written,
+            'peakRssMb': round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None
+        }
+
+# ==================== 查询索引 ====================
+# 热点连接/筛选列的二级索引；已有库通过 migrations/add_query_indexes.py（或 init_db）补建
+# 已发布资产的筛选统一写作 (is_embedded = 0 OR is_embedded IS NULL)，部分索引条件与之保持一致
+
+_PUBLISHED = text("is_embedded = 0 OR is_embedded IS NULL")
+
+QUERY_INDEXES = (
+    # 四表架构
+    Index('ix_regular_fields_unique_id', RegularField.unique_id),
+    Index('ix_calculated_fields_unique_id', CalculatedField.unique_id),
+    Index('ix_calculated_fields_datasource_id', CalculatedField.datasource_id),
+    Index('ix_calculated_fields_workbook_id', CalculatedField.workbook_id),
+    # 重复公式分组取代表实例（按使用次数排序）
+    Index('ix_calculated_fields_formula_hash_usage', CalculatedField.formula_hash,
+          CalculatedField.usage_count.desc(), CalculatedField.reference_count.desc(), CalculatedField.id),
+    Index('ix_calc_field_dependencies_source_field_id', CalcFieldDependency.source_field_id),
+    Index('ix_calc_field_dependencies_dependency_calc_field_id', CalcFieldDependency.dependency_calc_field_id),
+    Index('ix_regular_field_full_lineage_datasource_id', RegularFieldFullLineage.datasource_id),
+    Index('ix_regular_field_to_view_view_id', regular_field_to_view.c.view_id),
+    Index('ix_calc_field_to_view_view_id', calc_field_to_view.c.view_id),
+    # 原始字段表
+    Index('ix_fields_datasource_id', Field.datasource_id),
+    Index('ix_fields_table_id', Field.table_id),
+    Index('ix_fields_workbook_id', Field.workbook_id),
+    Index('ix_field_to_view_view_id', field_to_view.c.view_id),
+    # 资产层级（关联表主键以左列开头，反向查询用覆盖索引）
+    Index('ix_views_workbook_id', View.workbook_id),
+    Index('ix_db_columns_table_id', DBColumn.table_id),
+    Index('ix_dashboard_to_sheet_sheet_id', dashboard_to_sheet.c.sheet_id),
+    Index('ix_datasource_to_workbook_workbook_id',
+          datasource_to_workbook.c.workbook_id, datasource_to_workbook.c.datasource_id),
+    Index('ix_table_to_datasource_datasource_id',
+          table_to_datasource.c.datasource_id, table_to_datasource.c.table_id),
+    # 视图访问历史（按视图取快照并按时间倒序）
+    Index('ix_view_usage_history_view_recorded',
+          ViewUsageHistory.view_id, ViewUsageHistory.recorded_at),
+    # 已发布/嵌入式筛选（部分索引）
+    Index('ix_datasources_published_extract', Datasource.has_extract,
+          Datasource.extract_last_refresh_time, sqlite_where=_PUBLISHED),
+    Index('ix_tables_published_name', DBTable.name, sqlite_where=_PUBLISHED),
+    Index('ix_datasources_embedded_source', Datasource.source_published_datasource_id,
+          sqlite_where=text("is_embedded = 1")),
+)
+
+
+def ensure_query_indexes(engine):
+    """补建缺失的查询索引（已存在的表不会被 create_all 补建索引），返回新建的索引名"""
+    from sqlalchemy import inspect
+
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    created = []
+    for index in QUERY_INDEXES:
+        if index.table.name not in tables:
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(index.table.name)}
+        if index.name not in existing:
+            index.create(engine)
+            created.append(index.name)
+    if created:
+        with engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+    return created
+
+
 # ==================== 数据库工具函数 ====================
 
-def get_engine(database_path):
-    """创建数据库引擎"""
-    return create_engine(f'sqlite:///{database_path}', echo=False)
+# 连接档位：default 为通用读写连接；sync 为同步写入（更大的页缓存，日志模式沿用库文件设置，
+# 影子库保持回滚日志）；api 为只读查询连接 (query_only)
+ENGINE_PROFILES = ("default", "sync", "api")
+
+
+def sqlite_pragmas(profile='default'):
+    """连接档位对应的 PRAGMA 列表（按顺序执行），关闭 SQLITE_TUNING 时只保留 query_only"""
+    from backend.config import Config
+
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"未知的连接档位: {profile}")
+    pragmas = []
+    if Config.SQLITE_TUNING:
+        pragmas.append(('busy_timeout', Config.SQLITE_BUSY_TIMEOUT_MS))
+        if profile == 'default':
+            # journal_mode=WAL 持久化在库文件上，读写互不阻塞
+            pragmas.append(('journal_mode', Config.SQLITE_JOURNAL_MODE))
+        if profile != 'api':
+            pragmas.append(('synchronous', Config.SQLITE_SYNCHRONOUS))
+        cache_kb = Config.SQLITE_SYNC_CACHE_SIZE_KB if profile == 'sync' else Config.SQLITE_CACHE_SIZE_KB
+        pragmas += [
+            ('cache_size', -cache_kb),  # 负值表示 KB
+            ('mmap_size', Config.SQLITE_MMAP_SIZE_MB * 1024 * 1024),
+            ('temp_store', 'MEMORY'),
+        ]
+    if profile == 'api':
+        pragmas.append(('query_only', 1))
+    return pragmas
+
+
+def _apply_pragmas(dbapi_connection, connection_record, pragmas=()):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            try:
+                cursor.execute(f'PRAGMA {name}={value}')
+            except sqlite3.OperationalError as e:
+                # 切换 WAL 需要短暂独占；库被其他进程锁定时沿用现有模式
+                if name != 'journal_mode':
+                    raise
+                print(f"⚠️ 设置 journal_mode 失败，沿用现有模式: {e}")
+    finally:
+        cursor.close()
+
+
+# 本进程创建的引擎与其会话工厂（弱引用，引擎释放后自动移除）
+_ENGINES = weakref.WeakSet()
+_SESSION_FACTORIES = weakref.WeakKeyDictionary()
+
+
+def _dispose_engines_after_fork():
+    """fork 出的子进程（如 gunicorn --preload 的 worker）丢弃继承的连接池，
+    继承的 SQLite 连接仍归父进程所有，不在子进程中关闭"""
+    for engine in list(_ENGINES):
+        engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
+
+def get_engine(database_path, profile='default'):
+    """创建数据库引擎，建立连接时应用档位对应的 PRAGMA（见 sqlite_pragmas）"""
+    from backend.config import Config
+
+    pool_args = {}
+    if database_path not in ('', ':memory:'):  # 内存库使用单连接池
+        pool_args = {
+            'pool_size': Config.SQLITE_POOL_SIZE,
+            'max_overflow': Config.SQLITE_POOL_MAX_OVERFLOW,
+        }
+    engine = create_engine(f'sqlite:///{database_path}', echo=False, **pool_args)
+    pragmas = sqlite_pragmas(profile)
+    if pragmas:
+        event.listen(engine, 'connect', partial(_apply_pragmas, pragmas=pragmas))
+    _ENGINES.add(engine)
+    return engine
 
 
 def init_db(engine):
-    """初始化数据库表"""
+    """初始化数据库表（含已有库缺失的查询索引与目录聚合）"""
+    from backend.migrations.split_fields_table_v5 import ensure_catalog_stats
+
     Base.metadata.create_all(engine)
+    ensure_query_indexes(engine)
+    ensure_catalog_stats(engine)
+
+
+def session_factory(engine):
+    """引擎对应的 sessionmaker（按引擎缓存，避免每次获取会话时重建）"""
+    factory = _SESSION_FACTORIES.get(engine)
+    if factory is None:
+        factory = _SESSION_FACTORIES[engine] = sessionmaker(bind=engine)
+    return factory
 
 
 def get_session(engine):
     """获取数据库会话"""
-    Session = sessionmaker(bind=engine)
-    return Session()
+    return session_factory(engine)()
@@ -12,6 +12,9 @@
 - fields.py: 字段接口
 - metrics.py: 指标接口
 - lineage.py: 血缘接口
+- sync.py: 同步任务接口
+- sites.py: 多站点接口（站点列表、跨站点搜索）
+- export.py: 批量导出接口（NDJSON / CSV 流式导出）
 - api_legacy.py: 剩余接口（统计、搜索、质量、项目、用户等）
 """
 
@@ -34,6 +37,8 @@ from . import metrics
 from . import glossary
 from . import lineage
 from . import sync
+from . import sites
+from . import export
 
 # 导入原 api_legacy.py 中剩余的路由
 from . import api_legacy
@@ -3,32 +3,52 @@
 包含数据库列表和详情接口
 """
 from flask import jsonify, request, g
-from sqlalchemy.orm import selectinload
 from sqlalchemy import text, bindparam
 from . import api_bp
-from .utils import build_tableau_url
+from .utils import build_tableau_url, parse_fieldset, project_fields, wants_field
 from ..models import Database
 
 
 @api_bp.route('/databases')
 def get_databases():
-    """获取数据库列表 - 性能优化版"""
+    """获取数据库列表 - 性能优化版（支持 ?fields= 只返回所需字段）"""
     session = g.db_session
     search = request.args.get('search', '')
-    
-    # 使用 selectinload 预加载 tables 关系，避免 N+1
-    query = session.query(Database).options(
-        selectinload(Database.tables)
-    )
+    fieldset = parse_fieldset()
 
+    query = session.query(Database)
     if search: 
         query = query.filter(Database.name.ilike(f'%{search}%'))
 
     databases = query.all()
     
-    # 预先查询所有相关统计（一次性获取所有数据库的字段和数据源统计）
+    # 表数量与表名预览按数据库聚合（不加载 tables 集合）
     db_ids = [db.id for db in databases]
-    if db_ids:
+    table_map = {}
+    table_names_map = {}
+    if db_ids and wants_field(fieldset, 'tables', 'table_count', 'table_names'):
+        stmt = text("""
+            SELECT database_id, COUNT(*) as table_count
+            FROM tables
+            WHERE database_id IN :db_ids
+            GROUP BY database_id
+        """).bindparams(bindparam('db_ids', expanding=True))
+        table_map = {row[0]: row[1] for row in session.execute(stmt, {'db_ids': list(db_ids)})}
+    if db_ids and wants_field(fieldset, 'table_names'):
+        stmt = text("""
+            SELECT database_id, name FROM (
+                SELECT database_id, name,
+                       ROW_NUMBER() OVER (PARTITION BY database_id ORDER BY rowid) as rn
+                FROM tables
+                WHERE database_id IN :db_ids
+            ) WHERE rn <= 10
+        """).bindparams(bindparam('db_ids', expanding=True))
+        for database_id, name in session.execute(stmt, {'db_ids': list(db_ids)}):
+            table_names_map.setdefault(database_id, []).append(name)
+
+    # 预先查询所有相关统计（一次性获取所有数据库的字段和数据源统计）
+    stats_map = {}
+    if db_ids and wants_field(fieldset, 'datasource_count', 'total_field_count'):
         stmt = text("""
             SELECT 
                 t.database_id,
@@ -43,18 +63,17 @@ def get_databases():
         stmt = stmt.bindparams(bindparam('db_ids', expanding=True))
         stats = session.execute(stmt, {'db_ids': list(db_ids)}).fetchall()
         stats_map = {row[0]: {'fields': row[1], 'ds': row[2]} for row in stats}
-    else:
-        stats_map = {}
     
     results = []
     for db in databases:
-        data = db.to_dict()
-        data['table_count'] = len(db.tables)
-        data['table_names'] = [t.name for t in db.tables[:10]]
+        table_count = table_map.get(db.id, 0)
+        data = db.to_dict(table_count=table_count)
+        data['table_count'] = table_count
+        data['table_names'] = table_names_map.get(db.id, [])
         db_stats = stats_map.get(db.id, {'fields': 0, 'ds': 0})
         data['datasource_count'] = db_stats['ds']
         data['total_field_count'] = db_stats['fields']
-        results.append(data)
+        results.append(project_fields(data, fieldset))
 
     return jsonify({
         'items': results,
@@ -73,7 +92,7 @@ def get_database_detail(db_id):
     if not db:
         return jsonify({'error': 'Not found'}), 404
 
-    data = db.to_dict()
+    data = db.to_dict(table_count=len(db.tables))
 
     # 包含的表列表（完整信息）
     tables_data = []
@@ -4,10 +4,20 @@
 """
 
 from flask import jsonify, request, g
-from sqlalchemy import text, bindparam
-from sqlalchemy.orm import selectinload
+from sqlalchemy import text, bindparam, func
 from . import api_bp
-from .utils import build_tableau_url
+from .utils import (
+    CursorError,
+    apply_keyset,
+    build_tableau_url,
+    decode_cursor,
+    list_total,
+    next_cursor,
+    page_count,
+    parse_fieldset,
+    project_fields,
+    wants_field,
+)
 from ..models import Datasource, Field, View
 
 
@@ -25,15 +35,9 @@ def get_datasources():
     def parse_list(value: str) -> list[str]:
         return [item.strip() for item in value.split(",") if item.strip()]
 
-    from sqlalchemy.orm import selectinload
-    from sqlalchemy import text
-
-    # 使用 selectinload 预加载关联数据
-    query = session.query(Datasource).options(
-        selectinload(Datasource.tables),
-        selectinload(Datasource.fields),
-        selectinload(Datasource.workbooks),
-    )
+    # 只查询数据源本身，数量来自预计算列与当前页的聚合查询（?fields= 未请求的统计不查询）
+    fieldset = parse_fieldset()
+    query = session.query(Datasource)
 
     # 嵌入式筛选
     if is_embedded is not None:
@@ -62,48 +66,57 @@ def get_datasources():
         elif project_values:
             query = query.filter(Datasource.project_name.in_(project_values))
 
-    # 分页参数
+    # 分页参数（cursor 为上一页返回的 next_cursor）
     page = request.args.get("page", 1, type=int)
     page_size = request.args.get("page_size", 50, type=int)
-    page_size = min(page_size, 10000)
+    page_size = min(page_size, 1000)  # 全量清单改用 /api/export
+    cursor = request.args.get("cursor", "")
 
-    # 排序
+    total_count, total_exact = list_total("datasources", query.count)
+
+    # 排序（id 兜底保证顺序稳定，供游标分页使用）
+    descending = order == "desc"
     if sort == "name":
-        query = query.order_by(
-            Datasource.name.desc() if order == "desc" else Datasource.name.asc()
-        )
+        sort_columns = [Datasource.name, Datasource.id]
+        sort_values = lambda ds: [ds.name, ds.id]
     elif sort == "project_name":
-        query = query.order_by(
-            Datasource.project_name.desc()
-            if order == "desc"
-            else Datasource.project_name.asc()
-        )
+        sort_columns = [func.coalesce(Datasource.project_name, ""), Datasource.id]
+        sort_values = lambda ds: [ds.project_name or "", ds.id]
     elif sort == "table_count":
-        query = query.order_by(
-            Datasource.table_count.desc()
-            if order == "desc"
-            else Datasource.table_count.asc()
-        )
+        sort_columns = [func.coalesce(Datasource.table_count, 0), Datasource.id]
+        sort_values = lambda ds: [ds.table_count or 0, ds.id]
     elif sort == "workbook_count":
-        query = query.order_by(
-            Datasource.workbook_count.desc()
-            if order == "desc"
-            else Datasource.workbook_count.asc()
-        )
+        sort_columns = [func.coalesce(Datasource.workbook_count, 0), Datasource.id]
+        sort_values = lambda ds: [ds.workbook_count or 0, ds.id]
     elif sort == "last_refresh":
+        sort_columns = None  # 时间可能为空，不支持游标
         query = query.order_by(
             Datasource.extract_last_refresh_time.desc()
-            if order == "desc"
-            else Datasource.extract_last_refresh_time.asc()
+            if descending
+            else Datasource.extract_last_refresh_time.asc(),
+            Datasource.id,
         )
     else:
         # 默认排序
-        query = query.order_by(Datasource.name.asc())
-
-    total_count = query.count()
-    offset = (page - 1) * page_size
-
-    datasources = query.limit(page_size).offset(offset).all()
+        sort_columns = [Datasource.name, Datasource.id]
+        sort_values = lambda ds: [ds.name, ds.id]
+        descending = False
+
+    if sort_columns is None:
+        if cursor:
+            return jsonify({"error": f"排序 {sort} 不支持游标分页"}), 400
+        datasources = query.limit(page_size).offset((page - 1) * page_size).all()
+        cursor_next = None
+    else:
+        try:
+            cursor_values = decode_cursor(cursor, len(sort_columns)) if cursor else None
+        except CursorError as e:
+            return jsonify({"error": str(e)}), 400
+        query = apply_keyset(query, sort_columns, descending, cursor_values)
+        offset = 0 if cursor else (page - 1) * page_size
+        datasources, cursor_next = next_cursor(
+            query.limit(page_size + 1).offset(offset).all(), page_size, sort_values
+        )
 
     # 预查询各项统计（仅针对当前页的数据源，统一口径）
     ds_ids = [ds.id for ds in datasources]
@@ -112,7 +125,10 @@ def get_datasources():
     table_map = {}
     field_map = {}
 
-    if ds_ids:
+    def stats_for(*fields):
+        return ds_ids and wants_field(fieldset, *fields)
+
+    if stats_for("view_count"):
         # 1. 视图统计
         stmt_view = text("""
             SELECT dw.datasource_id, COUNT(v.id) as view_count
@@ -124,6 +140,7 @@ def get_datasources():
         view_stats = session.execute(stmt_view, {"ds_ids": list(ds_ids)}).fetchall()
         view_map = {row[0]: row[1] for row in view_stats}
 
+    if stats_for("workbook_count"):
         # 2. 工作簿统计
         stmt_wb = text("""
             SELECT datasource_id, COUNT(workbook_id) as wb_count
@@ -134,6 +151,7 @@ def get_datasources():
         wb_stats = session.execute(stmt_wb, {"ds_ids": list(ds_ids)}).fetchall()
         wb_map = {row[0]: row[1] for row in wb_stats}
 
+    if stats_for("table_count", "embedded_table_count", "regular_table_count"):
         # 3. 物理表统计 - 分别统计嵌入表和原始表
         stmt_tbl = text("""
             SELECT 
@@ -150,6 +168,7 @@ def get_datasources():
             row[0]: {"embedded": row[1], "regular": row[2]} for row in tbl_stats
         }
 
+    if stats_for("field_count"):
         # 4. 字段统计 (仅统计原始字段，即 is_calculated=0)
         # 4. 字段统计 (增加对穿透已发布数据源的支持)
         # 如果是嵌入式且有关联的已发布数据源，则统计已发布数据源的字段
@@ -184,7 +203,7 @@ def get_datasources():
         data["view_count"] = view_map.get(ds.id, 0)
         # 优化：不返回完整的关联对象列表，仅返回数量以减少 payload
         # 如果前端需要详情，应使用详情接口
-        results.append(data)
+        results.append(project_fields(data, fieldset))
 
     # Facets 统计
     facets = {}
@@ -220,7 +239,9 @@ def get_datasources():
             "total": total_count,
             "page": page,
             "page_size": page_size,
-            "total_pages": (total_count + page_size - 1) // page_size,
+            "total_pages": page_count(total_count, page_size),
+            "total_exact": total_exact,
+            "next_cursor": cursor_next,
             "facets": facets,
         }
     )
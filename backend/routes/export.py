@@ -0,0 +1,58 @@
+"""
+批量导出接口路由模块
+全量清单的流式导出（NDJSON / CSV，可选 gzip），替代超大 page_size 的列表请求
+"""
+
+from itertools import chain
+
+from flask import Response, g, jsonify, request, stream_with_context
+
+from . import api_bp
+from ..services.export import EXPORT_FORMATS, EXPORT_SOURCES, export_chunks
+
+
+@api_bp.route("/export/<entity>")
+def export_entity(entity):
+    """流式导出实体清单
+
+    参数:
+        format: ndjson（默认，每行一个 JSON 对象）/ csv（首行表头，UTF-8 BOM）
+        gzip: 1 压缩 / 0 不压缩；缺省时按 Accept-Encoding 协商
+    """
+    if entity not in EXPORT_SOURCES:
+        return jsonify({
+            "error": f"不支持导出的实体: {entity}",
+            "supported": sorted(EXPORT_SOURCES),
+        }), 404
+
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"不支持的导出格式: {fmt}（可选 ndjson / csv）"}), 400
+
+    gzip_arg = request.args.get("gzip")
+    if gzip_arg is None:
+        compress = "gzip" in request.accept_encodings
+    else:
+        compress = gzip_arg.lower() in ("1", "true", "yes")
+
+    # 先取第一块：查询在返回响应头之前执行，表缺失等错误仍能以 JSON 报错
+    chunks = export_chunks(g.db_session, entity, fmt, compress)
+    try:
+        first = next(chunks, b"")
+    except Exception as e:
+        g.db_session.rollback()
+        return jsonify({"error": f"导出失败: {e}"}), 500
+
+    response = Response(
+        stream_with_context(chain([first], chunks)),
+        mimetype=EXPORT_FORMATS[fmt],
+        direct_passthrough=True,
+    )
+    if fmt == "csv":
+        response.charset = "utf-8"
+    response.headers["Content-Disposition"] = f'attachment; filename="{entity}.{fmt}"'
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["X-Accel-Buffering"] = "no"  # 反向代理不缓冲整份响应
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
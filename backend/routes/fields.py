@@ -7,7 +7,18 @@ from flask import jsonify, request, g
 from sqlalchemy import text, bindparam, func
 from sqlalchemy.orm import selectinload
 from . import api_bp
-from .utils import build_tableau_url, get_field_usage_by_name
+from .utils import (
+    CursorError,
+    build_tableau_url,
+    decode_cursor,
+    get_field_usage_by_name,
+    keyset_sql,
+    list_facets,
+    list_total,
+    next_cursor,
+    page_count,
+    parse_lineage_pairs,
+)
 from ..models import Field, Datasource, View, FieldDependency, DBColumn, CalculatedField
 
 # ==================== 字段接口 ====================
@@ -196,6 +207,7 @@ def get_fields_catalog():
 
     此接口已重构，直接查询 unique_regular_fields 表（标准资产），
     而不是从 fields 表动态聚合。这确保了列表数量与侧边栏统计（也是基于 unique 表）完全一致。
+    实例统计与数据源/工作簿列表读取 V5 迁移物化的 unique_regular_field_stats。
     """
     session = g.db_session
     from sqlalchemy import text
@@ -211,6 +223,7 @@ def get_fields_catalog():
     dedup_method_filter = request.args.get("dedup_method", "")  # 新增：去重方式筛选
     sort = request.args.get("sort", "total_usage")
     order = request.args.get("order", "desc")
+    cursor = request.args.get("cursor", "")
 
     def parse_list(value: str) -> list[str]:
         return [item.strip() for item in value.split(",") if item.strip()]
@@ -233,8 +246,7 @@ def get_fields_catalog():
         conditions.append("(urf.name LIKE :search OR urf.description LIKE :search)")
         params["search"] = f"%{search}%"
 
-    # 2. 角色筛选 (针对实例属性 - 只要有一个实例匹配即可)
-    # 注意：这需要在 JOIN regular_fields 后应用，或者在 WHERE 中
+    # 2. 角色筛选 (目录聚合中的代表角色)
     if role_filter:
         role_values = parse_list(role_filter)
         # 处理 'group_set' 特殊值：匹配空字符串或 NULL（组/集类型字段）
@@ -243,141 +255,100 @@ def get_fields_catalog():
 
         role_conditions = []
         if has_group_set:
-            role_conditions.append("(rf.role IS NULL OR rf.role = '')")
+            role_conditions.append("(s.role IS NULL OR s.role = '')")
         if normal_values:
             if len(normal_values) == 1:
-                role_conditions.append("rf.role = :role")
+                role_conditions.append("s.role = :role")
                 params["role"] = normal_values[0]
             else:
                 role_clause = build_in_clause("role", normal_values, params)
-                role_conditions.append(f"rf.role IN {role_clause}")
+                role_conditions.append(f"s.role IN {role_clause}")
 
         if role_conditions:
             conditions.append(f"({' OR '.join(role_conditions)})")
 
-    # 3. 去重方式筛选
+    # 3. 去重方式筛选 (物理表/嵌入式表/数据源)
     if dedup_method_filter:
-        dedup_values = parse_list(dedup_method_filter)
-        dedup_clauses = []
-        for value in dedup_values:
-            if value == "physical_table":
-                dedup_clauses.append(
-                    "(urf.table_id IS NOT NULL AND (t.is_embedded = 0 OR t.is_embedded IS NULL))"
-                )
-            elif value == "embedded_table":
-                dedup_clauses.append("(urf.table_id IS NOT NULL AND t.is_embedded = 1)")
-            elif value == "datasource":
-                dedup_clauses.append("(urf.table_id IS NULL)")
-        if dedup_clauses:
-            conditions.append(f"({' OR '.join(dedup_clauses)})")
+        dedup_values = [
+            value
+            for value in parse_list(dedup_method_filter)
+            if value in ("physical_table", "embedded_table", "datasource")
+        ]
+        if dedup_values:
+            dedup_clause = build_in_clause("dedup_method", dedup_values, params)
+            conditions.append(f"s.dedup_method IN {dedup_clause}")
 
     where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
 
-    # 构建 SQL
-    # 使用 CTE 预先计算统计信息可能会更快，但直接 JOIN 也是可行的
-    # 注意：GROUP_CONCAT 去重依赖于 DISTINCT
-
-    # 使用 CTE 预先计算统计信息，并使用子查询获取血缘信息，避免数据膨胀
+    # 统计信息与血缘列表来自 V5 迁移物化的目录聚合表，按 (total_usage / instance_count, unique_id) 索引分页
     base_sql = f"""
-        WITH field_stats AS (
-            SELECT 
-                rf.unique_id,
-                COUNT(DISTINCT rf.id) as instance_count,
-                COALESCE(SUM(rf.usage_count + rf.metric_usage_count), 0) as total_usage,
-                MAX(rf.role) as role,
-                MAX(rf.data_type) as data_type,
-                MAX(rf.remote_type) as remote_type
-            FROM regular_fields rf
-            GROUP BY rf.unique_id
-        )
         SELECT 
-            urf.id as representative_id,
+            s.unique_id as representative_id,
             urf.name as canonical_name,
             urf.upstream_column_name,
             urf.table_id,
             t.name as table_name,
             t.schema as table_schema,
-            t.is_embedded as table_is_embedded,
             db.name as database_name,
             urf.description as description,
-            fs.role,
-            fs.data_type,
-            fs.remote_type,
-            COALESCE(fs.instance_count, 0) as instance_count,
-            COALESCE(fs.total_usage, 0) as total_usage,
-            
-            -- 血缘信息 (使用子查询避免主查询膨胀)
-            (SELECT GROUP_CONCAT(DISTINCT rfl.datasource_id || '|' || COALESCE(d.name, 'Unknown'))
-             FROM regular_fields rf2
-             JOIN regular_field_full_lineage rfl ON rf2.id = rfl.field_id
-             LEFT JOIN datasources d ON rfl.datasource_id = d.id
-             WHERE rf2.unique_id = urf.id) as datasource_info,
-             
-            (SELECT GROUP_CONCAT(DISTINCT rfl.workbook_id || '|' || COALESCE(w.name, 'Unknown'))
-             FROM regular_fields rf2
-             JOIN regular_field_full_lineage rfl ON rf2.id = rfl.field_id
-             LEFT JOIN workbooks w ON rfl.workbook_id = w.id
-             WHERE rf2.unique_id = urf.id) as workbook_info
-
-        FROM unique_regular_fields urf
+            s.role,
+            s.data_type,
+            s.remote_type,
+            s.instance_count,
+            s.total_usage,
+            s.dedup_method,
+            s.datasource_info,
+            s.workbook_info
+        FROM unique_regular_field_stats s
+        JOIN unique_regular_fields urf ON urf.id = s.unique_id
         LEFT JOIN tables t ON urf.table_id = t.id
         LEFT JOIN databases db ON t.database_id = db.id
-        LEFT JOIN field_stats fs ON fs.unique_id = urf.id
-        {where_clause.replace("rf.", "fs.")}
+        {where_clause}
     """
 
-    # 统计总数 (在外层统计，因为内层有 GROUP BY 或者 CTE)
+    # 统计总数
     count_sql = f"SELECT COUNT(*) FROM ({base_sql}) sub"
-    total = session.execute(text(count_sql), params).scalar() or 0
-    total_pages = (total + page_size - 1) // page_size if total > 0 else 0
+    total, total_exact = list_total(
+        "fields_catalog", lambda: session.execute(text(count_sql), params).scalar()
+    )
+    total_pages = page_count(total, page_size)
 
-    # 排序
-    order_dir = "DESC" if order == "desc" else "ASC"
-    if sort == "total_usage":
-        order_clause = f"ORDER BY total_usage {order_dir}"
-    elif sort == "instance_count":
-        order_clause = f"ORDER BY instance_count {order_dir}"
+    # 排序（representative_id 兜底保证顺序稳定，供游标分页使用）
+    if sort == "instance_count":
+        sort_keys = ["instance_count", "representative_id"]
+        sort_values = lambda row: [row.instance_count, row.representative_id]
     elif sort == "name":
-        order_clause = f"ORDER BY canonical_name {order_dir}"
+        sort_keys = ["COALESCE(canonical_name, '')", "representative_id"]
+        sort_values = lambda row: [row.canonical_name or "", row.representative_id]
     else:
-        order_clause = f"ORDER BY total_usage {order_dir}"
-
-    # 分页
-    offset = (page - 1) * page_size
-    params["limit"] = page_size
-    params["offset"] = offset
+        sort_keys = ["total_usage", "representative_id"]
+        sort_values = lambda row: [row.total_usage, row.representative_id]
+
+    # 分页：传入 cursor 时按键集定位，否则按 page 偏移
+    try:
+        cursor_values = decode_cursor(cursor, len(sort_keys)) if cursor else None
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    keyset_condition, order_clause = keyset_sql(
+        sort_keys, order == "desc", cursor_values, params
+    )
+    params["limit"] = page_size + 1
+    params["offset"] = 0 if cursor else (page - 1) * page_size
 
-    data_sql = f"{base_sql} {order_clause} LIMIT :limit OFFSET :offset"
-    rows = session.execute(text(data_sql), params).fetchall()
+    data_sql = f"""
+        SELECT * FROM ({base_sql}) page_rows
+        {"WHERE " + keyset_condition if keyset_condition else ""}
+        {order_clause} LIMIT :limit OFFSET :offset
+    """
+    rows, cursor_next = next_cursor(
+        session.execute(text(data_sql), params).fetchall(), page_size, sort_values
+    )
 
     # 构建结果
     items = []
     for row in rows:
-        # 解析数据源列表
-        datasources = []
-        if row.datasource_info:
-            for ds_pair in row.datasource_info.split(","):
-                if "|" in ds_pair:
-                    ds_id, ds_name = ds_pair.split("|", 1)
-                    datasources.append({"id": ds_id, "name": ds_name})
-
-        # 解析工作簿列表
-        workbooks = []
-        if row.workbook_info:
-            for wb_pair in row.workbook_info.split(","):
-                if "|" in wb_pair:
-                    wb_id, wb_name = wb_pair.split("|", 1)
-                    if wb_id and wb_id != "None":
-                        workbooks.append({"id": wb_id, "name": wb_name})
-
-        # 判断去重方式 (区分物理表/嵌入式表/数据源)
-        if row.table_id:
-            if getattr(row, "table_is_embedded", False):
-                dedup_method = "embedded_table"
-            else:
-                dedup_method = "physical_table"
-        else:
-            dedup_method = "datasource"
+        datasources = parse_lineage_pairs(row.datasource_info)
+        workbooks = parse_lineage_pairs(row.workbook_info)
 
         items.append(
             {
@@ -398,50 +369,19 @@ def get_fields_catalog():
                 "datasource_count": len(datasources),
                 "workbooks": workbooks,
                 "workbook_count": len(workbooks),
-                "dedup_method": dedup_method,  # 新增：去重方式
+                "dedup_method": row.dedup_method,
             }
         )
 
-    # Facets 统计
-    facets = {}
-
-    facet_base_params = {}
-    facet_where = ""
-    if search:
-        facet_base_params["search"] = f"%{search}%"
-        facet_where = "WHERE (urf.name LIKE :search OR urf.description LIKE :search)"
-
-    role_sql = f"""
-        SELECT sub.role, COUNT(*) FROM (
-            SELECT fs.role
-            FROM unique_regular_fields urf
-            LEFT JOIN (
-                SELECT unique_id, MAX(role) as role
-                FROM regular_fields
-                GROUP BY unique_id
-            ) fs ON fs.unique_id = urf.id
-            {facet_where}
-        ) sub GROUP BY sub.role
-    """
-
-    role_counts = session.execute(text(role_sql), facet_base_params).fetchall()
-    facets["role"] = {str(r if r else "group_set"): c for r, c in role_counts}
-
-    # 去重方式统计 (区分物理表/嵌入式表/数据源)
-    dedup_sql = """
-        SELECT 
-            CASE 
-                WHEN urf.table_id IS NULL THEN 'datasource'
-                WHEN t.is_embedded = 1 THEN 'embedded_table'
-                ELSE 'physical_table'
-            END as dedup_method,
-            COUNT(*) as cnt
-        FROM unique_regular_fields urf
-        LEFT JOIN tables t ON urf.table_id = t.id
-        GROUP BY dedup_method
-    """
-    dedup_counts = session.execute(text(dedup_sql)).fetchall()
-    facets["dedup_method"] = {r[0]: r[1] for r in dedup_counts}
+    # Facets 统计（角色 group_set 表示组/集类型字段）
+    facets = list_facets(
+        "fields_catalog",
+        search,
+        {
+            "role": parse_list(role_filter),
+            "dedup_method": parse_list(dedup_method_filter),
+        },
+    )
 
     return jsonify(
         {
@@ -450,6 +390,8 @@ def get_fields_catalog():
             "page": page,
             "page_size": page_size,
             "total_pages": total_pages,
+            "total_exact": total_exact,
+            "next_cursor": cursor_next,
             "facets": facets,
         }
     )
@@ -472,51 +414,24 @@ def get_fields_catalog_no_description():
     page_size = min(page_size, 100)
 
     base_sql = """
-        WITH field_stats AS (
-            SELECT 
-                rf.unique_id,
-                MAX(rf.role) as role,
-                MAX(rf.data_type) as data_type,
-                MAX(rf.remote_type) as remote_type,
-                COUNT(*) as instance_count,
-                COALESCE(SUM(rf.usage_count + rf.metric_usage_count), 0) as total_usage
-            FROM regular_fields rf
-            GROUP BY rf.unique_id
-        ),
-        field_lineage AS (
-            SELECT 
-                rf.unique_id,
-                GROUP_CONCAT(DISTINCT d.name) as datasource_names,
-                GROUP_CONCAT(DISTINCT rfl.datasource_id) as datasource_ids
-            FROM regular_fields rf 
-            JOIN regular_field_full_lineage rfl ON rf.id = rfl.field_id 
-            JOIN datasources d ON rfl.datasource_id = d.id 
-            GROUP BY rf.unique_id
-        )
         SELECT 
-            urf.id as representative_id,
+            s.unique_id as representative_id,
             urf.name as canonical_name,
             urf.table_id,
             t.name as table_name,
             t.schema as table_schema,
             db.name as database_name,
-            
-            fs.role,
-            fs.data_type,
-            fs.remote_type,
+            s.role,
+            s.data_type,
+            s.remote_type,
             urf.description,
-            
-            COALESCE(fs.instance_count, 0) as instance_count,
-            COALESCE(fs.total_usage, 0) as total_usage,
-            
-            fl.datasource_names,
-            fl.datasource_ids
-            
-        FROM unique_regular_fields urf
+            s.instance_count,
+            s.total_usage,
+            s.datasource_info
+        FROM unique_regular_field_stats s
+        JOIN unique_regular_fields urf ON urf.id = s.unique_id
         LEFT JOIN tables t ON urf.table_id = t.id
         LEFT JOIN databases db ON t.database_id = db.id
-        LEFT JOIN field_stats fs ON urf.id = fs.unique_id
-        LEFT JOIN field_lineage fl ON urf.id = fl.unique_id
         WHERE (urf.description IS NULL OR urf.description = '')
     """
 
@@ -532,12 +447,7 @@ def get_fields_catalog_no_description():
 
     items = []
     for row in rows:
-        ds_ids = row.datasource_ids.split(",") if row.datasource_ids else []
-        ds_names = row.datasource_names.split(",") if row.datasource_names else []
-        datasources = [
-            {"id": ds_ids[i] if i < len(ds_ids) else None, "name": ds_names[i]}
-            for i in range(len(ds_names))
-        ]
+        datasources = parse_lineage_pairs(row.datasource_info)
 
         items.append(
             {
@@ -583,52 +493,25 @@ def get_fields_catalog_orphan():
     page_size = min(page_size, 100)
 
     base_sql = """
-        WITH field_stats AS (
-            SELECT 
-                rf.unique_id,
-                MAX(rf.role) as role,
-                MAX(rf.data_type) as data_type,
-                MAX(rf.remote_type) as remote_type,
-                COUNT(*) as instance_count,
-                COALESCE(SUM(rf.usage_count + rf.metric_usage_count), 0) as total_usage
-            FROM regular_fields rf
-            GROUP BY rf.unique_id
-        ),
-        field_lineage AS (
-            SELECT 
-                rf.unique_id,
-                GROUP_CONCAT(DISTINCT d.name) as datasource_names,
-                GROUP_CONCAT(DISTINCT rfl.datasource_id) as datasource_ids
-            FROM regular_fields rf 
-            JOIN regular_field_full_lineage rfl ON rf.id = rfl.field_id 
-            JOIN datasources d ON rfl.datasource_id = d.id 
-            GROUP BY rf.unique_id
-        )
         SELECT 
-            urf.id as representative_id,
+            s.unique_id as representative_id,
             urf.name as canonical_name,
             urf.table_id,
             t.name as table_name,
             t.schema as table_schema,
             db.name as database_name,
-            
-            fs.role,
-            fs.data_type,
-            fs.remote_type,
+            s.role,
+            s.data_type,
+            s.remote_type,
             urf.description,
-            
-            COALESCE(fs.instance_count, 0) as instance_count,
-            COALESCE(fs.total_usage, 0) as total_usage,
-            
-            fl.datasource_names,
-            fl.datasource_ids
-            
-        FROM unique_regular_fields urf
+            s.instance_count,
+            s.total_usage,
+            s.datasource_info
+        FROM unique_regular_field_stats s
+        JOIN unique_regular_fields urf ON urf.id = s.unique_id
         LEFT JOIN tables t ON urf.table_id = t.id
         LEFT JOIN databases db ON t.database_id = db.id
-        LEFT JOIN field_stats fs ON urf.id = fs.unique_id
-        LEFT JOIN field_lineage fl ON urf.id = fl.unique_id
-        WHERE COALESCE(fs.total_usage, 0) = 0
+        WHERE s.total_usage = 0
     """
 
     count_sql = f"SELECT COUNT(*) FROM ({base_sql}) sub"
@@ -643,12 +526,7 @@ def get_fields_catalog_orphan():
 
     items = []
     for row in rows:
-        ds_ids = row.datasource_ids.split(",") if row.datasource_ids else []
-        ds_names = row.datasource_names.split(",") if row.datasource_names else []
-        datasources = [
-            {"id": ds_ids[i] if i < len(ds_ids) else None, "name": ds_names[i]}
-            for i in range(len(ds_names))
-        ]
+        datasources = parse_lineage_pairs(row.datasource_info)
 
         items.append(
             {
@@ -693,52 +571,25 @@ def get_fields_catalog_hot():
     page_size = min(page_size, 100)
 
     base_sql = """
-        WITH field_stats AS (
-            SELECT 
-                rf.unique_id,
-                MAX(rf.role) as role,
-                MAX(rf.data_type) as data_type,
-                MAX(rf.remote_type) as remote_type,
-                COUNT(*) as instance_count,
-                COALESCE(SUM(rf.usage_count + rf.metric_usage_count), 0) as total_usage
-            FROM regular_fields rf
-            GROUP BY rf.unique_id
-        ),
-        field_lineage AS (
-            SELECT 
-                rf.unique_id,
-                GROUP_CONCAT(DISTINCT d.name) as datasource_names,
-                GROUP_CONCAT(DISTINCT rfl.datasource_id) as datasource_ids
-            FROM regular_fields rf 
-            JOIN regular_field_full_lineage rfl ON rf.id = rfl.field_id 
-            JOIN datasources d ON rfl.datasource_id = d.id 
-            GROUP BY rf.unique_id
-        )
         SELECT 
-            urf.id as representative_id,
+            s.unique_id as representative_id,
             urf.name as canonical_name,
             urf.table_id,
             t.name as table_name,
             t.schema as table_schema,
             db.name as database_name,
-            
-            fs.role,
-            fs.data_type,
-            fs.remote_type,
+            s.role,
+            s.data_type,
+            s.remote_type,
             urf.description,
-            
-            COALESCE(fs.instance_count, 0) as instance_count,
-            COALESCE(fs.total_usage, 0) as total_usage,
-            
-            fl.datasource_names,
-            fl.datasource_ids
-            
-        FROM unique_regular_fields urf
+            s.instance_count,
+            s.total_usage,
+            s.datasource_info
+        FROM unique_regular_field_stats s
+        JOIN unique_regular_fields urf ON urf.id = s.unique_id
         LEFT JOIN tables t ON urf.table_id = t.id
         LEFT JOIN databases db ON t.database_id = db.id
-        LEFT JOIN field_stats fs ON urf.id = fs.unique_id
-        LEFT JOIN field_lineage fl ON urf.id = fl.unique_id
-        WHERE COALESCE(fs.total_usage, 0) > 20
+        WHERE s.total_usage > 20
     """
 
     count_sql = f"SELECT COUNT(*) FROM ({base_sql}) sub"
@@ -753,12 +604,7 @@ def get_fields_catalog_hot():
 
     items = []
     for row in rows:
-        ds_ids = row.datasource_ids.split(",") if row.datasource_ids else []
-        ds_names = row.datasource_names.split(",") if row.datasource_names else []
-        datasources = [
-            {"id": ds_ids[i] if i < len(ds_ids) else None, "name": ds_names[i]}
-            for i in range(len(ds_names))
-        ]
+        datasources = parse_lineage_pairs(row.datasource_info)
 
         usage = row.total_usage
         if usage >= 200:
@@ -815,10 +661,11 @@ def get_fields():
     sort = request.args.get("sort", "")
     order = request.args.get("order", "desc")
 
-    # 分页参数
+    # 分页参数（cursor 为上一页返回的 next_cursor）
     page = request.args.get("page", 1, type=int)
     page_size = request.args.get("page_size", 50, type=int)
-    page_size = min(page_size, 10000)
+    page_size = min(page_size, 1000)  # 全量清单改用 /api/export
+    cursor = request.args.get("cursor", "")
 
     from sqlalchemy import text
 
@@ -916,18 +763,29 @@ def get_fields():
         "false": total - (stats.has_desc or 0),
     }
 
-    # 3. 数据查询 (使用新表 regular_fields)
-    order_clause = "ORDER BY rf.name ASC"
+    # 3. 数据查询 (使用新表 regular_fields)，rf.id 兜底保证顺序稳定
+    descending = order == "desc"
     if sort == "usageCount":
-        order_clause = f"ORDER BY (rf.usage_count + rf.metric_usage_count) {'DESC' if order == 'desc' else 'ASC'}"
-    elif sort == "name":
-        order_clause = f"ORDER BY rf.name {'DESC' if order == 'desc' else 'ASC'}"
+        sort_keys = ["(COALESCE(rf.usage_count, 0) + COALESCE(rf.metric_usage_count, 0))", "rf.id"]
+        sort_values = lambda row: [(row.usage_count or 0) + (row.metric_usage_count or 0), row.id]
     elif sort == "data_type":
-        order_clause = f"ORDER BY rf.data_type {'DESC' if order == 'desc' else 'ASC'}"
+        sort_keys = ["COALESCE(rf.data_type, '')", "rf.id"]
+        sort_values = lambda row: [row.data_type or "", row.id]
+    else:
+        sort_keys = ["rf.name", "rf.id"]
+        sort_values = lambda row: [row.name, row.id]
+        descending = descending and sort == "name"  # 默认按名称升序
 
-    offset = (page - 1) * page_size
-    params["limit"] = page_size
-    params["offset"] = offset
+    try:
+        cursor_values = decode_cursor(cursor, len(sort_keys)) if cursor else None
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    keyset_condition, order_clause = keyset_sql(sort_keys, descending, cursor_values, params)
+    if keyset_condition:
+        where_clause = f"{where_clause} AND {keyset_condition}" if where_clause else f"WHERE {keyset_condition}"
+
+    params["limit"] = page_size + 1
+    params["offset"] = 0 if cursor else (page - 1) * page_size
 
     data_sql = f"""
         SELECT 
@@ -945,7 +803,9 @@ def get_fields():
         {order_clause}
         LIMIT :limit OFFSET :offset
     """
-    rows = session.execute(text(data_sql), params).fetchall()
+    rows, cursor_next = next_cursor(
+        session.execute(text(data_sql), params).fetchall(), page_size, sort_values
+    )
 
     # 4. 构建结果
     results = []
@@ -983,6 +843,7 @@ def get_fields():
             "page": page,
             "page_size": page_size,
             "total_pages": total_pages,
+            "next_cursor": cursor_next,
             "facets": facets,
         }
     )
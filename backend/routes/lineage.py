@@ -4,10 +4,11 @@
 """
 
 import re
-from flask import jsonify, request, g
+from flask import current_app, jsonify, request, g
 from sqlalchemy import text
 from . import api_bp
 from .utils import build_tableau_url
+from ..services import search_index, suggest
 from ..models import (
     Field,
     CalculatedField,
@@ -127,7 +128,11 @@ def get_lineage(item_type, item_id):
 
 @api_bp.route("/search")
 def global_search():
-    """全局跨资产类型搜索 - 使用去重标准表"""
+    """全局跨资产类型搜索
+
+    优先使用同步时构建的 FTS5 索引（一次查询，完全匹配、前缀匹配优先，再按 BM25 + 使用量排序）；
+    索引尚未构建或 SQLite 不支持 FTS5 时回退为逐表 LIKE 匹配
+    """
     session = g.db_session
     q = request.args.get("q", "").strip()
     limit = request.args.get("limit", 20, type=int)
@@ -135,6 +140,39 @@ def global_search():
     if not q or len(q) < 2:
         return jsonify({"error": "搜索关键词至少需要2个字符"}), 400
 
+    results = search_index.search(session, q, limit)
+    if results is None:
+        results = _search_like(session, q, limit)
+
+    total = sum(len(v) for v in results.values())
+
+    return jsonify({"query": q, "total": total, "results": results})
+
+
+@api_bp.route("/search/suggest")
+def search_suggest():
+    """搜索框联想：按前缀匹配资产名称（含拼音、拆分标识符），按使用量排序
+
+    GET /api/search/suggest?q=dd&limit=10&type=field,metric
+
+    参数:
+        q: 输入前缀（必填）
+        limit: 返回条数，默认 10，最大 20
+        type: 可选，逗号分隔的实体类型（field/metric/table/datasource/workbook/view/database/project）
+    """
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "缺少搜索关键词 q"}), 400
+    limit = min(max(request.args.get("limit", 10, type=int), 1), suggest.MAX_SUGGESTIONS)
+    types = [t.strip() for t in request.args.get("type", "").split(",") if t.strip()]
+
+    index = current_app.suggest.index_for(g.site, g.db_session)
+    suggestions = index.suggest(q, limit, types) if index is not None else []
+    return jsonify({"query": q, "suggestions": suggestions})
+
+
+def _search_like(session, q, limit):
+    """逐表 LIKE 搜索（使用去重标准表）"""
     search_pattern = f"%{q}%"
     results = {
         "fields": [],
@@ -271,9 +309,7 @@ def global_search():
         for p in projects
     ]
 
-    total = sum(len(v) for v in results.values())
-
-    return jsonify({"query": q, "total": total, "results": results})
+    return results
 
 
 # ==================== 增强血缘接口（支持 Mermaid 图形化）====================
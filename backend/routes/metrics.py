@@ -7,7 +7,18 @@ from flask import jsonify, request, g
 from sqlalchemy import text, bindparam, func, case
 from sqlalchemy.orm import selectinload
 from . import api_bp
-from .utils import build_tableau_url, get_field_usage_by_name
+from .utils import (
+    CursorError,
+    build_tableau_url,
+    decode_cursor,
+    get_field_usage_by_name,
+    keyset_sql,
+    list_facets,
+    list_total,
+    next_cursor,
+    page_count,
+    parse_lineage_pairs,
+)
 from ..models import Field, CalculatedField, Datasource, Workbook, FieldDependency, View
 
 # ==================== 指标接口 ====================
@@ -160,6 +171,7 @@ def get_metrics_catalog():
     dedup_method_filter = request.args.get("dedup_method", "")
     sort = request.args.get("sort", "total_references")
     order = request.args.get("order", "desc")
+    cursor = request.args.get("cursor", "")
 
     def parse_list(value: str) -> list[str]:
         return [item.strip() for item in value.split(",") if item.strip()]
@@ -206,19 +218,15 @@ def get_metrics_catalog():
         f"ucf.name LIKE :search OR ucf.formula LIKE :search" if search else ""
     )
 
-    # 聚合查询 - 直接从 calculated_fields 表
-    # 修正：使用 unique_id 进行聚合，区分不同数据源的同名指标
-    # 聚合查询 - 引入 Lineage 中台表进行精准聚合 (统一卡片与详情页口径)
-    # 聚合查询 - 使用子查询聚合确保口径绝对统一 (由列表项驱动血缘聚合)
     outer_conditions = []
 
     if is_aggregated:
         agg_values = {value.lower() for value in parse_list(is_aggregated)}
         agg_clauses = []
         if "true" in agg_values or "1" in agg_values or "yes" in agg_values:
-            agg_clauses.append("stats.instance_count > 1")
+            agg_clauses.append("s.instance_count > 1")
         if "false" in agg_values or "0" in agg_values or "no" in agg_values:
-            agg_clauses.append("stats.instance_count <= 1")
+            agg_clauses.append("s.instance_count <= 1")
         if agg_clauses:
             outer_conditions.append(f"({' OR '.join(agg_clauses)})")
 
@@ -226,47 +234,30 @@ def get_metrics_catalog():
         dedup_values = parse_list(dedup_method_filter)
         if dedup_values:
             dedup_clause = build_in_clause("dedup_method", dedup_values, params)
-            outer_conditions.append(
-                "CASE "
-                "WHEN stats.has_embedded = 1 AND stats.has_published = 1 THEN 'hash_mixed' "
-                "WHEN stats.has_embedded = 1 THEN 'hash_embedded' "
-                "ELSE 'hash_published' "
-                f"END IN {dedup_clause}"
-            )
+            outer_conditions.append(f"s.dedup_method IN {dedup_clause}")
 
     outer_where = f"WHERE {' AND '.join(outer_conditions)}" if outer_conditions else ""
 
+    # 统计信息与血缘列表来自 V5 迁移物化的目录聚合表，按 (排序列, unique_id) 索引分页
     base_sql = f"""
         SELECT 
-            ucf.id as representative_id,
+            s.unique_id as representative_id,
             ucf.name,
             ucf.formula,
             ucf.formula_hash,
             ucf.description,
             ucf.complexity_score as complexity,
-            COALESCE(stats.instance_count, 1) as instance_count,
-            COALESCE(stats.total_references, 0) as total_references,
-            COALESCE(stats.total_usage, 0) as total_usage,
-            stats.role,
-            stats.data_type,
-            COALESCE(stats.has_embedded, 0) as has_embedded,
-            COALESCE(stats.has_published, 1) as has_published,
-            ucf.id as unique_id
-        FROM unique_calculated_fields ucf
-        LEFT JOIN (
-            SELECT 
-                TRIM(cf.name) as clean_name,
-                cf.formula_hash,
-                COUNT(DISTINCT cf.id) as instance_count,
-                COALESCE(SUM(cf.reference_count), 0) as total_references,
-                COALESCE(SUM(cf.usage_count), 0) as total_usage,
-                MAX(cf.role) as role,
-                MAX(cf.data_type) as data_type,
-                MAX(CASE WHEN cf.datasource_id IN (SELECT id FROM datasources WHERE is_embedded = 1) THEN 1 ELSE 0 END) as has_embedded,
-                MAX(CASE WHEN cf.datasource_id IN (SELECT id FROM datasources WHERE is_embedded = 0 OR is_embedded IS NULL) THEN 1 ELSE 0 END) as has_published
-            FROM calculated_fields cf
-            GROUP BY TRIM(cf.name), cf.formula_hash
-        ) stats ON TRIM(ucf.name) = stats.clean_name AND ucf.formula_hash = stats.formula_hash
+            s.instance_count,
+            s.total_references,
+            s.total_usage,
+            s.role,
+            s.data_type,
+            s.dedup_method,
+            s.datasource_info,
+            s.workbook_info,
+            s.unique_id as unique_id
+        FROM unique_calculated_field_stats s
+        JOIN unique_calculated_fields ucf ON ucf.id = s.unique_id
         WHERE 1=1 {"AND (" + search_condition + ")" if search else ""}
         {outer_where.replace("WHERE", "AND") if outer_where.startswith("WHERE") else outer_where}
     """
@@ -279,39 +270,49 @@ def get_metrics_catalog():
             GROUP BY TRIM(cf.name), cf.formula_hash
         ) sub
     """
-    total = session.execute(text(count_sql), params).scalar() or 0
-    total_pages = (total + page_size - 1) // page_size if total > 0 else 0
+    total, total_exact = list_total(
+        "metrics_catalog", lambda: session.execute(text(count_sql), params).scalar()
+    )
+    total_pages = page_count(total, page_size)
 
-    # 排序
-    order_dir = "DESC" if order == "desc" else "ASC"
-    if sort == "total_usage":
-        order_clause = f"ORDER BY total_usage {order_dir}"
-    elif sort == "total_references":
-        order_clause = f"ORDER BY total_references {order_dir}"
-    elif sort == "instance_count":
-        order_clause = f"ORDER BY instance_count {order_dir}"
+    # 排序（representative_id 兜底保证顺序稳定，供游标分页使用）
+    if sort in ("total_references", "instance_count"):
+        sort_keys = [sort, "representative_id"]
+        sort_values = lambda row: [getattr(row, sort), row.representative_id]
     elif sort == "complexity":
-        order_clause = f"ORDER BY complexity {order_dir}"
+        sort_keys = ["COALESCE(complexity, 0)", "representative_id"]
+        sort_values = lambda row: [row.complexity or 0, row.representative_id]
     elif sort == "name":
-        order_clause = f"ORDER BY name {order_dir}"
+        sort_keys = ["COALESCE(name, '')", "representative_id"]
+        sort_values = lambda row: [row.name or "", row.representative_id]
     else:
         # 默认优先按热度排序 (与字段目录一致)
-        order_clause = f"ORDER BY total_usage {order_dir}"
+        sort_keys = ["total_usage", "representative_id"]
+        sort_values = lambda row: [row.total_usage, row.representative_id]
 
-    # 分页
-    offset = (page - 1) * page_size
-    params["limit"] = page_size
-    params["offset"] = offset
+    # 分页：传入 cursor 时按键集定位，否则按 page 偏移
+    try:
+        cursor_values = decode_cursor(cursor, len(sort_keys)) if cursor else None
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    keyset_condition, order_clause = keyset_sql(
+        sort_keys, order == "desc", cursor_values, params
+    )
+    params["limit"] = page_size + 1
+    params["offset"] = 0 if cursor else (page - 1) * page_size
 
-    data_sql = f"{base_sql} {order_clause} LIMIT :limit OFFSET :offset"
-    rows = session.execute(text(data_sql), params).fetchall()
+    data_sql = f"""
+        SELECT * FROM ({base_sql}) page_rows
+        {"WHERE " + keyset_condition if keyset_condition else ""}
+        {order_clause} LIMIT :limit OFFSET :offset
+    """
+    rows, cursor_next = next_cursor(
+        session.execute(text(data_sql), params).fetchall(), page_size, sort_values
+    )
 
     # 构建结果
     items = []
     for row in rows:
-        has_embedded = bool(row.has_embedded)
-        has_published = bool(row.has_published)
-
         formula_len = len(row.formula) if row.formula else 0
         if formula_len >= 500:
             complexity_level = "超高"
@@ -329,13 +330,8 @@ def get_metrics_catalog():
         )
 
         is_aggregated = row.instance_count > 1
-
-        if has_embedded and has_published:
-            dedup_method = "hash_mixed"
-        elif has_embedded:
-            dedup_method = "hash_embedded"
-        else:
-            dedup_method = "hash_published"
+        datasources = parse_lineage_pairs(row.datasource_info)
+        workbooks = parse_lineage_pairs(row.workbook_info)
 
         items.append(
             {
@@ -345,7 +341,7 @@ def get_metrics_catalog():
                 "formula": row.formula,
                 "formula_hash": row.formula_hash,
                 "dedup_key": dedup_key,
-                "dedup_method": dedup_method,
+                "dedup_method": row.dedup_method,
                 "is_aggregated": is_aggregated,
                 "role": row.role,
                 "data_type": row.data_type,
@@ -359,86 +355,31 @@ def get_metrics_catalog():
                 "usage_status": "direct"
                 if (row.total_usage or 0) > 0
                 else ("intermediate" if (row.total_references or 0) > 0 else "unused"),
-                "datasources": [],
-                "datasource_count": 0,
-                "workbooks": [],
-                "workbook_count": 0,
-                "datasource_name": "-",
+                "datasources": datasources,
+                "datasource_count": len(datasources),
+                "workbooks": workbooks,
+                "workbook_count": len(workbooks),
+                "datasource_name": datasources[0]["name"] if datasources else "-",
             }
         )
 
     # Facets 统计
-    facets = {}
-
-    facet_base_params = {}
-    facet_where = ""
-    if search:
-        facet_base_params["search"] = f"%{search}%"
-        facet_where = "WHERE (cf.name LIKE :search OR cf.formula LIKE :search)"
-
-    role_sql = f"""
-        SELECT sub.role, COUNT(*) FROM (
-            SELECT MAX(cf.role) as role
-            FROM calculated_fields cf
-            {facet_where}
-            GROUP BY cf.unique_id
-        ) sub GROUP BY sub.role
-    """
-    role_counts = session.execute(text(role_sql), facet_base_params).fetchall()
-    facets["role"] = {str(r or "unknown"): c for r, c in role_counts}
-
-    # 分享搜索参数给 facets 统计
-
-    # 聚合状态统计 - 修正为受搜索条件影响
-    agg_sql_simple = f"""
-        SELECT 
-            CASE WHEN COUNT(DISTINCT cf.id) > 1 THEN 'true' ELSE 'false' END as is_agg,
-            COUNT(*) as cnt
-        FROM (
-            SELECT TRIM(cf.name) as clean_name, cf.formula_hash
-            FROM calculated_fields cf
-            {where_clause}
-            GROUP BY TRIM(cf.name), cf.formula_hash
-        ) gs
-        JOIN calculated_fields cf ON TRIM(cf.name) = gs.clean_name AND cf.formula_hash = gs.formula_hash
-        GROUP BY is_agg
-    """
-    # 简化版统计，为了速度牺牲绝对精准（不再跨表根据 Lineage 实时判断，仅根据搜索后的结果统计）
-    # 或者为了性能，暂时跳过复杂的 facets 统计，如果加载依然卡顿
-
-    # 获取真正的聚合情况（在当前筛选下）
-    facets["is_aggregated"] = {}
-
-    dedup_method_sql = f"""
-        SELECT 
-            CASE 
-                WHEN has_embedded = 1 AND has_published = 1 THEN 'hash_mixed'
-                WHEN has_embedded = 1 THEN 'hash_embedded'
-                ELSE 'hash_published'
-            END as method,
-            COUNT(*) as cnt
-        FROM (
-            SELECT 
-                TRIM(cf.name) as clean_name, 
-                cf.formula_hash,
-                MAX(CASE WHEN d.is_embedded = 1 THEN 1 ELSE 0 END) as has_embedded,
-                MAX(CASE WHEN d.is_embedded = 0 OR d.is_embedded IS NULL THEN 1 ELSE 0 END) as has_published
-            FROM calculated_fields cf
-            LEFT JOIN calc_field_full_lineage cfl ON cf.id = cfl.field_id
-            LEFT JOIN datasources d ON cfl.datasource_id = d.id
-            {facet_where}
-            GROUP BY TRIM(cf.name), cf.formula_hash
-        ) sub
-        GROUP BY method
-    """
-    try:
-        dedup_counts = session.execute(
-            text(dedup_method_sql), facet_base_params
-        ).fetchall()
-        facets["dedup_method"] = {str(r[0]): r[1] for r in dedup_counts}
-    except Exception as e:
-        print(f"Facets error: {e}")
-        facets["dedup_method"] = {}
+    agg_selected = []
+    if is_aggregated:
+        agg_values = {value.lower() for value in parse_list(is_aggregated)}
+        if agg_values & {"true", "1", "yes"}:
+            agg_selected.append("true")
+        if agg_values & {"false", "0", "no"}:
+            agg_selected.append("false")
+    facets = list_facets(
+        "metrics_catalog",
+        search,
+        {
+            "role": parse_list(role_filter),
+            "dedup_method": parse_list(dedup_method_filter),
+            "is_aggregated": agg_selected,
+        },
+    )
 
     return jsonify(
         {
@@ -447,6 +388,8 @@ def get_metrics_catalog():
             "page": page,
             "page_size": page_size,
             "total_pages": total_pages,
+            "total_exact": total_exact,
+            "next_cursor": cursor_next,
             "facets": facets,
         }
     )
@@ -890,10 +833,11 @@ def get_metrics():
     metric_type = request.args.get("metric_type", "all")
     role_filter = request.args.get("role", "")
 
-    # 分页参数
+    # 分页参数（cursor 为上一页返回的 next_cursor）
     page = request.args.get("page", 1, type=int)
     page_size = request.args.get("page_size", 50, type=int)
-    page_size = min(page_size, 10000)
+    page_size = min(page_size, 1000)  # 全量清单改用 /api/export
+    cursor = request.args.get("cursor", "")
 
     from sqlalchemy import text
 
@@ -954,29 +898,38 @@ def get_metrics():
     stats_sql = f"""
         SELECT COUNT(*) as total FROM calculated_fields cf {where_clause}
     """
-    stats = session.execute(text(stats_sql), params).first()
-    total = stats.total or 0
-    total_pages = (total + page_size - 1) // page_size if total > 0 else 0
+    total, total_exact = list_total(
+        "metrics", lambda: session.execute(text(stats_sql), params).scalar()
+    )
+    total_pages = page_count(total, page_size)
 
-    # 2. 构建排序
-    order_clause = "ORDER BY cf.name ASC"
+    # 2. 构建排序（cf.id 兜底保证顺序稳定，供游标分页使用）
+    descending = order == "desc"
     if sort == "complexity":
-        order_clause = (
-            f"ORDER BY cf.complexity_score {'DESC' if order == 'desc' else 'ASC'}"
-        )
+        sort_keys = ["COALESCE(cf.complexity_score, 0)", "cf.id"]
+        sort_values = lambda row: [row.complexity_score or 0, row.id]
     elif sort == "referenceCount":
-        order_clause = (
-            f"ORDER BY cf.reference_count {'DESC' if order == 'desc' else 'ASC'}"
-        )
-    elif sort == "name":
-        order_clause = f"ORDER BY cf.name {'DESC' if order == 'desc' else 'ASC'}"
+        sort_keys = ["COALESCE(cf.reference_count, 0)", "cf.id"]
+        sort_values = lambda row: [row.reference_count or 0, row.id]
     elif sort == "usageCount":
-        order_clause = f"ORDER BY cf.usage_count {'DESC' if order == 'desc' else 'ASC'}"
+        sort_keys = ["COALESCE(cf.usage_count, 0)", "cf.id"]
+        sort_values = lambda row: [row.usage_count or 0, row.id]
+    else:
+        sort_keys = ["cf.name", "cf.id"]
+        sort_values = lambda row: [row.name, row.id]
+        descending = descending and sort == "name"  # 默认按名称升序
+
+    try:
+        cursor_values = decode_cursor(cursor, len(sort_keys)) if cursor else None
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    keyset_condition, order_clause = keyset_sql(sort_keys, descending, cursor_values, params)
+    if keyset_condition:
+        where_clause = f"{where_clause} AND {keyset_condition}" if where_clause else f"WHERE {keyset_condition}"
 
     # 3. 数据查询
-    offset = (page - 1) * page_size
-    params["limit"] = page_size
-    params["offset"] = offset
+    params["limit"] = page_size + 1
+    params["offset"] = 0 if cursor else (page - 1) * page_size
 
     data_sql = f"""
         SELECT 
@@ -991,7 +944,9 @@ def get_metrics():
         {order_clause}
         LIMIT :limit OFFSET :offset
     """
-    rows = session.execute(text(data_sql), params).fetchall()
+    rows, cursor_next = next_cursor(
+        session.execute(text(data_sql), params).fetchall(), page_size, sort_values
+    )
 
     # 4. 构建结果
     metrics = []
@@ -1024,6 +979,8 @@ def get_metrics():
             "page": page,
             "page_size": page_size,
             "total_pages": total_pages,
+            "total_exact": total_exact,
+            "next_cursor": cursor_next,
             "facets": facets,
         }
     )
@@ -0,0 +1,159 @@
+"""
+多站点接口路由模块
+站点列表与跨站点查询（各站点分区库并发查询后合并）
+"""
+
+import os
+
+from flask import jsonify, request, current_app
+from sqlalchemy import text
+
+from . import api_bp
+from backend.services.sites import (
+    configured_sites,
+    run_per_site,
+    site_database_path,
+    site_key,
+)
+
+# 跨站点搜索的实体类型 -> 表名
+SEARCHABLE_ENTITIES = {
+    "datasource": "datasources",
+    "workbook": "workbooks",
+    "view": "views",
+    "table": "tables",
+    "field": "regular_fields",
+    "metric": "calculated_fields",
+}
+
+# 站点概览统计的表
+SUMMARY_TABLES = {
+    "datasources": "datasources",
+    "workbooks": "workbooks",
+    "views": "views",
+    "tables": "tables",
+    "fields": "regular_fields",
+    "metrics": "calculated_fields",
+}
+
+
+def _with_site_session(content_url, func):
+    """在站点分区库会话中执行 func(session)，分区未同步时返回 None"""
+    session = current_app.site_engines.session_for(content_url, read_only=True)
+    if session is None:
+        return None
+    try:
+        return func(session)
+    finally:
+        session.close()
+
+
+@api_bp.route("/sites", methods=["GET"])
+def get_sites():
+    """获取已配置站点及各分区概览
+
+    GET /api/sites
+
+    Returns:
+        站点列表：key、contentUrl、是否已同步、各类资产数量、最近一次完成的同步时间
+    """
+    app = current_app._get_current_object()
+
+    def summarize(session):
+        counts = {}
+        for key, table in SUMMARY_TABLES.items():
+            try:
+                counts[key] = session.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() or 0
+            except Exception:
+                counts[key] = 0
+        last_sync = session.execute(text("""
+            SELECT MAX(completed_at) FROM sync_logs
+            WHERE sync_type IN ('full', 'incremental', 'usage') AND status = 'completed'
+        """)).scalar()
+        return {"counts": counts, "lastSyncAt": last_sync}
+
+    def describe(content_url):
+        with app.app_context():
+            summary = _with_site_session(content_url, summarize)
+        return {
+            "key": site_key(content_url),
+            "contentUrl": content_url,
+            "synced": summary is not None,
+            "counts": summary["counts"] if summary else {},
+            "lastSyncAt": summary["lastSyncAt"] if summary else None,
+        }
+
+    sites = configured_sites()
+    results = run_per_site(sites, describe)
+    items = []
+    for content_url in sites:
+        result = results[content_url]
+        if isinstance(result, Exception):
+            items.append({
+                "key": site_key(content_url),
+                "contentUrl": content_url,
+                "synced": os.path.exists(site_database_path(content_url)),
+                "error": str(result),
+            })
+        else:
+            items.append(result)
+    return jsonify({"sites": items, "total": len(items)})
+
+
+@api_bp.route("/sites/search", methods=["GET"])
+def search_across_sites():
+    """跨站点按名称搜索资产
+
+    GET /api/sites/search?q=订单&type=datasource,workbook&sites=default,sales&limit=20
+
+    参数:
+        q: 搜索关键词（必填）
+        type: 可选，逗号分隔的实体类型（datasource/workbook/view/table/field/metric），默认全部
+        sites: 可选，逗号分隔的站点标识，默认全部已配置站点
+        limit: 每个站点每类实体的最大条数，默认 20，最大 100
+
+    Returns:
+        results: [{site, type, id, name}]，按站点顺序合并
+    """
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "缺少搜索关键词 q"}), 400
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    types = [t.strip() for t in request.args.get("type", "").split(",") if t.strip()]
+    types = [t for t in types if t in SEARCHABLE_ENTITIES] or list(SEARCHABLE_ENTITIES)
+
+    sites = configured_sites()
+    requested = [s.strip() for s in request.args.get("sites", "").split(",") if s.strip()]
+    if requested:
+        sites = [s for s in sites if site_key(s) in requested]
+
+    app = current_app._get_current_object()
+
+    def search(session):
+        rows = []
+        for entity_type in types:
+            table = SEARCHABLE_ENTITIES[entity_type]
+            try:
+                found = session.execute(
+                    text(f"SELECT id, name FROM {table} WHERE name LIKE :q LIMIT :limit"),
+                    {"q": f"%{q}%", "limit": limit},
+                ).fetchall()
+            except Exception:
+                continue
+            rows.extend({"type": entity_type, "id": r[0], "name": r[1]} for r in found)
+        return rows
+
+    def search_site(content_url):
+        with app.app_context():
+            return _with_site_session(content_url, search) or []
+
+    results = run_per_site(sites, search_site)
+    merged, errors = [], {}
+    for content_url in sites:
+        result = results[content_url]
+        if isinstance(result, Exception):
+            errors[site_key(content_url)] = str(result)
+            continue
+        merged.extend(dict(item, site=site_key(content_url)) for item in result)
+
+    return jsonify({"query": q, "results": merged, "total": len(merged), "errors": errors})
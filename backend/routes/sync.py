@@ -3,104 +3,275 @@
 提供 Tableau 元数据同步触发接口
 """
 
-import threading
+import hmac
 from datetime import datetime
-from flask import jsonify, request
-from sqlalchemy import text
+from flask import current_app, jsonify, request, g
+from sqlalchemy import func, text
 
 from . import api_bp
-from backend.models import get_session, get_engine, SyncLog
+from backend.models import (
+    get_session,
+    get_engine,
+    SyncLog,
+    SyncChange,
+    SyncJob,
+    SyncRefreshRequest,
+    SyncStageMetric,
+)
 from backend.config import Config
+from backend.services.sync_jobs import (
+    JobConflictError,
+    enqueue_job,
+    ensure_runner,
+    get_active_job,
+    get_latest_job,
+    recover_stale_jobs,
+)
+from backend.services.refresh_queue import (
+    WebhookPayloadError,
+    enqueue_refresh,
+    is_valid_asset_id,
+    parse_webhook_event,
+)
+from backend.services.change_journal import RUN_SYNC_TYPES
+from backend.services.sites import resolve_site
+from backend.services.sync_scheduler import (
+    SCHEDULED_JOB_TYPES,
+    SKIPPED_SYNC_TYPE_PREFIX,
+    SKIPPED_SYNC_TYPES,
+    CronExpression,
+    configured_schedules,
+)
+
+
+def _job_status(session):
+    """从任务表构建当前同步状态（所有 worker 看到的状态一致）"""
+    recover_stale_jobs(session)
+    active = get_active_job(session)
+    job = active or get_latest_job(session)
+    last_completed = (
+        session.query(func.max(SyncJob.completed_at))
+        .filter(SyncJob.status == "completed")
+        .scalar()
+    )
+    return {
+        "is_running": active is not None,
+        "started_at": (job.started_at or job.requested_at).isoformat()
+        if job
+        else None,
+        "progress": job.message if job else None,
+        "percent": round(job.percent or 0, 1) if job else 0,
+        "error": job.error_message if job else None,
+        "last_completed": last_completed.isoformat() if last_completed else None,
+        "job": job.to_dict() if job else None,
+    }
 
 
-# 同步状态管理
-_sync_status = {
-    "is_running": False,
-    "started_at": None,
-    "progress": None,
-    "error": None,
-    "last_completed": None,
-}
-_sync_lock = threading.Lock()
+@api_bp.route("/sync", methods=["POST"])
+def trigger_sync():
+    """触发 Tableau 元数据同步
+
+    POST /api/sync
+    Body (可选): {"job_type": "full" | "incremental" | "usage", "streaming_fields": bool, "shadow": bool,
+                 "sites": ["default", "<contentUrl>", ...]}
+
+    多站点部署（TABLEAU_SITES）默认同步全部已配置站点，sites 可限定本次同步的站点。
 
+    同步任务登记到 sync_jobs 表，由独立的同步执行进程领取执行，不占用 Web worker。
+
+    Returns:
+        - 202: 同步任务已登记
+        - 400: 不支持的任务类型
+        - 409: 同步正在进行中
+        - 500: 配置错误
+    """
+    # 检查配置
+    if not Config.TABLEAU_BASE_URL or not Config.TABLEAU_PAT_NAME:
+        return jsonify(
+            {"success": False, "error": "Tableau 配置缺失，请检查 .env 文件"}
+        ), 500
 
-def _run_sync_task():
-    """后台执行同步任务"""
-    global _sync_status
+    session = g.primary_db_session
+    payload = request.get_json(silent=True) or {}
+    job_type = payload.get("job_type", "full")
+    if job_type not in SCHEDULED_JOB_TYPES:
+        return jsonify(
+            {"success": False, "error": f"不支持的任务类型: {job_type}"}
+        ), 400
+    params = {}
+    if "streaming_fields" in payload:
+        params["streaming_fields"] = bool(payload["streaming_fields"])
+    if "shadow" in payload:
+        params["shadow"] = bool(payload["shadow"])
+    if payload.get("sites"):
+        sites = [resolve_site(str(key)) for key in payload["sites"]]
+        if any(site is None for site in sites):
+            return jsonify(
+                {"success": False, "error": f"存在未配置的站点: {payload['sites']}"}
+            ), 400
+        params["sites"] = sites
 
     try:
-        from backend.services.tableau_client import TableauMetadataClient
-        from backend.services.sync_manager import MetadataSync
+        job = enqueue_job(session, job_type=job_type, params=params, requested_by="api")
+    except JobConflictError:
+        return jsonify(
+            {
+                "success": False,
+                "error": "同步正在进行中",
+                "status": _job_status(session),
+            }
+        ), 409
 
-        _sync_status["progress"] = "正在连接 Tableau Server..."
+    ensure_runner()
 
-        client = TableauMetadataClient(
-            base_url=Config.TABLEAU_BASE_URL,
-            pat_name=Config.TABLEAU_PAT_NAME,
-            pat_secret=Config.TABLEAU_PAT_SECRET,
-        )
+    return jsonify(
+        {
+            "success": True,
+            "message": "同步已启动",
+            "job_id": job.id,
+            "status": _job_status(session),
+        }
+    ), 202
 
-        client.sign_in()
-        _sync_status["progress"] = "连接成功，开始同步..."
 
-        sync = MetadataSync(client, db_path=Config.DATABASE_PATH)
+def _enqueue_asset_refresh(job_type: str, asset_id: str):
+    """登记单个工作簿/数据源的定向刷新任务（站点由 ?site= 或 X-Tableau-Site 选择）"""
+    # 资产 ID 会拼入 GraphQL 筛选条件，只接受 UUID 格式
+    if not is_valid_asset_id(asset_id):
+        return jsonify({"success": False, "error": f"无效的资产 ID: {asset_id}"}), 400
+    if not Config.TABLEAU_BASE_URL or not Config.TABLEAU_PAT_NAME:
+        return jsonify(
+            {"success": False, "error": "Tableau 配置缺失，请检查 .env 文件"}
+        ), 500
 
-        # 执行全量同步
-        sync.sync_all()
-        sync.close()
+    session = g.primary_db_session
+    params = {"asset_id": asset_id, "sites": [g.site]}
+    try:
+        job = enqueue_job(session, job_type=job_type, params=params, requested_by="api")
+    except JobConflictError:
+        return jsonify(
+            {
+                "success": False,
+                "error": "同步正在进行中",
+                "status": _job_status(session),
+            }
+        ), 409
 
-        client.sign_out()
+    ensure_runner()
 
-        _sync_status["progress"] = "同步完成"
-        _sync_status["last_completed"] = datetime.now().isoformat()
-        _sync_status["error"] = None
+    return jsonify(
+        {
+            "success": True,
+            "message": "定向刷新已启动",
+            "job_id": job.id,
+            "status": _job_status(session),
+        }
+    ), 202
 
-    except Exception as e:
-        _sync_status["error"] = str(e)
-        _sync_status["progress"] = f"同步失败: {e}"
-        import traceback
 
-        traceback.print_exc()
-    finally:
-        with _sync_lock:
-            _sync_status["is_running"] = False
+@api_bp.route("/sync/workbook/<workbook_id>", methods=["POST"])
+def refresh_workbook(workbook_id):
+    """定向刷新单个工作簿
 
+    POST /api/sync/workbook/<workbook_id>
 
-@api_bp.route("/sync", methods=["POST"])
-def trigger_sync():
-    """触发 Tableau 元数据同步
+    只拉取该工作簿的子图（嵌入式数据源、字段、工作表/仪表板、字段实例），
+    增量更新其关联、血缘、统计与四表架构；工作簿在 Tableau 端已删除时清理本地记录。
 
-    POST /api/sync
+    Returns:
+        - 202: 刷新任务已登记
+        - 400: 资产 ID 不是 UUID 格式
+        - 409: 同步正在进行中
+        - 500: 配置错误
+    """
+    return _enqueue_asset_refresh("workbook", workbook_id)
+
+
+@api_bp.route("/sync/datasource/<datasource_id>", methods=["POST"])
+def refresh_datasource(datasource_id):
+    """定向刷新单个已发布数据源
+
+    POST /api/sync/datasource/<datasource_id>
+
+    只拉取该数据源及其字段，增量更新字段、血缘、统计与四表架构；
+    数据源在 Tableau 端已删除时清理本地记录。
 
     Returns:
-        - 200: 同步已启动
+        - 202: 刷新任务已登记
+        - 400: 资产 ID 不是 UUID 格式
         - 409: 同步正在进行中
         - 500: 配置错误
     """
-    global _sync_status
+    return _enqueue_asset_refresh("datasource", datasource_id)
 
-    # 检查配置
-    if not Config.TABLEAU_BASE_URL or not Config.TABLEAU_PAT_NAME:
-        return jsonify(
-            {"success": False, "error": "Tableau 配置缺失，请检查 .env 文件"}
-        ), 500
 
-    with _sync_lock:
-        if _sync_status["is_running"]:
-            return jsonify(
-                {"success": False, "error": "同步正在进行中", "status": _sync_status}
-            ), 409
+@api_bp.route("/sync/webhook", methods=["POST"])
+def receive_webhook():
+    """接收 Tableau Server Webhook 事件，合并进定向刷新队列
 
-        _sync_status["is_running"] = True
-        _sync_status["started_at"] = datetime.now().isoformat()
-        _sync_status["progress"] = "初始化..."
-        _sync_status["error"] = None
+    POST /api/sync/webhook?site=<contentUrl>&token=<WEBHOOK_TOKEN>
+    Body: Tableau Webhook 请求体 {"event_type": "WorkbookUpdated", "resource_luid": "...", "resource_name": "...", ...}
 
-    # 启动后台线程执行同步
-    thread = threading.Thread(target=_run_sync_task, daemon=True)
-    thread.start()
+    同一资产的重复事件合并为一条待处理记录，由同步执行进程在静默期后限速执行定向刷新。
+
+    Returns:
+        - 202: 事件已入队（coalesced 表示与已有记录合并）
+        - 200: 不关心的事件类型，已忽略
+        - 400: 请求体无效（含 resource_luid 不是 UUID）
+        - 401: 令牌错误
+    """
+    if Config.WEBHOOK_TOKEN:
+        token = request.args.get("token") or request.headers.get("X-Webhook-Token") or ""
+        if not hmac.compare_digest(token, Config.WEBHOOK_TOKEN):
+            return jsonify({"success": False, "error": "Webhook 令牌无效"}), 401
+
+    try:
+        event = parse_webhook_event(request.get_json(silent=True))
+    except WebhookPayloadError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if event is None:
+        return jsonify({"success": True, "ignored": True}), 200
 
-    return jsonify({"success": True, "message": "同步已启动", "status": _sync_status})
+    refresh, coalesced = enqueue_refresh(g.primary_db_session, event, site=g.site)
+    ensure_runner()
+
+    return jsonify(
+        {
+            "success": True,
+            "coalesced": coalesced,
+            "request": refresh.to_dict(),
+        }
+    ), 202
+
+
+@api_bp.route("/sync/refresh-queue", methods=["GET"])
+def get_refresh_queue():
+    """查看 Webhook 定向刷新队列
+
+    GET /api/sync/refresh-queue?status=pending&limit=50
+    """
+    status = request.args.get("status")
+    limit = request.args.get("limit", 50, type=int)
+    session = g.primary_db_session
+
+    query = session.query(SyncRefreshRequest)
+    if status:
+        query = query.filter(SyncRefreshRequest.status == status)
+    items = query.order_by(SyncRefreshRequest.id.desc()).limit(limit).all()
+    pending = (
+        session.query(func.count(SyncRefreshRequest.id))
+        .filter(SyncRefreshRequest.status == "pending")
+        .scalar()
+    )
+
+    return jsonify(
+        {
+            "pending": pending,
+            "coalesceSeconds": Config.WEBHOOK_COALESCE_SECONDS,
+            "refreshIntervalSeconds": Config.WEBHOOK_REFRESH_INTERVAL_SECONDS,
+            "items": [item.to_dict() for item in items],
+        }
+    )
 
 
 @api_bp.route("/sync/status", methods=["GET"])
@@ -145,7 +316,7 @@ def get_sync_status():
 
         return jsonify(
             {
-                "current": _sync_status,
+                "current": _job_status(session),
                 "last_sync": last_sync_info,
                 "history": [
                     {
@@ -206,3 +377,227 @@ def get_sync_logs():
         )
     finally:
         session.close()
+
+
+@api_bp.route("/sync/schedules", methods=["GET"])
+def get_sync_schedules():
+    """获取定时同步配置与最近运行记录
+
+    GET /api/sync/schedules?limit=20
+
+    Returns:
+        各任务类型的 cron 表达式、下次触发时间（不含抖动）及最近运行（含 skipped）
+    """
+    limit = request.args.get("limit", 20, type=int)
+    session = g.primary_db_session
+    now = datetime.now()
+
+    schedules = []
+    for job_type, expression in configured_schedules().items():
+        item = {"jobType": job_type, "cron": expression or None, "nextRunAt": None}
+        if expression:
+            try:
+                item["nextRunAt"] = CronExpression(expression).next_after(now).isoformat()
+            except ValueError as e:
+                item["error"] = str(e)
+        schedules.append(item)
+
+    runs = (
+        session.query(SyncLog)
+        .filter(SyncLog.sync_type.in_(SCHEDULED_JOB_TYPES + SKIPPED_SYNC_TYPES))
+        .order_by(SyncLog.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+    return jsonify(
+        {
+            "enabled": Config.SYNC_SCHEDULER_ENABLED,
+            "jitterSeconds": Config.SYNC_SCHEDULE_JITTER_SECONDS,
+            "schedules": schedules,
+            "recentRuns": [
+                {
+                    "id": log.id,
+                    "type": log.sync_type.removeprefix(SKIPPED_SYNC_TYPE_PREFIX),
+                    "status": log.status,
+                    "started_at": log.started_at.isoformat()
+                    if log.started_at
+                    else None,
+                    "completed_at": log.completed_at.isoformat()
+                    if log.completed_at
+                    else None,
+                    "records": log.records_synced,
+                    "error": log.error_message,
+                }
+                for log in runs
+            ],
+        }
+    )
+
+
+@api_bp.route("/sync/changes", methods=["GET"])
+def get_sync_changes():
+    """获取增量变更日志（CDC），用于缓存和前端精准失效
+
+    GET /api/sync/changes?since=<run_id>&entity_type=field,view&after=<change_id>&limit=5000
+
+    参数:
+        since: 上次已消费的运行 ID，返回其后所有运行的变更（默认 0）
+        entity_type: 可选，逗号分隔的实体类型过滤
+        after: 可选，分页游标（上一页返回的 next_after）
+        limit: 单页条数，默认 5000，最大 50000
+
+    Returns:
+        - latest_run: 最近一次完成的运行 ID，消费完毕后作为下次的 since
+        - reset_required: since 早于日志保留窗口，调用方需全量失效
+        - changes: [{runId, entityType, entityId, op}]
+    """
+    from backend.services.change_journal import (
+        latest_run_id,
+        retention_horizon,
+        has_pruned_runs_after,
+    )
+
+    session = g.db_session
+    since = request.args.get("since", 0, type=int)
+    after = request.args.get("after", 0, type=int)
+    limit = min(max(request.args.get("limit", 5000, type=int), 1), 50000)
+    entity_types = [
+        t.strip() for t in request.args.get("entity_type", "").split(",") if t.strip()
+    ]
+
+    latest = latest_run_id(session)
+    horizon = retention_horizon(session)
+    if since and has_pruned_runs_after(session, since, horizon):
+        return jsonify(
+            {
+                "since": since,
+                "latest_run": latest,
+                "reset_required": True,
+                "changes": [],
+                "summary": {},
+                "truncated": False,
+                "next_after": None,
+            }
+        )
+
+    query = session.query(SyncChange).filter(SyncChange.sync_run_id > since)
+    # 仅返回已完成运行的变更，避免读到进行中的运行
+    query = query.filter(SyncChange.sync_run_id <= (latest or 0))
+    if entity_types:
+        query = query.filter(SyncChange.entity_type.in_(entity_types))
+    if after:
+        query = query.filter(SyncChange.id > after)
+
+    rows = query.order_by(SyncChange.id.asc()).limit(limit + 1).all()
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+
+    summary = {}
+    for row in rows:
+        counts = summary.setdefault(
+            row.entity_type, {"insert": 0, "update": 0, "delete": 0}
+        )
+        counts[row.op] = counts.get(row.op, 0) + 1
+
+    return jsonify(
+        {
+            "since": since,
+            "latest_run": latest,
+            "reset_required": False,
+            "changes": [row.to_dict() for row in rows],
+            "summary": summary,
+            "truncated": truncated,
+            "next_after": rows[-1].id if truncated and rows else None,
+        }
+    )
+
+
+@api_bp.route("/sync/runs/<int:run_id>/profile", methods=["GET"])
+def get_sync_run_profile(run_id):
+    """获取单次同步运行的阶段遥测
+
+    GET /api/sync/runs/<run_id>/profile
+
+    Returns:
+        - run: 运行级日志
+        - stages: 各阶段耗时、Tableau 请求数/传输字节（压缩后）、GraphQL 错误、SQL 语句数、写入行数、峰值内存，
+          附带上一次同类型运行的耗时（previousWallMs）与倍数（wallRatio）
+        - totals: 全部阶段汇总
+    """
+    session = g.db_session
+    run = session.get(SyncLog, run_id)
+    if not run or run.sync_type not in RUN_SYNC_TYPES:
+        return jsonify({"error": "同步运行不存在"}), 404
+
+    metrics = (
+        session.query(SyncStageMetric)
+        .filter(SyncStageMetric.sync_run_id == run_id)
+        .order_by(SyncStageMetric.id.asc())
+        .all()
+    )
+
+    # 上一次同类型且有遥测的运行，用于定位变慢的阶段
+    previous_run_id = (
+        session.query(func.max(SyncStageMetric.sync_run_id))
+        .join(SyncLog, SyncLog.id == SyncStageMetric.sync_run_id)
+        .filter(
+            SyncStageMetric.sync_run_id < run_id,
+            SyncLog.sync_type == run.sync_type,
+            SyncLog.status == "completed",
+        )
+        .scalar()
+    )
+    previous = {}
+    if previous_run_id:
+        previous = {
+            m.stage: m.wall_ms
+            for m in session.query(SyncStageMetric).filter(
+                SyncStageMetric.sync_run_id == previous_run_id
+            )
+        }
+
+    stages = []
+    totals = {
+        "wallMs": 0.0,
+        "tableauRequests": 0,
+        "tableauBytes": 0,
+        "graphqlErrors": 0,
+        "sqlStatements": 0,
+        "rowsWritten": 0,
+        "peakRssMb": None,
+    }
+    for metric in metrics:
+        item = metric.to_dict()
+        prev_ms = previous.get(metric.stage)
+        item["previousWallMs"] = round(prev_ms, 1) if prev_ms is not None else None
+        item["wallRatio"] = (
+            round(metric.wall_ms / prev_ms, 2) if prev_ms else None
+        )
+        stages.append(item)
+        for key in ("wallMs", "tableauRequests", "tableauBytes", "graphqlErrors", "sqlStatements", "rowsWritten"):
+            totals[key] += item[key] or 0
+        if item["peakRssMb"] is not None:
+            totals["peakRssMb"] = max(totals["peakRssMb"] or 0, item["peakRssMb"])
+    totals["wallMs"] = round(totals["wallMs"], 1)
+
+    return jsonify(
+        {
+            "run": run.to_dict(),
+            "previousRunId": previous_run_id,
+            "stages": stages,
+            "totals": totals,
+        }
+    )
+
+
+@api_bp.route("/cache/stats", methods=["GET"])
+def get_response_cache_stats():
+    """响应缓存命中率与占用（所有 worker 合计）
+
+    GET /api/cache/stats
+    """
+    cache = current_app.response_cache
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
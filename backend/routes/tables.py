@@ -5,9 +5,19 @@
 
 from flask import jsonify, request, g
 from sqlalchemy import func, text, bindparam
-from sqlalchemy.orm import selectinload
 from . import api_bp
-from .utils import build_tableau_url
+from .utils import (
+    CursorError,
+    apply_keyset,
+    build_tableau_url,
+    decode_cursor,
+    list_facets,
+    list_total,
+    next_cursor,
+    parse_fieldset,
+    project_fields,
+    wants_field,
+)
 from ..models import DBTable, DBColumn, Field, Database
 
 
@@ -117,19 +127,16 @@ def get_tables():
     def parse_list(value: str) -> list[str]:
         return [item.strip() for item in value.split(",") if item.strip()]
 
-    # 分页参数
+    # 分页参数（cursor 为上一页返回的 next_cursor）
     page = request.args.get("page", 1, type=int)
     page_size = request.args.get("page_size", 50, type=int)
-    page_size = min(page_size, 10000)
+    page_size = min(page_size, 1000)  # 全量清单改用 /api/export
     offset = (page - 1) * page_size
+    cursor = request.args.get("cursor", "")
 
-    # 使用 selectinload 预加载关联数据
-    query = session.query(DBTable).options(
-        selectinload(DBTable.fields),
-        selectinload(DBTable.columns),
-        selectinload(DBTable.datasources),
-        selectinload(DBTable.database),
-    )
+    # 只查询表本身，数量与数据库名按当前页聚合（?fields= 未请求的统计不查询）
+    fieldset = parse_fieldset()
+    query = session.query(DBTable)
 
     # 嵌入式筛选
     if is_embedded is not None:
@@ -155,72 +162,96 @@ def get_tables():
             else:
                 query = query.filter(Database.name.in_(database_values))
 
-    # 排序
-    if sort == "name":
-        query = query.order_by(
-            DBTable.name.desc() if order == "desc" else DBTable.name.asc()
-        )
-    elif sort == "schema":
-        query = query.order_by(
-            DBTable.schema.desc() if order == "desc" else DBTable.schema.asc()
-        )
+    total_count, total_exact = list_total("tables", query.count)
+
+    # 排序（id 兜底保证顺序稳定，供游标分页使用）
+    descending = order == "desc"
+    if sort == "schema":
+        sort_columns = [func.coalesce(DBTable.schema, ""), DBTable.id]
+        sort_values = lambda t: [t.schema or "", t.id]
     elif sort == "field_count":
+        sort_columns = None  # 聚合排序，不支持游标
         query = query.outerjoin(Field, DBTable.id == Field.table_id).group_by(
             DBTable.id
         )
         if order == "desc":
-            query = query.order_by(func.count(Field.id).desc())
+            query = query.order_by(func.count(Field.id).desc(), DBTable.id)
         else:
-            query = query.order_by(func.count(Field.id).asc())
-
-    # 总数和分页
-    total_count = query.count()
-    tables = query.limit(page_size).offset(offset).all()
-
-    # Facets 统计
-    schema_stats = session.execute(
-        text("""
-        SELECT schema, COUNT(*) as cnt FROM tables WHERE schema IS NOT NULL GROUP BY schema
-    """)
-    ).fetchall()
-
-    database_stats = session.execute(
-        text("""
-        SELECT d.name as database_name, COUNT(*) as cnt 
-        FROM tables t
-        LEFT JOIN databases d ON t.database_id = d.id
-        WHERE d.name IS NOT NULL
-        GROUP BY d.name
-        ORDER BY cnt DESC
-        LIMIT 20
-    """)
-    ).fetchall()
+            query = query.order_by(func.count(Field.id).asc(), DBTable.id)
+    else:
+        sort_columns = [DBTable.name, DBTable.id]
+        sort_values = lambda t: [t.name, t.id]
+        descending = descending and sort == "name"  # 默认按名称升序
+
+    if sort_columns is None:
+        if cursor:
+            return jsonify({"error": f"排序 {sort} 不支持游标分页"}), 400
+        tables = query.limit(page_size).offset(offset).all()
+        cursor_next = None
+    else:
+        try:
+            cursor_values = decode_cursor(cursor, len(sort_columns)) if cursor else None
+        except CursorError as e:
+            return jsonify({"error": str(e)}), 400
+        query = apply_keyset(query, sort_columns, descending, cursor_values)
+        tables, cursor_next = next_cursor(
+            query.limit(page_size + 1).offset(0 if cursor else offset).all(),
+            page_size,
+            sort_values,
+        )
 
-    facets = {
-        "schema": {row[0]: row[1] for row in schema_stats if row[0]},
-        "database_name": {row[0]: row[1] for row in database_stats if row[0]},
-    }
+    # Facets 统计（数据库取数量最多的 20 个）
+    embedded_selected = []
+    if is_embedded is not None:
+        embedded_selected.append("true" if is_embedded == "1" or is_embedded.lower() == "true" else "false")
+    facets = list_facets(
+        "tables",
+        search,
+        {
+            "schema": parse_list(schema_filter),
+            "database_name": parse_list(database_name),
+            "is_embedded": embedded_selected,
+        },
+    )
+    facets["database_name"] = dict(
+        sorted(facets.get("database_name", {}).items(), key=lambda item: -item[1])[:20]
+    )
 
     # 预查询统计数据
     table_ids = [t.id for t in tables]
     wb_map = {}
     field_stats_map = {}
+    direct_field_map = {}
+    column_map = {}
+    ds_map = {}
+    database_map = {}
+
+    def count_by_table(sql):
+        stmt = text(sql).bindparams(bindparam("table_ids", expanding=True))
+        return session.execute(stmt, {"table_ids": list(table_ids)}).fetchall()
+
+    if table_ids and wants_field(fieldset, "database_name"):
+        database_ids = list({t.database_id for t in tables if t.database_id})
+        if database_ids:
+            stmt = text("SELECT id, name FROM databases WHERE id IN :database_ids").bindparams(
+                bindparam("database_ids", expanding=True)
+            )
+            database_map = dict(session.execute(stmt, {"database_ids": database_ids}).fetchall())
 
-    if table_ids:
+    if table_ids and wants_field(fieldset, "workbook_count"):
         # 预查询工作簿统计
-        stmt = text("""
+        wb_stats = count_by_table("""
             SELECT td.table_id, COUNT(DISTINCT dw.workbook_id) as wb_count
             FROM table_to_datasource td
             JOIN datasource_to_workbook dw ON td.datasource_id = dw.datasource_id
             WHERE td.table_id IN :table_ids
             GROUP BY td.table_id
         """)
-        stmt = stmt.bindparams(bindparam("table_ids", expanding=True))
-        wb_stats = session.execute(stmt, {"table_ids": list(table_ids)}).fetchall()
         wb_map = {row[0]: row[1] for row in wb_stats}
 
+    if table_ids and wants_field(fieldset, "field_count", "preview_fields"):
         # 预查询字段统计（支持直接和间接关联）
-        field_stmt = text("""
+        field_stats = count_by_table("""
             SELECT
                 t.table_id,
                 COUNT(DISTINCT t.field_id) as field_count,
@@ -246,10 +277,6 @@ def get_tables():
             JOIN fields f ON t.field_id = f.id
             GROUP BY t.table_id
         """)
-        field_stmt = field_stmt.bindparams(bindparam("table_ids", expanding=True))
-        field_stats = session.execute(
-            field_stmt, {"table_ids": list(table_ids)}
-        ).fetchall()
         field_stats_map = {
             row[0]: {
                 "field_count": row[1],
@@ -259,21 +286,47 @@ def get_tables():
             for row in field_stats
         }
 
+        # 直接关联的字段数（无间接关联统计时兜底）
+        direct_field_map = dict(count_by_table("""
+            SELECT table_id, COUNT(*) FROM fields
+            WHERE table_id IN :table_ids
+            GROUP BY table_id
+        """))
+
+    if table_ids and wants_field(fieldset, "column_count"):
+        column_map = dict(count_by_table("""
+            SELECT table_id, COUNT(*) FROM db_columns
+            WHERE table_id IN :table_ids
+            GROUP BY table_id
+        """))
+
+    if table_ids and wants_field(fieldset, "datasource_count", "embedded_datasource_count"):
+        # 分开统计嵌入式和已发布数据源
+        for table_id, embedded, count in count_by_table("""
+            SELECT td.table_id, COALESCE(ds.is_embedded, 0), COUNT(*)
+            FROM table_to_datasource td
+            JOIN datasources ds ON ds.id = td.datasource_id
+            WHERE td.table_id IN :table_ids
+            GROUP BY td.table_id, COALESCE(ds.is_embedded, 0)
+        """):
+            ds_map.setdefault(table_id, {})[bool(embedded)] = count
+
     results = []
     for t in tables:
-        data = t.to_dict()
-
         stats = field_stats_map.get(t.id, {})
-        direct_field_count = len(t.fields) if t.fields else 0
+        direct_field_count = direct_field_map.get(t.id, 0)
+        column_count = column_map.get(t.id, 0)
+        data = t.to_dict(
+            column_count=column_count,
+            field_count=direct_field_count,
+            database_name=database_map.get(t.database_id),
+        )
         data["field_count"] = stats.get("field_count", direct_field_count)
-        data["column_count"] = len(t.columns) if t.columns else 0
+        data["column_count"] = column_count
 
-        # 分开统计嵌入式和已发布数据源
-        all_datasources = t.datasources if t.datasources else []
-        published_ds = [ds for ds in all_datasources if not ds.is_embedded]
-        embedded_ds = [ds for ds in all_datasources if ds.is_embedded]
-        data["datasource_count"] = len(published_ds)
-        data["embedded_datasource_count"] = len(embedded_ds)
+        ds_counts = ds_map.get(t.id, {})
+        data["datasource_count"] = ds_counts.get(False, 0)
+        data["embedded_datasource_count"] = ds_counts.get(True, 0)
 
         data["workbook_count"] = wb_map.get(t.id, 0)
 
@@ -285,7 +338,7 @@ def get_tables():
             if dimension_count > 0
             else [],
         }
-        results.append(data)
+        results.append(project_fields(data, fieldset))
 
     return jsonify(
         {
@@ -293,6 +346,8 @@ def get_tables():
             "total": total_count,
             "page": page,
             "page_size": page_size,
+            "total_exact": total_exact,
+            "next_cursor": cursor_next,
             "facets": facets,
         }
     )
@@ -306,7 +361,12 @@ def get_table_detail(table_id):
     if not table:
         return jsonify({"error": "Not found"}), 404
 
-    data = table.to_dict()
+    # 详情页本身要逐个输出列与字段，集合已加载，数量直接取其长度
+    data = table.to_dict(
+        column_count=len(table.columns),
+        field_count=len(table.fields),
+        database_name=table.database.name if table.database else None,
+    )
 
     # 所属数据库信息
     if table.database:
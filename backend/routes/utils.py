@@ -3,12 +3,14 @@
 供各路由模块共享使用
 """
 
+import base64
+import json
 import re
 from collections import defaultdict
 from typing import Optional
 from typing import Any, Dict, List, Union
-from flask import g
-from sqlalchemy import func, case
+from flask import current_app, g, request
+from sqlalchemy import func, case, tuple_
 from ..models import (
     Database,
     DBTable,
@@ -28,6 +30,7 @@ from ..models import (
     TermEnum,
 )
 from ..config import Config
+from ..services.counts import COUNT_MODES
 
 
 def snake_to_camel(s: str) -> str:
@@ -177,6 +180,136 @@ def apply_sorting(query, model, sort_key, order):
     return query
 
 
+class CursorError(ValueError):
+    """游标无法解析或与当前排序不匹配"""
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """排序键取值 -> 不透明游标（base64url 编码的 JSON 数组）"""
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """游标 -> 排序键取值，长度须与当前排序的键数一致"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError) as e:
+        raise CursorError("无效的游标") from e
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or not all(isinstance(v, (str, int, float)) for v in values)
+    ):
+        raise CursorError("游标与当前排序不匹配")
+    return values
+
+
+def keyset_sql(expressions: List[str], descending: bool, values: Optional[List[Any]], params: dict):
+    """原生 SQL 的键集分页：返回 (游标条件, ORDER BY 子句)
+
+    expressions 为排序键（最后一个须是唯一键），取值不能为 NULL；
+    行值比较 (k1, id) < (:cursor_0, :cursor_1) 让 SQLite 直接定位到上一页末尾，不再逐行跳过 OFFSET
+    """
+    direction = "DESC" if descending else "ASC"
+    order_clause = "ORDER BY " + ", ".join(f"{expr} {direction}" for expr in expressions)
+    if values is None:
+        return "", order_clause
+    keys = []
+    for idx, value in enumerate(values):
+        params[f"cursor_{idx}"] = value
+        keys.append(f":cursor_{idx}")
+    op = "<" if descending else ">"
+    return f"({', '.join(expressions)}) {op} ({', '.join(keys)})", order_clause
+
+
+def apply_keyset(query, columns: List[Any], descending: bool, values: Optional[List[Any]]):
+    """ORM 查询的键集分页：按 columns 排序（最后一列须唯一），有游标时只取其后的行"""
+    if values is not None:
+        row, cursor = tuple_(*columns), tuple_(*values)
+        query = query.filter(row < cursor if descending else row > cursor)
+    return query.order_by(*[c.desc() if descending else c.asc() for c in columns])
+
+
+def next_cursor(rows: list, page_size: int, key):
+    """rows 按 page_size + 1 条查询：多出的一条说明还有下一页，返回 (当前页, 下一页游标或 None)"""
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+# 不影响列表总数的请求参数
+_NON_FILTER_ARGS = {"page", "page_size", "cursor", "sort", "order", "count", "site", "fields"}
+
+
+def list_total(list_name: str, count, filters: Optional[tuple] = None):
+    """分页总数：返回 (total, total_exact)
+
+    ?count=exact|estimate|none 选择统计方式（见 services.counts）；
+    filters 默认取除分页/排序外的全部查询参数，作为缓存键的一部分
+    """
+    mode = request.args.get("count", "exact")
+    if mode not in COUNT_MODES:
+        mode = "exact"
+    if filters is None:
+        filters = tuple(sorted(
+            (k, v) for k, values in request.args.lists()
+            if k not in _NON_FILTER_ARGS for v in values if v
+        ))
+    version = current_app.data_versions.version(g.site)
+    return current_app.counts.total(
+        g.db_session, g.site, list_name, filters, version and version[0], mode, count
+    )
+
+
+def list_facets(list_name: str, search: str = "", filters: Optional[Dict[str, List[str]]] = None):
+    """分面统计：{分面: {取值: 数量}}（见 services.facets），filters 为 {分面: 选中的取值}"""
+    version = current_app.data_versions.version(g.site)
+    return current_app.facets.counts(
+        g.db_session, g.site, list_name, version and version[0], search, filters
+    )
+
+
+def page_count(total: Optional[int], page_size: int) -> Optional[int]:
+    """总页数；未统计总数时为 None"""
+    if total is None:
+        return None
+    return (total + page_size - 1) // page_size if total > 0 else 0
+
+
+def parse_fieldset() -> Optional[set]:
+    """?fields=id,name,tableCount：请求的字段集合（统一为 camelCase，snake_case 亦可）；未指定时为 None 表示全部字段"""
+    raw = request.args.get("fields", "")
+    if not raw.strip():
+        return None
+    return {snake_to_camel(name) for name in parse_list(raw)} | {"id"}
+
+
+def wants_field(fieldset: Optional[set], *names: str) -> bool:
+    """是否需要输出其中任一字段（用于跳过未请求字段的统计查询与关联加载）"""
+    return fieldset is None or any(snake_to_camel(name) in fieldset for name in names)
+
+
+def project_fields(item: Dict[str, Any], fieldset: Optional[set]) -> Dict[str, Any]:
+    """按字段集合裁剪单条记录；键名按 camelCase 匹配（tableCount 同时保留 table_count）"""
+    if fieldset is None:
+        return item
+    return {key: value for key, value in item.items() if snake_to_camel(key) in fieldset}
+
+
+def parse_lineage_pairs(info: Optional[str]) -> List[Dict[str, str]]:
+    """解析目录聚合表中 "id|name" 逗号拼接的数据源/工作簿列表"""
+    items = []
+    for pair in (info or "").split(","):
+        if "|" in pair:
+            item_id, name = pair.split("|", 1)
+            if item_id and item_id != "None":
+                items.append({"id": item_id, "name": name})
+    return items
+
+
 def get_field_usage_by_name(session, field_name):
     """
     按需查询：获取指定字段被哪些指标引用
@@ -6,7 +6,17 @@ from flask import jsonify, request, g
 from sqlalchemy import text, bindparam, func
 from sqlalchemy.orm import selectinload
 from . import api_bp
-from .utils import build_tableau_url
+from .utils import (
+    CursorError,
+    apply_keyset,
+    build_tableau_url,
+    decode_cursor,
+    list_total,
+    next_cursor,
+    parse_fieldset,
+    project_fields,
+    wants_field,
+)
 from ..models import View, Field, Workbook, Datasource, field_to_view
 
 # ==================== 视图接口 ====================
@@ -184,12 +194,14 @@ def get_views():
     session = g.db_session
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('page_size', 50, type=int)
-    page_size = min(page_size, 10000)
+    page_size = min(page_size, 1000)  # 全量清单改用 /api/export
+    cursor = request.args.get('cursor', '')  # 上一页返回的 next_cursor
     search = request.args.get('search', '').strip()
     
     view_type = request.args.get('view_type', '')
     workbook_name = request.args.get('workbook_name', '')
     include_standalone = request.args.get('include_standalone', '')
+    fieldset = parse_fieldset()
     
     offset = (page - 1) * page_size
     base_query = session.query(View)
@@ -233,37 +245,62 @@ def get_views():
             (View.workbook.has(Workbook.name.ilike(f'%{search}%')))
         )
         
-    base_total = base_query.count()
-    total = query.count()
+    base_filters = (('include_standalone', 'true'),) if include_standalone == 'true' else ()
+    base_total, _ = list_total('views', base_query.count, filters=base_filters)
+    total, total_exact = list_total('views', query.count)
     
-    # 排序
+    # 排序（id 兜底保证顺序稳定，供游标分页使用）
     sort = request.args.get('sort', '')
     order = request.args.get('order', 'asc')
+    descending = order == 'desc'
 
     if sort in ('total_view_count', 'hits_total'):
-        query = query.order_by(View.total_view_count.desc() if order == 'desc' else View.total_view_count.asc())
+        sort_columns = [func.coalesce(View.total_view_count, 0), View.id]
+        sort_values = lambda v: [v.total_view_count or 0, v.id]
     elif sort == 'field_count':
+        sort_columns = None  # 聚合排序，不支持游标
         field_count_subq = session.query(
             field_to_view.c.view_id.label('view_id'),
             func.count(func.distinct(field_to_view.c.field_id)).label('field_count')
         ).group_by(field_to_view.c.view_id).subquery()
         query = query.outerjoin(field_count_subq, View.id == field_count_subq.c.view_id)
         count_order = func.coalesce(field_count_subq.c.field_count, 0)
-        query = query.order_by(count_order.desc() if order == 'desc' else count_order.asc())
+        query = query.order_by(count_order.desc() if descending else count_order.asc(), View.id)
     elif sort == 'name':
-         query = query.order_by(View.name.desc() if order == 'desc' else View.name.asc())
+        sort_columns = [View.name, View.id]
+        sort_values = lambda v: [v.name, v.id]
     elif include_standalone == 'true':
-        # 默认：优先显示仪表盘，然后是独立视图
-        query = query.order_by(View.view_type.asc(), View.name.asc()) # dashboard < sheet
+        # 默认：优先显示仪表盘，然后是独立视图 (dashboard < sheet)
+        sort_columns = [func.coalesce(View.view_type, ''), View.name, View.id]
+        sort_values = lambda v: [v.view_type or '', v.name, v.id]
+        descending = False
     else:
-        query = query.order_by(View.name.asc())
-    
-    views = query.limit(page_size).offset(offset).all()
+        sort_columns = [View.name, View.id]
+        sort_values = lambda v: [v.name, v.id]
+        descending = False
+
+    if sort_columns is None:
+        if cursor:
+            return jsonify({'error': f'排序 {sort} 不支持游标分页'}), 400
+        views = query.limit(page_size).offset(offset).all()
+        cursor_next = None
+    else:
+        try:
+            cursor_values = decode_cursor(cursor, len(sort_columns)) if cursor else None
+        except CursorError as e:
+            return jsonify({'error': str(e)}), 400
+        query = apply_keyset(query, sort_columns, descending, cursor_values)
+        views, cursor_next = next_cursor(
+            query.limit(page_size + 1).offset(0 if cursor else offset).all(), page_size, sort_values
+        )
     
-    # 预查询统计数据，确保列表与详情一致
+    # 预查询统计数据，确保列表与详情一致（?fields= 未请求的统计不查询）
     view_ids = [v.id for v in views]
     stats_map = {}
-    if view_ids:
+    workbook_map = {}
+    contained_map = {}
+    parent_map = {}
+    if view_ids and wants_field(fieldset, 'field_count', 'metric_count'):
         stats_sql = text("""
             SELECT 
                 fv.view_id,
@@ -277,6 +314,30 @@ def get_views():
         rows = session.execute(stats_sql, {'view_ids': list(view_ids)}).fetchall()
         stats_map = {row[0]: {'field_count': row[1], 'metric_count': row[2]} for row in rows}
 
+    if view_ids and wants_field(fieldset, 'workbook_name'):
+        workbook_ids = list({v.workbook_id for v in views if v.workbook_id})
+        if workbook_ids:
+            stmt = text("SELECT id, name FROM workbooks WHERE id IN :workbook_ids").bindparams(
+                bindparam('workbook_ids', expanding=True)
+            )
+            workbook_map = dict(session.execute(stmt, {'workbook_ids': workbook_ids}).fetchall())
+
+    # 仪表盘包含的工作表数 / 工作表被多少仪表盘包含（替代逐行懒加载关系集合）
+    if view_ids and wants_field(fieldset, 'contained_sheet_count'):
+        stmt = text("""
+            SELECT dashboard_id, COUNT(*) FROM dashboard_to_sheet
+            WHERE dashboard_id IN :view_ids
+            GROUP BY dashboard_id
+        """).bindparams(bindparam('view_ids', expanding=True))
+        contained_map = dict(session.execute(stmt, {'view_ids': list(view_ids)}).fetchall())
+    if view_ids and wants_field(fieldset, 'is_standalone'):
+        stmt = text("""
+            SELECT sheet_id, COUNT(*) FROM dashboard_to_sheet
+            WHERE sheet_id IN :view_ids
+            GROUP BY sheet_id
+        """).bindparams(bindparam('view_ids', expanding=True))
+        parent_map = dict(session.execute(stmt, {'view_ids': list(view_ids)}).fetchall())
+
     # Facets 统计
     facets = {}
     
@@ -329,11 +390,15 @@ def get_views():
     
     results = []
     for v in views:
-        data = v.to_dict()
+        data = v.to_dict(
+            workbook_name=workbook_map.get(v.workbook_id),
+            contained_sheet_count=contained_map.get(v.id, 0),
+            is_standalone=parent_map.get(v.id, 0) == 0,
+        )
         v_stats = stats_map.get(v.id, {})
         data['fieldCount'] = v_stats.get('field_count', 0)
         data['metricCount'] = v_stats.get('metric_count', 0)
-        results.append(data)
+        results.append(project_fields(data, fieldset))
 
     return jsonify({
         'items': results,
@@ -341,6 +406,8 @@ def get_views():
         'base_total': base_total,
         'page': page,
         'page_size': page_size,
+        'total_exact': total_exact,
+        'next_cursor': cursor_next,
         'facets': facets
     })
 
@@ -360,7 +427,17 @@ def get_view_detail(view_id):
     if not view:
         return jsonify({'error': 'Not found'}), 404
     
-    data = view.to_dict()
+    contained_sheet_count = session.execute(
+        text("SELECT COUNT(*) FROM dashboard_to_sheet WHERE dashboard_id = :id"), {'id': view.id}
+    ).scalar() or 0
+    parent_count = session.execute(
+        text("SELECT COUNT(*) FROM dashboard_to_sheet WHERE sheet_id = :id"), {'id': view.id}
+    ).scalar() or 0
+    data = view.to_dict(
+        workbook_name=view.workbook.name if view.workbook else None,
+        contained_sheet_count=contained_sheet_count,
+        is_standalone=parent_count == 0,
+    )
     
     # 所属工作簿信息
     if view.workbook:
@@ -412,7 +489,6 @@ def get_view_detail(view_id):
         data['aggregatedViewCount'] = dashboard_own_views + sheets_total_views
     
     # 上游血缘：通过视图使用的字段反查数据源和物理表
-    from sqlalchemy import text
     upstream_result = session.execute(text("""
         SELECT DISTINCT 
             fl.datasource_id, d.name as ds_name, d.project_name, d.is_certified,
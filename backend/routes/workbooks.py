@@ -7,7 +7,17 @@ from flask import jsonify, request, g
 from sqlalchemy import text, bindparam, func
 from sqlalchemy.orm import selectinload
 from . import api_bp
-from .utils import build_tableau_url
+from .utils import (
+    CursorError,
+    apply_keyset,
+    build_tableau_url,
+    decode_cursor,
+    list_total,
+    next_cursor,
+    parse_fieldset,
+    project_fields,
+    wants_field,
+)
 from ..models import Workbook, Field, View
 
 # ==================== 工作簿接口 ====================
@@ -98,6 +108,7 @@ def get_workbooks():
     def parse_list(value: str) -> list[str]:
         return [item.strip() for item in value.split(",") if item.strip()]
 
+    fieldset = parse_fieldset()
     query = session.query(Workbook)
     if search:
         query = query.filter(Workbook.name.ilike(f"%{search}%"))
@@ -108,33 +119,40 @@ def get_workbooks():
         elif project_values:
             query = query.filter(Workbook.project_name.in_(project_values))
 
-    # SQL 级别排序
-    if sort == "viewCount":
-        if order == "desc":
-            query = query.order_by(Workbook.view_count.desc())
-        else:
-            query = query.order_by(Workbook.view_count.asc())
-    elif sort == "name":
-        if order == "desc":
-            query = query.order_by(Workbook.name.desc())
-        else:
-            query = query.order_by(Workbook.name.asc())
-    else:
-        # 默认排序
-        query = query.order_by(Workbook.name.asc())
-
-    # 分页参数
+    # 分页参数（cursor 为上一页返回的 next_cursor）
     page = request.args.get("page", 1, type=int)
     page_size = request.args.get("page_size", 50, type=int)
     offset = (page - 1) * page_size
+    cursor = request.args.get("cursor", "")
 
-    total_count = query.count()
-    workbooks = query.limit(page_size).offset(offset).all()
+    total_count, total_exact = list_total("workbooks", query.count)
+
+    # SQL 级别排序（id 兜底保证顺序稳定，供游标分页使用）
+    descending = order == "desc"
+    if sort == "viewCount":
+        sort_columns = [func.coalesce(Workbook.view_count, 0), Workbook.id]
+        sort_values = lambda wb: [wb.view_count or 0, wb.id]
+    else:
+        sort_columns = [Workbook.name, Workbook.id]
+        sort_values = lambda wb: [wb.name, wb.id]
+        descending = descending and sort == "name"  # 默认按名称升序
+
+    try:
+        cursor_values = decode_cursor(cursor, len(sort_columns)) if cursor else None
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    query = apply_keyset(query, sort_columns, descending, cursor_values)
+    workbooks, cursor_next = next_cursor(
+        query.limit(page_size + 1).offset(0 if cursor else offset).all(),
+        page_size,
+        sort_values,
+    )
 
     # 预查询统计数据，确保列表与详情一致
     wb_ids = [wb.id for wb in workbooks]
     stats_map = {}
-    if wb_ids:
+    upstream_map = {}
+    if wb_ids and wants_field(fieldset, "view_count", "datasource_count", "field_count"):
         # 1. 视图数和数据源数
         stats_sql = text("""
             SELECT 
@@ -159,6 +177,17 @@ def get_workbooks():
             for row in rows
         }
 
+    if wb_ids and wants_field(fieldset, "upstream_datasources"):
+        # 2. 上游数据源名称（一次查询当前页，不逐个加载 datasources 集合）
+        upstream_sql = text("""
+            SELECT dw.workbook_id, d.name
+            FROM datasource_to_workbook dw
+            JOIN datasources d ON d.id = dw.datasource_id
+            WHERE dw.workbook_id IN :wb_ids
+        """).bindparams(bindparam("wb_ids", expanding=True))
+        for workbook_id, name in session.execute(upstream_sql, {"wb_ids": list(wb_ids)}):
+            upstream_map.setdefault(workbook_id, []).append(name)
+
     results = []
     for wb in workbooks:
         data = wb.to_dict()
@@ -168,8 +197,8 @@ def get_workbooks():
         data["datasource_count"] = wb_stats.get("datasource_count", 0)
         data["field_count"] = wb_stats.get("field_count", 0)
 
-        data["upstream_datasources"] = [ds.name for ds in wb.datasources]
-        results.append(data)
+        data["upstream_datasources"] = upstream_map.get(wb.id, [])
+        results.append(project_fields(data, fieldset))
 
     # Facets 统计 - 只应用搜索条件
     facets = {}
@@ -199,6 +228,8 @@ def get_workbooks():
             "total": total_count,
             "page": page,
             "page_size": page_size,
+            "total_exact": total_exact,
+            "next_cursor": cursor_next,
             "facets": facets,
         }
     )
@@ -0,0 +1,223 @@
+"""
+同步变更日志 (Change Data Capture)
+在同步前后对核心实体表做行级指纹快照，比对得出新增/更新/删除，写入 sync_changes 表
+
+采用快照比对而不是 ORM 事件，是因为同步流程中既有 ORM 写入，也有大量原生 SQL
+批量更新（如 usage_count、统计字段），只有比对最终行内容才能完整捕获变更。
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, insert, text
+
+from backend.models import SyncChange
+
+
+# 实体类型 -> 表名（实体类型与 API 路由命名保持一致）
+TRACKED_ENTITIES = {
+    "database": "databases",
+    "table": "tables",
+    "datasource": "datasources",
+    "workbook": "workbooks",
+    "view": "views",
+    "field": "fields",
+    "metric": "calculated_fields",
+}
+
+# 不参与指纹计算的列（由 ORM onupdate 自动刷新，不代表元数据变化）
+VOLATILE_COLUMNS = {
+    "databases": {"updated_at"},
+}
+
+# 运行级同步日志的 sync_type（sync_logs 中其余记录为各阶段日志）
+RUN_SYNC_TYPES = ("full", "incremental", "usage", "workbook_refresh", "datasource_refresh")
+
+# 按 ID 范围快照时每条 IN 查询的 ID 数
+_SCOPE_CHUNK = 500
+
+# 变更日志保留的运行次数
+DEFAULT_RETENTION_RUNS = 50
+
+
+def _row_digest(values) -> bytes:
+    """计算单行内容的紧凑指纹（8 字节）"""
+    return hashlib.blake2b(repr(values).encode("utf-8"), digest_size=8).digest()
+
+
+class ChangeJournal:
+    """同步变更日志记录器
+
+    用法:
+        journal = ChangeJournal(session)
+        before = journal.snapshot()
+        ... 执行同步 ...
+        journal.record(run_id, before, journal.snapshot())
+
+    定向刷新只快照受影响的行：snapshot({"field": [...], "view": [...]})，
+    同步后以同一范围（可追加新出现的 ID）再快照一次
+    """
+
+    def __init__(self, session, entities: Dict[str, str] = None):
+        self.session = session
+        self.entities = entities or TRACKED_ENTITIES
+
+    def _table_exists(self, table: str) -> bool:
+        row = self.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": table},
+        ).first()
+        return row is not None
+
+    def snapshot(
+        self, scope: Optional[Dict[str, Iterable[str]]] = None
+    ) -> Dict[str, Dict[str, bytes]]:
+        """对跟踪实体表做快照：{entity_type: {id: digest}}
+
+        scope 为 {entity_type: [id, ...]} 时只快照其中的实体类型与行
+        """
+        result = {}
+        for entity_type, table in self.entities.items():
+            if scope is not None and entity_type not in scope:
+                continue
+            if not self._table_exists(table):
+                result[entity_type] = {}
+                continue
+
+            columns = [
+                row[1]
+                for row in self.session.execute(text(f"PRAGMA table_info({table})"))
+            ]
+            skip = VOLATILE_COLUMNS.get(table, set())
+            hashed_columns = [c for c in columns if c not in skip and c != "id"]
+            select_cols = ", ".join(["id"] + [f'"{c}"' for c in hashed_columns])
+
+            digests = {}
+            if scope is None:
+                for row in self.session.execute(text(f"SELECT {select_cols} FROM {table}")):
+                    digests[row[0]] = _row_digest(tuple(row[1:]))
+            else:
+                query = text(
+                    f"SELECT {select_cols} FROM {table} WHERE id IN :ids"
+                ).bindparams(bindparam("ids", expanding=True))
+                ids = list(dict.fromkeys(scope[entity_type]))
+                for start in range(0, len(ids), _SCOPE_CHUNK):
+                    chunk = ids[start:start + _SCOPE_CHUNK]
+                    for row in self.session.execute(query, {"ids": chunk}):
+                        digests[row[0]] = _row_digest(tuple(row[1:]))
+            result[entity_type] = digests
+        return result
+
+    @staticmethod
+    def diff(before: Dict[str, Dict[str, bytes]], after: Dict[str, Dict[str, bytes]]):
+        """比对两次快照，产出 (entity_type, entity_id, op)"""
+        for entity_type in after.keys() | before.keys():
+            old = before.get(entity_type, {})
+            new = after.get(entity_type, {})
+            for entity_id, digest in new.items():
+                old_digest = old.get(entity_id)
+                if old_digest is None:
+                    yield entity_type, entity_id, "insert"
+                elif old_digest != digest:
+                    yield entity_type, entity_id, "update"
+            for entity_id in old.keys() - new.keys():
+                yield entity_type, entity_id, "delete"
+
+    def record(
+        self,
+        sync_run_id: int,
+        before: Dict[str, Dict[str, bytes]],
+        after: Dict[str, Dict[str, bytes]],
+        retention_runs: Optional[int] = DEFAULT_RETENTION_RUNS,
+    ) -> Dict[str, Dict[str, int]]:
+        """写入变更日志并返回按实体类型汇总的计数"""
+        summary: Dict[str, Dict[str, int]] = {}
+        now = datetime.utcnow()
+        batch = []
+        for entity_type, entity_id, op in self.diff(before, after):
+            counts = summary.setdefault(
+                entity_type, {"insert": 0, "update": 0, "delete": 0}
+            )
+            counts[op] += 1
+            batch.append(
+                {
+                    "sync_run_id": sync_run_id,
+                    "entity_type": entity_type,
+                    "entity_id": entity_id,
+                    "op": op,
+                    "created_at": now,
+                }
+            )
+            if len(batch) >= 5000:
+                self.session.execute(insert(SyncChange), batch)
+                batch = []
+        if batch:
+            self.session.execute(insert(SyncChange), batch)
+
+        if retention_runs:
+            self.prune(retention_runs)
+        self.session.commit()
+        return summary
+
+    def prune(self, retention_runs: int):
+        """仅保留最近 retention_runs 次运行的变更记录"""
+        horizon = retention_horizon(self.session, retention_runs)
+        if horizon is not None:
+            self.session.execute(
+                text("DELETE FROM sync_changes WHERE sync_run_id < :horizon"),
+                {"horizon": horizon},
+            )
+
+
+def _run_types_clause(params: dict) -> str:
+    keys = []
+    for idx, value in enumerate(RUN_SYNC_TYPES):
+        params[f"run_type_{idx}"] = value
+        keys.append(f":run_type_{idx}")
+    return f"({', '.join(keys)})"
+
+
+def retention_horizon(session, retention_runs: int = DEFAULT_RETENTION_RUNS):
+    """变更日志保留窗口内最早的运行 ID（更早运行的变更已被清理）"""
+    params = {"keep": retention_runs}
+    types_clause = _run_types_clause(params)
+    return session.execute(
+        text(f"""
+        SELECT MIN(id) FROM (
+            SELECT id FROM sync_logs WHERE sync_type IN {types_clause}
+            ORDER BY id DESC LIMIT :keep
+        )
+    """),
+        params,
+    ).scalar()
+
+
+def latest_run_id(session) -> Optional[int]:
+    """最近一次成功完成的同步运行 ID"""
+    params = {}
+    types_clause = _run_types_clause(params)
+    return session.execute(
+        text(f"""
+        SELECT MAX(id) FROM sync_logs
+        WHERE sync_type IN {types_clause} AND status = 'completed'
+    """),
+        params,
+    ).scalar()
+
+
+def has_pruned_runs_after(session, since: int, horizon: Optional[int]) -> bool:
+    """since 之后是否存在已被清理变更记录的运行（调用方需全量失效）"""
+    if horizon is None:
+        return False
+    params = {"since": since, "horizon": horizon}
+    types_clause = _run_types_clause(params)
+    row = session.execute(
+        text(f"""
+        SELECT 1 FROM sync_logs
+        WHERE sync_type IN {types_clause} AND id > :since AND id < :horizon
+        LIMIT 1
+    """),
+        params,
+    ).first()
+    return row is not None
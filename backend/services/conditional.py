@@ -0,0 +1,84 @@
+"""
+条件请求 (ETag / Last-Modified)
+GET 响应附带由数据版本生成的 ETag 与 Last-Modified，客户端携带 If-None-Match / If-Modified-Since
+且数据未变化时直接返回 304，不执行任何 SQL
+
+- 数据版本 = 同步代数 + 库文件签名（主库与 -wal 文件的 inode、mtime、大小）：
+  同步完成、影子库替换以及字段/指标编辑等任何写入都会改变签名
+- 签名只需 stat()；签名变化时才查询一次同步代数并记住，签名不变的请求全程不访问数据库
+- 站点请求同时计入默认库（同步任务表所在）与站点分区库
+"""
+
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from backend.models import get_session
+from backend.services.shadow_db import sync_generation
+
+# 响应不只取决于当前库数据的接口：跨站点汇总、进程内索引、按当前时间计算或读取时会修复状态的接口
+NON_CONDITIONAL_ENDPOINTS = {
+    "api.get_sites",
+    "api.search_across_sites",
+    "api.search_suggest",
+    "api.get_sync_status",
+    "api.get_sync_schedules",
+    "api.get_response_cache_stats",
+}
+
+
+def data_signature(path: str) -> tuple:
+    """库文件签名：主库与 WAL 文件的 (inode, mtime_ns, size)，提交写入后必然变化"""
+    signature = []
+    for suffix in ("", "-wal"):
+        try:
+            st = os.stat(path + suffix)
+        except FileNotFoundError:
+            signature.append(None)
+            continue
+        signature.append((st.st_ino, st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+class DataVersionTracker:
+    """按站点记住 (库文件签名, 同步代数, ETag, Last-Modified)"""
+
+    def __init__(self, site_engines):
+        self.site_engines = site_engines
+        self._versions: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _paths(self, content_url: str):
+        paths = []
+        for site in dict.fromkeys(("", content_url)):
+            entry = self.site_engines.get(site)
+            if entry is not None and entry[2] is not None:
+                paths.append(entry[2].database_path)
+        return paths
+
+    def version(self, content_url: str = "") -> Optional[Tuple[str, datetime]]:
+        """返回 (ETag, Last-Modified)；库不可用时返回 None"""
+        paths = self._paths(content_url)
+        if not paths:
+            return None
+        signature = tuple(data_signature(p) for p in paths)
+        cached = self._versions.get(content_url)
+        if cached is not None and cached[0] == signature:
+            return cached[1], cached[2]
+
+        session = get_session(self.site_engines.get(content_url)[1])  # 只读引擎
+        try:
+            generation = sync_generation(session)
+        finally:
+            session.close()
+        digest = hashlib.sha1(repr((content_url, generation, signature)).encode("utf-8")).hexdigest()
+        etag = f"{generation}-{digest[:16]}"
+        mtimes = [part[1] for sig in signature for part in sig if part is not None]
+        last_modified = datetime.fromtimestamp(
+            (max(mtimes) if mtimes else 0) / 1e9, tz=timezone.utc
+        ).replace(microsecond=0)
+        with self._lock:
+            self._versions[content_url] = (signature, etag, last_modified)
+        return etag, last_modified
@@ -0,0 +1,122 @@
+"""
+列表总数
+分页接口的 total 不再每页重新统计：未筛选的总数在同步结束时预先计算，筛选后的总数按 (站点, 列表, 筛选条件, 数据版本) 缓存
+
+- count=exact（默认）：精确总数；未筛选时读取预计算值，筛选时命中当前数据版本的缓存或重新统计
+- count=estimate：允许返回之前数据版本缓存的总数（近似），没有缓存时与 exact 相同
+- count=none：不统计总数（配合 cursor 翻页）
+- 平台只读，列表行数只随同步变化，预计算值在下次同步前保持精确
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy import text
+
+
+COUNT_MODES = ("exact", "estimate", "none")
+
+LIST_TOTALS_TABLE = "list_totals"
+
+# 列表 -> 未筛选时的总数 SQL（与各路由的统计口径一致）
+LIST_TOTAL_SOURCES = {
+    "fields_catalog": "SELECT COUNT(*) FROM unique_regular_fields",
+    "metrics_catalog": """
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM calculated_fields cf GROUP BY TRIM(cf.name), cf.formula_hash
+        )
+    """,
+    "metrics": "SELECT COUNT(*) FROM calculated_fields",
+    "datasources": "SELECT COUNT(*) FROM datasources",
+    "tables": "SELECT COUNT(*) FROM tables",
+    "workbooks": "SELECT COUNT(*) FROM workbooks",
+    "views": "SELECT COUNT(*) FROM views",
+}
+
+# 缓存的筛选总数条目上限（每个进程）
+MAX_CACHED_COUNTS = 4096
+
+
+def refresh_list_totals(session) -> int:
+    """重新计算未筛选的列表总数（调用方负责提交），返回列表数"""
+    session.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {LIST_TOTALS_TABLE} (
+            list_name TEXT PRIMARY KEY,
+            total INTEGER NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    session.execute(text(f"DELETE FROM {LIST_TOTALS_TABLE}"))
+    refreshed = 0
+    for list_name, sql in LIST_TOTAL_SOURCES.items():
+        try:
+            total = session.execute(text(sql)).scalar() or 0
+        except Exception:  # 四表架构尚未生成
+            continue
+        session.execute(
+            text(f"INSERT INTO {LIST_TOTALS_TABLE} (list_name, total) VALUES (:name, :total)"),
+            {"name": list_name, "total": total},
+        )
+        refreshed += 1
+    print(f"  🔢 列表总数: {refreshed} 个列表")
+    return refreshed
+
+
+def precomputed_total(session, list_name: str) -> Optional[int]:
+    """同步时预计算的未筛选总数；尚未计算时返回 None"""
+    try:
+        row = session.execute(
+            text(f"SELECT total FROM {LIST_TOTALS_TABLE} WHERE list_name = :name"),
+            {"name": list_name},
+        ).first()
+    except Exception:
+        session.rollback()
+        return None
+    return row[0] if row else None
+
+
+class CountCache:
+    """进程内的筛选总数缓存（LRU）"""
+
+    def __init__(self, max_entries: int = MAX_CACHED_COUNTS):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[object, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def total(
+        self,
+        session,
+        site: str,
+        list_name: str,
+        filters: tuple,
+        version,
+        mode: str,
+        count: Callable[[], int],
+    ) -> Tuple[Optional[int], bool]:
+        """返回 (总数, 是否精确)；mode=none 时返回 (None, False)"""
+        if mode == "none":
+            return None, False
+        if not filters and list_name in LIST_TOTAL_SOURCES:
+            total = precomputed_total(session, list_name)
+            if total is not None:
+                return total, True
+
+        if version is None:  # 无法确定数据版本时不缓存
+            return count() or 0, True
+
+        key = (site, list_name, filters)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+        if cached is not None and (cached[0] == version or mode == "estimate"):
+            return cached[1], cached[0] == version
+
+        total = count() or 0
+        with self._lock:
+            self._entries[key] = (version, total)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return total, True
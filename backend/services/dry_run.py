@@ -0,0 +1,164 @@
+"""
+同步试运行 (Dry Run)
+在临时库中执行完整的拉取与转换流程，与线上库比对后输出按实体汇总的差异，不写入线上库
+
+- 临时库以线上库为种子（SQLite 在线备份 API），同步流程与正式同步完全一致
+- 差异比对复用变更日志的行级指纹快照 (ChangeJournal.snapshot / diff)
+- 线上库以只读方式打开；临时库及其报告目录在结束后删除
+"""
+
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import create_engine, text
+
+from backend.models import get_engine, get_session
+from backend.services.change_journal import TRACKED_ENTITIES, VOLATILE_COLUMNS, ChangeJournal
+from backend.services.shadow_db import ShadowDatabase
+
+
+# 每个实体每类变更保留的样例数
+DEFAULT_SAMPLE_SIZE = 5
+
+# 变更类型 -> 摘要中的键名
+_OP_LABELS = {"insert": "added", "delete": "removed", "update": "changed"}
+
+
+def _readonly_session(path: str):
+    """只读打开线上库；线上库尚不存在时以空的内存库代替（全部视为新增）"""
+    if os.path.exists(path):
+        engine = create_engine(f"sqlite:///file:{os.path.abspath(path)}?mode=ro&uri=true")
+    else:
+        engine = create_engine("sqlite://")
+    return engine, get_session(engine)
+
+
+def _fetch_row(session, table: str, entity_id: str):
+    row = session.execute(
+        text(f"SELECT * FROM {table} WHERE id = :id"), {"id": entity_id}
+    ).mappings().first()
+    return dict(row) if row else {}
+
+
+def diff_databases(live_session, candidate_session, sample_size: int = DEFAULT_SAMPLE_SIZE) -> Dict:
+    """比对两个库的跟踪实体，返回 {entity_type: {added, removed, changed, unchanged, samples}}"""
+    before = ChangeJournal(live_session).snapshot()
+    after = ChangeJournal(candidate_session).snapshot()
+
+    summary = {
+        entity_type: {
+            "added": 0,
+            "removed": 0,
+            "changed": 0,
+            "unchanged": 0,
+            "samples": {"added": [], "removed": [], "changed": []},
+        }
+        for entity_type in TRACKED_ENTITIES
+    }
+    for entity_type, entity_id, op in ChangeJournal.diff(before, after):
+        entry = summary[entity_type]
+        label = _OP_LABELS[op]
+        entry[label] += 1
+        if len(entry["samples"][label]) < sample_size:
+            entry["samples"][label].append(entity_id)
+    for entity_type, entry in summary.items():
+        entry["unchanged"] = len(after.get(entity_type, {})) - entry["added"] - entry["changed"]
+    del before, after
+
+    # 样例补充名称；变化的样例列出变化的列
+    for entity_type, entry in summary.items():
+        table = TRACKED_ENTITIES[entity_type]
+        skip = VOLATILE_COLUMNS.get(table, set()) | {"id"}
+        for label, ids in entry["samples"].items():
+            detailed = []
+            for entity_id in ids:
+                old = _fetch_row(live_session, table, entity_id) if label != "added" else {}
+                new = _fetch_row(candidate_session, table, entity_id) if label != "removed" else {}
+                item = {"id": entity_id, "name": (new or old).get("name")}
+                if label == "changed":
+                    item["columns"] = sorted(
+                        c for c in new.keys() & old.keys()
+                        if c not in skip and new[c] != old[c]
+                    )
+                detailed.append(item)
+            entry["samples"][label] = detailed
+    return summary
+
+
+def dry_run_sync(
+    client,
+    live_path: str,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    streaming_fields: bool = None,
+) -> Dict:
+    """在临时库中执行全量同步并与线上库比对，线上库不做任何写入
+
+    Returns:
+        {"livePath", "startedAt", "durationSeconds", "stageErrors", "entities": {...}}
+    """
+    from backend.services.sync_manager import MetadataSync
+
+    start_time = datetime.now()
+    work_dir = tempfile.mkdtemp(prefix="metadata-dryrun-")
+    candidate = ShadowDatabase(
+        live_path, seed=True, path=os.path.join(work_dir, os.path.basename(live_path))
+    )
+    try:
+        sync = MetadataSync(
+            client, db_path=candidate.prepare(), streaming_fields=streaming_fields
+        )
+        try:
+            sync.sync_all(run_type="dry_run")
+            stage_errors = dict(sync.stage_errors)
+        finally:
+            sync.close()
+            sync.engine.dispose()
+
+        print("\n🔍 比对试运行结果与线上库...")
+        live_engine, live_session = _readonly_session(live_path)
+        candidate_engine = get_engine(candidate.path)
+        candidate_session = get_session(candidate_engine)
+        try:
+            entities = diff_databases(live_session, candidate_session, sample_size)
+        finally:
+            live_session.close()
+            candidate_session.close()
+            live_engine.dispose()
+            candidate_engine.dispose()
+    finally:
+        candidate.discard()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "livePath": os.path.abspath(live_path),
+        "startedAt": start_time.isoformat(),
+        "durationSeconds": round((datetime.now() - start_time).total_seconds(), 2),
+        "stageErrors": stage_errors,
+        "entities": entities,
+    }
+
+
+def format_dry_run(result: Dict) -> str:
+    """试运行结果的文本摘要（命令行输出）"""
+    lines = [
+        "=" * 60,
+        "🧪 试运行差异（线上库未修改）",
+        "=" * 60,
+    ]
+    for entity_type, entry in result["entities"].items():
+        lines.append(
+            f"  {entity_type:<10} +{entry['added']} ~{entry['changed']} -{entry['removed']}"
+            f" (未变化 {entry['unchanged']})"
+        )
+        for label, mark in (("added", "+"), ("changed", "~"), ("removed", "-")):
+            for sample in entry["samples"][label]:
+                columns = f" [{', '.join(sample['columns'])}]" if sample.get("columns") else ""
+                lines.append(f"      {mark} {sample['id']} {sample['name'] or ''}{columns}")
+    if result["stageErrors"]:
+        lines.append(f"  ⚠️ 阶段错误: {result['stageErrors']}")
+    lines.append(f"  耗时: {result['durationSeconds']:.2f} 秒")
+    lines.append("=" * 60)
+    return "\n".join(lines)
@@ -0,0 +1,218 @@
+"""
+批量导出
+全量清单按 NDJSON / CSV 流式输出，内存占用与导出行数无关：
+
+- 每个实体一条原生 SQL（不构造 ORM 对象、不加载关联集合），数量取同步时预计算的 *_count 列或聚合子查询
+- 结果集以 yield_per 分批从游标读取（SQLite 游标逐行步进，本身即服务端游标），每批编码成一个输出块
+- 可选 gzip：同一个 zlib 压缩流逐块压缩，不缓存整份响应
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Iterator, List
+
+from sqlalchemy import text
+
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# 每批从游标读取的行数
+EXPORT_BATCH_SIZE = 1000
+
+# 实体 -> (SQL, 布尔列)：SQL 按主键排序，列名即导出字段名（snake_case，输出时转 camelCase）
+EXPORT_SOURCES = {
+    "databases": (
+        """
+        SELECT d.id, d.luid, d.name, d.connection_type, d.host_name, d.port, d.service,
+               d.platform, d.is_certified, d.description,
+               COALESCE(tc.table_count, 0) AS table_count,
+               d.created_at, d.updated_at
+        FROM databases d
+        LEFT JOIN (
+            SELECT database_id, COUNT(*) AS table_count FROM tables GROUP BY database_id
+        ) tc ON tc.database_id = d.id
+        ORDER BY d.id
+        """,
+        ("is_certified",),
+    ),
+    "tables": (
+        """
+        SELECT t.id, t.luid, t.name, t.full_name, t.schema,
+               t.database_id, d.name AS database_name,
+               t.connection_type, t.table_type, t.is_embedded, t.is_certified,
+               t.project_name, t.description,
+               (SELECT COUNT(*) FROM db_columns c WHERE c.table_id = t.id) AS column_count,
+               (SELECT COUNT(*) FROM table_to_datasource td
+                JOIN datasources ds ON ds.id = td.datasource_id
+                WHERE td.table_id = t.id AND ds.is_embedded = 0) AS datasource_count,
+               (SELECT COUNT(*) FROM table_to_datasource td
+                JOIN datasources ds ON ds.id = td.datasource_id
+                WHERE td.table_id = t.id AND ds.is_embedded = 1) AS embedded_datasource_count,
+               t.created_at, t.updated_at
+        FROM tables t
+        LEFT JOIN databases d ON d.id = t.database_id
+        ORDER BY t.id
+        """,
+        ("is_embedded", "is_certified"),
+    ),
+    "datasources": (
+        """
+        SELECT id, luid, name, project_name, owner, is_embedded, source_published_datasource_id,
+               has_extract, extract_last_refresh_time AS last_refresh,
+               is_certified, certifier_display_name, contains_unsupported_custom_sql,
+               has_active_warning, description,
+               COALESCE(table_count, 0) AS table_count,
+               COALESCE(workbook_count, 0) AS workbook_count,
+               COALESCE(field_count, 0) AS field_count,
+               COALESCE(metric_count, 0) AS metric_count,
+               created_at, updated_at
+        FROM datasources
+        ORDER BY id
+        """,
+        ("is_embedded", "has_extract", "is_certified", "contains_unsupported_custom_sql", "has_active_warning"),
+    ),
+    "workbooks": (
+        """
+        SELECT id, luid, name, project_name, owner, uri,
+               contains_unsupported_custom_sql, has_active_warning, description,
+               COALESCE(view_count, 0) AS view_count,
+               COALESCE(datasource_count, 0) AS datasource_count,
+               COALESCE(field_count, 0) AS field_count,
+               COALESCE(metric_count, 0) AS metric_count,
+               created_at, updated_at
+        FROM workbooks
+        ORDER BY id
+        """,
+        ("contains_unsupported_custom_sql", "has_active_warning"),
+    ),
+    "views": (
+        """
+        SELECT v.id, v.luid, v.name, v.view_type, v.path,
+               v.workbook_id, w.name AS workbook_name, w.project_name,
+               COALESCE(v.total_view_count, 0) AS total_view_count,
+               v.created_at, v.updated_at
+        FROM views v
+        LEFT JOIN workbooks w ON w.id = v.workbook_id
+        ORDER BY v.id
+        """,
+        (),
+    ),
+    "fields": (
+        """
+        SELECT rf.id, rf.unique_id, rf.name, rf.caption, rf.role, rf.data_type, rf.remote_type,
+               rf.aggregation, rf.is_hidden, rf.description,
+               rf.upstream_column_name, rf.table_id, t.name AS table_name,
+               rf.datasource_id, ds.name AS datasource_name,
+               rf.workbook_id, wb.name AS workbook_name,
+               COALESCE(rf.usage_count, 0) AS usage_count,
+               COALESCE(rf.metric_usage_count, 0) AS metric_usage_count
+        FROM regular_fields rf
+        LEFT JOIN tables t ON t.id = rf.table_id
+        LEFT JOIN datasources ds ON ds.id = rf.datasource_id
+        LEFT JOIN workbooks wb ON wb.id = rf.workbook_id
+        ORDER BY rf.id
+        """,
+        ("is_hidden",),
+    ),
+    "metrics": (
+        """
+        SELECT cf.id, cf.unique_id, cf.name, cf.caption, cf.role, cf.data_type, cf.formula,
+               cf.complexity_score, cf.is_hidden, cf.description,
+               cf.datasource_id, ds.name AS datasource_name,
+               cf.workbook_id, wb.name AS workbook_name,
+               COALESCE(cf.dependency_count, 0) AS dependency_count,
+               COALESCE(cf.usage_count, 0) AS usage_count,
+               COALESCE(cf.reference_count, 0) AS reference_count,
+               cf.has_duplicates, COALESCE(cf.duplicate_count, 0) AS duplicate_count
+        FROM calculated_fields cf
+        LEFT JOIN datasources ds ON ds.id = cf.datasource_id
+        LEFT JOIN workbooks wb ON wb.id = cf.workbook_id
+        ORDER BY cf.id
+        """,
+        ("is_hidden", "has_duplicates"),
+    ),
+}
+
+
+def _camel(name: str) -> str:
+    head, *rest = name.split("_")
+    return head + "".join(part.title() for part in rest)
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _encode_ndjson(columns: List[str], rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False, separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return _value(value)
+
+
+def _encode_csv(columns: List[str], rows) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerows([[_csv_value(v) for v in row] for row in rows])
+    return buf.getvalue()
+
+
+def export_rows(session, entity: str) -> Iterator[tuple]:
+    """按批读取实体行：首先产出列名（camelCase），随后逐批产出行列表"""
+    sql, bool_columns = EXPORT_SOURCES[entity]
+    result = session.execute(text(sql), execution_options={"yield_per": EXPORT_BATCH_SIZE})
+    keys = list(result.keys())
+    bool_positions = [i for i, key in enumerate(keys) if key in bool_columns]
+    yield [_camel(key) for key in keys]
+    for partition in result.partitions():
+        if bool_positions:
+            rows = []
+            for row in partition:
+                row = list(row)
+                for i in bool_positions:
+                    if row[i] is not None:
+                        row[i] = bool(row[i])
+                rows.append(row)
+        else:
+            rows = partition
+        yield rows
+
+
+def export_chunks(session, entity: str, fmt: str = "ndjson", compress: bool = False) -> Iterator[bytes]:
+    """导出响应体的字节块；CSV 首行为表头并带 BOM（Excel 按 UTF-8 打开中文）"""
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def emit(chunk: str) -> bytes:
+        data = chunk.encode("utf-8")
+        return gzip.compress(data) if gzip else data
+
+    batches = export_rows(session, entity)
+    columns = next(batches)
+    if fmt == "csv":
+        header = io.StringIO()
+        csv.writer(header).writerow(columns)
+        chunk = emit("\ufeff" + header.getvalue())
+        if chunk:
+            yield chunk
+    for rows in batches:
+        chunk = emit(encode(columns, rows))
+        if chunk:
+            yield chunk
+    if gzip:
+        yield gzip.flush()
@@ -0,0 +1,247 @@
+"""
+列表分面统计 (facets)
+分面计数不再在每次列表请求时对整表 GROUP BY：
+
+- 同步结束时把未筛选的分面直方图写入 facet_counts 表，无筛选的请求直接读取
+- 带筛选的请求由进程内位图计算：每个分面取值对应一个实体位图（Python int），
+  计数 = popcount(取值位图 & 筛选位图)，搜索词命中的位图按 LRU 缓存
+- 各分面按“除自身以外的筛选条件”计数（多选分面的常规口径），选中一个取值后同分面的其他取值仍可见
+- 位图索引按站点构建，数据版本（conditional.DataVersionTracker）变化后在后台重建，重建期间继续使用旧索引
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from backend.models import get_session
+
+
+FACET_COUNTS_TABLE = "facet_counts"
+
+# 列表 -> (SQL, 搜索列数, 分面名)：SQL 先返回搜索列（与路由的 LIKE 条件一致），再按顺序返回各分面取值
+FACET_SOURCES = {
+    "fields_catalog": (
+        """
+        SELECT urf.name, urf.description,
+               COALESCE(NULLIF(s.role, ''), 'group_set'), s.dedup_method
+        FROM unique_regular_field_stats s
+        JOIN unique_regular_fields urf ON urf.id = s.unique_id
+        """,
+        2,
+        ("role", "dedup_method"),
+    ),
+    "metrics_catalog": (
+        """
+        SELECT ucf.name, ucf.formula,
+               COALESCE(NULLIF(s.role, ''), 'unknown'), s.dedup_method,
+               CASE WHEN s.instance_count > 1 THEN 'true' ELSE 'false' END
+        FROM unique_calculated_field_stats s
+        JOIN unique_calculated_fields ucf ON ucf.id = s.unique_id
+        """,
+        2,
+        ("role", "dedup_method", "is_aggregated"),
+    ),
+    "tables": (
+        """
+        SELECT t.name, t.schema, d.name,
+               CASE WHEN t.is_embedded = 1 THEN 'true' ELSE 'false' END
+        FROM tables t
+        LEFT JOIN databases d ON t.database_id = d.id
+        """,
+        1,
+        ("schema", "database_name", "is_embedded"),
+    ),
+}
+
+# 每个索引缓存的搜索词位图数量
+MAX_CACHED_SEARCHES = 256
+
+
+def _bitmap(positions: Iterable[int], size: int) -> int:
+    buf = bytearray((size + 7) // 8)
+    for i in positions:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+class FacetIndex:
+    """单个列表的分面位图，构建后只读（搜索位图缓存除外）"""
+
+    def __init__(self, rows: List[tuple], search_columns: int, facets: tuple, version=None):
+        self.version = version
+        self.size = len(rows)
+        self.all = (1 << self.size) - 1
+        # 搜索文本：各搜索列小写后以不可见分隔符拼接，一次子串判断覆盖 "A LIKE x OR B LIKE x"
+        self._texts = [
+            "\x1f".join((value or "").lower() for value in row[:search_columns]) for row in rows
+        ]
+        self.bitmaps: Dict[str, Dict[str, int]] = {}
+        for offset, facet in enumerate(facets, start=search_columns):
+            positions: Dict[str, List[int]] = {}
+            for i, row in enumerate(rows):
+                if row[offset]:  # 空值不计入分面
+                    positions.setdefault(str(row[offset]), []).append(i)
+            self.bitmaps[facet] = {
+                value: _bitmap(ids, self.size) for value, ids in positions.items()
+            }
+        self._searches: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, session, list_name: str, version=None) -> "FacetIndex":
+        sql, search_columns, facets = FACET_SOURCES[list_name]
+        try:
+            rows = session.execute(text(sql)).fetchall()
+        except Exception:  # 表尚未创建（未同步过的库）
+            session.rollback()
+            rows = []
+        return cls(rows, search_columns, facets, version)
+
+    def _search_bitmap(self, search: str) -> int:
+        needle = search.lower()
+        with self._lock:
+            cached = self._searches.get(needle)
+            if cached is not None:
+                self._searches.move_to_end(needle)
+                return cached
+        bitmap = _bitmap((i for i, t in enumerate(self._texts) if needle in t), self.size)
+        with self._lock:
+            self._searches[needle] = bitmap
+            while len(self._searches) > MAX_CACHED_SEARCHES:
+                self._searches.popitem(last=False)
+        return bitmap
+
+    def counts(self, search: str = "", filters: Optional[Dict[str, Iterable[str]]] = None) -> Dict[str, Dict[str, int]]:
+        """各分面的取值计数；filters 为 {分面: 选中的取值}，计算某个分面时不应用它自己的筛选"""
+        base = self._search_bitmap(search) if search else self.all
+        selected = {}
+        for facet, values in (filters or {}).items():
+            if values and facet in self.bitmaps:
+                mask = 0
+                for value in values:
+                    mask |= self.bitmaps[facet].get(value, 0)
+                selected[facet] = mask
+
+        result = {}
+        for facet, bitmaps in self.bitmaps.items():
+            mask = base
+            for other, other_mask in selected.items():
+                if other != facet:
+                    mask &= other_mask
+            counts = {value: (bitmap & mask).bit_count() for value, bitmap in bitmaps.items()}
+            result[facet] = {value: n for value, n in counts.items() if n}
+        return result
+
+
+def refresh_facet_counts(session) -> int:
+    """重新计算未筛选的分面直方图（调用方负责提交），返回写入的行数"""
+    session.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {FACET_COUNTS_TABLE} (
+            list_name TEXT NOT NULL,
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (list_name, facet, value)
+        )
+    """))
+    session.execute(text(f"DELETE FROM {FACET_COUNTS_TABLE}"))
+    rows = [
+        {"list_name": list_name, "facet": facet, "value": value, "count": n}
+        for list_name in FACET_SOURCES
+        for facet, counts in FacetIndex.build(session, list_name).counts().items()
+        for value, n in counts.items()
+    ]
+    if rows:
+        session.execute(
+            text(f"""
+                INSERT INTO {FACET_COUNTS_TABLE} (list_name, facet, value, count)
+                VALUES (:list_name, :facet, :value, :count)
+            """),
+            rows,
+        )
+    print(f"  📊 分面直方图: {len(rows)} 个取值")
+    return len(rows)
+
+
+def precomputed_facets(session, list_name: str) -> Optional[Dict[str, Dict[str, int]]]:
+    """同步时预计算的未筛选分面；尚未计算时返回 None"""
+    try:
+        rows = session.execute(
+            text(f"SELECT facet, value, count FROM {FACET_COUNTS_TABLE} WHERE list_name = :name"),
+            {"name": list_name},
+        ).fetchall()
+    except Exception:
+        session.rollback()
+        return None
+    if not rows:
+        return None
+    result = {facet: {} for facet in FACET_SOURCES[list_name][2]}
+    for facet, value, n in rows:
+        result.setdefault(facet, {})[value] = n
+    return result
+
+
+class FacetRegistry:
+    """按 (站点, 列表) 缓存分面位图索引，数据版本变化后后台重建"""
+
+    def __init__(self, site_engines):
+        self.site_engines = site_engines
+        self._indexes: Dict[tuple, FacetIndex] = {}
+        self._rebuilding = set()
+        self._lock = threading.Lock()
+
+    def _build(self, site: str, list_name: str, version) -> Optional[FacetIndex]:
+        entry = self.site_engines.get(site)
+        if entry is None:
+            return None
+        session = get_session(entry[1])  # 只读引擎
+        try:
+            index = FacetIndex.build(session, list_name, version)
+        finally:
+            session.close()
+        if version is not None:
+            with self._lock:
+                self._indexes[(site, list_name)] = index
+        return index
+
+    def _rebuild_in_background(self, site: str, list_name: str, version):
+        key = (site, list_name)
+
+        def run():
+            try:
+                self._build(site, list_name, version)
+            except Exception as e:
+                print(f"⚠️ 分面索引重建失败: {e}")
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(key)
+
+        with self._lock:
+            if key in self._rebuilding:
+                return
+            self._rebuilding.add(key)
+        threading.Thread(target=run, name=f"facets-rebuild-{site or 'default'}-{list_name}", daemon=True).start()
+
+    def index_for(self, site: str, list_name: str, version) -> Optional[FacetIndex]:
+        """返回索引（首次访问时同步构建）；数据版本变化时触发后台重建，本次仍返回旧索引"""
+        index = self._indexes.get((site, list_name))
+        if index is None or version is None:
+            return self._build(site, list_name, version)
+        if index.version != version:
+            self._rebuild_in_background(site, list_name, version)
+        return index
+
+    def counts(self, session, site: str, list_name: str, version, search: str = "",
+               filters: Optional[Dict[str, Iterable[str]]] = None) -> Dict[str, Dict[str, int]]:
+        """无筛选时读取预计算直方图，否则由位图索引计算"""
+        filters = {facet: values for facet, values in (filters or {}).items() if values}
+        if not search and not filters:
+            base = precomputed_facets(session, list_name)
+            if base is not None:
+                return base
+        index = self.index_for(site, list_name, version)
+        if index is None:
+            return {facet: {} for facet in FACET_SOURCES[list_name][2]}
+        return index.counts(search, filters)
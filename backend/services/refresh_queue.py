@@ -0,0 +1,229 @@
+"""
+Webhook 定向刷新队列
+接收 Tableau Server Webhook 事件，按资产去重合并后落库 (sync_refresh_queue)，
+由同步执行进程限速登记为定向刷新任务
+
+- Web worker: parse_webhook_event() 解析事件，enqueue_refresh() 合并入队
+- 执行进程 (backend/sync_runner.py): dispatch_due_refresh() 在空闲时登记到期的刷新任务
+- 同一资产在静默期 (WEBHOOK_COALESCE_SECONDS) 内的重复事件只触发一次刷新
+- 两次刷新间隔不小于 WEBHOOK_REFRESH_INTERVAL_SECONDS；积压超过阈值时合并为一次增量同步
+- 登记的任务失败时对应请求标记为 failed，资产的下一次事件重新入队
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from backend.config import Config
+from backend.models import SyncJob, SyncRefreshRequest
+
+
+# Webhook 事件 -> 刷新的资产类型（删除事件同样走定向刷新，由刷新流程清理本地记录）
+WEBHOOK_EVENTS = {
+    "WorkbookCreated": "workbook",
+    "WorkbookUpdated": "workbook",
+    "WorkbookDeleted": "workbook",
+    "WorkbookRefreshSucceeded": "workbook",
+    "DatasourceCreated": "datasource",
+    "DatasourceUpdated": "datasource",
+    "DatasourceDeleted": "datasource",
+    "DatasourceRefreshSucceeded": "datasource",
+}
+
+
+# Tableau 资产 LUID / Metadata API ID 均为 UUID
+_ASSET_ID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+class WebhookPayloadError(ValueError):
+    """Webhook 请求体缺少必要字段"""
+
+
+def is_valid_asset_id(value) -> bool:
+    """是否为 UUID 格式的资产 LUID / ID（拼入 GraphQL 查询或作为任务参数前校验）"""
+    return isinstance(value, str) and _ASSET_ID_RE.match(value) is not None
+
+
+def parse_webhook_event(payload: Dict) -> Optional[Dict]:
+    """解析 Tableau Webhook 请求体
+
+    Returns:
+        {"asset_type", "asset_luid", "asset_name", "event_type"}；不关心的事件（如刷新开始/失败）返回 None
+    """
+    if not isinstance(payload, dict):
+        raise WebhookPayloadError("请求体必须为 JSON 对象")
+    event_type = payload.get("event_type")
+    if not event_type:
+        raise WebhookPayloadError("缺少 event_type")
+    # 兼容 Tableau 早期的事件名前缀（如 webhook-source-event-workbook-updated）
+    event_type = _normalize_event_type(event_type)
+    asset_type = WEBHOOK_EVENTS.get(event_type)
+    if asset_type is None:
+        return None
+    asset_luid = payload.get("resource_luid")
+    if not asset_luid:
+        raise WebhookPayloadError("缺少 resource_luid")
+    if not is_valid_asset_id(asset_luid):
+        raise WebhookPayloadError("resource_luid 格式无效")
+    return {
+        "asset_type": asset_type,
+        "asset_luid": asset_luid,
+        "asset_name": payload.get("resource_name"),
+        "event_type": event_type,
+    }
+
+
+def _normalize_event_type(event_type: str) -> str:
+    prefix = "webhook-source-event-"
+    if not event_type.startswith(prefix):
+        return event_type
+    return "".join(part.capitalize() for part in event_type[len(prefix):].split("-"))
+
+
+def enqueue_refresh(session, event: Dict, site: str = "") -> Tuple[SyncRefreshRequest, bool]:
+    """合并入队：同一资产已有待处理记录时只累加计数并刷新时间
+
+    Returns:
+        (队列记录, 是否与已有记录合并)
+    """
+    now = datetime.utcnow()
+    for _ in range(2):
+        request = _pending_request(session, event["asset_type"], event["asset_luid"], site)
+        if request is not None:
+            request.event_count = (request.event_count or 0) + 1
+            request.event_type = event["event_type"]
+            request.asset_name = event.get("asset_name") or request.asset_name
+            request.last_received_at = now
+            session.commit()
+            return request, True
+
+        request = SyncRefreshRequest(
+            asset_type=event["asset_type"],
+            asset_luid=event["asset_luid"],
+            asset_name=event.get("asset_name"),
+            site=site,
+            event_type=event["event_type"],
+            event_count=1,
+            status="pending",
+            first_received_at=now,
+            last_received_at=now,
+        )
+        session.add(request)
+        try:
+            session.commit()
+            return request, False
+        except IntegrityError:
+            # 其他 worker 同时登记了同一资产，改为合并到对方的记录
+            session.rollback()
+    raise RuntimeError(f"刷新请求入队失败: {event['asset_type']} {event['asset_luid']}")
+
+
+def _pending_request(session, asset_type: str, asset_luid: str, site: str):
+    return (
+        session.query(SyncRefreshRequest)
+        .filter(
+            SyncRefreshRequest.asset_type == asset_type,
+            SyncRefreshRequest.asset_luid == asset_luid,
+            SyncRefreshRequest.site == site,
+            SyncRefreshRequest.status == "pending",
+        )
+        .first()
+    )
+
+
+def has_pending_refresh(session) -> bool:
+    return (
+        session.query(SyncRefreshRequest.id)
+        .filter(SyncRefreshRequest.status == "pending")
+        .first()
+        is not None
+    )
+
+
+def next_refresh_delay(session, now: datetime = None) -> Optional[float]:
+    """距离下一次可登记刷新的秒数；队列为空时返回 None"""
+    now = now or datetime.utcnow()
+    oldest_quiet = (
+        session.query(func.min(SyncRefreshRequest.last_received_at))
+        .filter(SyncRefreshRequest.status == "pending")
+        .scalar()
+    )
+    if oldest_quiet is None:
+        return None
+    ready_at = oldest_quiet + timedelta(seconds=Config.WEBHOOK_COALESCE_SECONDS)
+    last_dispatch = session.query(func.max(SyncRefreshRequest.dispatched_at)).scalar()
+    if last_dispatch is not None:
+        ready_at = max(
+            ready_at,
+            last_dispatch + timedelta(seconds=Config.WEBHOOK_REFRESH_INTERVAL_SECONDS),
+        )
+    return max(0.0, (ready_at - now).total_seconds())
+
+
+def mark_failed_refresh(session) -> int:
+    """已登记任务执行失败的请求从 dispatched 改为 failed，返回标记的条数"""
+    failed_jobs = session.query(SyncJob.id).filter(SyncJob.status == "failed")
+    count = (
+        session.query(SyncRefreshRequest)
+        .filter(
+            SyncRefreshRequest.status == "dispatched",
+            SyncRefreshRequest.job_id.in_(failed_jobs),
+        )
+        .update({"status": "failed"}, synchronize_session=False)
+    )
+    if count:
+        session.commit()
+        print(f"⚠️ Webhook 刷新任务失败: {count} 个请求标记为 failed")
+    return count
+
+
+def dispatch_due_refresh(session, now: datetime = None) -> Optional[SyncJob]:
+    """登记一个到期的刷新任务（静默期已过且满足最小间隔），返回登记的任务
+
+    积压超过 WEBHOOK_INCREMENTAL_THRESHOLD 个资产时，改为登记一次增量同步并清空队列。
+    已有同步任务排队或运行中时不登记，待下次检查。
+    登记前先把任务已失败的请求标记为 failed（见 mark_failed_refresh）。
+    """
+    from backend.services.sync_jobs import JobConflictError, enqueue_job
+
+    mark_failed_refresh(session)
+    now = now or datetime.utcnow()
+    delay = next_refresh_delay(session, now)
+    if delay is None or delay > 0:
+        return None
+
+    pending = (
+        session.query(SyncRefreshRequest)
+        .filter(SyncRefreshRequest.status == "pending")
+        .order_by(SyncRefreshRequest.first_received_at.asc(), SyncRefreshRequest.id.asc())
+        .all()
+    )
+    quiet_before = now - timedelta(seconds=Config.WEBHOOK_COALESCE_SECONDS)
+    if len(pending) > Config.WEBHOOK_INCREMENTAL_THRESHOLD:
+        batch: List[SyncRefreshRequest] = pending
+        job_type = "incremental"
+        params = {"sites": sorted({r.site for r in pending})}
+    else:
+        due = next((r for r in pending if r.last_received_at <= quiet_before), None)
+        if due is None:
+            return None
+        batch = [due]
+        job_type = due.asset_type
+        params = {"asset_luid": due.asset_luid, "sites": [due.site]}
+
+    try:
+        job = enqueue_job(session, job_type=job_type, params=params, requested_by="webhook")
+    except JobConflictError:
+        return None
+
+    for request in batch:
+        request.status = "dispatched"
+        request.dispatched_at = now
+        request.job_id = job.id
+    session.commit()
+    target = params.get("asset_luid") or f"{len(batch)} 个资产"
+    print(f"🪝 Webhook 刷新: {job_type} {target} (任务 #{job.id})")
+    return job
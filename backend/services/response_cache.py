@@ -0,0 +1,214 @@
+"""
+API 响应缓存
+元数据只在同步完成后变化，重查询接口的 JSON 响应按 (站点, 路由, 规范化参数, 同步代数) 缓存，
+存放在独立的 SQLite 文件中，所有 gunicorn worker 共享
+
+- 同步代数 (shadow_db.sync_generation) 作为键的一部分：新一代数据发布后旧条目不再命中，并在写入新条目时清理
+- 同一站点的写请求 (POST/PUT/PATCH/DELETE) 成功后清空该站点的缓存（字段/指标编辑、术语表等）
+- 按总大小限制做近似 LRU 淘汰（命中时最多每分钟刷新一次访问时间，避免每次命中都写库）
+- 命中/未命中计数先在进程内累积，定期合并到缓存库，供 GET /api/cache/stats 汇总
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# 缓存的接口（Flask endpoint）：仪表盘、目录、桑基图与详情页等重查询
+CACHED_ENDPOINTS = {
+    "api.get_stats",
+    "api.get_dashboard_analysis",
+    "api.get_quality_overview",
+    "api.get_fields_catalog",
+    "api.get_fields_catalog_hot",
+    "api.get_fields_catalog_no_description",
+    "api.get_fields_catalog_orphan",
+    "api.get_metrics_catalog",
+    "api.get_metrics_catalog_complex",
+    "api.get_metrics_catalog_duplicate",
+    "api.get_metrics_catalog_duplicate_formula",
+    "api.get_metrics_catalog_unused",
+    "api.get_lineage_sankey",
+    "api.get_lineage",
+    "api.get_lineage_graph",
+    "api.get_column_detail",
+    "api.get_database_detail",
+    "api.get_datasource_detail",
+    "api.get_field_detail",
+    "api.get_metric_detail",
+    "api.get_project_detail",
+    "api.get_table_detail",
+    "api.get_user_detail",
+    "api.get_view_detail",
+    "api.get_workbook_detail",
+}
+
+# 命中时刷新访问时间的最小间隔（秒）
+_TOUCH_INTERVAL = 60
+# 进程内计数合并到缓存库的间隔（秒）
+_STATS_FLUSH_INTERVAL = 10
+# 超出容量时淘汰到容量的该比例以下
+_EVICT_TARGET = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response_cache (
+    cache_key TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    mimetype TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_response_cache_accessed ON response_cache (accessed_at);
+CREATE INDEX IF NOT EXISTS ix_response_cache_site ON response_cache (site, generation);
+CREATE TABLE IF NOT EXISTS response_cache_stats (
+    endpoint TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def cache_key(site: str, endpoint: str, path: str, args) -> str:
+    """规范化请求：参数按名称、取值排序（忽略 site，站点已单独计入）"""
+    items = sorted((k, v) for k, values in args.lists() if k != "site" for v in values)
+    raw = "\x1f".join([site, endpoint, path] + [f"{k}={v}" for k, v in items])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """跨 worker 共享的响应缓存（每个线程一个 SQLite 连接，fork 后重新连接）"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats: Dict[str, list] = {}
+        self._stats_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # 缓存可随时丢弃
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str, generation: int) -> Optional[Tuple[bytes, str]]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT body, mimetype, accessed_at FROM response_cache WHERE cache_key = ? AND generation = ?",
+            (key, generation),
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[2] > _TOUCH_INTERVAL:
+            conn.execute("UPDATE response_cache SET accessed_at = ? WHERE cache_key = ?", (now, key))
+        return row[0], row[1]
+
+    def put(self, key: str, site: str, endpoint: str, generation: int, body: bytes, mimetype: str):
+        if len(body) > self.max_bytes * (1 - _EVICT_TARGET):
+            return  # 单条过大，不缓存
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 旧一代数据的条目不会再命中
+            conn.execute(
+                "DELETE FROM response_cache WHERE site = ? AND generation <> ?", (site, generation)
+            )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO response_cache
+                    (cache_key, site, endpoint, generation, body, mimetype, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, site, endpoint, generation, body, mimetype, len(body), now, now),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total - int(self.max_bytes * _EVICT_TARGET))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, excess: int):
+        """按访问时间从旧到新淘汰，直到释放 excess 字节"""
+        keys, freed = [], 0
+        for key, size in conn.execute("SELECT cache_key, size FROM response_cache ORDER BY accessed_at"):
+            keys.append(key)
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM response_cache WHERE cache_key = ?", [(k,) for k in keys])
+
+    def invalidate(self, site: str = None):
+        """清空某个站点（或全部）的缓存"""
+        conn = self._conn()
+        if site is None:
+            conn.execute("DELETE FROM response_cache")
+        else:
+            conn.execute("DELETE FROM response_cache WHERE site = ?", (site,))
+
+    def record(self, endpoint: str, hit: bool):
+        with self._stats_lock:
+            counts = self._stats.setdefault(endpoint, [0, 0])
+            counts[0 if hit else 1] += 1
+            due = time.monotonic() - self._flushed_at >= _STATS_FLUSH_INTERVAL
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self._stats_lock:
+            pending, self._stats = self._stats, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        self._conn().executemany(
+            """
+            INSERT INTO response_cache_stats (endpoint, hits, misses) VALUES (?, ?, ?)
+            ON CONFLICT(endpoint) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses
+            """,
+            [(endpoint, hits, misses) for endpoint, (hits, misses) in pending.items()],
+        )
+
+    def stats(self) -> Dict:
+        """各接口命中/未命中次数（所有 worker 合计）与当前缓存占用"""
+        self.flush_stats()
+        conn = self._conn()
+        endpoints = []
+        total_hits = total_misses = 0
+        for endpoint, hits, misses in conn.execute(
+            "SELECT endpoint, hits, misses FROM response_cache_stats ORDER BY hits + misses DESC"
+        ):
+            total_hits += hits
+            total_misses += misses
+            endpoints.append({
+                "endpoint": endpoint,
+                "hits": hits,
+                "misses": misses,
+                "hitRatio": round(hits / (hits + misses), 4) if hits + misses else 0,
+            })
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache"
+        ).fetchone()
+        return {
+            "entries": entries,
+            "sizeBytes": size,
+            "maxBytes": self.max_bytes,
+            "hits": total_hits,
+            "misses": total_misses,
+            "hitRatio": round(total_hits / (total_hits + total_misses), 4) if total_hits + total_misses else 0,
+            "endpoints": endpoints,
+        }
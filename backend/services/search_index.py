@@ -0,0 +1,222 @@
+"""
+全文搜索索引 (SQLite FTS5)
+所有可搜索实体写入同一张 FTS5 虚拟表，/api/search 一次查询返回按 BM25 排序、按使用量加权的结果
+
+- 分词器使用 trigram：中文按三字切分，英文大小写不敏感且支持子串匹配；
+  另存一列拆分后的标识符（OrderAmount / order_amount -> order amount），使多词查询能命中标识符
+- 名称与查询完全相同的排最前，其次是名称以查询开头的，同一档内再按 BM25 × 使用量加权排序
+- 少于 3 个字符的查询无法使用 trigram，退化为对索引表的 LIKE 匹配（同样分档，档内按使用量排序）
+- 索引在同步结束（及定向刷新后）整体重建；SQLite 未编译 FTS5/trigram 时调用方回退到逐表 LIKE 查询
+"""
+
+import json
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+
+SEARCH_TABLE = "search_index"
+
+# 实体类型 -> (结果分组键, 数据来源 SQL)
+# 每条 SQL 返回 entity_id, name, body(描述/公式等次要文本), usage(加权用使用量), extra(JSON 展示属性)
+ENTITY_SOURCES = {
+    "field": ("fields", """
+        SELECT u.id, u.name, u.description,
+               COALESCE((SELECT SUM(rf.usage_count) FROM regular_fields rf WHERE rf.unique_id = u.id), 0),
+               json_object('description', COALESCE(u.description, ''), 'source', COALESCE(t.name, '-'))
+        FROM unique_regular_fields u
+        LEFT JOIN tables t ON t.id = u.table_id
+    """),
+    "table": ("tables", """
+        SELECT t.id, t.name, COALESCE(t.schema, '') || ' ' || COALESCE(t.description, ''),
+               (SELECT COUNT(*) FROM table_to_datasource td WHERE td.table_id = t.id),
+               json_object('schema', COALESCE(t.schema, ''), 'database', COALESCE(d.name, '-'))
+        FROM tables t
+        LEFT JOIN databases d ON d.id = t.database_id
+    """),
+    "datasource": ("datasources", """
+        SELECT id, name, description, COALESCE(workbook_count, 0),
+               json_object('project', COALESCE(project_name, ''), 'owner', COALESCE(owner, ''))
+        FROM datasources
+    """),
+    "workbook": ("workbooks", """
+        SELECT w.id, w.name, w.description,
+               COALESCE((SELECT SUM(v.total_view_count) FROM views v WHERE v.workbook_id = w.id), 0),
+               json_object('project', COALESCE(w.project_name, ''), 'owner', COALESCE(w.owner, ''))
+        FROM workbooks w
+    """),
+    "metric": ("metrics", """
+        SELECT u.id, u.name, COALESCE(u.formula, '') || ' ' || COALESCE(u.description, ''),
+               COALESCE((SELECT SUM(COALESCE(cf.usage_count, 0) + COALESCE(cf.reference_count, 0))
+                         FROM calculated_fields cf WHERE cf.unique_id = u.id), 0),
+               json_object(
+                   'formula', CASE WHEN length(u.formula) > 50
+                                   THEN substr(u.formula, 1, 50) || '...'
+                                   ELSE COALESCE(u.formula, '') END,
+                   'datasource', '-')
+        FROM unique_calculated_fields u
+    """),
+    "database": ("databases", """
+        SELECT d.id, d.name, d.description,
+               (SELECT COUNT(*) FROM tables t WHERE t.database_id = d.id),
+               json_object('connectionType', COALESCE(d.connection_type, ''))
+        FROM databases d
+    """),
+    "project": ("projects", """
+        SELECT id, name, description, 0,
+               json_object('description', COALESCE(description, ''))
+        FROM projects
+    """),
+}
+
+RESULT_KEYS = {entity_type: key for entity_type, (key, _) in ENTITY_SOURCES.items()}
+
+# bm25 列权重（按建表列顺序）：名称 > 拆分标识符 > 次要文本，UNINDEXED 列为 0
+_BM25_WEIGHTS = "0, 0, 10.0, 8.0, 2.0, 0, 0"
+# 使用量加权：rank * (1 + usage / (usage + 10))，使用量越高排名越靠前（bm25 越小越相关）
+_USAGE_BOOST = "(1.0 + usage / (usage + 10.0))"
+# 匹配档位：0 名称（或拆分后的标识符）与查询完全相同，1 名称以查询开头，2 其他命中
+_MATCH_TIER = """CASE
+    WHEN name = :exact COLLATE NOCASE OR name_tokens = :exact_tokens THEN 0
+    WHEN name LIKE :prefix ESCAPE '\\' THEN 1
+    ELSE 2 END"""
+
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_SEPARATOR_RE = re.compile(r"[\s_\-\.\[\]\(\)/]+")
+
+
+def split_identifier(value: str) -> str:
+    """拆分英文标识符：OrderAmount、order_amount、[Order Amount] -> order amount"""
+    if not value:
+        return ""
+    return " ".join(w for w in _SEPARATOR_RE.split(_CAMEL_RE.sub(" ", value)) if w).lower()
+
+
+def fts5_available(session) -> bool:
+    """当前 SQLite 是否支持 FTS5 trigram 分词器"""
+    try:
+        session.execute(text(
+            "CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x, tokenize='trigram')"
+        ))
+        session.execute(text("DROP TABLE temp._fts5_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def index_ready(session) -> bool:
+    """索引表存在（已构建过）"""
+    return session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": SEARCH_TABLE},
+    ).first() is not None
+
+
+def rebuild_search_index(session) -> int:
+    """整体重建搜索索引（调用方负责提交），返回索引条目数；不支持 FTS5 时返回 0"""
+    if not fts5_available(session):
+        print("⚠️ SQLite 不支持 FTS5 trigram，跳过搜索索引")
+        return 0
+
+    session.execute(text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+    session.execute(text(f"""
+        CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+            entity_type UNINDEXED, entity_id UNINDEXED, name, name_tokens, body,
+            usage UNINDEXED, extra UNINDEXED,
+            tokenize = 'trigram'
+        )
+    """))
+
+    total = 0
+    for entity_type, (_, sql) in ENTITY_SOURCES.items():
+        rows = session.execute(text(sql)).fetchall()
+        if not rows:
+            continue
+        session.execute(
+            text(f"""
+                INSERT INTO {SEARCH_TABLE} (entity_type, entity_id, name, name_tokens, body, usage, extra)
+                VALUES (:entity_type, :entity_id, :name, :name_tokens, :body, :usage, :extra)
+            """),
+            [
+                {
+                    "entity_type": entity_type,
+                    "entity_id": entity_id,
+                    "name": name or "",
+                    "name_tokens": split_identifier(name),
+                    "body": (body or "").strip(),
+                    "usage": usage or 0,
+                    "extra": extra,
+                }
+                for entity_id, name, body, usage, extra in rows
+            ],
+        )
+        total += len(rows)
+    session.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+    print(f"  🔎 搜索索引: {total} 条")
+    return total
+
+
+def build_match_query(q: str) -> str:
+    """用户输入 -> FTS5 查询：原文与拆分后的标识符各作为一个短语，任一命中即可"""
+    phrases = []
+    for candidate in (q.strip(), split_identifier(q)):
+        if len(candidate) >= 3 and candidate not in phrases:
+            phrases.append(candidate)
+    return " OR ".join('"' + p.replace('"', '""') + '"' for p in phrases)
+
+
+def search(session, q: str, limit: int = 20, types: List[str] = None) -> Optional[Dict[str, List[Dict]]]:
+    """按类型分组返回排序后的结果 {结果分组键: [...]}；索引不可用时返回 None"""
+    if not index_ready(session):
+        return None
+
+    types = [t for t in (types or ENTITY_SOURCES) if t in ENTITY_SOURCES]
+    type_filter = ", ".join(f"'{t}'" for t in types)
+    match = build_match_query(q)
+    term = q.strip()
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    params = {
+        "limit": limit,
+        "exact": term,
+        "exact_tokens": split_identifier(term) or term,
+        "prefix": escaped + "%",
+    }
+    if match:
+        candidates = f"""
+            SELECT entity_type, entity_id, name, extra, {_MATCH_TIER} AS tier,
+                   bm25({SEARCH_TABLE}, {_BM25_WEIGHTS}) * {_USAGE_BOOST} AS rank
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH :match AND entity_type IN ({type_filter})
+        """
+        params["match"] = match
+    else:
+        # 少于 3 个字符：trigram 无法匹配，扫描索引表
+        candidates = f"""
+            SELECT entity_type, entity_id, name, extra, {_MATCH_TIER} AS tier, -usage AS rank
+            FROM {SEARCH_TABLE}
+            WHERE (name LIKE :pattern ESCAPE '\\' OR name_tokens LIKE :pattern ESCAPE '\\'
+                   OR body LIKE :pattern ESCAPE '\\')
+              AND entity_type IN ({type_filter})
+        """
+        params["pattern"] = f"%{escaped}%"
+
+    rows = session.execute(text(f"""
+        SELECT entity_type, entity_id, name, extra FROM (
+            SELECT entity_type, entity_id, name, extra,
+                   ROW_NUMBER() OVER (PARTITION BY entity_type ORDER BY tier, rank, name) AS rn
+            FROM ({candidates})
+        )
+        WHERE rn <= :limit
+        ORDER BY entity_type, rn
+    """), params).fetchall()
+
+    results = {RESULT_KEYS[t]: [] for t in ENTITY_SOURCES}
+    for entity_type, entity_id, name, extra in rows:
+        results[RESULT_KEYS[entity_type]].append({
+            "id": entity_id,
+            "name": name,
+            "type": entity_type,
+            **json.loads(extra or "{}"),
+        })
+    return results
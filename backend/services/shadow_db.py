@@ -0,0 +1,284 @@
+"""
+影子库构建与原子切换
+同步写入独立的 SQLite 文件，完成后用 SQLite 在线备份 API 整库写回线上库，API 始终读取完整的一代数据
+
+- prepare(): 在线上库同目录创建影子库（默认用 SQLite 在线备份 API 复制线上库作为种子）
+- swap(): 校验影子库，在备份持有线上库写锁期间合并同步期间线上库产生的运行状态（任务表、调度日志、术语表），
+  再把影子库整库复制进线上库。复制是线上库上的一次普通写事务：不重命名正在使用的文件，
+  其他进程持有的 WAL 连接保持有效，读请求在提交前看到旧一代、提交后看到新一代
+- DatabaseGenerationWatcher: Web 端每次请求前检查库文件是否被整体替换（如手工恢复备份），是则释放连接池，
+  下一次请求自动连接到新文件（已在处理中的请求继续读取旧文件，不受影响）
+- sync_generation(): 数据代数（最近一次结束的同步运行 ID），原地同步与影子库切换都会使其递增
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+
+from backend.models import get_engine, init_db
+
+
+# 同步期间仍可能由 API / 执行进程写入线上库的表
+# replace: 切换前整表以线上库为准；append: 追加影子库种子之后新增的行
+LIVE_STATE_TABLES = {
+    "sync_jobs": "replace",
+    "glossary": "replace",
+    "term_enums": "replace",
+    "sync_logs": "append",
+}
+
+# 不使用种子时，需要从线上库保留的非同步数据（同步流程不会重建这些表）
+PRESERVED_TABLES = (
+    "glossary",
+    "term_enums",
+    "view_usage_history",
+    "sync_logs",
+    "sync_changes",
+    "sync_jobs",
+)
+
+
+def _sidecar_files(path: str):
+    return [path + suffix for suffix in ("-journal", "-wal", "-shm")]
+
+
+def _remove_db_file(path: str):
+    for candidate in [path] + _sidecar_files(path):
+        if os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def _table_exists(conn: sqlite3.Connection, table: str, schema: str = "main") -> bool:
+    row = conn.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+        (table,),
+    ).fetchone()
+    return row is not None
+
+
+def _common_columns(conn: sqlite3.Connection, table: str):
+    main_cols = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+    live_cols = {row[1] for row in conn.execute(f"PRAGMA live.table_info({table})")}
+    return [c for c in main_cols if c in live_cols]
+
+
+def file_identity(path: str) -> Optional[Tuple[int, int]]:
+    """库文件身份 (st_dev, st_ino)：os.replace 切换后必然变化，普通写入不变"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+class ShadowDatabase:
+    """影子库构建器
+
+    用法:
+        shadow = ShadowDatabase(live_path)
+        shadow.prepare()
+        MetadataSync(client, db_path=shadow.path).sync_all()
+        shadow.swap()      # 失败时调用 shadow.discard()
+    """
+
+    def __init__(self, live_path: str, seed: bool = True, path: str = None):
+        self.live_path = os.path.abspath(live_path)
+        self.path = os.path.abspath(path) if path else self.live_path + ".shadow"
+        self.seed = seed
+        self._seed_log_id = 0  # 种子中 sync_logs 的最大 ID，其后的线上记录需要合并
+
+    def prepare(self) -> str:
+        """创建影子库，返回其路径"""
+        _remove_db_file(self.path)
+        live_exists = os.path.exists(self.live_path)
+
+        if self.seed and live_exists:
+            print(f"🗂 复制线上库作为影子库种子: {self.path}")
+            source = sqlite3.connect(self.live_path)
+            target = sqlite3.connect(self.path)
+            try:
+                # 在线备份 API：复制过程中线上库仍可读写，得到一致的快照
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+        else:
+            print(f"🗂 创建空影子库: {self.path}")
+            if live_exists:
+                # 备份 API 写入 WAL 模式的线上库要求两边页大小一致
+                source = sqlite3.connect(self.live_path)
+                target = sqlite3.connect(self.path)
+                try:
+                    page_size = source.execute("PRAGMA page_size").fetchone()[0]
+                    target.execute(f"PRAGMA page_size = {int(page_size)}")
+                    target.execute("VACUUM")
+                finally:
+                    target.close()
+                    source.close()
+
+        engine = get_engine(self.path)
+        init_db(engine)
+        engine.dispose()
+
+        conn = sqlite3.connect(self.path)
+        try:
+            if live_exists and not self.seed:
+                self._copy_preserved_tables(conn)
+            if _table_exists(conn, "sync_logs"):
+                self._seed_log_id = conn.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM sync_logs"
+                ).fetchone()[0]
+            # 影子库统一使用回滚日志模式，切换时不留下 -wal 文件
+            conn.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            conn.close()
+        return self.path
+
+    def _copy_preserved_tables(self, conn: sqlite3.Connection):
+        conn.execute("ATTACH DATABASE ? AS live", (self.live_path,))
+        try:
+            for table in PRESERVED_TABLES:
+                if not _table_exists(conn, table, "live"):
+                    continue
+                columns = ", ".join(f'"{c}"' for c in _common_columns(conn, table))
+                conn.execute(
+                    f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM live.{table}"
+                )
+            conn.commit()
+        finally:
+            conn.execute("DETACH DATABASE live")
+
+    def _merge_live_state(self, conn: sqlite3.Connection):
+        """合并同步期间线上库的运行状态写入（需在持有线上库写锁时调用）"""
+        for table, mode in LIVE_STATE_TABLES.items():
+            if not (_table_exists(conn, table) and _table_exists(conn, table, "live")):
+                continue
+            columns = _common_columns(conn, table)
+            if mode == "replace":
+                column_list = ", ".join(f'"{c}"' for c in columns)
+                conn.execute(f"DELETE FROM main.{table}")
+                conn.execute(
+                    f"INSERT INTO main.{table} ({column_list}) "
+                    f"SELECT {column_list} FROM live.{table}"
+                )
+            else:
+                # 追加模式不复制 ID，避免与影子库中同步写入的记录冲突
+                column_list = ", ".join(f'"{c}"' for c in columns if c != "id")
+                conn.execute(
+                    f"INSERT INTO main.{table} ({column_list}) "
+                    f"SELECT {column_list} FROM live.{table} WHERE id > ? ORDER BY id",
+                    (self._seed_log_id,),
+                )
+        conn.commit()
+
+    def swap(self):
+        """校验影子库并整库写回线上库
+
+        不能用 os.replace 替换线上库：其他进程（Web worker 连接池、任务心跳）仍按文件名使用
+        线上库的 -wal / -shm，重命名后旧日志帧可能被回放进新库导致损坏。这里改用备份 API：
+        第一步复制时备份已持有线上库写锁，此时合并运行状态到影子库（源库被修改，备份自动从头重来），
+        之后直到复制完成都没有其他写入能插入，合并的状态不会丢失
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+            if result != "ok":
+                raise RuntimeError(f"影子库校验失败: {result}")
+        finally:
+            conn.close()
+
+        if not os.path.exists(self.live_path):
+            # 线上库尚不存在，没有任何连接在使用，直接移动
+            os.replace(self.path, self.live_path)
+            print(f"🔁 影子库已切换为线上库: {self.live_path}")
+            return
+
+        merged = []
+
+        def merge_under_lock(status, remaining, total):
+            if merged or remaining == 0:  # remaining 为 0 时复制已提交，交给下面的兜底
+                return
+            conn = sqlite3.connect(self.path)
+            try:
+                conn.execute("ATTACH DATABASE ? AS live", (self.live_path,))
+                self._merge_live_state(conn)
+                conn.execute("DETACH DATABASE live")
+            finally:
+                conn.close()
+            merged.append(True)
+
+        source = sqlite3.connect(self.path)
+        target = sqlite3.connect(self.live_path, timeout=30)
+        try:
+            if target.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                # 分步复制：首步之后才触发回调，回调时备份已持有线上库写锁，其他写入者都在等待；
+                # WAL 模式下读者不受写锁影响，合并仍可读取线上库（读到的是备份开始前的最新状态）
+                page_count = source.execute("PRAGMA page_count").fetchone()[0]
+                source.backup(target, pages=max(1, min(256, page_count // 64)), progress=merge_under_lock)
+                if not merged:  # 只有一页的影子库一步即复制完成：合并后再复制一次
+                    merge_under_lock(0, 1, 1)
+                    source.backup(target)
+            else:
+                # 回滚日志模式（SQLITE_TUNING=false）：备份持有排他锁期间无法读取线上库，
+                # 只能先合并再一步复制；两者之间提交的运行时状态写入会丢失，默认的 WAL 模式无此窗口
+                merge_under_lock(0, 1, 1)
+                source.backup(target)
+            try:
+                target.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error:
+                pass  # 仍有读者时下次自动检查点再回收 WAL
+        finally:
+            target.close()
+            source.close()
+        _remove_db_file(self.path)
+        print(f"🔁 影子库已写回线上库: {self.live_path}")
+
+    def discard(self):
+        """丢弃影子库（同步失败时调用，线上库保持不变）"""
+        _remove_db_file(self.path)
+
+
+class DatabaseGenerationWatcher:
+    """检测库文件是否被影子库替换，替换后释放引擎连接池，使新请求连接到新一代库"""
+
+    def __init__(self, engine, database_path: str, read_engine=None):
+        self.engine = engine
+        self.read_engine = read_engine  # 只读查询引擎（api 档位），随主引擎一起释放
+        self.database_path = database_path
+        self.identity = file_identity(database_path)
+        self._lock = threading.Lock()
+
+    def check(self) -> bool:
+        """库文件已被替换时返回 True（连接池已释放）"""
+        identity = file_identity(self.database_path)
+        if identity is None or identity == self.identity:
+            return False
+        with self._lock:
+            if identity == self.identity:
+                return False
+            # 已借出的连接继续使用旧文件直至归还；池中空闲连接立即关闭
+            self.engine.dispose()
+            if self.read_engine is not None:
+                self.read_engine.dispose()
+            self.identity = identity
+        return True
+
+
+def sync_generation(session) -> int:
+    """当前数据代数：最近一次结束（成功或失败）的同步运行 ID，尚无同步时为 0
+
+    各 worker 读取同一库文件，据此判断派生的进程内数据（索引、缓存）是否过期；
+    调度跳过的记录（status='skipped'）未改动数据，不计入
+    """
+    try:
+        row = session.execute(text(
+            "SELECT id FROM sync_logs WHERE completed_at IS NOT NULL AND status != 'skipped' "
+            "ORDER BY id DESC LIMIT 1"
+        )).first()
+    except Exception:
+        session.rollback()
+        return 0
+    return row[0] if row else 0
@@ -0,0 +1,137 @@
+"""
+多站点支持
+每个 Tableau 站点同步到独立的 SQLite 分区文件，各站点由独立的客户端并发同步
+
+- 默认站点（contentUrl 为空）沿用 Config.DATABASE_PATH，单站点部署行为不变
+- 其他站点写入 data/sites/<contentUrl>.db
+- Web 端通过 ?site=<contentUrl> 或 X-Tableau-Site 请求头选择分区，跨站点查询见 routes/sites.py
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from backend.config import Config
+from backend.models import get_engine, get_session
+
+
+DEFAULT_SITE_KEY = "default"
+
+_SITE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def configured_sites() -> List[str]:
+    """配置的站点 contentUrl 列表（"" 表示默认站点）
+
+    TABLEAU_SITES 为逗号分隔的 contentUrl，default 或留空项表示默认站点；未配置时仅同步默认站点。
+    """
+    raw = Config.TABLEAU_SITES
+    if not raw or not raw.strip():
+        return [""]
+    sites = []
+    for item in raw.split(","):
+        item = item.strip()
+        content_url = "" if item.lower() == DEFAULT_SITE_KEY else item
+        if content_url and not _SITE_NAME_PATTERN.match(content_url):
+            raise ValueError(f"非法的站点 contentUrl: {item!r}")
+        if content_url not in sites:
+            sites.append(content_url)
+    return sites or [""]
+
+
+def is_multi_site() -> bool:
+    return configured_sites() != [""]
+
+
+def site_key(content_url: str) -> str:
+    """站点对外标识：默认站点为 default，其余为 contentUrl"""
+    return content_url or DEFAULT_SITE_KEY
+
+
+def resolve_site(key: Optional[str]) -> Optional[str]:
+    """将请求中的站点标识解析为已配置的 contentUrl，未配置返回 None"""
+    if key is None:
+        return None
+    content_url = "" if key in ("", DEFAULT_SITE_KEY) else key
+    return content_url if content_url in configured_sites() or content_url == "" else None
+
+
+def site_database_path(content_url: str) -> str:
+    """站点分区库路径"""
+    if not content_url:
+        return Config.DATABASE_PATH
+    base_dir = os.path.dirname(os.path.abspath(Config.DATABASE_PATH))
+    return os.path.join(base_dir, "sites", f"{content_url}.db")
+
+
+class SiteEngineRegistry:
+    """Web 端按站点缓存引擎（每个分区一对读写/只读引擎与一代库检测器）"""
+
+    def __init__(self, primary_engine=None, primary_watcher=None, primary_read_engine=None):
+        from backend.services.shadow_db import DatabaseGenerationWatcher
+
+        self._watcher_cls = DatabaseGenerationWatcher
+        self._engines: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        if primary_engine is not None:
+            self._engines[""] = (
+                primary_engine,
+                primary_read_engine or primary_engine,
+                primary_watcher,
+            )
+
+    def get(self, content_url: str):
+        """返回 (engine, read_engine, watcher)，分区文件不存在时返回 None"""
+        entry = self._engines.get(content_url)
+        if entry is not None:
+            return entry
+        path = site_database_path(content_url)
+        if not os.path.exists(path):
+            return None
+        with self._lock:
+            entry = self._engines.get(content_url)
+            if entry is None:
+                engine = get_engine(path)
+                read_engine = get_engine(path, profile="api")
+                entry = (
+                    engine,
+                    read_engine,
+                    self._watcher_cls(engine, path, read_engine=read_engine),
+                )
+                self._engines[content_url] = entry
+        return entry
+
+    def session_for(self, content_url: str, read_only: bool = False):
+        """站点会话；read_only 时使用 query_only 连接"""
+        entry = self.get(content_url)
+        if entry is None:
+            return None
+        engine, read_engine, watcher = entry
+        if watcher is not None:
+            watcher.check()
+        return get_session(read_engine if read_only else engine)
+
+
+def run_per_site(
+    sites: List[str],
+    func: Callable[[str], object],
+    max_workers: int = None,
+) -> Dict[str, object]:
+    """对每个站点并发执行 func(content_url)，返回 {content_url: 结果或异常}
+
+    同步主要耗时在等待 Tableau Metadata API 响应，线程并发即可重叠各站点的网络等待。
+    """
+    max_workers = max_workers or Config.SYNC_SITE_CONCURRENCY
+    results: Dict[str, object] = {}
+    if not sites:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sites)))) as pool:
+        futures = {site: pool.submit(func, site) for site in sites}
+        for site, future in futures.items():
+            try:
+                results[site] = future.result()
+            except Exception as e:
+                results[site] = e
+    return results
@@ -0,0 +1,167 @@
+"""
+流式同步辅助工具
+为大规模同步提供有界内存缓存（超限时溢出到 SQLite 临时文件）与峰值内存统计
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """返回当前进程的峰值常驻内存 (MB)，不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 单位为字节
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class _SpillStore:
+    """溢出存储：单个 SQLite 临时文件中的一张 key/value 表"""
+
+    def __init__(self, spill_dir: Optional[str] = None):
+        fd, self.path = tempfile.mkstemp(
+            prefix="sync_spill_", suffix=".db", dir=spill_dir
+        )
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE kv (k TEXT PRIMARY KEY, v TEXT)")
+        self.count = 0
+
+    def put_many(self, items: Iterable[tuple]):
+        self.conn.executemany("INSERT OR REPLACE INTO kv (k, v) VALUES (?, ?)", items)
+        self.count = self.conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT v FROM kv WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def delete(self, key: str):
+        cursor = self.conn.execute("DELETE FROM kv WHERE k = ?", (key,))
+        self.count -= cursor.rowcount
+
+    def keys(self):
+        for (k,) in self.conn.execute("SELECT k FROM kv"):
+            yield k
+
+    def close(self):
+        try:
+            self.conn.close()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class SpillableCache:
+    """
+    有界 LRU 缓存，超出 max_items 时将最久未使用的条目批量溢出到 SQLite
+
+    用法与 dict 相近（get / [] / in / len），键可为任意可 JSON 序列化的元组或字符串。
+    """
+
+    def __init__(
+        self,
+        max_items: int = 50000,
+        spill_dir: Optional[str] = None,
+        name: str = "cache",
+    ):
+        self.max_items = max(1, max_items)
+        self.spill_dir = spill_dir
+        self.name = name
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._spill: Optional[_SpillStore] = None
+        self.spilled = 0  # 累计溢出条目数
+
+    @staticmethod
+    def _encode_key(key: Hashable) -> str:
+        return json.dumps(key, ensure_ascii=False)
+
+    def _evict(self):
+        """将最旧的一半条目写入溢出存储"""
+        if self._spill is None:
+            self._spill = _SpillStore(self.spill_dir)
+        batch = []
+        evict_count = max(1, len(self._memory) // 2)
+        for _ in range(evict_count):
+            k, v = self._memory.popitem(last=False)
+            batch.append((k, json.dumps(v, ensure_ascii=False)))
+        self._spill.put_many(batch)
+        self.spilled += len(batch)
+
+    def __setitem__(self, key: Hashable, value: Any):
+        k = self._encode_key(key)
+        self._memory[k] = value
+        self._memory.move_to_end(k)
+        if self._spill is not None:
+            self._spill.delete(k)
+        if len(self._memory) > self.max_items:
+            self._evict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        k = self._encode_key(key)
+        if k in self._memory:
+            self._memory.move_to_end(k)
+            return self._memory[k]
+        if self._spill is not None:
+            raw = self._spill.get(k)
+            if raw is not None:
+                return json.loads(raw)
+        return default
+
+    def __getitem__(self, key: Hashable) -> Any:
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        k = self._encode_key(key)
+        if k in self._memory:
+            return True
+        return self._spill is not None and self._spill.get(k) is not None
+
+    def __len__(self) -> int:
+        spilled = self._spill.count if self._spill is not None else 0
+        return len(self._memory) + spilled
+
+    def keys(self):
+        """遍历全部键（内存 + 溢出），键以解码后的形式返回"""
+        for k in list(self._memory.keys()):
+            yield self._decode_key(k)
+        if self._spill is not None:
+            for k in self._spill.keys():
+                yield self._decode_key(k)
+
+    @staticmethod
+    def _decode_key(k: str):
+        key = json.loads(k)
+        return tuple(key) if isinstance(key, list) else key
+
+    def close(self):
+        """释放内存与溢出文件"""
+        self._memory.clear()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+class SpillableSet(SpillableCache):
+    """基于 SpillableCache 的有界集合，用于记录本轮同步见到的 ID"""
+
+    def add(self, key: Hashable):
+        self[key] = 1
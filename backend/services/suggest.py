@@ -0,0 +1,202 @@
+"""
+搜索框联想 (typeahead)
+进程内前缀索引：资产名称的小写、拆分标识符、拼音全拼与首字母作为键存入有序数组，bisect 定位前缀区间
+
+- 1~2 个字符的前缀及匹配条目过多的长前缀预先计算按使用量排序的 top-k，其余前缀在区间内（条目有限）取 top-k
+- 应用启动时构建默认站点索引；同步代数变化后在后台线程重建，重建期间继续使用旧索引
+- 拼音依赖 pypinyin（可选），未安装时只使用名称与标识符键
+"""
+
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from backend.config import Config
+from backend.models import get_session
+from backend.services.search_index import ENTITY_SOURCES, split_identifier
+from backend.services.shadow_db import sync_generation
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # 未安装 pypinyin 时不生成拼音键
+    lazy_pinyin = None
+
+
+# 每次查询返回的最大条数（同时是预计算 top-k 的长度）
+MAX_SUGGESTIONS = 20
+# 不超过该长度的前缀全部预计算 top-k
+PRECOMPUTED_PREFIX_LEN = 2
+# 更长的前缀匹配的键超过该数量时也预计算，保证查询时扫描的区间有界
+PRECOMPUTED_RANGE_THRESHOLD = 256
+
+# 联想实体：复用全文搜索的数据来源（id, name, body, usage, extra），另加视图（按访问量）
+SUGGEST_SOURCES = {
+    **{entity_type: sql for entity_type, (_, sql) in ENTITY_SOURCES.items()},
+    "view": """
+        SELECT id, name, NULL, COALESCE(total_view_count, 0), NULL
+        FROM views
+    """,
+}
+
+
+_CJK_RE = re.compile("[\u4e00-\u9fff]")
+
+
+def suggest_keys(name: str) -> List[str]:
+    """名称 -> 前缀匹配键：小写全名、拆分后的每个词起始的后缀、拼音全拼与首字母"""
+    lowered = name.strip().lower()
+    keys = {lowered}
+    words = split_identifier(name).split()
+    for i in range(len(words)):
+        keys.add(" ".join(words[i:]))
+    if lazy_pinyin is not None and _CJK_RE.search(name):
+        keys.add("".join(lazy_pinyin(lowered)))
+        keys.add("".join(lazy_pinyin(lowered, style=Style.FIRST_LETTER)))
+    keys.discard("")
+    return list(keys)
+
+
+class SuggestIndex:
+    """单个库（站点分区）的前缀索引，构建后只读"""
+
+    def __init__(self, entries: List[tuple], generation: int = 0):
+        # entries: [(entity_type, entity_id, name, usage)]
+        self.entries = entries
+        self.generation = generation
+        # 排序键：使用量高优先，其次名称短优先
+        self._rank = [(entry[3], -len(entry[2])) for entry in entries].__getitem__
+        pairs = sorted(
+            (key, idx) for idx, entry in enumerate(entries) for key in suggest_keys(entry[2])
+        )
+        self._keys = [key for key, _ in pairs]
+        self._refs = [idx for _, idx in pairs]
+        self._top: Dict[str, List[int]] = self._precompute_top()
+
+    @classmethod
+    def build(cls, session) -> "SuggestIndex":
+        generation = sync_generation(session)
+        entries = []
+        for entity_type, sql in SUGGEST_SOURCES.items():
+            try:
+                rows = session.execute(text(sql)).fetchall()
+            except Exception:  # 表尚未创建（未同步过的库）
+                session.rollback()
+                continue
+            entries.extend(
+                (entity_type, row[0], row[1], row[3] or 0) for row in rows if row[1]
+            )
+        return cls(entries, generation)
+
+    def _precompute_top(self) -> Dict[str, List[int]]:
+        """逐层按前缀切分有序键：短前缀与区间过大的前缀计算 top-k，区间过大的继续向下一层切分"""
+        keys, top = self._keys, {}
+        ranges, depth = [(0, len(keys))], 0
+        while ranges:
+            depth += 1
+            next_ranges = []
+            for lo, hi in ranges:
+                i = lo
+                while i < hi:
+                    if len(keys[i]) < depth:  # 与上一层前缀相同的键，已计入上一层
+                        i += 1
+                        continue
+                    prefix = keys[i][:depth]
+                    j = bisect_left(keys, prefix + "\uffff", i, hi)
+                    large = j - i > PRECOMPUTED_RANGE_THRESHOLD
+                    if depth <= PRECOMPUTED_PREFIX_LEN or large:
+                        top[prefix] = heapq.nlargest(
+                            MAX_SUGGESTIONS, set(self._refs[i:j]), key=self._rank
+                        )
+                    if depth < PRECOMPUTED_PREFIX_LEN or large:
+                        next_ranges.append((i, j))
+                    i = j
+            ranges = next_ranges
+        return top
+
+    def _range_ids(self, prefix: str):
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + "\uffff")
+        return set(self._refs[lo:hi])
+
+    def suggest(self, prefix: str, limit: int = 10, types: List[str] = None) -> List[Dict]:
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+        if not types and prefix in self._top:
+            ids = self._top[prefix][:limit]
+        else:
+            # 按类型筛选时可能需要扫描整个区间
+            candidates = self._range_ids(prefix)
+            if types:
+                candidates = {i for i in candidates if self.entries[i][0] in types}
+            ids = heapq.nlargest(limit, candidates, key=self._rank)
+        return [
+            {"type": entity_type, "id": entity_id, "name": name, "usage": usage}
+            for entity_type, entity_id, name, usage in (self.entries[i] for i in ids)
+        ]
+
+
+class SuggestRegistry:
+    """按站点缓存联想索引，定期比对同步代数，变化后后台重建"""
+
+    def __init__(self, site_engines):
+        self.site_engines = site_engines
+        self._indexes: Dict[str, SuggestIndex] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._rebuilding = set()
+        self._lock = threading.Lock()
+
+    def _build(self, content_url: str) -> Optional[SuggestIndex]:
+        entry = self.site_engines.get(content_url)
+        if entry is None:
+            return None
+        session = get_session(entry[1])  # 只读引擎
+        try:
+            index = SuggestIndex.build(session)
+        finally:
+            session.close()
+        with self._lock:
+            self._indexes[content_url] = index
+            self._checked_at[content_url] = time.monotonic()
+        return index
+
+    def warm(self, content_url: str = ""):
+        """启动时构建索引；库尚不可用时忽略，首次请求时再构建"""
+        try:
+            self._build(content_url)
+        except Exception as e:
+            print(f"⚠️ 联想索引构建失败: {e}")
+
+    def _rebuild_in_background(self, content_url: str):
+        def run():
+            try:
+                self._build(content_url)
+            except Exception as e:
+                print(f"⚠️ 联想索引重建失败: {e}")
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(content_url)
+
+        with self._lock:
+            if content_url in self._rebuilding:
+                return
+            self._rebuilding.add(content_url)
+        threading.Thread(target=run, name=f"suggest-rebuild-{content_url or 'default'}", daemon=True).start()
+
+    def index_for(self, content_url: str, session) -> Optional[SuggestIndex]:
+        """返回站点索引（首次访问时同步构建）；同步代数变化时触发后台重建，本次仍返回旧索引"""
+        index = self._indexes.get(content_url)
+        if index is None:
+            return self._build(content_url)
+        now = time.monotonic()
+        if now - self._checked_at.get(content_url, 0) >= Config.SUGGEST_CHECK_SECONDS:
+            self._checked_at[content_url] = now
+            if sync_generation(session) != index.generation:
+                self._rebuild_in_background(content_url)
+        return index
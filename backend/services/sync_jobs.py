@@ -0,0 +1,325 @@
+"""
+同步任务协调
+基于 sync_jobs 表的跨进程任务登记与领取，保证多 worker 部署下同一时间只有一个同步在执行
+
+- Web worker: enqueue_job() 登记任务，ensure_runner() 确保同步执行进程存在
+- 执行进程 (backend/sync_runner.py): claim_next_job() 领取任务，JobProgressReporter 持久化阶段进度
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from backend.config import Config
+from backend.models import SyncJob, get_engine, get_session
+
+try:
+    import fcntl
+except ImportError:  # Windows 无 fcntl，退化为仅依赖任务表的原子领取
+    fcntl = None
+
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobConflictError(Exception):
+    """已有排队或运行中的同步任务"""
+
+    def __init__(self, job: Optional[SyncJob]):
+        super().__init__("同步正在进行中")
+        self.job = job
+
+
+# ==================== 任务登记 ====================
+
+
+def recover_stale_jobs(session, stale_seconds: int = None) -> int:
+    """将心跳超时的运行中任务标记为失败（执行进程异常退出的兜底）"""
+    stale_seconds = stale_seconds or Config.SYNC_JOB_STALE_SECONDS
+    deadline = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    stale_jobs = (
+        session.query(SyncJob)
+        .filter(SyncJob.status == "running", SyncJob.heartbeat_at < deadline)
+        .all()
+    )
+    for job in stale_jobs:
+        job.status = "failed"
+        job.completed_at = datetime.utcnow()
+        job.error_message = f"执行进程心跳超时 ({stale_seconds}s)，任务已中止"
+    if stale_jobs:
+        session.commit()
+    return len(stale_jobs)
+
+
+def get_active_job(session, lock_key: str = "sync") -> Optional[SyncJob]:
+    """获取当前排队或运行中的任务"""
+    return (
+        session.query(SyncJob)
+        .filter(SyncJob.lock_key == lock_key, SyncJob.status.in_(ACTIVE_STATUSES))
+        .order_by(SyncJob.id.desc())
+        .first()
+    )
+
+
+def get_latest_job(session, lock_key: str = "sync") -> Optional[SyncJob]:
+    """获取最近一次任务（任意状态）"""
+    return (
+        session.query(SyncJob)
+        .filter(SyncJob.lock_key == lock_key)
+        .order_by(SyncJob.id.desc())
+        .first()
+    )
+
+
+def enqueue_job(
+    session,
+    job_type: str = "full",
+    params: Dict[str, Any] = None,
+    requested_by: str = "api",
+    lock_key: str = "sync",
+) -> SyncJob:
+    """登记同步任务；已有活动任务时抛出 JobConflictError
+
+    互斥由部分唯一索引 ux_sync_jobs_active 保证，多个 worker 并发登记时只有一个成功。
+    """
+    recover_stale_jobs(session)
+
+    job = SyncJob(
+        job_type=job_type,
+        lock_key=lock_key,
+        status="queued",
+        params=json.dumps(params or {}, ensure_ascii=False),
+        requested_by=requested_by,
+        requested_at=datetime.utcnow(),
+        message="等待同步执行进程领取...",
+    )
+    session.add(job)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise JobConflictError(get_active_job(session, lock_key))
+    return job
+
+
+def claim_next_job(session, runner_pid: int = None) -> Optional[SyncJob]:
+    """领取最早排队的任务（条件更新，保证只有一个执行进程领取成功）"""
+    recover_stale_jobs(session)
+    job = (
+        session.query(SyncJob)
+        .filter(SyncJob.status == "queued")
+        .order_by(SyncJob.id.asc())
+        .first()
+    )
+    if not job:
+        return None
+
+    now = datetime.utcnow()
+    updated = (
+        session.query(SyncJob)
+        .filter(SyncJob.id == job.id, SyncJob.status == "queued")
+        .update(
+            {
+                "status": "running",
+                "started_at": now,
+                "heartbeat_at": now,
+                "runner_pid": runner_pid or os.getpid(),
+                "message": "正在连接 Tableau Server...",
+            },
+            synchronize_session=False,
+        )
+    )
+    session.commit()
+    if updated != 1:
+        return None
+    session.refresh(job)
+    return job
+
+
+def finish_job(session, job_id: int, error: str = None, sync_run_id: int = None):
+    """结束任务"""
+    job = session.get(SyncJob, job_id)
+    if not job:
+        return
+    job.status = "failed" if error else "completed"
+    job.completed_at = datetime.utcnow()
+    job.heartbeat_at = job.completed_at
+    job.error_message = error
+    job.message = f"同步失败: {error}" if error else "同步完成"
+    if not error:
+        job.percent = 100.0
+    if sync_run_id:
+        job.sync_run_id = sync_run_id
+    session.commit()
+
+
+# ==================== 进度持久化 ====================
+
+
+class JobProgressReporter:
+    """MetadataSync 的进度回调：将阶段进度写入 sync_jobs，并维持心跳
+
+    使用独立会话写入，避免与同步会话共享事务；写入失败（如数据库短暂锁定）仅打印告警。
+    """
+
+    def __init__(self, job_id: int, db_path: str = None, stages=None):
+        from backend.services.sync_manager import SYNC_STAGES
+
+        self.job_id = job_id
+        self.engine = get_engine(db_path or Config.DATABASE_PATH)
+        self.stages = [
+            {"name": key, "label": label, "status": "pending", "records": None}
+            for key, label in (stages or SYNC_STAGES)
+        ]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def __call__(self, event: Dict[str, Any]):
+        with self._lock:
+            now = datetime.utcnow().isoformat()
+            for stage in self.stages:
+                if stage["name"] != event["stage"]:
+                    continue
+                stage["status"] = event["status"]
+                if event["status"] == "running":
+                    stage["startedAt"] = now
+                else:
+                    stage["completedAt"] = now
+                    stage["records"] = event.get("records")
+
+            done = sum(1 for s in self.stages if s["status"] == "completed")
+            total = len(self.stages)
+            names = [s["name"] for s in self.stages]
+            position = names.index(event["stage"]) + 1 if event["stage"] in names else 0
+            values = {
+                "current_stage": event["stage"],
+                "stage_index": position,
+                "stage_total": total,
+                "percent": done * 100.0 / total if total else 0.0,
+                "stage_progress": json.dumps(self.stages, ensure_ascii=False),
+                "message": f"[{position}/{total}] {event['label']}"
+                + ("..." if event["status"] == "running" else " 完成"),
+                "heartbeat_at": datetime.utcnow(),
+            }
+            if event.get("sync_run_id"):
+                values["sync_run_id"] = event["sync_run_id"]
+            self._update(values)
+
+    def _update(self, values: Dict[str, Any]):
+        session = get_session(self.engine)
+        try:
+            session.query(SyncJob).filter(SyncJob.id == self.job_id).update(
+                values, synchronize_session=False
+            )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            print(f"  ⚠️ 任务进度写入失败: {e}")
+        finally:
+            session.close()
+
+    def _heartbeat_loop(self, interval: int):
+        while not self._stop.wait(interval):
+            with self._lock:
+                self._update({"heartbeat_at": datetime.utcnow()})
+
+    def start_heartbeat(self, interval: int = None):
+        interval = interval or Config.SYNC_JOB_HEARTBEAT_SECONDS
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop, args=(interval,), daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    @contextmanager
+    def paused(self):
+        """暂停进度与心跳写入并释放连接（影子库写回线上库期间使用）"""
+        with self._lock:
+            self.engine.dispose()
+            yield
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_thread:
+            self._heartbeat_thread.join(timeout=5)
+        self.engine.dispose()
+
+
+# ==================== 同步执行进程 ====================
+
+
+def runner_lock_path(db_path: str = None) -> str:
+    """执行进程文件锁路径（与数据库同目录）"""
+    db_dir = os.path.dirname(os.path.abspath(db_path or Config.DATABASE_PATH))
+    return os.path.join(db_dir, "sync_runner.lock")
+
+
+def acquire_runner_lock(db_path: str = None):
+    """尝试获取执行进程文件锁，成功返回文件句柄（需保持打开），失败返回 None"""
+    path = runner_lock_path(db_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle = open(path, "a+")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    return handle
+
+
+def is_runner_alive(db_path: str = None) -> bool:
+    """是否已有执行进程持有文件锁"""
+    if fcntl is None:
+        return False
+    handle = acquire_runner_lock(db_path)
+    if handle is None:
+        return True
+    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    handle.close()
+    return False
+
+
+def ensure_runner(db_path: str = None) -> bool:
+    """确保存在同步执行进程
+
+    SYNC_RUNNER_MODE=spawn（默认）时，若无执行进程则以独立会话拉起一个
+    `python -m backend.sync_runner --once`，执行完队列后自动退出；
+    SYNC_RUNNER_MODE=external 时由外部（如 docker-compose 中的 sync-runner 服务）常驻运行。
+    返回是否新拉起了进程。
+    """
+    if Config.SYNC_RUNNER_MODE != "spawn":
+        return False
+    if is_runner_alive(db_path):
+        return False
+
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args = [sys.executable, "-m", "backend.sync_runner", "--once"]
+    if db_path:
+        args += ["--db-path", db_path]
+    log_dir = os.path.join(project_root, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = open(os.path.join(log_dir, "sync_runner.log"), "a")
+    subprocess.Popen(
+        args,
+        cwd=project_root,
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        stdin=subprocess.DEVNULL,
+        start_new_session=True,
+        close_fds=True,
+    )
+    log_file.close()
+    return True
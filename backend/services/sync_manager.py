@@ -8,8 +8,8 @@ import sys
 import hashlib
 from collections import defaultdict
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from sqlalchemy import select, text
+from typing import Optional, List, Dict, Any, Callable
+from sqlalchemy import bindparam, select, text
 import re
 
 # 添加项目根目录到路径
@@ -42,18 +42,100 @@ from backend.models import (
 )
 from .tableau_client import TableauMetadataClient
 from .sync_report import SyncReportGenerator
+from .streaming import SpillableCache, SpillableSet, peak_rss_mb
+from .change_journal import ChangeJournal
+from . import counts, facets, search_index
+from .sync_telemetry import SyncTelemetry
+
+
+# 全量同步阶段（顺序即执行顺序），用于进度与百分比计算
+SYNC_STAGES = [
+    ("users", "用户"),
+    ("projects", "项目"),
+    ("databases", "数据库"),
+    ("tables", "数据表"),
+    ("datasources", "数据源"),
+    ("workbooks", "工作簿"),
+    ("fields", "字段"),
+    ("calculated_fields", "计算字段"),
+    ("field_to_view", "字段→视图"),
+    ("lineage", "血缘"),
+    ("views_usage", "视图使用统计"),
+    ("stats", "预存统计"),
+    ("v5_migration", "V5 迁移"),
+    ("search_index", "搜索索引"),
+    ("list_totals", "列表总数"),
+    ("facets", "分面统计"),
+    ("change_journal", "变更日志"),
+    ("report", "同步报告"),
+]
+# 仅使用统计同步阶段
+USAGE_SYNC_STAGES = [
+    ("views_usage", "视图使用统计"),
+    ("change_journal", "变更日志"),
+]
+# 增量同步：先探测变更，有变化时执行全量阶段
+INCREMENTAL_SYNC_STAGES = [("change_probe", "变更探测")] + SYNC_STAGES
+# 定向刷新单个工作簿/数据源
+TARGETED_SYNC_STAGES = [
+    ("asset", "资产"),
+    ("field_to_view", "字段→视图"),
+    ("lineage", "血缘"),
+    ("stats", "预存统计"),
+    ("v5_migration", "V5 迁移"),
+    ("search_index", "搜索索引"),
+    ("list_totals", "列表总数"),
+    ("facets", "分面统计"),
+    ("change_journal", "变更日志"),
+]
+# 任务类型 -> 阶段列表（同步执行进程据此计算进度百分比）
+JOB_STAGES = {
+    "full": SYNC_STAGES,
+    "incremental": INCREMENTAL_SYNC_STAGES,
+    "usage": USAGE_SYNC_STAGES,
+    "workbook": TARGETED_SYNC_STAGES,
+    "datasource": TARGETED_SYNC_STAGES,
+}
+# 定向刷新任务类型（params 中以 asset_id 指定资产）
+TARGETED_JOB_TYPES = ("workbook", "datasource")
+SYNC_STAGE_KEYS = [key for key, _ in INCREMENTAL_SYNC_STAGES]
+SYNC_STAGE_LABELS = dict(INCREMENTAL_SYNC_STAGES + TARGETED_SYNC_STAGES)
+
+
+def _chunked(ids: List[str], size: int = 500):
+    """按批切分 ID 列表（控制 SQL IN 参数个数）"""
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i : i + size]
 
 
 class MetadataSync:
     """元数据同步管理器"""
 
-    def __init__(self, client: TableauMetadataClient, db_path: str = None):
+    def __init__(
+        self,
+        client: TableauMetadataClient,
+        db_path: str = None,
+        streaming_fields: bool = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
         self.client = client
         self.db_path = db_path or Config.DATABASE_PATH
-        self.engine = get_engine(self.db_path)
+        self.engine = get_engine(self.db_path, profile="sync")
+        init_db(self.engine)  # 确保新增的系统表（如 sync_changes）存在
         self.session = get_session(self.engine)
         self.sync_log: Optional[SyncLog] = None
+        self.run_log: Optional[SyncLog] = None  # 运行级日志（sync_run_id）
+        self.progress_callback = progress_callback  # 阶段进度回调（同步执行进程写入任务表）
         self.deduplication_map = {}  # skipped_id -> survivor_id (跨阶段去重映射)
+        self.stage_errors: Dict[str, str] = {}  # 被吞掉的阶段错误（影子库据此决定是否切换）
+        self.telemetry = SyncTelemetry(client)  # 阶段遥测（写入 sync_stage_metrics）
+        # 字段流式同步开关（None 时读取配置）
+        self.streaming_fields = (
+            Config.SYNC_FIELDS_STREAMING
+            if streaming_fields is None
+            else streaming_fields
+        )
 
     def _start_sync_log(self, sync_type: str):
         """开始同步日志"""
@@ -67,7 +149,10 @@ class MetadataSync:
         self.session.commit()
 
     def _complete_sync_log(self, records: int, error: str = None):
-        """完成同步日志"""
+        """完成同步日志；带错误完成的阶段同时记入 stage_errors（抓取阶段吞掉异常后返回 0）"""
+        if error:
+            stage = self.sync_log.sync_type if self.sync_log else "unknown"
+            self.stage_errors[stage] = error
         if self.sync_log:
             self.sync_log.status = "failed" if error else "completed"
             self.sync_log.completed_at = datetime.utcnow()
@@ -75,6 +160,63 @@ class MetadataSync:
             self.sync_log.error_message = error
             self.session.commit()
 
+    def _start_run_log(self, sync_type: str):
+        """开始运行级同步日志，其 ID 作为本次运行的 sync_run_id"""
+        self.run_log = SyncLog(
+            sync_type=sync_type,
+            status="running",
+            started_at=datetime.now(),
+            records_synced=0,
+        )
+        self.session.add(self.run_log)
+        self.session.commit()
+        return self.run_log.id
+
+    def _complete_run_log(self, records: int, error: str = None):
+        """完成运行级同步日志"""
+        if self.run_log:
+            self.telemetry.flush(self.session, self.run_log.id)
+            self.run_log.status = "failed" if error else "completed"
+            self.run_log.completed_at = datetime.now()
+            self.run_log.records_synced = records
+            self.run_log.error_message = error
+            self.session.commit()
+
+    def _emit_progress(self, stage: str, status: str, records: Optional[int] = None):
+        """向进度回调报告阶段状态，回调异常不影响同步"""
+        if not self.progress_callback:
+            return
+        index = SYNC_STAGE_KEYS.index(stage) if stage in SYNC_STAGE_KEYS else -1
+        event = {
+            "stage": stage,
+            "label": SYNC_STAGE_LABELS.get(stage, stage),
+            "index": index,
+            "total": len(SYNC_STAGES),
+            "status": status,
+            "records": records,
+            "sync_run_id": self.run_log.id if self.run_log else None,
+        }
+        try:
+            self.progress_callback(event)
+        except Exception as e:
+            print(f"  ⚠️ 进度回调失败: {e}")
+
+    def _stage_started(self, stage: str):
+        self.telemetry.stage_started(stage)
+        self._emit_progress(stage, "running")
+
+    def _stage_finished(self, stage: str, records: Optional[int] = None):
+        self.telemetry.stage_finished(stage, records)
+        self.telemetry.flush(self.session, self.run_log.id if self.run_log else None)
+        self._emit_progress(stage, "completed", records)
+
+    def _run_stage(self, stage: str, func: Callable[[], Any]):
+        """执行单个同步阶段并报告进度"""
+        self._stage_started(stage)
+        result = func()
+        self._stage_finished(stage, result if isinstance(result, int) else None)
+        return result
+
     def _cleanup_orphaned_records(
         self, model_class, current_ids: List[str], filter_condition=None
     ):
@@ -91,39 +233,43 @@ class MetadataSync:
 
         count = 0
         for record in orphaned:
-            # 对于 Field，还需要清理相关的依赖和关联
-            if model_class == Field:
-                # 新模型: CalculatedField 使用 id 作为主键，与 Field.id 相同
-                self.session.query(CalculatedField).filter_by(id=record.id).delete()
-                self.session.query(FieldDependency).filter(
-                    (FieldDependency.source_field_id == record.id)
-                    | (FieldDependency.dependency_field_id == record.id)
-                ).delete()
-                from backend.models import Metric, field_to_view
-
-                self.session.query(Metric).filter_by(id=record.id).delete()
-                self.session.execute(
-                    field_to_view.delete().where(field_to_view.c.field_id == record.id)
-                )
-                self.session.execute(
-                    text("DELETE FROM field_full_lineage WHERE field_id = :fid"),
-                    {"fid": record.id},
-                )
-
-            # 对于 View，需要先清理 view_usage_history 表中的相关记录
-            if model_class == View:
-                self.session.execute(
-                    text("DELETE FROM view_usage_history WHERE view_id = :vid"),
-                    {"vid": record.id},
-                )
-
-            self.session.delete(record)
+            self._delete_orphaned_record(model_class, record)
             count += 1
 
         if count > 0:
             print(f"  🧹 清理了 {count} 个已不存在的 {model_class.__name__} 记录")
         return count
 
+    def _delete_orphaned_record(self, model_class, record):
+        """物理删除单条孤立记录及其关联数据"""
+        # 对于 Field，还需要清理相关的依赖和关联
+        if model_class == Field:
+            # 新模型: CalculatedField 使用 id 作为主键，与 Field.id 相同
+            self.session.query(CalculatedField).filter_by(id=record.id).delete()
+            self.session.query(FieldDependency).filter(
+                (FieldDependency.source_field_id == record.id)
+                | (FieldDependency.dependency_field_id == record.id)
+            ).delete()
+            from backend.models import Metric, field_to_view
+
+            self.session.query(Metric).filter_by(id=record.id).delete()
+            self.session.execute(
+                field_to_view.delete().where(field_to_view.c.field_id == record.id)
+            )
+            self.session.execute(
+                text("DELETE FROM field_full_lineage WHERE field_id = :fid"),
+                {"fid": record.id},
+            )
+
+        # 对于 View，需要先清理 view_usage_history 表中的相关记录
+        if model_class == View:
+            self.session.execute(
+                text("DELETE FROM view_usage_history WHERE view_id = :vid"),
+                {"vid": record.id},
+            )
+
+        self.session.delete(record)
+
     def sync_databases(self) -> int:
         """同步数据库（增强版）"""
         print("\n📦 同步数据库...")
@@ -295,90 +441,9 @@ class MetadataSync:
                     continue
 
                 current_ids.append(ds_data["id"])
-                ds = self.session.query(Datasource).filter_by(id=ds_data["id"]).first()
-                if not ds:
-                    ds = Datasource(id=ds_data["id"])
-                    self.session.add(ds)
-
-                ds.name = ds_data.get("name", "")
-                ds.luid = ds_data.get("luid")
-                ds.description = ds_data.get("description")
-                ds.uri = ds_data.get("uri")
-                ds.project_name = ds_data.get("projectName", "")
-                ds.has_extract = ds_data.get("hasExtracts", False)
-                ds.is_certified = ds_data.get("isCertified", False)
-                ds.certification_note = ds_data.get("certificationNote")
-                ds.certifier_display_name = ds_data.get("certifierDisplayName")
-                ds.contains_unsupported_custom_sql = ds_data.get(
-                    "containsUnsupportedCustomSql", False
-                )
-                ds.has_active_warning = ds_data.get("hasActiveWarning", False)
-                ds.vizportal_url_id = ds_data.get("vizportalUrlId")
-                ds.is_embedded = False  # 明确设置为False，因为我们过滤掉了嵌入式数据源
-
-                owner = ds_data.get("owner", {})
-                if owner:
-                    ds.owner = owner.get("username", "")
-                    ds.owner_id = owner.get("id")
-
-                # 解析时间字段
-                for time_field, attr_name in [
-                    ("extractLastRefreshTime", "extract_last_refresh_time"),
-                    (
-                        "extractLastIncrementalUpdateTime",
-                        "extract_last_incremental_update_time",
-                    ),
-                    ("extractLastUpdateTime", "extract_last_update_time"),
-                    ("createdAt", "created_at"),
-                    ("updatedAt", "updated_at"),
-                ]:
-                    time_val = ds_data.get(time_field)
-                    if time_val:
-                        try:
-                            setattr(
-                                ds,
-                                attr_name,
-                                datetime.fromisoformat(time_val.replace("Z", "+00:00")),
-                            )
-                        except:
-                            pass
-
+                self._save_datasource(ds_data)
                 count += 1
 
-                # 同步表到数据源的关系
-                upstream_tables = ds_data.get("upstreamTables", [])
-                if upstream_tables:
-                    print(
-                        f"  📊 数据源 {ds_data.get('name')} 的上游表: {len(upstream_tables)} 个"
-                    )
-                    # 抽样打印 ID 格式
-                    if len(upstream_tables) > 0:
-                        print(f"     示例表 ID: {upstream_tables[0].get('id')}")
-
-                for tbl in upstream_tables:
-                    if not tbl or not tbl.get("id"):
-                        continue
-                    rel = self.session.execute(
-                        select(table_to_datasource).where(
-                            table_to_datasource.c.table_id == tbl["id"],
-                            table_to_datasource.c.datasource_id == ds_data["id"],
-                        )
-                    ).first()
-
-                    if not rel:
-                        try:
-                            self.session.execute(
-                                table_to_datasource.insert().values(
-                                    table_id=tbl["id"],
-                                    datasource_id=ds_data["id"],
-                                    relationship_type="upstream",
-                                    lineage_source="api",
-                                    created_at=datetime.utcnow(),
-                                )
-                            )
-                        except:
-                            pass
-
             self.session.commit()
 
             # 清理数据库中已不存在的数据源（排除嵌入式）
@@ -398,6 +463,90 @@ class MetadataSync:
             print(f"  ❌ 同步失败: {e}")
             return 0
 
+    def _save_datasource(self, ds_data: Dict):
+        """写入单个已发布数据源及其上游表关联（全量同步与定向刷新共用）"""
+        ds = self.session.query(Datasource).filter_by(id=ds_data["id"]).first()
+        if not ds:
+            ds = Datasource(id=ds_data["id"])
+            self.session.add(ds)
+
+        ds.name = ds_data.get("name", "")
+        ds.luid = ds_data.get("luid")
+        ds.description = ds_data.get("description")
+        ds.uri = ds_data.get("uri")
+        ds.project_name = ds_data.get("projectName", "")
+        ds.has_extract = ds_data.get("hasExtracts", False)
+        ds.is_certified = ds_data.get("isCertified", False)
+        ds.certification_note = ds_data.get("certificationNote")
+        ds.certifier_display_name = ds_data.get("certifierDisplayName")
+        ds.contains_unsupported_custom_sql = ds_data.get(
+            "containsUnsupportedCustomSql", False
+        )
+        ds.has_active_warning = ds_data.get("hasActiveWarning", False)
+        ds.vizportal_url_id = ds_data.get("vizportalUrlId")
+        ds.is_embedded = False  # 明确设置为False，因为我们过滤掉了嵌入式数据源
+
+        owner = ds_data.get("owner", {})
+        if owner:
+            ds.owner = owner.get("username", "")
+            ds.owner_id = owner.get("id")
+
+        # 解析时间字段
+        for time_field, attr_name in [
+            ("extractLastRefreshTime", "extract_last_refresh_time"),
+            (
+                "extractLastIncrementalUpdateTime",
+                "extract_last_incremental_update_time",
+            ),
+            ("extractLastUpdateTime", "extract_last_update_time"),
+            ("createdAt", "created_at"),
+            ("updatedAt", "updated_at"),
+        ]:
+            time_val = ds_data.get(time_field)
+            if time_val:
+                try:
+                    setattr(
+                        ds,
+                        attr_name,
+                        datetime.fromisoformat(time_val.replace("Z", "+00:00")),
+                    )
+                except:
+                    pass
+
+        # 同步表到数据源的关系
+        upstream_tables = ds_data.get("upstreamTables", [])
+        if upstream_tables:
+            print(
+                f"  📊 数据源 {ds_data.get('name')} 的上游表: {len(upstream_tables)} 个"
+            )
+            # 抽样打印 ID 格式
+            if len(upstream_tables) > 0:
+                print(f"     示例表 ID: {upstream_tables[0].get('id')}")
+
+        for tbl in upstream_tables:
+            if not tbl or not tbl.get("id"):
+                continue
+            rel = self.session.execute(
+                select(table_to_datasource).where(
+                    table_to_datasource.c.table_id == tbl["id"],
+                    table_to_datasource.c.datasource_id == ds_data["id"],
+                )
+            ).first()
+
+            if not rel:
+                try:
+                    self.session.execute(
+                        table_to_datasource.insert().values(
+                            table_id=tbl["id"],
+                            datasource_id=ds_data["id"],
+                            relationship_type="upstream",
+                            lineage_source="api",
+                            created_at=datetime.utcnow(),
+                        )
+                    )
+                except:
+                    pass
+
     def _save_embedded_datasource(
         self, ds_data: Dict, workbook_id: str, source_published_ds_id: str = None
     ):
@@ -464,198 +613,9 @@ class MetadataSync:
 
             for wb_data in workbooks:
                 current_wb_ids.append(wb_data["id"])
-                wb = self.session.query(Workbook).filter_by(id=wb_data["id"]).first()
-                if not wb:
-                    wb = Workbook(id=wb_data["id"])
-                    self.session.add(wb)
-
-                wb.name = wb_data.get("name", "")
-                wb.luid = wb_data.get("luid")
-                wb.description = wb_data.get("description")
-                wb.uri = wb_data.get("uri")
-                wb.project_name = wb_data.get("projectName", "")
-                wb.contains_unsupported_custom_sql = wb_data.get(
-                    "containsUnsupportedCustomSql", False
-                )
-                wb.has_active_warning = wb_data.get("hasActiveWarning", False)
-                wb.vizportal_url_id = wb_data.get("vizportalUrlId")
-
-                owner = wb_data.get("owner", {})
-                if owner:
-                    wb.owner = owner.get("username", "")
-                    wb.owner_id = owner.get("id")
-
-                # 解析时间字段
-                for time_field, attr_name in [
-                    ("createdAt", "created_at"),
-                    ("updatedAt", "updated_at"),
-                ]:
-                    time_val = wb_data.get(time_field)
-                    if time_val:
-                        try:
-                            setattr(
-                                wb,
-                                attr_name,
-                                datetime.fromisoformat(time_val.replace("Z", "+00:00")),
-                            )
-                        except:
-                            pass
-
+                view_count += self._save_workbook(wb_data, current_view_ids)
                 wb_count += 1
 
-                # 同步数据源到工作簿的关系 (Published)
-                upstream_ds = wb_data.get("upstreamDatasources", [])
-                for ds in upstream_ds:
-                    if not ds or not ds.get("id"):
-                        continue
-                    self._link_datasource_to_workbook(ds["id"], wb_data["id"])
-
-                # 同步嵌入式数据源 (Embedded)
-                embedded_ds = wb_data.get("embeddedDatasources", [])
-                for eds in embedded_ds:
-                    if not eds or not eds.get("id"):
-                        continue
-
-                    upstream_published = eds.get("upstreamDatasources", [])
-                    upstream_ds_id = None
-
-                    if upstream_published:
-                        # 场景1：嵌入式源引用了已发布数据源 (穿透模式)
-                        # 将上游发布式数据源关联到工作簿
-                        for up_ds in upstream_published:
-                            if up_ds and up_ds.get("id"):
-                                self._link_datasource_to_workbook(
-                                    up_ds["id"], wb_data["id"]
-                                )
-                        upstream_ds_id = upstream_published[0]["id"]
-
-                        # 🆕 场景1也保存嵌入式数据源记录，并设置 source_published_datasource_id
-                        self._save_embedded_datasource(
-                            eds, wb_data["id"], source_published_ds_id=upstream_ds_id
-                        )
-                        # 🔧 修复：场景1也需要建立嵌入式数据源到工作簿的关联
-                        self._link_datasource_to_workbook(eds["id"], wb_data["id"])
-                    else:
-                        # 场景2：完全独立的嵌入式直连源 (保留模式)
-                        # 保存该嵌入式数据源，标记 is_embedded=True
-                        # 这样工作簿就有了一个关联的 Datasource，字段也有了归属
-                        self._save_embedded_datasource(eds, wb_data["id"])
-                        # 同时也建立 Datasource -> Workbook 关联 (虽然上面已经在 DB 层面建立了，但这里显式链接)
-                        self._link_datasource_to_workbook(eds["id"], wb_data["id"])
-                        upstream_ds_id = eds["id"]
-
-                    # 同步嵌入式字段
-                    eds_fields = eds.get("fields", [])
-                    for f_data in eds_fields:
-                        self._sync_field(
-                            f_data,
-                            datasource_id=upstream_ds_id,
-                            workbook_id=wb_data["id"],
-                        )
-
-                # 同步视图 (sheets + dashboards)
-                for idx, sheet in enumerate(wb_data.get("sheets", [])):
-                    if not sheet or not sheet.get("id"):
-                        continue
-                    current_view_ids.append(sheet["id"])
-                    view = self.session.query(View).filter_by(id=sheet["id"]).first()
-                    if not view:
-                        view = View(id=sheet["id"])
-                        self.session.add(view)
-
-                    view.name = sheet.get("name", "")
-                    view.luid = sheet.get("luid")
-                    view.path = sheet.get("path")
-                    view.index = sheet.get("index", idx)
-                    view.view_type = "sheet"
-                    view.workbook_id = wb_data["id"]
-
-                    # 解析时间
-                    for time_field, attr_name in [
-                        ("createdAt", "created_at"),
-                        ("updatedAt", "updated_at"),
-                    ]:
-                        time_val = sheet.get(time_field)
-                        if time_val:
-                            try:
-                                setattr(
-                                    view,
-                                    attr_name,
-                                    datetime.fromisoformat(
-                                        time_val.replace("Z", "+00:00")
-                                    ),
-                                )
-                            except:
-                                pass
-
-                    view_count += 1
-
-                # 同步仪表板 (dashboards)
-                for idx, dashboard in enumerate(wb_data.get("dashboards", [])):
-                    if not dashboard or not dashboard.get("id"):
-                        continue
-                    current_view_ids.append(dashboard["id"])
-                    view = (
-                        self.session.query(View).filter_by(id=dashboard["id"]).first()
-                    )
-                    if not view:
-                        view = View(id=dashboard["id"])
-                        self.session.add(view)
-
-                    view.name = dashboard.get("name", "")
-                    view.luid = dashboard.get("luid")
-                    view.path = dashboard.get("path")
-                    view.index = dashboard.get("index", idx)
-                    view.view_type = "dashboard"
-                    view.workbook_id = wb_data["id"]
-
-                    # 解析时间
-                    for time_field, attr_name in [
-                        ("createdAt", "created_at"),
-                        ("updatedAt", "updated_at"),
-                    ]:
-                        time_val = dashboard.get(time_field)
-                        if time_val:
-                            try:
-                                setattr(
-                                    view,
-                                    attr_name,
-                                    datetime.fromisoformat(
-                                        time_val.replace("Z", "+00:00")
-                                    ),
-                                )
-                            except:
-                                pass
-
-                    # 同步仪表板与 sheet 的关联
-                    contained_sheets = dashboard.get("sheets", [])
-                    for contained_sheet in contained_sheets:
-                        if contained_sheet and contained_sheet.get("id"):
-                            sheet_id = contained_sheet.get("id")
-                            # 检查是否存在
-                            rel = self.session.execute(
-                                select(dashboard_to_sheet).where(
-                                    dashboard_to_sheet.c.dashboard_id
-                                    == dashboard["id"],
-                                    dashboard_to_sheet.c.sheet_id == sheet_id,
-                                )
-                            ).first()
-                            if not rel:
-                                try:
-                                    self.session.execute(
-                                        dashboard_to_sheet.insert().values(
-                                            dashboard_id=dashboard["id"],
-                                            sheet_id=sheet_id,
-                                            lineage_source="api",
-                                            created_at=datetime.utcnow(),
-                                        )
-                                    )
-                                except Exception as e:
-                                    print(f"  ⚠️ 关联 sheet 失败: {e}")
-                                    pass
-
-                    view_count += 1
-
             self.session.commit()
 
             # 清理数据库中已不存在的工作簿
@@ -675,29 +635,229 @@ class MetadataSync:
 
             traceback.print_exc()
             return 0
-            return 0
+
+    def _save_workbook(self, wb_data: Dict, view_ids: List[str]) -> int:
+        """写入单个工作簿及其数据源关联、嵌入式数据源与字段、视图（全量同步与定向刷新共用）
+
+        写入的视图 ID 追加到 view_ids，返回视图数量。
+        """
+        view_count = 0
+        wb = self.session.query(Workbook).filter_by(id=wb_data["id"]).first()
+        if not wb:
+            wb = Workbook(id=wb_data["id"])
+            self.session.add(wb)
+
+        wb.name = wb_data.get("name", "")
+        wb.luid = wb_data.get("luid")
+        wb.description = wb_data.get("description")
+        wb.uri = wb_data.get("uri")
+        wb.project_name = wb_data.get("projectName", "")
+        wb.contains_unsupported_custom_sql = wb_data.get(
+            "containsUnsupportedCustomSql", False
+        )
+        wb.has_active_warning = wb_data.get("hasActiveWarning", False)
+        wb.vizportal_url_id = wb_data.get("vizportalUrlId")
+
+        owner = wb_data.get("owner", {})
+        if owner:
+            wb.owner = owner.get("username", "")
+            wb.owner_id = owner.get("id")
+
+        # 解析时间字段
+        for time_field, attr_name in [
+            ("createdAt", "created_at"),
+            ("updatedAt", "updated_at"),
+        ]:
+            time_val = wb_data.get(time_field)
+            if time_val:
+                try:
+                    setattr(
+                        wb,
+                        attr_name,
+                        datetime.fromisoformat(time_val.replace("Z", "+00:00")),
+                    )
+                except:
+                    pass
+
+        # 同步数据源到工作簿的关系 (Published)
+        upstream_ds = wb_data.get("upstreamDatasources", [])
+        for ds in upstream_ds:
+            if not ds or not ds.get("id"):
+                continue
+            self._link_datasource_to_workbook(ds["id"], wb_data["id"])
+
+        # 同步嵌入式数据源 (Embedded)
+        embedded_ds = wb_data.get("embeddedDatasources", [])
+        for eds in embedded_ds:
+            if not eds or not eds.get("id"):
+                continue
+
+            upstream_published = eds.get("upstreamDatasources", [])
+            upstream_ds_id = None
+
+            if upstream_published:
+                # 场景1：嵌入式源引用了已发布数据源 (穿透模式)
+                # 将上游发布式数据源关联到工作簿
+                for up_ds in upstream_published:
+                    if up_ds and up_ds.get("id"):
+                        self._link_datasource_to_workbook(
+                            up_ds["id"], wb_data["id"]
+                        )
+                upstream_ds_id = upstream_published[0]["id"]
+
+                # 🆕 场景1也保存嵌入式数据源记录，并设置 source_published_datasource_id
+                self._save_embedded_datasource(
+                    eds, wb_data["id"], source_published_ds_id=upstream_ds_id
+                )
+                # 🔧 修复：场景1也需要建立嵌入式数据源到工作簿的关联
+                self._link_datasource_to_workbook(eds["id"], wb_data["id"])
+            else:
+                # 场景2：完全独立的嵌入式直连源 (保留模式)
+                # 保存该嵌入式数据源，标记 is_embedded=True
+                # 这样工作簿就有了一个关联的 Datasource，字段也有了归属
+                self._save_embedded_datasource(eds, wb_data["id"])
+                # 同时也建立 Datasource -> Workbook 关联 (虽然上面已经在 DB 层面建立了，但这里显式链接)
+                self._link_datasource_to_workbook(eds["id"], wb_data["id"])
+                upstream_ds_id = eds["id"]
+
+            # 同步嵌入式字段
+            eds_fields = eds.get("fields", [])
+            for f_data in eds_fields:
+                self._sync_field(
+                    f_data,
+                    datasource_id=upstream_ds_id,
+                    workbook_id=wb_data["id"],
+                )
+
+        # 同步视图 (sheets + dashboards)
+        for idx, sheet in enumerate(wb_data.get("sheets", [])):
+            if not sheet or not sheet.get("id"):
+                continue
+            view_ids.append(sheet["id"])
+            view = self.session.query(View).filter_by(id=sheet["id"]).first()
+            if not view:
+                view = View(id=sheet["id"])
+                self.session.add(view)
+
+            view.name = sheet.get("name", "")
+            view.luid = sheet.get("luid")
+            view.path = sheet.get("path")
+            view.index = sheet.get("index", idx)
+            view.view_type = "sheet"
+            view.workbook_id = wb_data["id"]
+
+            # 解析时间
+            for time_field, attr_name in [
+                ("createdAt", "created_at"),
+                ("updatedAt", "updated_at"),
+            ]:
+                time_val = sheet.get(time_field)
+                if time_val:
+                    try:
+                        setattr(
+                            view,
+                            attr_name,
+                            datetime.fromisoformat(
+                                time_val.replace("Z", "+00:00")
+                            ),
+                        )
+                    except:
+                        pass
+
+            view_count += 1
+
+        # 同步仪表板 (dashboards)
+        for idx, dashboard in enumerate(wb_data.get("dashboards", [])):
+            if not dashboard or not dashboard.get("id"):
+                continue
+            view_ids.append(dashboard["id"])
+            view = (
+                self.session.query(View).filter_by(id=dashboard["id"]).first()
+            )
+            if not view:
+                view = View(id=dashboard["id"])
+                self.session.add(view)
+
+            view.name = dashboard.get("name", "")
+            view.luid = dashboard.get("luid")
+            view.path = dashboard.get("path")
+            view.index = dashboard.get("index", idx)
+            view.view_type = "dashboard"
+            view.workbook_id = wb_data["id"]
+
+            # 解析时间
+            for time_field, attr_name in [
+                ("createdAt", "created_at"),
+                ("updatedAt", "updated_at"),
+            ]:
+                time_val = dashboard.get(time_field)
+                if time_val:
+                    try:
+                        setattr(
+                            view,
+                            attr_name,
+                            datetime.fromisoformat(
+                                time_val.replace("Z", "+00:00")
+                            ),
+                        )
+                    except:
+                        pass
+
+            # 同步仪表板与 sheet 的关联
+            contained_sheets = dashboard.get("sheets", [])
+            for contained_sheet in contained_sheets:
+                if contained_sheet and contained_sheet.get("id"):
+                    sheet_id = contained_sheet.get("id")
+                    # 检查是否存在
+                    rel = self.session.execute(
+                        select(dashboard_to_sheet).where(
+                            dashboard_to_sheet.c.dashboard_id
+                            == dashboard["id"],
+                            dashboard_to_sheet.c.sheet_id == sheet_id,
+                        )
+                    ).first()
+                    if not rel:
+                        try:
+                            self.session.execute(
+                                dashboard_to_sheet.insert().values(
+                                    dashboard_id=dashboard["id"],
+                                    sheet_id=sheet_id,
+                                    lineage_source="api",
+                                    created_at=datetime.utcnow(),
+                                )
+                            )
+                        except Exception as e:
+                            print(f"  ⚠️ 关联 sheet 失败: {e}")
+                            pass
+
+            view_count += 1
+
+        return view_count
+
+    def _build_table_real_ds_map(self) -> Dict[str, str]:
+        """建立物理表到发布式数据源的映射，用于穿透补齐（仅包含非嵌入式数据源）"""
+        table_real_ds_map = {}
+        ds_to_table_rels = self.session.execute(
+            select(table_to_datasource.c.table_id, table_to_datasource.c.datasource_id)
+            .join(Datasource, Datasource.id == table_to_datasource.c.datasource_id)
+            .where(Datasource.is_embedded == 0)
+        ).fetchall()
+        for tid, dsid in ds_to_table_rels:
+            if tid not in table_real_ds_map:
+                table_real_ds_map[tid] = dsid
+        return table_real_ds_map
 
     def sync_fields(self) -> int:
         """同步字段（含去重逻辑）"""
+        if self.streaming_fields:
+            return self.sync_fields_streaming()
+
         print("\n🔤 同步字段...")
         self._start_sync_log("fields")
 
         try:
-            from backend.models import table_to_datasource, Datasource
-
             # 建立物理表到发布式数据源的映射，用于穿透补齐
-            # 仅包含非嵌入式数据源
-            table_real_ds_map = {}
-            ds_to_table_rels = self.session.execute(
-                select(
-                    table_to_datasource.c.table_id, table_to_datasource.c.datasource_id
-                )
-                .join(Datasource, Datasource.id == table_to_datasource.c.datasource_id)
-                .where(Datasource.is_embedded == 0)
-            ).fetchall()
-            for tid, dsid in ds_to_table_rels:
-                if tid not in table_real_ds_map:
-                    table_real_ds_map[tid] = dsid
+            table_real_ds_map = self._build_table_real_ds_map()
 
             # --- 去重准备开始 ---
             # 缓存已发布的字段：(datasource_id, name) -> field_id
@@ -867,6 +1027,154 @@ class MetadataSync:
             traceback.print_exc()
             return 0
 
+    def sync_fields_streaming(self) -> int:
+        """同步字段（流式有界内存模式）
+
+        与 sync_fields 逻辑一致，但按 GraphQL 批次边拉取边入库：
+        - 不在内存中累积全量字段列表
+        - 数据源解析缓存与已见字段集合为有界 LRU，超限部分溢出到 SQLite 临时文件
+        - 每批提交后释放会话中的字段对象
+        阶段结束时打印进程峰值内存 (RSS)
+        """
+        print("\n🔤 同步字段 (流式模式)...")
+        self._start_sync_log("fields")
+
+        max_items = Config.SYNC_CACHE_MAX_ITEMS
+        spill_dir = os.path.dirname(os.path.abspath(self.db_path))
+        # 已发布数据源解析结果：datasource_id -> 解析到的数据源 ID（未找到为 ""），每个数据源只查询一次
+        resolved_datasources = SpillableCache(max_items, spill_dir, "resolved_datasource")
+        # 本轮见到的字段 ID，用于清理孤立记录
+        seen_ids = SpillableSet(max_items, spill_dir, "seen_field_ids")
+        self.deduplication_map = {}  # skipped_id -> survivor_id（流式模式不产生去重记录）
+
+        try:
+            table_real_ds_map = self._build_table_real_ds_map()
+
+            count = 0
+            calc_count = 0
+            batch_count = 0
+            unresolved_count = 0
+
+            for type_name, batch in self.client.iter_fields():
+                batch_count += 1
+                is_embedded_batch = type_name == "embeddedDatasources"
+
+                for f_data in batch:
+                    if not f_data or not f_data.get("id"):
+                        continue
+
+                    name = f_data.get("name")
+                    is_calc = (
+                        f_data.get("isCalculated")
+                        or f_data.get("__typename") == "CalculatedField"
+                    )
+
+                    if is_embedded_batch:
+                        # 嵌入式字段：不去重，全部保存（去重在 V5 迁移阶段进行）
+                        if f_data.get("workbook"):
+                            f_data["workbook_id"] = f_data["workbook"]["id"]
+                        self._process_single_field(
+                            f_data,
+                            table_real_ds_map,
+                            workbook_id=f_data.get("workbook_id"),
+                        )
+                        if is_calc and name:
+                            calc_count += 1
+                    else:
+                        # 发布式字段：与 sync_fields 一致，只保存所属数据源能解析到的字段
+                        ds_id = f_data.get("datasource_id")
+                        if not ds_id:
+                            unresolved_count += 1
+                            continue
+                        resolved_id = resolved_datasources.get(ds_id)
+                        if resolved_id is None:
+                            ds_info = self.client.fetch_datasource_by_id(ds_id)
+                            resolved_id = ds_info["id"] if ds_info else ""
+                            resolved_datasources[ds_id] = resolved_id
+                        if not resolved_id:
+                            unresolved_count += 1
+                            continue
+
+                        # 为发布式字段设置正确的 datasource_id
+                        f_data["datasource_id"] = resolved_id
+                        self._process_single_field(f_data, table_real_ds_map)
+
+                        if is_calc and name and f_data.get("__typename") == "CalculatedField":
+                            formula = f_data.get("formula") or ""
+                            if "".join(formula.split()):
+                                calc_count += 1
+
+                    seen_ids.add(f_data["id"])
+                    count += 1
+
+                # 每批提交并释放会话中的 ORM 对象，保持内存有界
+                self.session.commit()
+                self._release_session_objects()
+
+                if batch_count % 20 == 0:
+                    rss = peak_rss_mb()
+                    rss_text = f", 峰值内存 {rss:.1f} MB" if rss is not None else ""
+                    print(f"    - 已入库 {count} 个字段{rss_text}")
+
+            self.session.commit()
+
+            # 清理数据库中已不存在的记录
+            self._cleanup_orphaned_fields_streaming(seen_ids)
+
+            self._complete_sync_log(count)
+            print(f"  ✅ 同步 {count} 个字段 (其中 {calc_count} 个计算字段)")
+            if unresolved_count:
+                print(f"  ⏭️ 跳过 {unresolved_count} 个无法解析所属数据源的发布式字段")
+            spilled = resolved_datasources.spilled + seen_ids.spilled
+            if spilled:
+                print(f"  💾 同步缓存溢出到磁盘 {spilled} 条")
+            return count
+
+        except Exception as e:
+            self.session.rollback()
+            self._complete_sync_log(0, str(e))
+            print(f"  ❌ 同步失败: {e}")
+            import traceback
+
+            traceback.print_exc()
+            return 0
+
+        finally:
+            for cache in (resolved_datasources, seen_ids):
+                cache.close()
+            rss = peak_rss_mb()
+            if rss is not None:
+                print(f"  📈 字段同步阶段峰值内存 (RSS): {rss:.1f} MB")
+
+    def _release_session_objects(self):
+        """从会话中移除已提交的字段及物理表/列对象，避免身份映射无限增长"""
+        for obj in list(self.session.identity_map.values()):
+            if isinstance(obj, (Field, DBTable, DBColumn, CalculatedField)):
+                self.session.expunge(obj)
+
+    def _cleanup_orphaned_fields_streaming(self, seen_ids: SpillableSet) -> int:
+        """流式模式下清理孤立字段：逐批比对数据库 ID 与本轮见到的 ID"""
+        if len(seen_ids) == 0:
+            return 0
+
+        orphan_ids = []
+        for (field_id,) in self.session.query(Field.id).yield_per(5000):
+            if field_id not in seen_ids:
+                orphan_ids.append(field_id)
+
+        count = 0
+        chunk_size = 500
+        for i in range(0, len(orphan_ids), chunk_size):
+            chunk = orphan_ids[i : i + chunk_size]
+            for record in self.session.query(Field).filter(Field.id.in_(chunk)).all():
+                self._delete_orphaned_record(Field, record)
+                count += 1
+            self.session.commit()
+
+        if count > 0:
+            print(f"  🧹 清理了 {count} 个已不存在的 Field 记录")
+        return count
+
     def _process_single_field(self, f_data, table_real_ds_map, workbook_id=None):
         """辅助：处理单个字段的保存逻辑"""
         from backend.models import DBTable, DBColumn
@@ -1246,125 +1554,7 @@ class MetadataSync:
             print("  🧹 已清空旧的字段关联关系")
 
             view_fields = self.client.fetch_views_with_fields()
-
-            # 2. 准备查找缓存 (Name + Datasource -> FieldID)
-            # 用于当原始 field_id 是嵌入式副本（已被去重）时，找回已发布的真身
-            from backend.models import Datasource
-
-            print("  - 构建字段查找缓存...")
-
-            # 获取所有字段信息: (datasource_id, name) -> field_id
-            # 修正：加载所有字段（包括嵌入式），避免因过滤导致有效关联被丢弃
-            published_fields_map = {}
-            result = self.session.execute(
-                select(Field.id, Field.name, Field.datasource_id)
-            ).fetchall()
-
-            for fid, fname, fdsid in result:
-                if fdsid and fname:
-                    published_fields_map[(fdsid, fname)] = fid
-
-            # ... (中间注释省略)
-
-            count = 0
-            relinked_count = 0
-            skipped = 0
-
-            # 缓存有效字段ID集合
-            valid_field_ids = set([r[0] for r in result])
-
-            # 为了处理嵌入式数据源ID -> 发布式ID，我们需要一个辅助映射
-            # 因为 view_fields 返回的数据中，field 往往带着嵌入式 DS ID
-            # 我们需要构建: embedded_ds_id -> published_ds_id
-            # 这可以通过 "fetch_fields" 的逻辑复现，或者更简单地：
-            # 在 sync_fields 阶段没有持久化这个映射有点可惜。
-            # 补救策略：
-            # 如果直接找不到 ID，尝试用 (任何发布式DS, name) 匹配？不，太宽泛。
-            # 我们可以尝试匹配 (view.workbook -> upstreamDatasource, name)
-
-            # 构建 Workbook -> Published Datasources 映射
-            wb_ds_map = {}
-            wb_ds_rels = self.session.execute(
-                select(
-                    datasource_to_workbook.c.workbook_id,
-                    datasource_to_workbook.c.datasource_id,
-                )
-            ).fetchall()
-            for wbid, dsid in wb_ds_rels:
-                if wbid not in wb_ds_map:
-                    wb_ds_map[wbid] = []
-                wb_ds_map[wbid].append(dsid)
-
-            for vf in view_fields:
-                field_id = vf.get("field_id")
-                field_name = vf.get("field_name")
-                view_id = vf.get("view_id")
-                workbook_id = vf.get(
-                    "workbook_id"
-                )  # 需要 fetch_views_with_fields 返回 workbook_id
-
-                if not field_id or not view_id:
-                    skipped += 1
-                    continue
-
-                final_field_id = field_id
-
-                # 检查ID是否有效
-                if field_id not in valid_field_ids:
-                    # ID 无效（可能是被去重的嵌入式字段）
-                    found_new_id = None  # 初始化变量
-
-                    # 策略1: 检查去重映射表 (Deduplication Map) - 最准确
-                    # 这是我们在 sync_fields 阶段记录的 "Skipped ID -> Survivor ID"
-                    if field_id in self.deduplication_map:
-                        final_field_id = self.deduplication_map[field_id]
-
-                        # 再次检查 map 出来的 id 是否有效 (防止链式去重或 survivor 也被删除)
-                        if final_field_id in valid_field_ids:
-                            relinked_count += 1
-                            # 继续执行插入，跳过后续匹配逻辑
-                        else:
-                            # 映射的目标也无效？尝试策略2
-                            pass
-
-                    # 策略2: 尝试智能重连 (Name 匹配) - 仅当策略1未成功时
-                    if final_field_id not in valid_field_ids:
-                        if workbook_id and field_name and workbook_id in wb_ds_map:
-                            potential_ds_ids = wb_ds_map[workbook_id]
-                            for p_ds_id in potential_ds_ids:
-                                key = (p_ds_id, field_name)
-                                if key in published_fields_map:
-                                    found_new_id = published_fields_map[key]
-                                    break
-
-                        if found_new_id:
-                            final_field_id = found_new_id
-                            relinked_count += 1
-                        else:
-                            # 确实找不到，放弃
-                            skipped += 1
-                            continue
-
-                # 插入关联 (批量插入优化可留待后续，目前单条插入并忽略错误)
-                # 根据是否经过智能重连设置不同的 lineage_source
-                is_relinked = final_field_id != field_id
-                lineage_source_value = "derived" if is_relinked else "api"
-
-                try:
-                    self.session.execute(
-                        field_to_view.insert().values(
-                            field_id=final_field_id,
-                            view_id=view_id,
-                            used_in_formula=False,
-                            lineage_source=lineage_source_value,
-                            created_at=datetime.utcnow(),
-                        )
-                    )
-                    count += 1
-                except Exception as e:
-                    # 可能是主键冲突（如果逻辑有误导致重复插入）
-                    skipped += 1
-                    continue
+            count, relinked_count, skipped = self._insert_field_to_view(view_fields)
 
             self.session.commit()
             self._complete_sync_log(count)
@@ -1382,14 +1572,137 @@ class MetadataSync:
             traceback.print_exc()
             return 0
 
-    def sync_users(self) -> int:
-        """同步 Tableau 用户"""
-        print("\n👥 同步用户...")
-        self._start_sync_log("users")
+    def _insert_field_to_view(self, view_fields: List[Dict]):
+        """写入字段→视图关联（含智能重连），返回 (写入数, 重连数, 跳过数)"""
+        # 准备查找缓存 (Name + Datasource -> FieldID)
+        # 用于当原始 field_id 是嵌入式副本（已被去重）时，找回已发布的真身
+        from backend.models import Datasource
 
-        try:
-            users = self.client.fetch_users()
-            count = 0
+        print("  - 构建字段查找缓存...")
+
+        # 获取所有字段信息: (datasource_id, name) -> field_id
+        # 修正：加载所有字段（包括嵌入式），避免因过滤导致有效关联被丢弃
+        published_fields_map = {}
+        result = self.session.execute(
+            select(Field.id, Field.name, Field.datasource_id)
+        ).fetchall()
+
+        for fid, fname, fdsid in result:
+            if fdsid and fname:
+                published_fields_map[(fdsid, fname)] = fid
+
+        # ... (中间注释省略)
+
+        count = 0
+        relinked_count = 0
+        skipped = 0
+
+        # 缓存有效字段ID集合
+        valid_field_ids = set([r[0] for r in result])
+
+        # 为了处理嵌入式数据源ID -> 发布式ID，我们需要一个辅助映射
+        # 因为 view_fields 返回的数据中，field 往往带着嵌入式 DS ID
+        # 我们需要构建: embedded_ds_id -> published_ds_id
+        # 这可以通过 "fetch_fields" 的逻辑复现，或者更简单地：
+        # 在 sync_fields 阶段没有持久化这个映射有点可惜。
+        # 补救策略：
+        # 如果直接找不到 ID，尝试用 (任何发布式DS, name) 匹配？不，太宽泛。
+        # 我们可以尝试匹配 (view.workbook -> upstreamDatasource, name)
+
+        # 构建 Workbook -> Published Datasources 映射
+        wb_ds_map = {}
+        wb_ds_rels = self.session.execute(
+            select(
+                datasource_to_workbook.c.workbook_id,
+                datasource_to_workbook.c.datasource_id,
+            )
+        ).fetchall()
+        for wbid, dsid in wb_ds_rels:
+            if wbid not in wb_ds_map:
+                wb_ds_map[wbid] = []
+            wb_ds_map[wbid].append(dsid)
+
+        for vf in view_fields:
+            field_id = vf.get("field_id")
+            field_name = vf.get("field_name")
+            view_id = vf.get("view_id")
+            workbook_id = vf.get(
+                "workbook_id"
+            )  # 需要 fetch_views_with_fields 返回 workbook_id
+
+            if not field_id or not view_id:
+                skipped += 1
+                continue
+
+            final_field_id = field_id
+
+            # 检查ID是否有效
+            if field_id not in valid_field_ids:
+                # ID 无效（可能是被去重的嵌入式字段）
+                found_new_id = None  # 初始化变量
+
+                # 策略1: 检查去重映射表 (Deduplication Map) - 最准确
+                # 这是我们在 sync_fields 阶段记录的 "Skipped ID -> Survivor ID"
+                if field_id in self.deduplication_map:
+                    final_field_id = self.deduplication_map[field_id]
+
+                    # 再次检查 map 出来的 id 是否有效 (防止链式去重或 survivor 也被删除)
+                    if final_field_id in valid_field_ids:
+                        relinked_count += 1
+                        # 继续执行插入，跳过后续匹配逻辑
+                    else:
+                        # 映射的目标也无效？尝试策略2
+                        pass
+
+                # 策略2: 尝试智能重连 (Name 匹配) - 仅当策略1未成功时
+                if final_field_id not in valid_field_ids:
+                    if workbook_id and field_name and workbook_id in wb_ds_map:
+                        potential_ds_ids = wb_ds_map[workbook_id]
+                        for p_ds_id in potential_ds_ids:
+                            key = (p_ds_id, field_name)
+                            if key in published_fields_map:
+                                found_new_id = published_fields_map[key]
+                                break
+
+                    if found_new_id:
+                        final_field_id = found_new_id
+                        relinked_count += 1
+                    else:
+                        # 确实找不到，放弃
+                        skipped += 1
+                        continue
+
+            # 插入关联 (批量插入优化可留待后续，目前单条插入并忽略错误)
+            # 根据是否经过智能重连设置不同的 lineage_source
+            is_relinked = final_field_id != field_id
+            lineage_source_value = "derived" if is_relinked else "api"
+
+            try:
+                self.session.execute(
+                    field_to_view.insert().values(
+                        field_id=final_field_id,
+                        view_id=view_id,
+                        used_in_formula=False,
+                        lineage_source=lineage_source_value,
+                        created_at=datetime.utcnow(),
+                    )
+                )
+                count += 1
+            except Exception as e:
+                # 可能是主键冲突（如果逻辑有误导致重复插入）
+                skipped += 1
+                continue
+
+        return count, relinked_count, skipped
+
+    def sync_users(self) -> int:
+        """同步 Tableau 用户"""
+        print("\n👥 同步用户...")
+        self._start_sync_log("users")
+
+        try:
+            users = self.client.fetch_users()
+            count = 0
 
             for u_data in users:
                 if not u_data or not u_data.get("id"):
@@ -1478,57 +1791,10 @@ class MetadataSync:
             calc_fields = self.session.query(CalculatedField).all()
 
             # 构建字段索引 (Name -> ID lookup cache)
-            all_fields = self.session.query(Field).all()
-            field_map = {}  # (datasource_id, name) -> field_id
-            global_field_map = {}  # name -> field_id (fallback)
-
-            for f in all_fields:
-                key = (f.datasource_id, f.name)
-                field_map[key] = f.id
-                global_field_map[f.name] = f.id
+            field_map, global_field_map = self._build_field_name_maps()
 
             for calc in calc_fields:
-                formula = calc.formula
-                if not formula:
-                    continue
-
-                # A. 识别 Metric
-                # 规则: 计算字段 且 Role=Measure
-                if calc.role == "measure":
-                    metric = Metric(
-                        id=calc.id,
-                        name=calc.name,
-                        description=calc.description,
-                        formula=formula,
-                        metric_type="Calculated",
-                        owner=None,  # 暂不获取 Owner
-                    )
-                    self.session.merge(metric)
-
-                # B. 解析依赖 (后端持久化)
-                refs = re.findall(r"\[(.*?)\]", formula)
-                unique_refs = set(refs)
-
-                for ref_name in unique_refs:
-                    dep_id = None
-
-                    # 1. 尝试同数据源匹配
-                    if calc.datasource_id:
-                        dep_id = field_map.get((calc.datasource_id, ref_name))
-
-                    # 2. 尝试全局匹配
-                    if not dep_id:
-                        dep_id = global_field_map.get(ref_name)
-
-                    # 3. 创建依赖记录
-                    dependency = FieldDependency(
-                        source_field_id=calc.id,
-                        dependency_field_id=dep_id,
-                        dependency_name=ref_name,
-                        dependency_type="formula",
-                    )
-                    self.session.add(dependency)
-                    count += 1
+                count += self._derive_calc_dependencies(calc, field_map, global_field_map)
 
             self.session.commit()
             print(f"  ✅ 同步 {count} 条依赖关系")
@@ -1542,6 +1808,64 @@ class MetadataSync:
             traceback.print_exc()
             return 0
 
+    def _build_field_name_maps(self):
+        """构建字段名称索引：((datasource_id, name) -> field_id, name -> field_id)"""
+        field_map = {}  # (datasource_id, name) -> field_id
+        global_field_map = {}  # name -> field_id (fallback)
+        for f_id, f_name, f_ds_id in self.session.execute(
+            select(Field.id, Field.name, Field.datasource_id)
+        ):
+            field_map[(f_ds_id, f_name)] = f_id
+            global_field_map[f_name] = f_id
+        return field_map, global_field_map
+
+    def _derive_calc_dependencies(self, calc, field_map, global_field_map) -> int:
+        """识别指标并解析单个计算字段的公式依赖，返回写入的依赖数"""
+        formula = calc.formula
+        if not formula:
+            return 0
+        count = 0
+
+        # A. 识别 Metric
+        # 规则: 计算字段 且 Role=Measure
+        if calc.role == "measure":
+            metric = Metric(
+                id=calc.id,
+                name=calc.name,
+                description=calc.description,
+                formula=formula,
+                metric_type="Calculated",
+                owner=None,  # 暂不获取 Owner
+            )
+            self.session.merge(metric)
+
+        # B. 解析依赖 (后端持久化)
+        refs = re.findall(r"\[(.*?)\]", formula)
+        unique_refs = set(refs)
+
+        for ref_name in unique_refs:
+            dep_id = None
+
+            # 1. 尝试同数据源匹配
+            if calc.datasource_id:
+                dep_id = field_map.get((calc.datasource_id, ref_name))
+
+            # 2. 尝试全局匹配
+            if not dep_id:
+                dep_id = global_field_map.get(ref_name)
+
+            # 3. 创建依赖记录
+            dependency = FieldDependency(
+                source_field_id=calc.id,
+                dependency_field_id=dep_id,
+                dependency_name=ref_name,
+                dependency_type="formula",
+            )
+            self.session.add(dependency)
+            count += 1
+
+        return count
+
     def _link_datasource_to_workbook(self, datasource_id: str, workbook_id: str):
         """建立数据源与工作簿的关联"""
         rel = self.session.execute(
@@ -1617,93 +1941,658 @@ class MetadataSync:
             field.is_hidden = f_data.get("isHidden") or False
             # 嵌入式列通常没有 upstreamColumns 因为它是直接连接
 
-    def sync_all(self):
-        """全量同步所有实体"""
+    def sync_all(self, run_type: str = "full"):
+        """全量同步所有实体
+
+        Args:
+            run_type: 运行级日志类型（增量同步探测到变化后也走全量流程，记为 incremental）
+
+        Returns:
+            本次运行的 sync_run_id
+        """
         print("=" * 60)
         print("🚀 开始全量同步 Tableau Metadata")
         print("=" * 60)
 
         start_time = datetime.now()
 
-        # 按依赖顺序同步
-        user_count = self.sync_users()  # 先同步用户
-        project_count = self.sync_projects()  # 同步项目
-        db_count = self.sync_databases()
-        table_count = self.sync_tables()
-        ds_count = self.sync_datasources()
-        wb_count = self.sync_workbooks()
-        field_count = self.sync_fields()
-        calc_count = self.sync_calculated_fields()
-        calc_count = self.sync_calculated_fields()
-        ftv_count = self.sync_field_to_view()
-        lineage_count = self.sync_lineage()
-
-        # 自行执行四表架构迁移与统计更新 (移至最后)
-        pass
-
-        duration = (datetime.now() - start_time).total_seconds()
-
-        print("\n" + "=" * 60)
-        print("📈 同步完成统计")
+        # 运行级日志 + 变更日志快照（同步前）
+        run_id = self._start_run_log(run_type)
+        try:
+            journal = ChangeJournal(self.session)
+            before_snapshot = journal.snapshot()
+
+            # 按依赖顺序同步
+            user_count = self._run_stage("users", self.sync_users)  # 先同步用户
+            project_count = self._run_stage("projects", self.sync_projects)  # 同步项目
+            db_count = self._run_stage("databases", self.sync_databases)
+            table_count = self._run_stage("tables", self.sync_tables)
+            ds_count = self._run_stage("datasources", self.sync_datasources)
+            wb_count = self._run_stage("workbooks", self.sync_workbooks)
+            field_count = self._run_stage("fields", self.sync_fields)
+            self._stage_started("calculated_fields")
+            calc_count = self.sync_calculated_fields()
+            calc_count = self.sync_calculated_fields()
+            self._stage_finished("calculated_fields", calc_count)
+            ftv_count = self._run_stage("field_to_view", self.sync_field_to_view)
+            lineage_count = self._run_stage("lineage", self.sync_lineage)
+
+            # 自行执行四表架构迁移与统计更新 (移至最后)
+            pass
+
+            duration = (datetime.now() - start_time).total_seconds()
+
+            print("\n" + "=" * 60)
+            print("📈 同步完成统计")
+            print("=" * 60)
+            print(f"  用户:   {user_count}")
+            print(f"  项目:   {project_count}")
+            print(f"  数据库: {db_count}")
+            print(f"  数据表: {table_count}")
+            print(f"  数据源: {ds_count}")
+            print(f"  工作簿: {wb_count}")
+            print(f"  血缘:   {lineage_count}")
+            print(f"  字段:   {field_count}")
+            print(f"  计算字段: {calc_count}")
+            print(f"  字段→视图: {ftv_count}")
+            print(f"  耗时: {duration:.2f} 秒")
+            print("=" * 60)
+
+            # 同步视图使用统计（通过 REST API）
+            self._run_stage("views_usage", self.sync_views_usage)
+
+            # 计算预存统计字段
+            self._run_stage("stats", self.calculate_stats)
+
+            # 🚀 最后：自动执行四表架构迁移与统计更新
+            # 必须在 calculate_stats 之后执行，以确保迁移的数据包含最新的 usage_count 等统计
+            print("-" * 30)
+            print("🛠 自动触发 V5 数据迁移...")
+            self._stage_started("v5_migration")
+            try:
+                # 确保当前会话已提交，避免锁竞争
+                self.session.commit()
+                split_fields_table_v5.main(db_path=self.db_path)
+            except Exception as e:
+                self.stage_errors["v5_migration"] = str(e)
+                print(f"❌ V5 迁移失败: {e}")
+                import traceback
+
+                traceback.print_exc()
+            self._stage_finished("v5_migration")
+
+            # 🔎 重建全文搜索索引（依赖四表架构）
+            self._run_stage("search_index", self.rebuild_search_index)
+
+            # 🔢 预计算未筛选的列表总数与分面直方图（分页接口直接读取）
+            self._run_stage("list_totals", self.refresh_list_totals)
+            self._run_stage("facets", self.refresh_facet_counts)
+
+            # 📝 写入变更日志（同步后快照与同步前比对）
+            self._stage_started("change_journal")
+            change_summary = {}
+            try:
+                change_summary = journal.record(
+                    run_id, before_snapshot, journal.snapshot()
+                )
+                del before_snapshot
+                print(f"📝 变更日志 (run #{run_id}):")
+                for entity_type, op_counts in sorted(change_summary.items()):
+                    if any(op_counts.values()):
+                        print(
+                            f"  {entity_type}: +{op_counts['insert']} ~{op_counts['update']} -{op_counts['delete']}"
+                        )
+            except Exception as e:
+                self.session.rollback()
+                print(f"⚠️ 变更日志写入失败: {e}")
+
+            total_changes = sum(sum(c.values()) for c in change_summary.values())
+            self._stage_finished("change_journal", total_changes)
+
+            # 📊 生成同步报告
+            end_time = datetime.now()
+            sync_stats = {
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+                "duration": (end_time - start_time).total_seconds(),
+                "status": "completed",
+                "user_count": user_count,
+                "project_count": project_count,
+                "db_count": db_count,
+                "table_count": table_count,
+                "ds_count": ds_count,
+                "wb_count": wb_count,
+                "field_count": field_count,
+                "calc_count": calc_count,
+                "ftv_count": ftv_count,
+                "lineage_count": lineage_count,
+                "sync_run_id": run_id,
+                "changes": change_summary,
+            }
+
+            self._stage_started("report")
+            try:
+                report_dir = os.path.join(os.path.dirname(self.db_path), "reports")
+                reporter = SyncReportGenerator(self.session, sync_stats, telemetry=self.telemetry)
+                reporter.generate_report(output_dir=report_dir)
+            except Exception as e:
+                print(f"⚠️ 报告生成失败: {e}")
+            self._stage_finished("report")
+        except Exception as e:
+            self.session.rollback()
+            self._complete_run_log(0, str(e))
+            raise
+
+        self._complete_run_log(total_changes)
+        return run_id
+
+    def detect_remote_changes(self) -> Dict[str, Dict[str, int]]:
+        """比对 Tableau 端与本地的工作簿/已发布数据源 updatedAt，统计新增、变化、删除数量"""
+        markers = self.client.fetch_change_markers()
+        local = {
+            "workbook": dict(self.session.query(Workbook.id, Workbook.updated_at).all()),
+            "datasource": dict(
+                self.session.query(Datasource.id, Datasource.updated_at)
+                .filter(Datasource.is_embedded == 0)
+                .all()
+            ),
+        }
+
+        def _normalize(value):
+            if not value:
+                return None
+            if isinstance(value, str):
+                try:
+                    value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+                except ValueError:
+                    return value
+            return value.replace(tzinfo=None, microsecond=0)
+
+        summary = {}
+        for entity_type, remote in markers.items():
+            local_map = local.get(entity_type, {})
+            new = sum(1 for entity_id in remote if entity_id not in local_map)
+            changed = sum(
+                1
+                for entity_id, updated_at in remote.items()
+                if entity_id in local_map
+                and _normalize(updated_at) != _normalize(local_map[entity_id])
+            )
+            removed = sum(1 for entity_id in local_map if entity_id not in remote)
+            summary[entity_type] = {"new": new, "changed": changed, "removed": removed}
+        return summary
+
+    def sync_incremental(self):
+        """增量同步：先探测工作簿/数据源的变更，无变化时只记录运行日志，不请求全量元数据
+
+        Returns:
+            本次运行的 sync_run_id
+        """
         print("=" * 60)
-        print(f"  用户:   {user_count}")
-        print(f"  项目:   {project_count}")
-        print(f"  数据库: {db_count}")
-        print(f"  数据表: {table_count}")
-        print(f"  数据源: {ds_count}")
-        print(f"  工作簿: {wb_count}")
-        print(f"  血缘:   {lineage_count}")
-        print(f"  字段:   {field_count}")
-        print(f"  计算字段: {calc_count}")
-        print(f"  字段→视图: {ftv_count}")
-        print(f"  耗时: {duration:.2f} 秒")
+        print("🔍 增量同步：探测 Tableau 端变更")
         print("=" * 60)
 
-        # 同步视图使用统计（通过 REST API）
-        self.sync_views_usage()
+        self._stage_started("change_probe")
+        changes = self.detect_remote_changes()
+        total = sum(sum(c.values()) for c in changes.values())
+        for entity_type, op_counts in changes.items():
+            print(
+                f"  {entity_type}: 新增 {op_counts['new']}, 变化 {op_counts['changed']}, 删除 {op_counts['removed']}"
+            )
+        self._stage_finished("change_probe", total)
+
+        if total == 0:
+            run_id = self._start_run_log("incremental")
+            self._complete_run_log(0)
+            print("  ✅ 无变化，跳过全量拉取")
+            return run_id
+
+        return self.sync_all(run_type="incremental")
+
+    def sync_usage(self):
+        """仅刷新视图使用统计（REST API），并写入变更日志
+
+        Returns:
+            本次运行的 sync_run_id
+        """
+        run_id = self._start_run_log("usage")
+        try:
+            journal = ChangeJournal(self.session, {"view": "views"})
+            before_snapshot = journal.snapshot()
+
+            updated = self._run_stage("views_usage", self.sync_views_usage)
+
+            self._stage_started("change_journal")
+            change_summary = {}
+            try:
+                change_summary = journal.record(
+                    run_id, before_snapshot, journal.snapshot()
+                )
+            except Exception as e:
+                self.session.rollback()
+                print(f"⚠️ 变更日志写入失败: {e}")
+            total_changes = sum(sum(c.values()) for c in change_summary.values())
+            self._stage_finished("change_journal", total_changes)
+        except Exception as e:
+            self.session.rollback()
+            self._complete_run_log(0, str(e))
+            raise
+
+        self._complete_run_log(updated)
+        return run_id
 
-        # 计算预存统计字段
-        self.calculate_stats()
+    # ==================== 定向刷新 ====================
 
-        # 🚀 最后：自动执行四表架构迁移与统计更新
-        # 必须在 calculate_stats 之后执行，以确保迁移的数据包含最新的 usage_count 等统计
-        print("-" * 30)
-        print("🛠 自动触发 V5 数据迁移...")
+    def resolve_asset_id(self, asset_type: str, luid: str) -> Optional[str]:
+        """将 REST LUID 解析为 Metadata API ID：优先查本地（已删除的资产只能在本地找到），再查 Tableau"""
+        model = Workbook if asset_type == "workbook" else Datasource
+        local_id = self.session.execute(
+            select(model.id).where(model.luid == luid)
+        ).scalar()
+        return local_id or self.client.fetch_asset_id_by_luid(asset_type, luid)
+
+    def refresh_workbook(self, workbook_id: str):
+        """定向刷新单个工作簿：只拉取该工作簿的子图（嵌入式数据源、字段、视图、字段实例），
+        增量更新其字段、关联、血缘、统计与四表架构
+
+        Returns:
+            本次运行的 sync_run_id
+        """
+        print(f"🎯 定向刷新工作簿: {workbook_id}")
+        run_id = self._start_run_log("workbook_refresh")
         try:
-            # 确保当前会话已提交，避免锁竞争
+            self._stage_started("asset")
+            old_field_ids = self._scalars(select(Field.id).where(Field.workbook_id == workbook_id))
+            old_view_ids = self._scalars(select(View.id).where(View.workbook_id == workbook_id))
+            old_ds_ids = self._scalars(
+                select(datasource_to_workbook.c.datasource_id).where(
+                    datasource_to_workbook.c.workbook_id == workbook_id
+                )
+            )
+            # 变更日志范围：工作簿、关联数据源、视图，以及字段与关联数据源的字段（统计随刷新变化）
+            journal = ChangeJournal(self.session)
+            journal_scope = self._journal_scope(
+                workbook_ids=[workbook_id],
+                datasource_ids=old_ds_ids,
+                view_ids=old_view_ids,
+                field_ids=old_field_ids + self._datasource_field_ids(old_ds_ids),
+            )
+            before_snapshot = journal.snapshot(journal_scope)
+
+            wb_data = self.client.fetch_workbook_detail(workbook_id)
+            view_ids: List[str] = []
+            field_ids: List[str] = []
+            if wb_data is None:
+                print("  ⚠️ Tableau 端已不存在该工作簿，清理本地记录")
+            else:
+                # 数据源关联以本次结果为准（仅重建 API 来源的关联）
+                self.session.execute(
+                    datasource_to_workbook.delete().where(
+                        datasource_to_workbook.c.workbook_id == workbook_id,
+                        datasource_to_workbook.c.lineage_source == "api",
+                    )
+                )
+                self._save_workbook(wb_data, view_ids)
+                self.session.flush()
+
+                embedded = wb_data.get("embeddedDatasources") or []
+                detail_types = {
+                    f["id"]: f.get("dataType")
+                    for eds in embedded
+                    if eds
+                    for f in eds.get("fields") or []
+                    if f and f.get("id")
+                }
+                fields = self.client.fetch_fields_for_datasources(embedded_datasources=embedded)
+                field_ids = self._save_refreshed_fields(fields, detail_types, workbook_id)
+
+            self._cleanup_orphaned_records(
+                Field, field_ids, filter_condition=(Field.workbook_id == workbook_id)
+            )
+            self._cleanup_orphaned_records(
+                View, view_ids, filter_condition=(View.workbook_id == workbook_id)
+            )
+            if wb_data is None:
+                self._cleanup_orphaned_records(
+                    Workbook, [], filter_condition=(Workbook.id == workbook_id)
+                )
             self.session.commit()
-            split_fields_table_v5.main()
+            self._stage_finished("asset", len(field_ids))
+
+            # 字段→视图：只重建该工作簿视图的关联
+            self._stage_started("field_to_view")
+            all_view_ids = list(dict.fromkeys(old_view_ids + view_ids))
+            self._delete_in(field_to_view.c.view_id, all_view_ids, field_to_view)
+            link_count = 0
+            if wb_data is not None:
+                view_fields = self.client.fetch_views_with_fields(workbook_ids=[workbook_id])
+                link_count, _, _ = self._insert_field_to_view(view_fields)
+            self.session.commit()
+            self._stage_finished("field_to_view", link_count)
+
+            new_ds_ids = self._scalars(
+                select(datasource_to_workbook.c.datasource_id).where(
+                    datasource_to_workbook.c.workbook_id == workbook_id
+                )
+            )
+            ds_ids = list(dict.fromkeys(old_ds_ids + new_ds_ids))
+            related_ids = self._scalars(
+                select(field_to_view.c.field_id).where(field_to_view.c.view_id.in_(view_ids))
+            ) + self._datasource_field_ids(ds_ids)
+            self._refresh_derived(
+                field_ids=list(dict.fromkeys(old_field_ids + field_ids)),
+                related_ids=related_ids,
+                view_ids=all_view_ids,
+                workbook_ids=[workbook_id] if wb_data is not None else [],
+                datasource_ids=ds_ids,
+            )
+            self._record_refresh_changes(
+                run_id, journal, before_snapshot,
+                self._journal_scope(
+                    base=journal_scope,
+                    datasource_ids=new_ds_ids,
+                    view_ids=view_ids,
+                    field_ids=field_ids,
+                ),
+            )
         except Exception as e:
-            print(f"❌ V5 迁移失败: {e}")
-            import traceback
+            self.session.rollback()
+            self._complete_run_log(0, str(e))
+            raise
 
-            traceback.print_exc()
+        self._complete_run_log(len(field_ids))
+        return run_id
+
+    def refresh_datasource(self, datasource_id: str):
+        """定向刷新单个已发布数据源：只拉取该数据源及其字段，增量更新字段、血缘、统计与四表架构
 
-        # 📊 生成同步报告
-        end_time = datetime.now()
-        sync_stats = {
-            "start_time": start_time.isoformat(),
-            "end_time": end_time.isoformat(),
-            "duration": (end_time - start_time).total_seconds(),
-            "status": "completed",
-            "user_count": user_count,
-            "project_count": project_count,
-            "db_count": db_count,
-            "table_count": table_count,
-            "ds_count": ds_count,
-            "wb_count": wb_count,
-            "field_count": field_count,
-            "calc_count": calc_count,
-            "ftv_count": ftv_count,
-            "lineage_count": lineage_count,
+        Returns:
+            本次运行的 sync_run_id
+        """
+        print(f"🎯 定向刷新数据源: {datasource_id}")
+        run_id = self._start_run_log("datasource_refresh")
+        published_scope = (Field.datasource_id == datasource_id) & Field.workbook_id.is_(None)
+        try:
+            self._stage_started("asset")
+            old_field_ids = self._scalars(select(Field.id).where(published_scope))
+            wb_ids = self._scalars(
+                select(datasource_to_workbook.c.workbook_id).where(
+                    datasource_to_workbook.c.datasource_id == datasource_id
+                )
+            )
+            ds_ids = [datasource_id] + self._scalars(
+                select(Datasource.id).where(
+                    Datasource.source_published_datasource_id == datasource_id
+                )
+            )
+            # 变更日志范围：数据源及引用它的嵌入式数据源、使用它的工作簿、其已发布字段
+            journal = ChangeJournal(self.session)
+            journal_scope = self._journal_scope(
+                workbook_ids=wb_ids, datasource_ids=ds_ids, field_ids=old_field_ids
+            )
+            before_snapshot = journal.snapshot(journal_scope)
+
+            found = self.client.fetch_datasources(ds_id=datasource_id)
+            ds_data = next((d for d in found or [] if d and d.get("id") == datasource_id), None)
+            field_ids: List[str] = []
+            if ds_data is None:
+                print("  ⚠️ Tableau 端已不存在该数据源，清理本地记录")
+            else:
+                # 上游表关联以本次结果为准（仅重建 API 来源的关联）
+                self.session.execute(
+                    table_to_datasource.delete().where(
+                        table_to_datasource.c.datasource_id == datasource_id,
+                        table_to_datasource.c.lineage_source == "api",
+                    )
+                )
+                self._save_datasource(ds_data)
+                self.session.flush()
+
+                fields = self.client.fetch_fields_for_datasources(published_ids=[datasource_id])
+                field_ids = self._save_refreshed_fields(fields, {}, None)
+
+            self._cleanup_orphaned_records(Field, field_ids, filter_condition=published_scope)
+            if ds_data is None:
+                self._cleanup_orphaned_records(
+                    Datasource, [], filter_condition=(Datasource.id == datasource_id)
+                )
+            self.session.commit()
+            self._stage_finished("asset", len(field_ids))
+
+            # 已发布字段 ID 稳定，视图关联无需重新拉取（已删除字段的关联随字段清理）
+            self._stage_started("field_to_view")
+            self._stage_finished("field_to_view", 0)
+
+            self._refresh_derived(
+                field_ids=list(dict.fromkeys(old_field_ids + field_ids)),
+                related_ids=[],
+                view_ids=[],
+                workbook_ids=wb_ids,
+                datasource_ids=ds_ids if ds_data is not None else ds_ids[1:],
+            )
+            self._record_refresh_changes(
+                run_id, journal, before_snapshot,
+                self._journal_scope(base=journal_scope, field_ids=field_ids),
+            )
+        except Exception as e:
+            self.session.rollback()
+            self._complete_run_log(0, str(e))
+            raise
+
+        self._complete_run_log(len(field_ids))
+        return run_id
+
+    def _datasource_field_ids(self, datasource_ids: List[str]) -> List[str]:
+        return [
+            fid
+            for chunk in _chunked(datasource_ids)
+            for fid in self._scalars(select(Field.id).where(Field.datasource_id.in_(chunk)))
+        ]
+
+    @staticmethod
+    def _journal_scope(base: Optional[Dict[str, List[str]]] = None, workbook_ids=(),
+                       datasource_ids=(), view_ids=(), field_ids=()) -> Dict[str, List[str]]:
+        """定向刷新的变更日志范围 {entity_type: ids}；指标与字段同 ID。
+        刷新后的范围在刷新前范围上追加本次写入的 ID（刷新前不在范围内的记为新增）"""
+        base = base or {}
+        added = {
+            "workbook": workbook_ids,
+            "datasource": datasource_ids,
+            "view": view_ids,
+            "field": field_ids,
+            "metric": field_ids,
         }
+        return {
+            entity_type: list(dict.fromkeys(list(base.get(entity_type, [])) + list(ids)))
+            for entity_type, ids in added.items()
+        }
+
+    def _record_refresh_changes(self, run_id: int, journal: ChangeJournal, before_snapshot,
+                                scope: Dict[str, List[str]]):
+        """定向刷新的变更日志阶段：按范围快照并与刷新前比对，写入本次 run_id"""
+        self._stage_started("change_journal")
+        change_summary = {}
+        try:
+            change_summary = journal.record(run_id, before_snapshot, journal.snapshot(scope))
+        except Exception as e:
+            self.session.rollback()
+            print(f"⚠️ 变更日志写入失败: {e}")
+        total_changes = sum(sum(c.values()) for c in change_summary.values())
+        self._stage_finished("change_journal", total_changes)
+
+    def _save_refreshed_fields(self, fields: List[Dict], detail_types: Dict[str, str],
+                               workbook_id: Optional[str]) -> List[str]:
+        """写入定向刷新拉取到的字段，返回字段 ID 列表
+
+        字段批量查询不含 dataType（全量同步由计算字段阶段补齐），
+        这里用工作簿详情中的类型或本地已有类型补齐，避免刷新后类型被清空。
+        """
+        ids = [f["id"] for f in fields if f and f.get("id")]
+        previous_types = {}
+        for chunk in _chunked(ids):
+            previous_types.update(
+                self.session.execute(
+                    select(Field.id, Field.data_type).where(Field.id.in_(chunk))
+                ).all()
+            )
+
+        table_real_ds_map = self._build_table_real_ds_map()
+        for f_data in fields:
+            if not f_data or not f_data.get("id"):
+                continue
+            self._process_single_field(f_data, table_real_ds_map, workbook_id=workbook_id)
+        self.session.flush()
+
+        for chunk in _chunked(ids):
+            for field in self.session.query(Field).filter(Field.id.in_(chunk)):
+                if not field.data_type:
+                    field.data_type = (
+                        detail_types.get(field.id) or previous_types.get(field.id) or ""
+                    )
+        return ids
+
+    def _refresh_derived(self, field_ids: List[str], related_ids: List[str], view_ids: List[str],
+                         workbook_ids: List[str], datasource_ids: List[str]):
+        """定向刷新的后续阶段：按范围重算依赖/指标、预存统计、完整血缘与四表架构
+
+        field_ids 为刷新范围内的字段（含已删除的），related_ids 为实例不变但关联可能变化的字段。
+        """
+        present_ids = set()
+        for chunk in _chunked(field_ids):
+            present_ids.update(self._scalars(select(Field.id).where(Field.id.in_(chunk))))
+
+        # 血缘：重建范围内计算字段的公式依赖与指标
+        self._stage_started("lineage")
+        dependency_targets = self._dependency_targets(field_ids)
+        for chunk in _chunked(field_ids):
+            self.session.query(FieldDependency).filter(
+                FieldDependency.source_field_id.in_(chunk)
+            ).delete(synchronize_session=False)
+            self.session.query(Metric).filter(Metric.id.in_(chunk)).delete(
+                synchronize_session=False
+            )
+        field_map, global_field_map = self._build_field_name_maps()
+        dep_count = 0
+        for chunk in _chunked(present_ids):
+            calcs = self.session.query(Field).filter(
+                Field.id.in_(chunk), Field.is_calculated == True
+            )
+            for calc in calcs:
+                dep_count += self._derive_calc_dependencies(calc, field_map, global_field_map)
+        self.session.flush()
+        dependency_targets += self._dependency_targets(field_ids)
+        self.session.commit()
+        self._stage_finished("lineage", dep_count)
+
+        scope_ids = list(dict.fromkeys(list(present_ids) + related_ids + dependency_targets))
+
+        # 预存统计：仅受影响的工作簿、数据源与字段
+        self._stage_started("stats")
+        for chunk in _chunked(workbook_ids):
+            for wb in self.session.query(Workbook).filter(Workbook.id.in_(chunk)):
+                self._update_workbook_stats(wb)
+        for chunk in _chunked(datasource_ids):
+            for ds in self.session.query(Datasource).filter(Datasource.id.in_(chunk)):
+                self._update_datasource_stats(ds)
+        self._update_usage_counts(scope_ids)
+        self.session.commit()
+        self._compute_full_lineage(scope_ids)
+        self.session.commit()
+        self._stage_finished("stats", len(scope_ids))
+
+        # 四表架构：增量维护（从未迁移过时退化为全量迁移）
+        self._stage_started("v5_migration")
+        old_hashes = self._formula_hashes(field_ids)
+        refreshed = split_fields_table_v5.refresh_fields(
+            self.session, field_ids, related_field_ids=scope_ids, view_ids=view_ids
+        )
+        self.session.commit()
+        if not refreshed:
+            split_fields_table_v5.main(db_path=self.db_path)
+        else:
+            # 公式查重：新旧公式哈希涉及的全部计算字段
+            hashes = list(set(old_hashes + self._formula_hashes(field_ids)))
+            self._update_formula_duplicates([
+                cf
+                for chunk in _chunked(hashes)
+                for cf in self.session.query(CalculatedField).filter(
+                    CalculatedField.formula_hash.in_(chunk)
+                )
+            ])
+            self.session.commit()
+        self._stage_finished("v5_migration")
+
+        self._run_stage("search_index", self.rebuild_search_index)
+        self._run_stage("list_totals", self.refresh_list_totals)
+        self._run_stage("facets", self.refresh_facet_counts)
+
+    def rebuild_search_index(self) -> int:
+        """重建全文搜索索引；失败时记录阶段错误，不影响同步结果"""
+        try:
+            count = search_index.rebuild_search_index(self.session)
+            self.session.commit()
+            return count
+        except Exception as e:
+            self.session.rollback()
+            self.stage_errors["search_index"] = str(e)
+            print(f"⚠️ 搜索索引重建失败: {e}")
+            return 0
 
+    def refresh_list_totals(self) -> int:
+        """预计算未筛选的列表总数；失败时记录阶段错误，不影响同步结果"""
         try:
-            report_dir = os.path.join(os.path.dirname(self.db_path), "reports")
-            reporter = SyncReportGenerator(self.session, sync_stats)
-            reporter.generate_report(output_dir=report_dir)
+            count = counts.refresh_list_totals(self.session)
+            self.session.commit()
+            return count
         except Exception as e:
-            print(f"⚠️ 报告生成失败: {e}")
+            self.session.rollback()
+            self.stage_errors["list_totals"] = str(e)
+            print(f"⚠️ 列表总数计算失败: {e}")
+            return 0
+
+    def refresh_facet_counts(self) -> int:
+        """预计算未筛选的分面直方图；失败时记录阶段错误，不影响同步结果"""
+        try:
+            count = facets.refresh_facet_counts(self.session)
+            self.session.commit()
+            return count
+        except Exception as e:
+            self.session.rollback()
+            self.stage_errors["facets"] = str(e)
+            print(f"⚠️ 分面直方图计算失败: {e}")
+            return 0
+
+    def _formula_hashes(self, field_ids: List[str]) -> List[str]:
+        hashes = []
+        for chunk in _chunked(field_ids):
+            hashes += self._scalars(
+                select(CalculatedField.formula_hash).where(
+                    CalculatedField.id.in_(chunk), CalculatedField.formula_hash.isnot(None)
+                )
+            )
+        return hashes
+
+    def _dependency_targets(self, source_ids: List[str]) -> List[str]:
+        """范围内计算字段所依赖的字段（其 metric_usage_count 会随依赖变化）"""
+        targets = []
+        for chunk in _chunked(source_ids):
+            rows = self.session.execute(
+                select(FieldDependency.dependency_field_id, FieldDependency.dependency_name)
+                .where(FieldDependency.source_field_id.in_(chunk))
+            ).all()
+            targets += [dep_id for dep_id, _ in rows if dep_id]
+            # 未解析到 ID 的依赖按名称计数
+            names = list({name for dep_id, name in rows if not dep_id and name})
+            for name_chunk in _chunked(names):
+                targets += self._scalars(select(Field.id).where(Field.name.in_(name_chunk)))
+        return targets
+
+    def _scalars(self, statement) -> List:
+        return list(self.session.execute(statement).scalars())
+
+    def _delete_in(self, column, values: List[str], table):
+        for chunk in _chunked(values):
+            self.session.execute(table.delete().where(column.in_(chunk)))
 
     def sync_views_usage(self) -> int:
         """同步视图使用统计（通过 REST API）并记录历史快照
@@ -1837,199 +2726,218 @@ class MetadataSync:
             # ========== Workbook 统计 ==========
             workbooks = self.session.query(Workbook).all()
             for wb in workbooks:
-                wb.view_count = len(wb.views) if wb.views else 0
-                wb.datasource_count = len(wb.datasources) if wb.datasources else 0
-
-                # 统计字段和指标（排除嵌入式数据源中的重复）
-                field_ids = set()
-                metric_ids = set()
-
-                # 方案1：通过关联的数据源统计（更准确且包含未引用的资产）
-                for ds in wb.datasources or []:
-                    # 仅统计非嵌入式数据源，除非工作簿本身没有发布式数据源
-                    if (
-                        ds.is_embedded
-                        and len([d for d in wb.datasources if not d.is_embedded]) > 0
-                    ):
-                        continue
-
-                    for f in ds.fields or []:
-                        if f.is_calculated:
-                            if f.role == "measure" or f.role is None:
-                                metric_ids.add(f.id)
-                        else:
-                            field_ids.add(f.id)
-
-                # 方案2：回退到视图引用（如果上述为空）
-                if len(field_ids) == 0 and len(metric_ids) == 0:
-                    for v in wb.views or []:
-                        for f in v.fields or []:
-                            if f.is_calculated:
-                                if f.role == "measure" or f.role is None:
-                                    metric_ids.add(f.id)
-                            else:
-                                field_ids.add(f.id)
-
-                wb.field_count = len(field_ids)
-                wb.metric_count = len(metric_ids)
+                self._update_workbook_stats(wb)
 
             # ========== Datasource 统计 ==========
             datasources = self.session.query(Datasource).all()
             for ds in datasources:
-                # 🔧 物理表统计修正：通过关联表统计
-                ds.table_count = (
-                    self.session.execute(
-                        text(
-                            "SELECT COUNT(*) FROM table_to_datasource WHERE datasource_id = :ds_id"
-                        ),
-                        {"ds_id": ds.id},
-                    ).scalar()
-                    or 0
-                )
-
-                # 🔧 工作簿统计修正：通过关联表统计
-                ds.workbook_count = (
-                    self.session.execute(
-                        text(
-                            "SELECT COUNT(*) FROM datasource_to_workbook WHERE datasource_id = :ds_id"
-                        ),
-                        {"ds_id": ds.id},
-                    ).scalar()
-                    or 0
-                )
-
-                # 🔧 嵌入式数据源字段统计修复：引用发布式则从发布式获取
-                source_fields = ds.fields
-                if ds.is_embedded and ds.source_published_datasource_id:
-                    published_ds = (
-                        self.session.query(Datasource)
-                        .filter_by(id=ds.source_published_datasource_id)
-                        .first()
-                    )
-                    if published_ds:
-                        source_fields = published_ds.fields
-
-                field_count = 0
-                metric_count = 0
-                for f in source_fields or []:
-                    if f.is_calculated:
-                        if f.role == "measure" or f.role is None:
-                            metric_count += 1
-                    else:
-                        field_count += 1
-                ds.field_count = field_count
-                ds.metric_count = metric_count
+                self._update_datasource_stats(ds)
 
             # ========== Field & CalculatedField 深度统计 (指标预计算优化) ==========
             print("  - 计算字段和指标深度统计...")
 
-            # 1. 计算字段公式哈希及查重
+            # 计算字段公式哈希及查重
             calc_fields = self.session.query(CalculatedField).all()
-            formula_map = defaultdict(list)
-            for cf in calc_fields:
-                # 🔧 修复：如果 CalculatedField 表中没有公式，尝试从 Field 表补全
-                if not cf.formula:
-                    f_record = self.session.query(Field).filter_by(id=cf.id).first()
-                    if f_record and f_record.formula:
-                        cf.formula = f_record.formula
-
-                if cf.formula:
-                    # 标准化公式并计算哈希
-                    formula_clean = cf.formula.strip()
-                    h = hashlib.md5(formula_clean.encode("utf-8")).hexdigest()
-                    cf.formula_hash = h
-                    formula_map[h].append(cf)
-
-            # 更新查重信息
-            for h, cfs in formula_map.items():
-                is_duplicate = len(cfs) > 1
-                for cf in cfs:
-                    cf.has_duplicates = is_duplicate
-                    cf.duplicate_count = len(cfs) - 1
-
-            # 2. 统计字段被视图引用的次数 (usage_count)
-            print("  - 使用 SQL 批量更新视图引用次数...")
-            self.session.execute(
-                text("""
+            self._update_formula_duplicates(calc_fields)
+
+            # 视图/指标引用统计
+            self._update_usage_counts()
+
+            self.session.commit()
+            print(
+                f"  ✅ 已更新 {len(workbooks)} 个工作簿, {len(datasources)} 个数据源, {len(calc_fields)} 个计算字段的统计字段"
+            )
+
+            # ========== 预计算完整血缘链 (field_full_lineage) ==========
+            print("  - 预计算完整血缘链...")
+            self._compute_full_lineage()
+
+        except Exception as e:
+            self.session.rollback()
+            print(f"  ❌ 统计计算失败: {e}")
+            import traceback
+
+            traceback.print_exc()
+
+    def _update_formula_duplicates(self, calc_fields):
+        """计算公式哈希并更新查重信息（calc_fields 需包含同哈希的全部计算字段）"""
+        formula_map = defaultdict(list)
+        for cf in calc_fields:
+            # 🔧 修复：如果 CalculatedField 表中没有公式，尝试从 Field 表补全
+            if not cf.formula:
+                f_record = self.session.query(Field).filter_by(id=cf.id).first()
+                if f_record and f_record.formula:
+                    cf.formula = f_record.formula
+
+            if cf.formula:
+                # 标准化公式并计算哈希
+                formula_clean = cf.formula.strip()
+                h = hashlib.md5(formula_clean.encode("utf-8")).hexdigest()
+                cf.formula_hash = h
+                formula_map[h].append(cf)
+
+        # 更新查重信息
+        for h, cfs in formula_map.items():
+            is_duplicate = len(cfs) > 1
+            for cf in cfs:
+                cf.has_duplicates = is_duplicate
+                cf.duplicate_count = len(cfs) - 1
+
+    def _update_usage_counts(self, field_ids: List[str] = None):
+        """SQL 批量更新字段/指标引用统计；指定 field_ids 时仅更新这些字段（定向刷新）"""
+        statements = [
+            # 统计字段被视图引用的次数 (usage_count)
+            ("视图引用次数", """
                 UPDATE fields SET usage_count = (
                     SELECT COUNT(*) FROM field_to_view 
                     WHERE field_to_view.field_id = fields.id
                 )
-            """)
-            )
-
-            # 3. 统计字段被指标引用的次数 (metric_usage_count)
-            print("  - 使用 SQL 批量更新指标引用次数...")
+            """),
+            # 统计字段被指标引用的次数 (metric_usage_count)
             # 优化：优先匹配此时确定的依赖 ID，fallback 到名称匹配
-            self.session.execute(
-                text("""
+            ("指标引用次数", """
                 UPDATE fields SET metric_usage_count = (
                     SELECT COUNT(*) FROM field_dependencies 
                     WHERE field_dependencies.dependency_field_id = fields.id
                        OR (field_dependencies.dependency_field_id IS NULL 
                            AND field_dependencies.dependency_name = fields.name)
                 )
-            """)
-            )
-
-            # 4. 统计指标依赖数 (dependency_count)
-            print("  - 使用 SQL 批量更新指标依赖数...")
-            self.session.execute(
-                text("""
+            """),
+            # 统计指标依赖数 (dependency_count)
+            ("指标依赖数", """
                 UPDATE calculated_fields SET dependency_count = (
                     SELECT COUNT(*) FROM field_dependencies 
                     WHERE field_dependencies.source_field_id = calculated_fields.id
                 )
-            """)
-            )
-
-            # 5. 统计指标引用数 (reference_count)
-            print("  - 使用 SQL 批量更新指标引用数...")
-            self.session.execute(
-                text("""
+            """),
+            # 统计指标引用数 (reference_count)
+            ("指标引用数", """
                 UPDATE calculated_fields SET reference_count = (
                     SELECT COUNT(*) FROM field_dependencies 
                     WHERE field_dependencies.dependency_field_id = calculated_fields.id
                 )
-            """)
-            )
-
-            # 6. 将 fields 表中的 usage_count 同步到 calculated_fields
-            print("  - 同步指标视图引用次数...")
-            self.session.execute(
-                text("""
+            """),
+            # 将 fields 表中的 usage_count 同步到 calculated_fields
+            ("指标视图引用次数", """
                 UPDATE calculated_fields 
                 SET usage_count = (SELECT usage_count FROM fields WHERE fields.id = calculated_fields.id)
-            """)
+            """),
+        ]
+
+        for label, sql in statements:
+            if field_ids is None:
+                print(f"  - 使用 SQL 批量更新{label}...")
+                self.session.execute(text(sql))
+                continue
+            scoped = text(sql + " WHERE id IN :ids").bindparams(
+                bindparam("ids", expanding=True)
             )
+            for chunk in _chunked(field_ids):
+                self.session.execute(scoped, {"ids": chunk})
+
+    def _update_workbook_stats(self, wb):
+        """更新单个工作簿的预存统计"""
+        wb.view_count = len(wb.views) if wb.views else 0
+        wb.datasource_count = len(wb.datasources) if wb.datasources else 0
+
+        # 统计字段和指标（排除嵌入式数据源中的重复）
+        field_ids = set()
+        metric_ids = set()
+
+        # 方案1：通过关联的数据源统计（更准确且包含未引用的资产）
+        for ds in wb.datasources or []:
+            # 仅统计非嵌入式数据源，除非工作簿本身没有发布式数据源
+            if (
+                ds.is_embedded
+                and len([d for d in wb.datasources if not d.is_embedded]) > 0
+            ):
+                continue
+
+            for f in ds.fields or []:
+                if f.is_calculated:
+                    if f.role == "measure" or f.role is None:
+                        metric_ids.add(f.id)
+                else:
+                    field_ids.add(f.id)
 
-            self.session.commit()
-            print(
-                f"  ✅ 已更新 {len(workbooks)} 个工作簿, {len(datasources)} 个数据源, {len(calc_fields)} 个计算字段的统计字段"
-            )
+        # 方案2：回退到视图引用（如果上述为空）
+        if len(field_ids) == 0 and len(metric_ids) == 0:
+            for v in wb.views or []:
+                for f in v.fields or []:
+                    if f.is_calculated:
+                        if f.role == "measure" or f.role is None:
+                            metric_ids.add(f.id)
+                    else:
+                        field_ids.add(f.id)
 
-            # ========== 预计算完整血缘链 (field_full_lineage) ==========
-            print("  - 预计算完整血缘链...")
-            self._compute_full_lineage()
+        wb.field_count = len(field_ids)
+        wb.metric_count = len(metric_ids)
 
-        except Exception as e:
-            self.session.rollback()
-            print(f"  ❌ 统计计算失败: {e}")
-            import traceback
+    def _update_datasource_stats(self, ds):
+        """更新单个数据源的预存统计"""
+        # 🔧 物理表统计修正：通过关联表统计
+        ds.table_count = (
+            self.session.execute(
+                text(
+                    "SELECT COUNT(*) FROM table_to_datasource WHERE datasource_id = :ds_id"
+                ),
+                {"ds_id": ds.id},
+            ).scalar()
+            or 0
+        )
 
-            traceback.print_exc()
+        # 🔧 工作簿统计修正：通过关联表统计
+        ds.workbook_count = (
+            self.session.execute(
+                text(
+                    "SELECT COUNT(*) FROM datasource_to_workbook WHERE datasource_id = :ds_id"
+                ),
+                {"ds_id": ds.id},
+            ).scalar()
+            or 0
+        )
+
+        # 🔧 嵌入式数据源字段统计修复：引用发布式则从发布式获取
+        source_fields = ds.fields
+        if ds.is_embedded and ds.source_published_datasource_id:
+            published_ds = (
+                self.session.query(Datasource)
+                .filter_by(id=ds.source_published_datasource_id)
+                .first()
+            )
+            if published_ds:
+                source_fields = published_ds.fields
+
+        field_count = 0
+        metric_count = 0
+        for f in source_fields or []:
+            if f.is_calculated:
+                if f.role == "measure" or f.role is None:
+                    metric_count += 1
+            else:
+                field_count += 1
+        ds.field_count = field_count
+        ds.metric_count = metric_count
 
-    def _compute_full_lineage(self):
+    def _compute_full_lineage(self, field_ids: List[str] = None):
         """预计算所有字段的完整血缘链并存入 field_full_lineage 表
 
         修复版：通过 datasource_to_workbook 推导字段的工作簿关联，
         解决发布数据源字段 workbook_id 为 NULL 导致血缘丢失的问题。
+        指定 field_ids 时仅重算这些字段（定向刷新）。
         """
         from backend.models import FieldFullLineage, Field, Datasource
 
         try:
             # 清空旧数据
-            self.session.execute(text("DELETE FROM field_full_lineage"))
+            if field_ids is None:
+                self.session.execute(text("DELETE FROM field_full_lineage"))
+            else:
+                scoped_delete = text(
+                    "DELETE FROM field_full_lineage WHERE field_id IN :ids"
+                ).bindparams(bindparam("ids", expanding=True))
+                for chunk in _chunked(field_ids):
+                    self.session.execute(scoped_delete, {"ids": chunk})
 
             # 构建数据源 -> 物理表的映射
             ds_table_map = {}  # datasource_id -> [table_ids]
@@ -2052,7 +2960,14 @@ class MetadataSync:
                 ds_workbook_map[ds_id].append(wb_id)
 
             # 遍历所有字段
-            fields = self.session.query(Field).all()
+            if field_ids is None:
+                fields = self.session.query(Field).all()
+            else:
+                fields = [
+                    f
+                    for chunk in _chunked(field_ids)
+                    for f in self.session.query(Field).filter(Field.id.in_(chunk))
+                ]
             lineage_records = []
 
             for f in fields:
@@ -2164,4 +3079,5 @@ class MetadataSync:
 
     def close(self):
         """关闭会话"""
+        self.telemetry.close()
         self.session.close()
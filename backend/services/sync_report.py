@@ -1,28 +1,325 @@
 """
 同步报告生成模块
 在每次 Tableau 元数据同步完成后生成详细的统计报告
+
+- 每张基础表只扫描一次：用条件聚合 (SUM(CASE ...)) + 小基数 GROUP BY 一次取回所有计数，
+  各报告章节在内存中由扫描结果组装
+- 相互独立的扫描在只读连接上并发执行（sqlite3 执行查询时释放 GIL）
+- Markdown / JSON 报告边生成边写入文件
 """
 import os
 import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import create_engine, text
+
+
+def _rows(conn, sql: str):
+    return conn.execute(text(sql)).fetchall()
+
+
+# ==================== 基础表扫描 ====================
+# 每个扫描函数接收一个连接，返回 dict；扫描之间互不依赖，可并发执行
+
+
+def _scan_fields(conn) -> dict:
+    """fields 单次扫描：按 (来源, 穿透状态, 角色, 数据类型) 分组的条件聚合"""
+    rows = _rows(conn, """
+        SELECT
+            lineage_source, penetration_status, role, data_type,
+            COUNT(*),
+            SUM(CASE WHEN is_calculated = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN table_id IS NOT NULL THEN 1 ELSE 0 END),
+            SUM(CASE WHEN datasource_id IS NOT NULL THEN 1 ELSE 0 END),
+            SUM(CASE WHEN workbook_id IS NOT NULL THEN 1 ELSE 0 END),
+            SUM(CASE WHEN description IS NOT NULL AND description != '' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN is_calculated = 0 AND upstream_column_id IS NULL THEN 1 ELSE 0 END),
+            SUM(CASE WHEN NOT EXISTS (
+                SELECT 1 FROM field_to_view ftv WHERE ftv.field_id = f.id
+            ) THEN 1 ELSE 0 END)
+        FROM fields f
+        GROUP BY lineage_source, penetration_status, role, data_type
+    """)
+    totals = dict.fromkeys(
+        ["total", "calculated", "with_table", "with_datasource", "with_workbook",
+         "with_description", "column_without_upstream", "without_views"], 0
+    )
+    by_source, by_penetration, by_role, by_data_type = {}, {}, {}, {}
+    for row in rows:
+        source, penetration, role, data_type, count = row[:5]
+        for key, value in zip(totals.keys(), row[4:]):
+            totals[key] += value or 0
+        key = str(source or "null")
+        by_source[key] = by_source.get(key, 0) + count
+        key = str(penetration or "null")
+        by_penetration[key] = by_penetration.get(key, 0) + count
+        key = str(role or "unknown")
+        by_role[key] = by_role.get(key, 0) + count
+        if data_type:
+            by_data_type[str(data_type)] = by_data_type.get(str(data_type), 0) + count
+
+    distinct = conn.execute(text(
+        "SELECT COUNT(DISTINCT datasource_id), COUNT(DISTINCT workbook_id) FROM fields"
+    )).first()
+    totals.update(
+        by_source=by_source,
+        by_penetration=by_penetration,
+        by_role=by_role,
+        by_data_type=dict(sorted(by_data_type.items(), key=lambda kv: -kv[1])[:15]),
+        distinct_datasources=distinct[0] or 0,
+        distinct_workbooks=distinct[1] or 0,
+        penetration_failed=by_penetration.get("failed", 0),
+    )
+    return totals
+
+
+def _scan_regular_fields(conn) -> dict:
+    rows = _rows(conn, """
+        SELECT lineage_source, penetration_status, COUNT(*)
+        FROM regular_fields GROUP BY lineage_source, penetration_status
+    """)
+    by_source, by_penetration = {}, {}
+    for source, penetration, count in rows:
+        by_source[str(source or "null")] = by_source.get(str(source or "null"), 0) + count
+        by_penetration[str(penetration or "null")] = by_penetration.get(str(penetration or "null"), 0) + count
+    return {"total": sum(r[2] for r in rows), "by_source": by_source, "by_penetration": by_penetration}
+
+
+def _scan_unique_regular_fields(conn) -> dict:
+    rows = _rows(conn, """
+        SELECT CASE WHEN table_id IS NOT NULL THEN 'has_table' ELSE 'no_table' END, COUNT(*)
+        FROM unique_regular_fields GROUP BY 1
+    """)
+    return {"total": sum(r[1] for r in rows), "by_table_association": {r[0]: r[1] for r in rows}}
+
+
+def _scan_unique_calculated_fields(conn) -> dict:
+    rows = _rows(conn, """
+        SELECT
+            CASE
+                WHEN complexity_score < 5 THEN 'simple'
+                WHEN complexity_score < 20 THEN 'medium'
+                ELSE 'complex'
+            END,
+            COUNT(*)
+        FROM unique_calculated_fields GROUP BY 1
+    """)
+    return {"total": sum(r[1] for r in rows), "by_complexity": {r[0]: r[1] for r in rows}}
+
+
+def _scan_tables(conn) -> dict:
+    row = conn.execute(text("""
+        SELECT
+            COUNT(*),
+            SUM(CASE WHEN is_embedded = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN database_id IS NULL THEN 1 ELSE 0 END),
+            SUM(CASE WHEN EXISTS (
+                SELECT 1 FROM databases db WHERE db.id = t.database_id
+            ) THEN 1 ELSE 0 END)
+        FROM tables t
+    """)).first()
+    total = row[0] or 0
+    embedded = row[1] or 0
+    return {
+        "total": total,
+        "embedded": embedded,
+        "physical": total - embedded,
+        "orphan": row[2] or 0,
+        "linked_to_database": row[3] or 0,
+    }
+
+
+def _scan_datasources(conn) -> dict:
+    """datasources 单次扫描：按项目分组，同时得到全局计数与项目分布"""
+    rows = _rows(conn, """
+        SELECT
+            project_name,
+            COUNT(*),
+            SUM(CASE WHEN is_embedded = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN is_certified = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN description IS NOT NULL AND description != '' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN is_embedded = 0 OR is_embedded IS NULL THEN 1 ELSE 0 END),
+            SUM(CASE WHEN (is_embedded = 0 OR is_embedded IS NULL) AND is_certified = 1 THEN 1 ELSE 0 END)
+        FROM datasources
+        GROUP BY project_name
+    """)
+    keys = ["total", "embedded", "certified", "with_description", "published", "published_certified"]
+    totals = dict.fromkeys(keys, 0)
+    by_project = {}
+    for row in rows:
+        for key, value in zip(keys, row[1:]):
+            totals[key] += value or 0
+        by_project[row[0]] = row[1]
+    totals["by_project"] = by_project
+    return totals
+
+
+def _scan_workbooks(conn) -> dict:
+    rows = _rows(conn, "SELECT project_name, COUNT(*) FROM workbooks GROUP BY project_name")
+    return {"total": sum(r[1] for r in rows), "by_project": {r[0]: r[1] for r in rows}}
+
+
+def _scan_views(conn) -> dict:
+    rows = _rows(conn, "SELECT view_type, COUNT(*) FROM views GROUP BY view_type")
+    by_type = {}
+    for view_type, count in rows:
+        by_type[str(view_type or "sheet")] = by_type.get(str(view_type or "sheet"), 0) + count
+    total = sum(r[1] for r in rows)
+    dashboards = sum(r[1] for r in rows if r[0] == "dashboard")
+    distinct_workbooks = conn.execute(text(
+        "SELECT COUNT(DISTINCT workbook_id) FROM views"
+    )).scalar() or 0
+    return {
+        "total": total,
+        "dashboards": dashboards,
+        "sheets": total - dashboards,
+        "by_type": by_type,
+        "distinct_workbooks": distinct_workbooks,
+    }
+
+
+def _scan_projects(conn) -> dict:
+    return {"projects": [(r[0], r[1]) for r in _rows(conn, "SELECT name, id FROM projects")]}
+
+
+def _association_scanner(table: str, distinct_columns=(), by_source: bool = True):
+    """关联表扫描：总数 + 血缘来源分布 + 指定列的去重计数"""
+    def scan(conn) -> dict:
+        result = {}
+        if by_source:
+            rows = _rows(conn, f"SELECT lineage_source, COUNT(*) FROM {table} GROUP BY lineage_source")
+            result["total"] = sum(r[1] for r in rows)
+            result["by_lineage_source"] = {}
+            for source, count in rows:
+                key = str(source or "null")
+                result["by_lineage_source"][key] = result["by_lineage_source"].get(key, 0) + count
+        else:
+            result["total"] = conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() or 0
+        if distinct_columns:
+            select = ", ".join(f"COUNT(DISTINCT {c})" for c in distinct_columns)
+            row = conn.execute(text(f"SELECT {select} FROM {table}")).first()
+            result["distinct"] = {c: row[i] or 0 for i, c in enumerate(distinct_columns)}
+        return result
+    return scan
+
+
+def _count_scanner(table: str):
+    def scan(conn) -> dict:
+        return {"total": conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() or 0}
+    return scan
+
+
+def _scan_hot_assets(conn) -> dict:
+    hot_views = _rows(conn, """
+        SELECT name, total_view_count, workbook_id
+        FROM views
+        WHERE total_view_count > 0
+        ORDER BY total_view_count DESC
+        LIMIT 10
+    """)
+    hot_fields = _rows(conn, """
+        SELECT name, (usage_count + COALESCE(metric_usage_count, 0)) as total_usage, datasource_id
+        FROM fields
+        WHERE usage_count > 0
+        ORDER BY total_usage DESC
+        LIMIT 10
+    """)
+    hot_ds = _rows(conn, """
+        SELECT d.name, COUNT(DISTINCT dw.workbook_id) as wb_count, d.id
+        FROM datasources d
+        LEFT JOIN datasource_to_workbook dw ON d.id = dw.datasource_id
+        GROUP BY d.id
+        ORDER BY wb_count DESC
+        LIMIT 10
+    """)
+    return {
+        "hot_views": [{"name": r[0], "views": r[1], "workbook_id": r[2]} for r in hot_views],
+        "hot_fields": [{"name": r[0], "usage": r[1], "datasource_id": r[2]} for r in hot_fields],
+        "hot_datasources": [{"name": r[0], "workbook_count": r[1], "id": r[2]} for r in hot_ds],
+    }
+
+
+def _scan_top_duplicates(conn) -> dict:
+    top_rf = _rows(conn, """
+        SELECT urf.name, COUNT(rf.id) as instance_count, urf.id
+        FROM unique_regular_fields urf
+        JOIN regular_fields rf ON rf.unique_id = urf.id
+        GROUP BY urf.id
+        ORDER BY instance_count DESC
+        LIMIT 10
+    """)
+    top_cf = _rows(conn, """
+        SELECT ucf.name, COUNT(cf.id) as instance_count, ucf.id
+        FROM unique_calculated_fields ucf
+        JOIN calculated_fields cf ON cf.unique_id = ucf.id
+        GROUP BY ucf.id
+        ORDER BY instance_count DESC
+        LIMIT 10
+    """)
+    return {
+        "top_regular_fields": [{"name": r[0], "instances": r[1], "id": r[2]} for r in top_rf],
+        "top_calculated_fields": [{"name": r[0], "instances": r[1], "id": r[2]} for r in top_cf],
+    }
+
+
+SCANS = {
+    "fields": _scan_fields,
+    "regular_fields": _scan_regular_fields,
+    "calculated_fields": _count_scanner("calculated_fields"),
+    "unique_regular_fields": _scan_unique_regular_fields,
+    "unique_calculated_fields": _scan_unique_calculated_fields,
+    "tables": _scan_tables,
+    "databases": _count_scanner("databases"),
+    "datasources": _scan_datasources,
+    "workbooks": _scan_workbooks,
+    "views": _scan_views,
+    "projects": _scan_projects,
+    "users": _count_scanner("tableau_users"),
+    "table_to_datasource": _association_scanner("table_to_datasource", ("table_id", "datasource_id")),
+    "datasource_to_workbook": _association_scanner("datasource_to_workbook", ("datasource_id", "workbook_id")),
+    "field_to_view": _association_scanner("field_to_view", ("field_id", "view_id")),
+    "dashboard_to_sheet": _association_scanner("dashboard_to_sheet", ("sheet_id",)),
+    "field_dependencies": _count_scanner("field_dependencies"),
+    "calc_field_dependencies": _count_scanner("calc_field_dependencies"),
+    "field_full_lineage": _count_scanner("field_full_lineage"),
+    "regular_field_full_lineage": _count_scanner("regular_field_full_lineage"),
+    "calc_field_full_lineage": _count_scanner("calc_field_full_lineage"),
+    "hot_assets": _scan_hot_assets,
+    "top_duplicates": _scan_top_duplicates,
+}
 
 
 class SyncReportGenerator:
     """同步报告生成器"""
     
-    def __init__(self, session, sync_stats: dict = None):
+    def __init__(self, session, sync_stats: dict = None, db_path: str = None, max_workers: int = 4,
+                 telemetry=None):
         """
         Args:
-            session: 数据库会话
+            session: 数据库会话（无法取得库文件路径时，扫描在该会话上顺序执行）
             sync_stats: 同步过程中收集的统计信息
+            db_path: 数据库文件路径，默认取会话绑定引擎的库文件
+            max_workers: 并发扫描的只读连接数
+            telemetry: 同步阶段遥测，并发扫描的 SQL 计入报告阶段
         """
         self.session = session
         self.sync_stats = sync_stats or {}
+        self.telemetry = telemetry
         self.report_data = {}
+        self.max_workers = max(1, max_workers)
+        if db_path is None:
+            try:
+                db_path = session.get_bind().url.database
+            except Exception:
+                db_path = None
+        self.db_path = db_path if db_path and db_path != ":memory:" else None
+        self._scans = {}
         
     def generate_report(self, output_dir: str = None) -> dict:
         """生成完整的同步报告"""
+        self._scans = self._run_scans()
         self.report_data = {
             "report_time": datetime.now().isoformat(),
             "sync_summary": self._get_sync_summary(),
@@ -46,6 +343,47 @@ class SyncReportGenerator:
             
         return self.report_data
     
+    # ==================== 扫描调度 ====================
+    
+    @staticmethod
+    def _safe_scan(scan, conn) -> dict:
+        try:
+            return scan(conn)
+        except Exception as e:
+            return {"error": str(e)}
+    
+    def _run_scans(self) -> dict:
+        """执行全部基础扫描：有库文件时在只读连接上并发，否则在当前会话上顺序执行"""
+        if not self.db_path or self.max_workers == 1:
+            return {name: self._safe_scan(scan, self.session) for name, scan in SCANS.items()}
+        
+        engine = create_engine(
+            f"sqlite:///file:{os.path.abspath(self.db_path)}?mode=ro&uri=true",
+            pool_size=self.max_workers,
+            max_overflow=0,
+        )
+        
+        def run(scan):
+            with self.telemetry.track_thread() if self.telemetry else nullcontext():
+                with engine.connect() as conn:
+                    return self._safe_scan(scan, conn)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {name: pool.submit(run, scan) for name, scan in SCANS.items()}
+                return {name: future.result() for name, future in futures.items()}
+        finally:
+            engine.dispose()
+    
+    def _scan(self, name: str) -> dict:
+        """取扫描结果；扫描失败时抛出，由各章节按原有方式记录 error"""
+        result = self._scans.get(name) or {}
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+    
+    # ==================== 报告章节组装 ====================
+    
     def _get_sync_summary(self) -> dict:
         """获取同步概要"""
         return {
@@ -59,25 +397,15 @@ class SyncReportGenerator:
         """获取各模块同步统计"""
         result = {}
         
-        # 从数据库直接统计
-        queries = {
-            "users": "SELECT COUNT(*) FROM tableau_users",
-            "projects": "SELECT COUNT(*) FROM projects",
-            "databases": "SELECT COUNT(*) FROM databases",
-            "tables": "SELECT COUNT(*) FROM tables",
-            "datasources": "SELECT COUNT(*) FROM datasources",
-            "workbooks": "SELECT COUNT(*) FROM workbooks",
-            "views": "SELECT COUNT(*) FROM views",
-            "fields": "SELECT COUNT(*) FROM fields",
-            "calculated_fields": "SELECT COUNT(*) FROM calculated_fields",
-            "regular_fields": "SELECT COUNT(*) FROM regular_fields",
-            "unique_regular_fields": "SELECT COUNT(*) FROM unique_regular_fields",
-            "unique_calculated_fields": "SELECT COUNT(*) FROM unique_calculated_fields",
-        }
-        
-        for module_name, sql in queries.items():
+        modules = [
+            "users", "projects", "databases", "tables", "datasources", "workbooks", "views",
+            "fields", "calculated_fields", "regular_fields",
+            "unique_regular_fields", "unique_calculated_fields",
+        ]
+        for module_name in modules:
             try:
-                count = self.session.execute(text(sql)).scalar() or 0
+                scan = self._scan(module_name)
+                count = len(scan["projects"]) if module_name == "projects" else scan.get("total", 0)
                 result[module_name] = {"count": count}
             except Exception as e:
                 result[module_name] = {"count": 0, "error": str(e)}
@@ -96,50 +424,16 @@ class SyncReportGenerator:
         """获取血缘建立统计"""
         result = {}
         
-        # 关联表统计
-        association_queries = {
-            "table_to_datasource": {
-                "count": "SELECT COUNT(*) FROM table_to_datasource",
-                "by_source": "SELECT lineage_source, COUNT(*) as cnt FROM table_to_datasource GROUP BY lineage_source"
-            },
-            "datasource_to_workbook": {
-                "count": "SELECT COUNT(*) FROM datasource_to_workbook",
-                "by_source": "SELECT lineage_source, COUNT(*) as cnt FROM datasource_to_workbook GROUP BY lineage_source"
-            },
-            "field_to_view": {
-                "count": "SELECT COUNT(*) FROM field_to_view",
-                "by_source": "SELECT lineage_source, COUNT(*) as cnt FROM field_to_view GROUP BY lineage_source"
-            },
-            "dashboard_to_sheet": {
-                "count": "SELECT COUNT(*) FROM dashboard_to_sheet",
-                "by_source": "SELECT lineage_source, COUNT(*) as cnt FROM dashboard_to_sheet GROUP BY lineage_source"
-            },
-            "field_dependencies": {
-                "count": "SELECT COUNT(*) FROM field_dependencies",
-            },
-            "calc_field_dependencies": {
-                "count": "SELECT COUNT(*) FROM calc_field_dependencies",
-            },
-            "field_full_lineage": {
-                "count": "SELECT COUNT(*) FROM field_full_lineage",
-            },
-            "regular_field_full_lineage": {
-                "count": "SELECT COUNT(*) FROM regular_field_full_lineage",
-            },
-            "calc_field_full_lineage": {
-                "count": "SELECT COUNT(*) FROM calc_field_full_lineage",
-            },
-        }
-        
-        for table_name, queries in association_queries.items():
+        for table_name in [
+            "table_to_datasource", "datasource_to_workbook", "field_to_view", "dashboard_to_sheet",
+            "field_dependencies", "calc_field_dependencies", "field_full_lineage",
+            "regular_field_full_lineage", "calc_field_full_lineage",
+        ]:
             try:
-                count = self.session.execute(text(queries["count"])).scalar() or 0
-                item = {"total": count}
-                
-                if "by_source" in queries:
-                    rows = self.session.execute(text(queries["by_source"])).fetchall()
-                    item["by_lineage_source"] = {str(r[0] or "null"): r[1] for r in rows}
-                    
+                scan = self._scan(table_name)
+                item = {"total": scan.get("total", 0)}
+                if "by_lineage_source" in scan:
+                    item["by_lineage_source"] = scan["by_lineage_source"]
                 result[table_name] = item
             except Exception as e:
                 result[table_name] = {"total": 0, "error": str(e)}
@@ -152,29 +446,17 @@ class SyncReportGenerator:
         
         # fields 表的标签分布
         try:
-            fields_source = self.session.execute(text(
-                "SELECT lineage_source, COUNT(*) FROM fields GROUP BY lineage_source"
-            )).fetchall()
-            result["fields_by_source"] = {str(r[0] or "null"): r[1] for r in fields_source}
-            
-            fields_penetration = self.session.execute(text(
-                "SELECT penetration_status, COUNT(*) FROM fields GROUP BY penetration_status"
-            )).fetchall()
-            result["fields_by_penetration"] = {str(r[0] or "null"): r[1] for r in fields_penetration}
+            fields = self._scan("fields")
+            result["fields_by_source"] = fields["by_source"]
+            result["fields_by_penetration"] = fields["by_penetration"]
         except Exception as e:
             result["fields_error"] = str(e)
             
         # regular_fields 表的标签分布
         try:
-            rf_source = self.session.execute(text(
-                "SELECT lineage_source, COUNT(*) FROM regular_fields GROUP BY lineage_source"
-            )).fetchall()
-            result["regular_fields_by_source"] = {str(r[0] or "null"): r[1] for r in rf_source}
-            
-            rf_penetration = self.session.execute(text(
-                "SELECT penetration_status, COUNT(*) FROM regular_fields GROUP BY penetration_status"
-            )).fetchall()
-            result["regular_fields_by_penetration"] = {str(r[0] or "null"): r[1] for r in rf_penetration}
+            rf = self._scan("regular_fields")
+            result["regular_fields_by_source"] = rf["by_source"]
+            result["regular_fields_by_penetration"] = rf["by_penetration"]
         except Exception as e:
             result["regular_fields_error"] = str(e)
             
@@ -186,64 +468,35 @@ class SyncReportGenerator:
         
         try:
             # 原始字段去重统计
-            rf_instances = self.session.execute(text(
-                "SELECT COUNT(*) FROM regular_fields"
-            )).scalar() or 0
-            rf_unique = self.session.execute(text(
-                "SELECT COUNT(*) FROM unique_regular_fields"
-            )).scalar() or 0
+            rf_instances = self._scan("regular_fields")["total"]
+            urf = self._scan("unique_regular_fields")
+            rf_unique = urf["total"]
             
             result["regular_fields"] = {
                 "total_instances": rf_instances,
                 "unique_fields": rf_unique,
                 "dedup_ratio": round(1 - rf_unique / rf_instances, 4) if rf_instances > 0 else 0,
-                "avg_instances_per_field": round(rf_instances / rf_unique, 2) if rf_unique > 0 else 0
+                "avg_instances_per_field": round(rf_instances / rf_unique, 2) if rf_unique > 0 else 0,
+                "by_table_association": urf["by_table_association"],
             }
             
-            # 去重策略分布 (如果有记录的话)
-            # 这需要在迁移时记录策略，目前先统计表关联情况
-            rf_by_table = self.session.execute(text("""
-                SELECT 
-                    CASE WHEN urf.table_id IS NOT NULL THEN 'has_table' ELSE 'no_table' END as has_tbl,
-                    COUNT(*)
-                FROM unique_regular_fields urf
-                GROUP BY has_tbl
-            """)).fetchall()
-            result["regular_fields"]["by_table_association"] = {r[0]: r[1] for r in rf_by_table}
-            
         except Exception as e:
             result["regular_fields_error"] = str(e)
             
         try:
             # 计算字段去重统计
-            cf_instances = self.session.execute(text(
-                "SELECT COUNT(*) FROM calculated_fields"
-            )).scalar() or 0
-            cf_unique = self.session.execute(text(
-                "SELECT COUNT(*) FROM unique_calculated_fields"
-            )).scalar() or 0
+            cf_instances = self._scan("calculated_fields")["total"]
+            ucf = self._scan("unique_calculated_fields")
+            cf_unique = ucf["total"]
             
             result["calculated_fields"] = {
                 "total_instances": cf_instances,
                 "unique_fields": cf_unique,
                 "dedup_ratio": round(1 - cf_unique / cf_instances, 4) if cf_instances > 0 else 0,
-                "avg_instances_per_field": round(cf_instances / cf_unique, 2) if cf_unique > 0 else 0
+                "avg_instances_per_field": round(cf_instances / cf_unique, 2) if cf_unique > 0 else 0,
+                "by_complexity": ucf["by_complexity"],
             }
             
-            # 复杂度分布
-            cf_complexity = self.session.execute(text("""
-                SELECT 
-                    CASE 
-                        WHEN complexity_score < 5 THEN 'simple'
-                        WHEN complexity_score < 20 THEN 'medium'
-                        ELSE 'complex'
-                    END as complexity_level,
-                    COUNT(*)
-                FROM unique_calculated_fields
-                GROUP BY complexity_level
-            """)).fetchall()
-            result["calculated_fields"]["by_complexity"] = {r[0]: r[1] for r in cf_complexity}
-            
         except Exception as e:
             result["calculated_fields_error"] = str(e)
             
@@ -254,44 +507,15 @@ class SyncReportGenerator:
         result = {}
         
         try:
-            # 没有关联数据源的字段
-            no_ds = self.session.execute(text("""
-                SELECT COUNT(*) FROM fields WHERE datasource_id IS NULL
-            """)).scalar() or 0
-            result["fields_without_datasource"] = no_ds
-            
-            # 没有关联表的字段
-            no_table = self.session.execute(text("""
-                SELECT COUNT(*) FROM fields WHERE table_id IS NULL
-            """)).scalar() or 0
-            result["fields_without_table"] = no_table
-            
-            # 没有关联工作簿的字段
-            no_wb = self.session.execute(text("""
-                SELECT COUNT(*) FROM fields WHERE workbook_id IS NULL
-            """)).scalar() or 0
-            result["fields_without_workbook"] = no_wb
-            
-            # 没有视图引用的字段
-            no_views = self.session.execute(text("""
-                SELECT COUNT(*) FROM fields f 
-                WHERE NOT EXISTS (SELECT 1 FROM field_to_view ftv WHERE ftv.field_id = f.id)
-            """)).scalar() or 0
-            result["fields_without_views"] = no_views
-            
-            # 穿透失败的字段
-            penetration_failed = self.session.execute(text("""
-                SELECT COUNT(*) FROM fields WHERE penetration_status = 'failed'
-            """)).scalar() or 0
-            result["penetration_failed"] = penetration_failed
-            
+            fields = self._scan("fields")
+            total = fields["total"]
+            result["fields_without_datasource"] = total - fields["with_datasource"]
+            result["fields_without_table"] = total - fields["with_table"]
+            result["fields_without_workbook"] = total - fields["with_workbook"]
+            result["fields_without_views"] = fields["without_views"]
+            result["penetration_failed"] = fields["penetration_failed"]
             # 没有上游列的字段（ColumnField 应该有）
-            no_upstream_col = self.session.execute(text("""
-                SELECT COUNT(*) FROM fields 
-                WHERE is_calculated = 0 AND upstream_column_id IS NULL
-            """)).scalar() or 0
-            result["column_fields_without_upstream"] = no_upstream_col
-            
+            result["column_fields_without_upstream"] = fields["column_without_upstream"]
         except Exception as e:
             result["error"] = str(e)
             
@@ -302,111 +526,54 @@ class SyncReportGenerator:
         result = {}
         
         try:
-            # 数据库血缘统计
-            db_stats = self.session.execute(text("""
-                SELECT 
-                    COUNT(DISTINCT db.id) as db_count,
-                    COUNT(DISTINCT t.id) as tables_with_db,
-                    (SELECT COUNT(*) FROM tables WHERE database_id IS NULL) as orphan_tables
-                FROM databases db
-                LEFT JOIN tables t ON t.database_id = db.id
-            """)).first()
+            tables = self._scan("tables")
+            t2d = self._scan("table_to_datasource")["distinct"]
+            d2w = self._scan("datasource_to_workbook")["distinct"]
+            ftv = self._scan("field_to_view")["distinct"]
+            fields = self._scan("fields")
+            views = self._scan("views")
+            datasources = self._scan("datasources")
+            
             result["databases"] = {
-                "total": db_stats[0] if db_stats else 0,
-                "linked_tables": db_stats[1] if db_stats else 0,
-                "orphan_tables": db_stats[2] if db_stats else 0
+                "total": self._scan("databases")["total"],
+                "linked_tables": tables["linked_to_database"],
+                "orphan_tables": tables["orphan"]
             }
-            
-            # 数据表血缘统计
-            table_stats = self.session.execute(text("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_embedded = 1 THEN 1 ELSE 0 END) as embedded,
-                    SUM(CASE WHEN is_embedded = 0 OR is_embedded IS NULL THEN 1 ELSE 0 END) as physical,
-                    (SELECT COUNT(DISTINCT table_id) FROM table_to_datasource) as linked_to_ds
-                FROM tables
-            """)).first()
             result["tables"] = {
-                "total": table_stats[0] if table_stats else 0,
-                "embedded": table_stats[1] if table_stats else 0,
-                "physical": table_stats[2] if table_stats else 0,
-                "linked_to_datasource": table_stats[3] if table_stats else 0
+                "total": tables["total"],
+                "embedded": tables["embedded"],
+                "physical": tables["physical"],
+                "linked_to_datasource": t2d["table_id"]
             }
-            
-            # 数据源血缘统计
-            ds_stats = self.session.execute(text("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_embedded = 1 THEN 1 ELSE 0 END) as embedded,
-                    SUM(CASE WHEN is_certified = 1 THEN 1 ELSE 0 END) as certified,
-                    (SELECT COUNT(DISTINCT datasource_id) FROM table_to_datasource) as with_tables,
-                    (SELECT COUNT(DISTINCT datasource_id) FROM datasource_to_workbook) as with_workbooks,
-                    (SELECT COUNT(DISTINCT datasource_id) FROM fields WHERE datasource_id IS NOT NULL) as with_fields
-                FROM datasources
-            """)).first()
             result["datasources"] = {
-                "total": ds_stats[0] if ds_stats else 0,
-                "embedded": ds_stats[1] if ds_stats else 0,
-                "certified": ds_stats[2] if ds_stats else 0,
-                "with_upstream_tables": ds_stats[3] if ds_stats else 0,
-                "with_downstream_workbooks": ds_stats[4] if ds_stats else 0,
-                "with_fields": ds_stats[5] if ds_stats else 0
+                "total": datasources["total"],
+                "embedded": datasources["embedded"],
+                "certified": datasources["certified"],
+                "with_upstream_tables": t2d["datasource_id"],
+                "with_downstream_workbooks": d2w["datasource_id"],
+                "with_fields": fields["distinct_datasources"]
             }
-            
-            # 工作簿血缘统计
-            wb_stats = self.session.execute(text("""
-                SELECT 
-                    COUNT(*) as total,
-                    (SELECT COUNT(DISTINCT workbook_id) FROM views) as with_views,
-                    (SELECT COUNT(DISTINCT workbook_id) FROM datasource_to_workbook) as with_datasources,
-                    (SELECT COUNT(DISTINCT workbook_id) FROM fields WHERE workbook_id IS NOT NULL) as with_fields
-                FROM workbooks
-            """)).first()
             result["workbooks"] = {
-                "total": wb_stats[0] if wb_stats else 0,
-                "with_views": wb_stats[1] if wb_stats else 0,
-                "with_datasources": wb_stats[2] if wb_stats else 0,
-                "with_fields": wb_stats[3] if wb_stats else 0
+                "total": self._scan("workbooks")["total"],
+                "with_views": views["distinct_workbooks"],
+                "with_datasources": d2w["workbook_id"],
+                "with_fields": fields["distinct_workbooks"]
             }
-            
-            # 视图血缘统计
-            view_stats = self.session.execute(text("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN view_type = 'dashboard' THEN 1 ELSE 0 END) as dashboards,
-                    SUM(CASE WHEN view_type != 'dashboard' OR view_type IS NULL THEN 1 ELSE 0 END) as sheets,
-                    (SELECT COUNT(DISTINCT view_id) FROM field_to_view) as with_fields,
-                    (SELECT COUNT(DISTINCT sheet_id) FROM dashboard_to_sheet) as sheets_in_dashboards
-                FROM views
-            """)).first()
             result["views"] = {
-                "total": view_stats[0] if view_stats else 0,
-                "dashboards": view_stats[1] if view_stats else 0,
-                "sheets": view_stats[2] if view_stats else 0,
-                "with_field_references": view_stats[3] if view_stats else 0,
-                "sheets_included_in_dashboards": view_stats[4] if view_stats else 0
+                "total": views["total"],
+                "dashboards": views["dashboards"],
+                "sheets": views["sheets"],
+                "with_field_references": ftv["view_id"],
+                "sheets_included_in_dashboards": self._scan("dashboard_to_sheet")["distinct"]["sheet_id"]
             }
-            
-            # 字段血缘统计
-            field_stats = self.session.execute(text("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_calculated = 1 THEN 1 ELSE 0 END) as calculated,
-                    SUM(CASE WHEN is_calculated = 0 OR is_calculated IS NULL THEN 1 ELSE 0 END) as regular,
-                    SUM(CASE WHEN table_id IS NOT NULL THEN 1 ELSE 0 END) as with_table,
-                    SUM(CASE WHEN datasource_id IS NOT NULL THEN 1 ELSE 0 END) as with_datasource,
-                    SUM(CASE WHEN workbook_id IS NOT NULL THEN 1 ELSE 0 END) as with_workbook,
-                    (SELECT COUNT(DISTINCT field_id) FROM field_to_view) as used_in_views
-                FROM fields
-            """)).first()
             result["fields"] = {
-                "total": field_stats[0] if field_stats else 0,
-                "calculated": field_stats[1] if field_stats else 0,
-                "regular": field_stats[2] if field_stats else 0,
-                "with_table": field_stats[3] if field_stats else 0,
-                "with_datasource": field_stats[4] if field_stats else 0,
-                "with_workbook": field_stats[5] if field_stats else 0,
-                "used_in_views": field_stats[6] if field_stats else 0
+                "total": fields["total"],
+                "calculated": fields["calculated"],
+                "regular": fields["total"] - fields["calculated"],
+                "with_table": fields["with_table"],
+                "with_datasource": fields["with_datasource"],
+                "with_workbook": fields["with_workbook"],
+                "used_in_views": ftv["field_id"]
             }
             
         except Exception as e:
@@ -419,33 +586,20 @@ class SyncReportGenerator:
         result = {}
         
         try:
+            fields = self._scan("fields")
             # 字段角色分布 (Dimension vs Measure)
-            role_dist = self.session.execute(text("""
-                SELECT role, COUNT(*) FROM fields GROUP BY role
-            """)).fetchall()
-            result["field_roles"] = {str(r[0] or "unknown"): r[1] for r in role_dist}
-            
+            result["field_roles"] = fields["by_role"]
             # 字段数据类型分布
-            dtype_dist = self.session.execute(text("""
-                SELECT data_type, COUNT(*) FROM fields WHERE data_type IS NOT NULL AND data_type != '' GROUP BY data_type ORDER BY COUNT(*) DESC LIMIT 15
-            """)).fetchall()
-            result["field_data_types"] = {str(r[0]): r[1] for r in dtype_dist}
+            result["field_data_types"] = fields["by_data_type"]
             
             # 表类型分布
-            table_type_dist = self.session.execute(text("""
-                SELECT 
-                    CASE WHEN is_embedded = 1 THEN 'embedded' ELSE 'physical' END,
-                    COUNT(*)
-                FROM tables 
-                GROUP BY CASE WHEN is_embedded = 1 THEN 'embedded' ELSE 'physical' END
-            """)).fetchall()
-            result["table_types"] = {r[0]: r[1] for r in table_type_dist}
+            tables = self._scan("tables")
+            result["table_types"] = {
+                k: v for k, v in (("embedded", tables["embedded"]), ("physical", tables["physical"])) if v
+            }
             
             # 视图类型分布
-            view_type_dist = self.session.execute(text("""
-                SELECT view_type, COUNT(*) FROM views GROUP BY view_type
-            """)).fetchall()
-            result["view_types"] = {str(r[0] or "sheet"): r[1] for r in view_type_dist}
+            result["view_types"] = self._scan("views")["by_type"]
             
         except Exception as e:
             result["error"] = str(e)
@@ -458,14 +612,9 @@ class SyncReportGenerator:
         
         try:
             # 字段描述覆盖率
-            desc_stats = self.session.execute(text("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN description IS NOT NULL AND description != '' THEN 1 ELSE 0 END) as has_desc
-                FROM fields
-            """)).first()
-            total = desc_stats[0] if desc_stats else 0
-            has_desc = desc_stats[1] if desc_stats else 0
+            fields = self._scan("fields")
+            total = fields["total"]
+            has_desc = fields["with_description"]
             result["field_description"] = {
                 "total": total,
                 "with_description": has_desc,
@@ -474,14 +623,9 @@ class SyncReportGenerator:
             }
             
             # 数据源描述覆盖率
-            ds_desc = self.session.execute(text("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN description IS NOT NULL AND description != '' THEN 1 ELSE 0 END) as has_desc
-                FROM datasources
-            """)).first()
-            ds_total = ds_desc[0] if ds_desc else 0
-            ds_has = ds_desc[1] if ds_desc else 0
+            datasources = self._scan("datasources")
+            ds_total = datasources["total"]
+            ds_has = datasources["with_description"]
             result["datasource_description"] = {
                 "total": ds_total,
                 "with_description": ds_has,
@@ -489,14 +633,8 @@ class SyncReportGenerator:
             }
             
             # 数据源认证覆盖率
-            cert_stats = self.session.execute(text("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_certified = 1 THEN 1 ELSE 0 END) as certified
-                FROM datasources WHERE is_embedded = 0 OR is_embedded IS NULL
-            """)).first()
-            cert_total = cert_stats[0] if cert_stats else 0
-            certified = cert_stats[1] if cert_stats else 0
+            cert_total = datasources["published"]
+            certified = datasources["published_certified"]
             result["datasource_certification"] = {
                 "published_total": cert_total,
                 "certified": certified,
@@ -510,67 +648,26 @@ class SyncReportGenerator:
     
     def _get_hot_assets(self) -> dict:
         """获取热门资产"""
-        result = {}
-        
         try:
-            # 热门视图 Top 10
-            hot_views = self.session.execute(text("""
-                SELECT name, total_view_count, workbook_id
-                FROM views
-                WHERE total_view_count > 0
-                ORDER BY total_view_count DESC
-                LIMIT 10
-            """)).fetchall()
-            result["hot_views"] = [{"name": r[0], "views": r[1], "workbook_id": r[2]} for r in hot_views]
-            
-            # 高频使用字段 Top 10
-            hot_fields = self.session.execute(text("""
-                SELECT name, (usage_count + COALESCE(metric_usage_count, 0)) as total_usage, datasource_id
-                FROM fields
-                WHERE usage_count > 0
-                ORDER BY total_usage DESC
-                LIMIT 10
-            """)).fetchall()
-            result["hot_fields"] = [{"name": r[0], "usage": r[1], "datasource_id": r[2]} for r in hot_fields]
-            
-            # 被引用最多的数据源 Top 10
-            hot_ds = self.session.execute(text("""
-                SELECT d.name, COUNT(DISTINCT dw.workbook_id) as wb_count, d.id
-                FROM datasources d
-                LEFT JOIN datasource_to_workbook dw ON d.id = dw.datasource_id
-                GROUP BY d.id
-                ORDER BY wb_count DESC
-                LIMIT 10
-            """)).fetchall()
-            result["hot_datasources"] = [{"name": r[0], "workbook_count": r[1], "id": r[2]} for r in hot_ds]
-            
+            return dict(self._scan("hot_assets"))
         except Exception as e:
-            result["error"] = str(e)
-            
-        return result
+            return {"error": str(e)}
     
     def _get_project_distribution(self) -> dict:
         """获取项目分布"""
         result = {}
         
         try:
-            # 各项目的资产数量
-            project_stats = self.session.execute(text("""
-                SELECT 
-                    p.name,
-                    p.id,
-                    (SELECT COUNT(*) FROM datasources WHERE project_name = p.name) as ds_count,
-                    (SELECT COUNT(*) FROM workbooks WHERE project_name = p.name) as wb_count
-                FROM projects p
-                ORDER BY ds_count + wb_count DESC
-            """)).fetchall()
-            result["by_project"] = [{
-                "name": r[0],
-                "id": r[1],
-                "datasource_count": r[2],
-                "workbook_count": r[3],
-                "total_assets": r[2] + r[3]
-            } for r in project_stats]
+            ds_by_project = self._scan("datasources")["by_project"]
+            wb_by_project = self._scan("workbooks")["by_project"]
+            projects = [{
+                "name": name,
+                "id": project_id,
+                "datasource_count": ds_by_project.get(name, 0),
+                "workbook_count": wb_by_project.get(name, 0),
+                "total_assets": ds_by_project.get(name, 0) + wb_by_project.get(name, 0)
+            } for name, project_id in self._scan("projects")["projects"]]
+            result["by_project"] = sorted(projects, key=lambda p: -p["total_assets"])
             
         except Exception as e:
             result["error"] = str(e)
@@ -579,35 +676,10 @@ class SyncReportGenerator:
     
     def _get_top_duplicates(self) -> dict:
         """获取重复最多的字段"""
-        result = {}
-        
         try:
-            # 实例数最多的标准字段 Top 10
-            top_rf = self.session.execute(text("""
-                SELECT urf.name, COUNT(rf.id) as instance_count, urf.id
-                FROM unique_regular_fields urf
-                JOIN regular_fields rf ON rf.unique_id = urf.id
-                GROUP BY urf.id
-                ORDER BY instance_count DESC
-                LIMIT 10
-            """)).fetchall()
-            result["top_regular_fields"] = [{"name": r[0], "instances": r[1], "id": r[2]} for r in top_rf]
-            
-            # 实例数最多的标准指标 Top 10
-            top_cf = self.session.execute(text("""
-                SELECT ucf.name, COUNT(cf.id) as instance_count, ucf.id
-                FROM unique_calculated_fields ucf
-                JOIN calculated_fields cf ON cf.unique_id = ucf.id
-                GROUP BY ucf.id
-                ORDER BY instance_count DESC
-                LIMIT 10
-            """)).fetchall()
-            result["top_calculated_fields"] = [{"name": r[0], "instances": r[1], "id": r[2]} for r in top_cf]
-            
+            return dict(self._scan("top_duplicates"))
         except Exception as e:
-            result["error"] = str(e)
-            
-        return result
+            return {"error": str(e)}
     
     def _save_report(self, output_dir: str):
         """保存报告到文件"""
@@ -615,28 +687,24 @@ class SyncReportGenerator:
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # 保存 JSON 报告
+        # 保存 JSON 报告（json.dump 分块写入文件，不在内存中拼接整串）
         json_filename = f"sync_report_{timestamp}.json"
         json_filepath = os.path.join(output_dir, json_filename)
         with open(json_filepath, 'w', encoding='utf-8') as f:
             json.dump(self.report_data, f, ensure_ascii=False, indent=2)
         
-        # 保存最新 JSON 报告副本
-        latest_json_path = os.path.join(output_dir, "sync_report_latest.json")
-        with open(latest_json_path, 'w', encoding='utf-8') as f:
-            json.dump(self.report_data, f, ensure_ascii=False, indent=2)
-        
-        # 生成并保存 Markdown 文字报告
-        md_content = self._generate_markdown_report()
+        # 生成并保存 Markdown 文字报告（逐行写入）
         md_filename = f"sync_report_{timestamp}.md"
         md_filepath = os.path.join(output_dir, md_filename)
         with open(md_filepath, 'w', encoding='utf-8') as f:
-            f.write(md_content)
+            for i, line in enumerate(self._iter_markdown_lines()):
+                if i:
+                    f.write("\n")
+                f.write(line)
         
-        # 保存最新 Markdown 报告副本
-        latest_md_path = os.path.join(output_dir, "sync_report_latest.md")
-        with open(latest_md_path, 'w', encoding='utf-8') as f:
-            f.write(md_content)
+        # 最新报告副本直接复制文件，不再重复序列化
+        shutil.copyfile(json_filepath, os.path.join(output_dir, "sync_report_latest.json"))
+        shutil.copyfile(md_filepath, os.path.join(output_dir, "sync_report_latest.md"))
             
         print(f"\n📄 报告已保存:")
         print(f"   JSON: {json_filepath}")
@@ -644,24 +712,26 @@ class SyncReportGenerator:
     
     def _generate_markdown_report(self) -> str:
         """生成 Markdown 格式的文字报告"""
-        lines = []
-        
+        return "\n".join(self._iter_markdown_lines())
+    
+    def _iter_markdown_lines(self):
+        """逐行生成 Markdown 报告内容"""
         # 标题
         summary = self.report_data.get("sync_summary", {})
-        lines.append("# Tableau 元数据同步报告")
-        lines.append("")
-        lines.append(f"**报告生成时间**: {self.report_data.get('report_time', '-')}")
-        lines.append(f"**同步状态**: {summary.get('status', 'unknown')}")
+        yield "# Tableau 元数据同步报告"
+        yield ""
+        yield f"**报告生成时间**: {self.report_data.get('report_time', '-')}"
+        yield f"**同步状态**: {summary.get('status', 'unknown')}"
         duration = summary.get('duration_seconds')
-        lines.append(f"**同步耗时**: {duration:.2f} 秒" if duration else "**同步耗时**: -")
-        lines.append("")
+        yield f"**同步耗时**: {duration:.2f} 秒" if duration else "**同步耗时**: -"
+        yield ""
         
         # 模块同步统计
-        lines.append("---")
-        lines.append("## 📦 模块同步统计")
-        lines.append("")
-        lines.append("| 模块 | 数量 | 说明 |")
-        lines.append("|------|------|------|")
+        yield "---"
+        yield "## 📦 模块同步统计"
+        yield ""
+        yield "| 模块 | 数量 | 说明 |"
+        yield "|------|------|------|"
         
         ms = self.report_data.get("module_stats", {})
         module_names = {
@@ -685,17 +755,17 @@ class SyncReportGenerator:
             note = f"本次同步: {synced}" if synced else ""
             if stats.get("error"):
                 note = f"⚠️ 错误"
-            lines.append(f"| {name} | {count:,} | {note} |")
-        lines.append("")
+            yield f"| {name} | {count:,} | {note} |"
+        yield ""
         
         # 血缘关联统计
-        lines.append("---")
-        lines.append("## 🔗 血缘关联统计")
-        lines.append("")
-        lines.append("### 关联表记录数")
-        lines.append("")
-        lines.append("| 关联表 | 总记录数 | 标签分布 |")
-        lines.append("|--------|----------|----------|")
+        yield "---"
+        yield "## 🔗 血缘关联统计"
+        yield ""
+        yield "### 关联表记录数"
+        yield ""
+        yield "| 关联表 | 总记录数 | 标签分布 |"
+        yield "|--------|----------|----------|"
         
         ls = self.report_data.get("lineage_stats", {})
         table_names = {
@@ -714,286 +784,286 @@ class SyncReportGenerator:
             total = stats.get("total", 0)
             by_source = stats.get("by_lineage_source", {})
             source_str = ", ".join([f"{k}: {v}" for k, v in by_source.items()]) if by_source else "-"
-            lines.append(f"| {name} | {total:,} | {source_str} |")
-        lines.append("")
+            yield f"| {name} | {total:,} | {source_str} |"
+        yield ""
         
         # 血缘标签分布
-        lines.append("### 血缘标签分布")
-        lines.append("")
+        yield "### 血缘标签分布"
+        yield ""
         ld = self.report_data.get("label_distribution", {})
         
         if "fields_by_source" in ld:
-            lines.append("**字段血缘来源 (lineage_source)**:")
-            lines.append("")
+            yield "**字段血缘来源 (lineage_source)**:"
+            yield ""
             for source, count in ld["fields_by_source"].items():
                 label = {"api": "🔗 API 直接返回", "derived": "🔄 智能重连推导", "computed": "📊 预计算", "null": "❓ 未标记"}.get(source, source)
-                lines.append(f"- {label}: {count:,} 个")
-            lines.append("")
+                yield f"- {label}: {count:,} 个"
+            yield ""
             
         if "fields_by_penetration" in ld:
-            lines.append("**字段穿透状态 (penetration_status)**:")
-            lines.append("")
+            yield "**字段穿透状态 (penetration_status)**:"
+            yield ""
             for status, count in ld["fields_by_penetration"].items():
                 label = {"success": "✅ 穿透成功", "failed": "❌ 穿透失败", "not_applicable": "➖ 无需穿透", "null": "❓ 未标记"}.get(status, status)
-                lines.append(f"- {label}: {count:,} 个")
-            lines.append("")
+                yield f"- {label}: {count:,} 个"
+            yield ""
         
         # 去重统计
-        lines.append("---")
-        lines.append("## 📊 字段去重统计")
-        lines.append("")
+        yield "---"
+        yield "## 📊 字段去重统计"
+        yield ""
         
         ds = self.report_data.get("deduplication_stats", {})
         
         if "regular_fields" in ds:
             rf = ds["regular_fields"]
-            lines.append("### 原始字段去重")
-            lines.append("")
-            lines.append(f"| 指标 | 数值 |")
-            lines.append("|------|------|")
-            lines.append(f"| 原始实例数 | {rf.get('total_instances', 0):,} |")
-            lines.append(f"| 去重后标准字段数 | {rf.get('unique_fields', 0):,} |")
-            lines.append(f"| 去重率 | {rf.get('dedup_ratio', 0):.2%} |")
-            lines.append(f"| 平均每个标准字段的实例数 | {rf.get('avg_instances_per_field', 0):.1f} |")
-            lines.append("")
+            yield "### 原始字段去重"
+            yield ""
+            yield f"| 指标 | 数值 |"
+            yield "|------|------|"
+            yield f"| 原始实例数 | {rf.get('total_instances', 0):,} |"
+            yield f"| 去重后标准字段数 | {rf.get('unique_fields', 0):,} |"
+            yield f"| 去重率 | {rf.get('dedup_ratio', 0):.2%} |"
+            yield f"| 平均每个标准字段的实例数 | {rf.get('avg_instances_per_field', 0):.1f} |"
+            yield ""
             
             if "by_table_association" in rf:
-                lines.append("**表关联情况**:")
+                yield "**表关联情况**:"
                 for k, v in rf["by_table_association"].items():
                     label = {"has_table": "✅ 有关联表", "no_table": "❌ 无关联表"}.get(k, k)
-                    lines.append(f"- {label}: {v:,} 个")
-                lines.append("")
+                    yield f"- {label}: {v:,} 个"
+                yield ""
         
         if "calculated_fields" in ds:
             cf = ds["calculated_fields"]
-            lines.append("### 计算字段去重")
-            lines.append("")
-            lines.append(f"| 指标 | 数值 |")
-            lines.append("|------|------|")
-            lines.append(f"| 原始实例数 | {cf.get('total_instances', 0):,} |")
-            lines.append(f"| 去重后标准指标数 | {cf.get('unique_fields', 0):,} |")
-            lines.append(f"| 去重率 | {cf.get('dedup_ratio', 0):.2%} |")
-            lines.append(f"| 平均每个标准指标的实例数 | {cf.get('avg_instances_per_field', 0):.1f} |")
-            lines.append("")
+            yield "### 计算字段去重"
+            yield ""
+            yield f"| 指标 | 数值 |"
+            yield "|------|------|"
+            yield f"| 原始实例数 | {cf.get('total_instances', 0):,} |"
+            yield f"| 去重后标准指标数 | {cf.get('unique_fields', 0):,} |"
+            yield f"| 去重率 | {cf.get('dedup_ratio', 0):.2%} |"
+            yield f"| 平均每个标准指标的实例数 | {cf.get('avg_instances_per_field', 0):.1f} |"
+            yield ""
             
             if "by_complexity" in cf:
-                lines.append("**复杂度分布**:")
+                yield "**复杂度分布**:"
                 for k, v in cf["by_complexity"].items():
                     label = {"simple": "🟢 简单 (<5分)", "medium": "🟡 中等 (5-20分)", "complex": "🔴 复杂 (>20分)"}.get(k, k)
-                    lines.append(f"- {label}: {v:,} 个")
-                lines.append("")
+                    yield f"- {label}: {v:,} 个"
+                yield ""
         
         # ========== 新增：各模块血缘详情 ==========
         mld = self.report_data.get("module_lineage_details", {})
         if mld:
-            lines.append("---")
-            lines.append("## 🔍 各模块血缘建立详情")
-            lines.append("")
+            yield "---"
+            yield "## 🔍 各模块血缘建立详情"
+            yield ""
             
             # 数据库
             if "databases" in mld:
                 db = mld["databases"]
-                lines.append("### 数据库")
-                lines.append(f"- 总数: {db.get('total', 0)}")
-                lines.append(f"- 已关联表数: {db.get('linked_tables', 0)}")
-                lines.append(f"- 孤立表数: {db.get('orphan_tables', 0)}")
-                lines.append("")
+                yield "### 数据库"
+                yield f"- 总数: {db.get('total', 0)}"
+                yield f"- 已关联表数: {db.get('linked_tables', 0)}"
+                yield f"- 孤立表数: {db.get('orphan_tables', 0)}"
+                yield ""
             
             # 数据表
             if "tables" in mld:
                 tb = mld["tables"]
-                lines.append("### 数据表")
-                lines.append(f"- 总数: {tb.get('total', 0)}")
-                lines.append(f"- 物理表: {tb.get('physical', 0)}")
-                lines.append(f"- 嵌入式表: {tb.get('embedded', 0)}")
-                lines.append(f"- 已关联数据源: {tb.get('linked_to_datasource', 0)}")
-                lines.append("")
+                yield "### 数据表"
+                yield f"- 总数: {tb.get('total', 0)}"
+                yield f"- 物理表: {tb.get('physical', 0)}"
+                yield f"- 嵌入式表: {tb.get('embedded', 0)}"
+                yield f"- 已关联数据源: {tb.get('linked_to_datasource', 0)}"
+                yield ""
             
             # 数据源
             if "datasources" in mld:
                 ds = mld["datasources"]
-                lines.append("### 数据源")
-                lines.append(f"- 总数: {ds.get('total', 0)}")
-                lines.append(f"- 嵌入式: {ds.get('embedded', 0)}")
-                lines.append(f"- 已认证: {ds.get('certified', 0)}")
-                lines.append(f"- 有上游表: {ds.get('with_upstream_tables', 0)}")
-                lines.append(f"- 被工作簿引用: {ds.get('with_downstream_workbooks', 0)}")
-                lines.append(f"- 包含字段: {ds.get('with_fields', 0)}")
-                lines.append("")
+                yield "### 数据源"
+                yield f"- 总数: {ds.get('total', 0)}"
+                yield f"- 嵌入式: {ds.get('embedded', 0)}"
+                yield f"- 已认证: {ds.get('certified', 0)}"
+                yield f"- 有上游表: {ds.get('with_upstream_tables', 0)}"
+                yield f"- 被工作簿引用: {ds.get('with_downstream_workbooks', 0)}"
+                yield f"- 包含字段: {ds.get('with_fields', 0)}"
+                yield ""
             
             # 工作簿
             if "workbooks" in mld:
                 wb = mld["workbooks"]
-                lines.append("### 工作簿")
-                lines.append(f"- 总数: {wb.get('total', 0)}")
-                lines.append(f"- 有视图: {wb.get('with_views', 0)}")
-                lines.append(f"- 有数据源: {wb.get('with_datasources', 0)}")
-                lines.append(f"- 有字段: {wb.get('with_fields', 0)}")
-                lines.append("")
+                yield "### 工作簿"
+                yield f"- 总数: {wb.get('total', 0)}"
+                yield f"- 有视图: {wb.get('with_views', 0)}"
+                yield f"- 有数据源: {wb.get('with_datasources', 0)}"
+                yield f"- 有字段: {wb.get('with_fields', 0)}"
+                yield ""
             
             # 视图
             if "views" in mld:
                 vw = mld["views"]
-                lines.append("### 视图")
-                lines.append(f"- 总数: {vw.get('total', 0)}")
-                lines.append(f"- 仪表盘: {vw.get('dashboards', 0)}")
-                lines.append(f"- Sheet: {vw.get('sheets', 0)}")
-                lines.append(f"- 有字段引用: {vw.get('with_field_references', 0)}")
-                lines.append(f"- Sheet被仪表盘包含: {vw.get('sheets_included_in_dashboards', 0)}")
-                lines.append("")
+                yield "### 视图"
+                yield f"- 总数: {vw.get('total', 0)}"
+                yield f"- 仪表盘: {vw.get('dashboards', 0)}"
+                yield f"- Sheet: {vw.get('sheets', 0)}"
+                yield f"- 有字段引用: {vw.get('with_field_references', 0)}"
+                yield f"- Sheet被仪表盘包含: {vw.get('sheets_included_in_dashboards', 0)}"
+                yield ""
             
             # 字段
             if "fields" in mld:
                 fd = mld["fields"]
-                lines.append("### 字段")
-                lines.append(f"- 总数: {fd.get('total', 0)}")
-                lines.append(f"- 计算字段: {fd.get('calculated', 0)}")
-                lines.append(f"- 普通字段: {fd.get('regular', 0)}")
-                lines.append(f"- 有表关联: {fd.get('with_table', 0)}")
-                lines.append(f"- 有数据源关联: {fd.get('with_datasource', 0)}")
-                lines.append(f"- 有工作簿关联: {fd.get('with_workbook', 0)}")
-                lines.append(f"- 被视图使用: {fd.get('used_in_views', 0)}")
-                lines.append("")
+                yield "### 字段"
+                yield f"- 总数: {fd.get('total', 0)}"
+                yield f"- 计算字段: {fd.get('calculated', 0)}"
+                yield f"- 普通字段: {fd.get('regular', 0)}"
+                yield f"- 有表关联: {fd.get('with_table', 0)}"
+                yield f"- 有数据源关联: {fd.get('with_datasource', 0)}"
+                yield f"- 有工作簿关联: {fd.get('with_workbook', 0)}"
+                yield f"- 被视图使用: {fd.get('used_in_views', 0)}"
+                yield ""
         
         # ========== 新增：类型分布 ==========
         td = self.report_data.get("type_distribution", {})
         if td:
-            lines.append("---")
-            lines.append("## 📈 类型分布")
-            lines.append("")
+            yield "---"
+            yield "## 📈 类型分布"
+            yield ""
             
             if "field_roles" in td:
-                lines.append("### 字段角色分布")
+                yield "### 字段角色分布"
                 for role, count in td["field_roles"].items():
-                    lines.append(f"- {role}: {count:,}")
-                lines.append("")
+                    yield f"- {role}: {count:,}"
+                yield ""
             
             if "field_data_types" in td:
-                lines.append("### 字段数据类型 Top 15")
+                yield "### 字段数据类型 Top 15"
                 for dtype, count in list(td["field_data_types"].items())[:15]:
-                    lines.append(f"- {dtype}: {count:,}")
-                lines.append("")
+                    yield f"- {dtype}: {count:,}"
+                yield ""
             
             if "table_types" in td:
-                lines.append("### 数据表类型")
+                yield "### 数据表类型"
                 for ttype, count in td["table_types"].items():
                     label = {"physical": "📋 物理表", "embedded": "📦 嵌入式表"}.get(ttype, ttype)
-                    lines.append(f"- {label}: {count:,}")
-                lines.append("")
+                    yield f"- {label}: {count:,}"
+                yield ""
             
             if "view_types" in td:
-                lines.append("### 视图类型")
+                yield "### 视图类型"
                 for vtype, count in td["view_types"].items():
                     label = {"dashboard": "📊 仪表盘", "sheet": "📄 Sheet"}.get(vtype, vtype)
-                    lines.append(f"- {label}: {count:,}")
-                lines.append("")
+                    yield f"- {label}: {count:,}"
+                yield ""
         
         # ========== 新增：覆盖率统计 ==========
         cs = self.report_data.get("coverage_stats", {})
         if cs:
-            lines.append("---")
-            lines.append("## 📝 覆盖率统计")
-            lines.append("")
+            yield "---"
+            yield "## 📝 覆盖率统计"
+            yield ""
             
             if "field_description" in cs:
                 fd = cs["field_description"]
-                lines.append("### 字段描述覆盖率")
-                lines.append(f"- 总字段数: {fd.get('total', 0):,}")
-                lines.append(f"- 有描述: {fd.get('with_description', 0):,}")
-                lines.append(f"- 无描述: {fd.get('without_description', 0):,}")
-                lines.append(f"- **覆盖率: {fd.get('coverage_rate', 0):.2%}**")
-                lines.append("")
+                yield "### 字段描述覆盖率"
+                yield f"- 总字段数: {fd.get('total', 0):,}"
+                yield f"- 有描述: {fd.get('with_description', 0):,}"
+                yield f"- 无描述: {fd.get('without_description', 0):,}"
+                yield f"- **覆盖率: {fd.get('coverage_rate', 0):.2%}**"
+                yield ""
             
             if "datasource_description" in cs:
                 dd = cs["datasource_description"]
-                lines.append("### 数据源描述覆盖率")
-                lines.append(f"- 总数据源: {dd.get('total', 0):,}")
-                lines.append(f"- 有描述: {dd.get('with_description', 0):,}")
-                lines.append(f"- **覆盖率: {dd.get('coverage_rate', 0):.2%}**")
-                lines.append("")
+                yield "### 数据源描述覆盖率"
+                yield f"- 总数据源: {dd.get('total', 0):,}"
+                yield f"- 有描述: {dd.get('with_description', 0):,}"
+                yield f"- **覆盖率: {dd.get('coverage_rate', 0):.2%}**"
+                yield ""
             
             if "datasource_certification" in cs:
                 dc = cs["datasource_certification"]
-                lines.append("### 数据源认证率")
-                lines.append(f"- 已发布数据源: {dc.get('published_total', 0):,}")
-                lines.append(f"- 已认证: {dc.get('certified', 0):,}")
-                lines.append(f"- **认证率: {dc.get('certification_rate', 0):.2%}**")
-                lines.append("")
+                yield "### 数据源认证率"
+                yield f"- 已发布数据源: {dc.get('published_total', 0):,}"
+                yield f"- 已认证: {dc.get('certified', 0):,}"
+                yield f"- **认证率: {dc.get('certification_rate', 0):.2%}**"
+                yield ""
         
         # ========== 新增：热门资产 ==========
         ha = self.report_data.get("hot_assets", {})
         if ha:
-            lines.append("---")
-            lines.append("## 🔥 热门资产 Top 10")
-            lines.append("")
+            yield "---"
+            yield "## 🔥 热门资产 Top 10"
+            yield ""
             
             if ha.get("hot_views"):
-                lines.append("### 热门视图")
-                lines.append("| 排名 | 视图名称 | 访问量 |")
-                lines.append("|------|----------|--------|")
+                yield "### 热门视图"
+                yield "| 排名 | 视图名称 | 访问量 |"
+                yield "|------|----------|--------|"
                 for i, v in enumerate(ha["hot_views"][:10], 1):
-                    lines.append(f"| {i} | {v['name']} | {v['views']:,} |")
-                lines.append("")
+                    yield f"| {i} | {v['name']} | {v['views']:,} |"
+                yield ""
             
             if ha.get("hot_fields"):
-                lines.append("### 高频使用字段")
-                lines.append("| 排名 | 字段名称 | 使用次数 |")
-                lines.append("|------|----------|----------|")
+                yield "### 高频使用字段"
+                yield "| 排名 | 字段名称 | 使用次数 |"
+                yield "|------|----------|----------|"
                 for i, f in enumerate(ha["hot_fields"][:10], 1):
-                    lines.append(f"| {i} | {f['name']} | {f['usage']:,} |")
-                lines.append("")
+                    yield f"| {i} | {f['name']} | {f['usage']:,} |"
+                yield ""
             
             if ha.get("hot_datasources"):
-                lines.append("### 被引用最多的数据源")
-                lines.append("| 排名 | 数据源名称 | 工作簿引用数 |")
-                lines.append("|------|------------|--------------|")
+                yield "### 被引用最多的数据源"
+                yield "| 排名 | 数据源名称 | 工作簿引用数 |"
+                yield "|------|------------|--------------|"
                 for i, d in enumerate(ha["hot_datasources"][:10], 1):
-                    lines.append(f"| {i} | {d['name']} | {d['workbook_count']:,} |")
-                lines.append("")
+                    yield f"| {i} | {d['name']} | {d['workbook_count']:,} |"
+                yield ""
         
         # ========== 新增：项目分布 ==========
         pd = self.report_data.get("project_distribution", {})
         if pd and pd.get("by_project"):
-            lines.append("---")
-            lines.append("## 📁 项目资产分布")
-            lines.append("")
-            lines.append("| 项目 | 数据源 | 工作簿 | 总资产 |")
-            lines.append("|------|--------|--------|--------|")
+            yield "---"
+            yield "## 📁 项目资产分布"
+            yield ""
+            yield "| 项目 | 数据源 | 工作簿 | 总资产 |"
+            yield "|------|--------|--------|--------|"
             for p in pd["by_project"]:
-                lines.append(f"| {p['name']} | {p['datasource_count']} | {p['workbook_count']} | {p['total_assets']} |")
-            lines.append("")
+                yield f"| {p['name']} | {p['datasource_count']} | {p['workbook_count']} | {p['total_assets']} |"
+            yield ""
         
         # ========== 新增：重复最多的字段 ==========
         td = self.report_data.get("dedup_top_duplicates", {})
         if td:
-            lines.append("---")
-            lines.append("## 🔄 重复最多的字段 Top 10")
-            lines.append("")
+            yield "---"
+            yield "## 🔄 重复最多的字段 Top 10"
+            yield ""
             
             if td.get("top_regular_fields"):
-                lines.append("### 原始字段（实例数最多）")
-                lines.append("| 排名 | 字段名称 | 实例数 |")
-                lines.append("|------|----------|--------|")
+                yield "### 原始字段（实例数最多）"
+                yield "| 排名 | 字段名称 | 实例数 |"
+                yield "|------|----------|--------|"
                 for i, f in enumerate(td["top_regular_fields"][:10], 1):
-                    lines.append(f"| {i} | {f['name']} | {f['instances']} |")
-                lines.append("")
+                    yield f"| {i} | {f['name']} | {f['instances']} |"
+                yield ""
             
             if td.get("top_calculated_fields"):
-                lines.append("### 计算字段（实例数最多）")
-                lines.append("| 排名 | 指标名称 | 实例数 |")
-                lines.append("|------|----------|--------|")
+                yield "### 计算字段（实例数最多）"
+                yield "| 排名 | 指标名称 | 实例数 |"
+                yield "|------|----------|--------|"
                 for i, f in enumerate(td["top_calculated_fields"][:10], 1):
-                    lines.append(f"| {i} | {f['name']} | {f['instances']} |")
-                lines.append("")
+                    yield f"| {i} | {f['name']} | {f['instances']} |"
+                yield ""
         
         # 未建立血缘
-        lines.append("---")
-        lines.append("## ⚠️ 未建立血缘/异常情况")
-        lines.append("")
+        yield "---"
+        yield "## ⚠️ 未建立血缘/异常情况"
+        yield ""
         
         ul = self.report_data.get("unestablished_lineage", {})
-        lines.append("| 异常类型 | 数量 | 说明 |")
-        lines.append("|----------|------|------|")
+        yield "| 异常类型 | 数量 | 说明 |"
+        yield "|----------|------|------|"
         
         issues = [
             ("fields_without_datasource", "无数据源关联", "字段未关联到任何数据源"),
@@ -1007,17 +1077,15 @@ class SyncReportGenerator:
         for key, name, desc in issues:
             count = ul.get(key, 0)
             if count > 0:
-                lines.append(f"| ❌ {name} | {count:,} | {desc} |")
+                yield f"| ❌ {name} | {count:,} | {desc} |"
             else:
-                lines.append(f"| ✅ {name} | {count} | {desc} |")
-        lines.append("")
+                yield f"| ✅ {name} | {count} | {desc} |"
+        yield ""
         
         # 结尾
-        lines.append("---")
-        lines.append("")
-        lines.append("*本报告由 Tableau 元数据同步系统自动生成*")
-        
-        return "\n".join(lines)
+        yield "---"
+        yield ""
+        yield "*本报告由 Tableau 元数据同步系统自动生成*"
             
     def _print_report(self):
         """打印报告摘要到控制台"""
@@ -0,0 +1,260 @@
+"""
+同步调度器
+按 cron 表达式定时登记全量 / 增量 / 仅使用统计同步任务
+
+- 每类任务独立的 cron 表达式（5 段：分 时 日 月 周），留空表示不调度
+- 触发时间叠加随机抖动，避免多个环境在整点同时请求 Tableau
+- 已有任务运行中时跳过本次触发，并在 sync_logs 中以 scheduled_<任务类型> 记录 skipped
+  （不占用运行级 sync_type，变更日志的保留窗口与数据代数不受影响）
+- 由常驻同步执行进程 (python -m backend.sync_runner --schedule) 在后台线程中驱动
+"""
+
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from backend.config import Config
+from backend.models import SyncLog, get_engine, get_session
+
+
+# 调度优先级：同一时刻多个任务到期时按此顺序登记（后者会因互斥被跳过）
+SCHEDULED_JOB_TYPES = ("full", "incremental", "usage")
+
+# 跳过记录的 sync_type 前缀：scheduled_full / scheduled_incremental / scheduled_usage
+SKIPPED_SYNC_TYPE_PREFIX = "scheduled_"
+SKIPPED_SYNC_TYPES = tuple(SKIPPED_SYNC_TYPE_PREFIX + t for t in SCHEDULED_JOB_TYPES)
+
+_CRON_ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+# (最小值, 最大值)
+_CRON_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# 表示“不限定”的字段取值
+_CRON_UNRESTRICTED = ("*", "?")
+
+
+class CronExpression:
+    """5 段 cron 表达式：分 时 日 月 周
+
+    支持 *、列表 (1,15)、范围 (8-18)、步长 (*/15, 8-18/2) 以及 @daily 等别名；
+    周字段 0 和 7 均表示周日。日与周同时限定时按标准 cron 语义取并集；
+    日、周字段的 ? 与 * 相同，表示不限定（*/2 等带步长的写法仍视为限定）。
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        normalized = _CRON_ALIASES.get(self.expression.lower(), self.expression)
+        parts = normalized.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron 表达式需要 5 段: {expression!r}")
+
+        fields = [
+            self._parse_field(part, low, high)
+            for part, (low, high) in zip(parts, _CRON_FIELD_RANGES)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = fields
+        # cron 周日为 0/7，Python weekday() 周一为 0
+        self.weekdays = {(d - 1) % 7 for d in weekdays}
+        self.day_restricted = parts[2] not in _CRON_UNRESTRICTED
+        self.weekday_restricted = parts[4] not in _CRON_UNRESTRICTED
+
+    @staticmethod
+    def _parse_field(part: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for item in part.split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/", 1)
+                step = int(step_text)
+                if step <= 0:
+                    raise ValueError(f"cron 步长必须为正数: {part!r}")
+            if item in _CRON_UNRESTRICTED:
+                start, end = low, high
+            elif "-" in item:
+                start_text, end_text = item.split("-", 1)
+                start, end = int(start_text), int(end_text)
+            else:
+                start = int(item)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"cron 字段超出范围 [{low}-{high}]: {part!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = dt.weekday() in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        if self.day_restricted:
+            return day_ok
+        if self.weekday_restricted:
+            return weekday_ok
+        return True
+
+    def matches(self, dt: datetime) -> bool:
+        return (
+            dt.minute in self.minutes
+            and dt.hour in self.hours
+            and dt.month in self.months
+            and self._day_matches(dt)
+        )
+
+    def next_after(self, dt: datetime) -> datetime:
+        """返回严格晚于 dt 的下一个触发时间（分钟精度）"""
+        candidate = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                # 跳到下个月 1 日 00:00
+                year = candidate.year + (1 if candidate.month == 12 else 0)
+                month = 1 if candidate.month == 12 else candidate.month + 1
+                candidate = candidate.replace(
+                    year=year, month=month, day=1, hour=0, minute=0
+                )
+                continue
+            if not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"cron 表达式无可用触发时间: {self.expression!r}")
+
+
+def configured_schedules() -> Dict[str, str]:
+    """读取配置中的调度表达式（空字符串表示不调度）"""
+    return {
+        "full": Config.SYNC_SCHEDULE_FULL,
+        "incremental": Config.SYNC_SCHEDULE_INCREMENTAL,
+        "usage": Config.SYNC_SCHEDULE_USAGE,
+    }
+
+
+class SyncScheduler:
+    """同步调度器：到期时登记 sync_jobs 任务，运行中则跳过并记录"""
+
+    def __init__(
+        self,
+        db_path: str = None,
+        schedules: Dict[str, str] = None,
+        jitter_seconds: int = None,
+    ):
+        self.db_path = db_path or Config.DATABASE_PATH
+        self.jitter_seconds = (
+            Config.SYNC_SCHEDULE_JITTER_SECONDS
+            if jitter_seconds is None
+            else jitter_seconds
+        )
+        self.crons: Dict[str, CronExpression] = {}
+        for job_type, expression in (schedules or configured_schedules()).items():
+            if expression and expression.strip():
+                self.crons[job_type] = CronExpression(expression)
+        self.next_fire: Dict[str, datetime] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _schedule_next(self, job_type: str, after: datetime):
+        base = self.crons[job_type].next_after(after)
+        jitter = random.uniform(0, self.jitter_seconds) if self.jitter_seconds else 0
+        self.next_fire[job_type] = base + timedelta(seconds=jitter)
+
+    def describe(self) -> List[Dict]:
+        return [
+            {
+                "jobType": job_type,
+                "cron": cron.expression,
+                "nextRunAt": self.next_fire[job_type].isoformat()
+                if job_type in self.next_fire
+                else None,
+            }
+            for job_type, cron in self.crons.items()
+        ]
+
+    def tick(self, now: datetime = None) -> List[str]:
+        """检查到期任务并登记，返回本次登记成功的任务类型"""
+        from backend.services.sync_jobs import JobConflictError, enqueue_job
+
+        now = now or datetime.now()
+        for job_type in self.crons:
+            if job_type not in self.next_fire:
+                self._schedule_next(job_type, now)
+
+        due = [
+            job_type
+            for job_type in SCHEDULED_JOB_TYPES
+            if job_type in self.next_fire and self.next_fire[job_type] <= now
+        ]
+        if not due:
+            return []
+
+        enqueued = []
+        engine = get_engine(self.db_path)
+        session = get_session(engine)
+        try:
+            for job_type in due:
+                self._schedule_next(job_type, now)
+                try:
+                    job = enqueue_job(session, job_type=job_type, requested_by="scheduler")
+                    enqueued.append(job_type)
+                    print(f"⏰ 调度触发 {job_type} 同步 (任务 #{job.id})")
+                except JobConflictError as e:
+                    running = f" #{e.job.id} ({e.job.job_type})" if e.job else ""
+                    reason = f"已有同步任务{running}进行中，跳过本次调度"
+                    session.add(
+                        SyncLog(
+                            sync_type=SKIPPED_SYNC_TYPE_PREFIX + job_type,
+                            status="skipped",
+                            started_at=now,
+                            completed_at=now,
+                            records_synced=0,
+                            error_message=reason,
+                        )
+                    )
+                    session.commit()
+                    print(f"⏭️ 调度跳过 {job_type} 同步: {reason}")
+        finally:
+            session.close()
+            engine.dispose()
+
+        if enqueued:
+            from backend.services.sync_jobs import ensure_runner
+
+            ensure_runner(self.db_path)
+        return enqueued
+
+    def _loop(self, interval: int):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ 调度检查失败: {e}")
+            self._stop.wait(interval)
+
+    def start(self, interval: int = 20):
+        """在后台线程中运行调度（执行同步任务时仍可检查并记录跳过）"""
+        if not self.crons:
+            print("ℹ️ 未配置同步调度表达式，调度器未启动")
+            return
+        for item in self.describe():
+            print(f"⏰ 同步调度: {item['jobType']} = {item['cron']}")
+        self._thread = threading.Thread(target=self._loop, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
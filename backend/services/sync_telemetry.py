@@ -0,0 +1,127 @@
+"""
+同步遥测
+按阶段采集墙钟耗时、Tableau 请求数/下载字节、GraphQL 错误、SQL 语句数、写入行数与峰值内存，
+写入 sync_stage_metrics 表，供 /api/sync/runs/<id>/profile 对比各阶段耗时变化
+
+SQL 统计挂在全局 Engine 事件上并按线程过滤，因此 V5 迁移等自建引擎的语句也会计入当前阶段；
+阶段内派生的工作线程（如报告的并发扫描）需在 track_thread() 中执行，其语句才会并入所属阶段
+（多站点并发同步时各站点在各自线程中运行，按线程过滤避免互相计入）。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from backend.models import SyncStageMetric
+from .streaming import peak_rss_mb
+
+
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class SyncTelemetry:
+    """同步阶段遥测采集器
+
+    用法:
+        telemetry = SyncTelemetry(client)
+        telemetry.stage_started("users")
+        ...
+        telemetry.stage_finished("users", records=10)
+        telemetry.flush(session, run_id)
+    """
+
+    def __init__(self, client=None):
+        self.client = client
+        self.thread_ids = {threading.get_ident()}
+        self._lock = threading.Lock()
+        self.sql_statements = 0
+        self.rows_written = 0
+        self._open: Dict[str, dict] = {}
+        self._pending: List[SyncStageMetric] = []
+        self._paused = False
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._paused or threading.get_ident() not in self.thread_ids:
+            return
+        rows = 0
+        if statement.lstrip()[:7].upper().startswith(_WRITE_PREFIXES):
+            rowcount = getattr(cursor, "rowcount", -1)
+            if rowcount and rowcount > 0:
+                rows = rowcount
+        with self._lock:
+            self.sql_statements += 1
+            self.rows_written += rows
+
+    @contextmanager
+    def track_thread(self):
+        """在工作线程中使用：期间该线程执行的 SQL 计入当前阶段"""
+        thread_id = threading.get_ident()
+        with self._lock:
+            self.thread_ids = self.thread_ids | {thread_id}
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.thread_ids = self.thread_ids - {thread_id}
+
+    def _counters(self) -> dict:
+        client = self.client
+        return {
+            "tableau_requests": getattr(client, "request_count", 0),
+            "tableau_bytes": getattr(client, "bytes_downloaded", 0),
+            "graphql_errors": getattr(client, "graphql_error_count", 0),
+            "sql_statements": self.sql_statements,
+            "rows_written": self.rows_written,
+        }
+
+    def stage_started(self, stage: str):
+        self._open[stage] = {
+            "started_at": datetime.now(),
+            "perf": time.perf_counter(),
+            "counters": self._counters(),
+        }
+
+    def stage_finished(self, stage: str, records: Optional[int] = None):
+        opened = self._open.pop(stage, None)
+        if opened is None:
+            return
+        current = self._counters()
+        deltas = {k: current[k] - opened["counters"][k] for k in current}
+        self._pending.append(
+            SyncStageMetric(
+                stage=stage,
+                started_at=opened["started_at"],
+                completed_at=datetime.now(),
+                wall_ms=(time.perf_counter() - opened["perf"]) * 1000,
+                records=records,
+                peak_rss_mb=peak_rss_mb(),
+                **deltas,
+            )
+        )
+
+    def flush(self, session, sync_run_id: Optional[int]):
+        """写入已完成阶段的指标（运行日志尚未创建时暂存，下次调用再写）"""
+        if not sync_run_id or not self._pending:
+            return
+        self._paused = True  # 指标自身的写入不计入阶段统计
+        try:
+            for metric in self._pending:
+                metric.sync_run_id = sync_run_id
+                session.add(metric)
+            session.commit()
+            self._pending = []
+        except Exception as e:
+            session.rollback()
+            print(f"  ⚠️ 阶段遥测写入失败: {e}")
+        finally:
+            self._paused = False
+
+    def close(self):
+        if event.contains(Engine, "after_cursor_execute", self._after_cursor_execute):
+            event.remove(Engine, "after_cursor_execute", self._after_cursor_execute)
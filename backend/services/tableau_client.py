@@ -5,9 +5,12 @@ Tableau Metadata API 客户端
 import os
 import sys
 import json
+import io
+import threading
 import requests
 from collections import defaultdict
 from typing import Optional, List, Dict, Any
+from urllib3 import HTTPResponse
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -18,8 +21,9 @@ class TableauMetadataClient:
     """Tableau Metadata API 客户端"""
     
     def __init__(self, base_url: str, username: str = None, password: str = None, 
-                 pat_name: str = None, pat_secret: str = None):
+                 pat_name: str = None, pat_secret: str = None, site_content_url: str = ""):
         self.base_url = base_url.rstrip('/')
+        self.site_content_url = site_content_url or ""  # 站点 contentUrl，空字符串为默认站点
         self.username = username
         self.password = password
         self.pat_name = pat_name
@@ -27,6 +31,65 @@ class TableauMetadataClient:
         self.auth_token: Optional[str] = None
         self.site_id: Optional[str] = None
         self.api_version = "3.10"
+        # 请求遥测（累计值，同步按阶段取差值）
+        self.request_count = 0
+        self.bytes_downloaded = 0
+        self.graphql_error_count = 0
+        self.reauth_count = 0
+        # 单飞锁：token 过期时并发请求只触发一次重新登录
+        self._auth_lock = threading.Lock()
+    
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """发送 HTTP 请求并累计请求数与下载字节数"""
+        response = requests.request(method, url, hooks={"response": self._count_wire_bytes}, **kwargs)
+        self.request_count += 1
+        return response
+    
+    def _count_wire_bytes(self, response: requests.Response, **kwargs) -> requests.Response:
+        """响应钩子：按传输字节（压缩后）累计下载量
+
+        在 requests 读取响应体之前先读出未解码的字节计数，再包回 response.raw，
+        由 requests 按 Content-Encoding 正常解码；分块传输时 Content-Length 缺失、
+        urllib3 的 tell() 也不计数，所以不能只看响应头
+        """
+        raw = response.raw
+        if not isinstance(raw, HTTPResponse):
+            # 非 urllib3 响应（如自定义适配器）：退回 Content-Length
+            self.bytes_downloaded += int(response.headers.get("Content-Length") or len(response.content))
+            return response
+        body = raw.read(decode_content=False)
+        raw.release_conn()
+        self.bytes_downloaded += len(body)
+        content_encoding = raw.headers.get("Content-Encoding")
+        response.raw = HTTPResponse(body=io.BytesIO(body), status=raw.status, preload_content=False,
+                                    headers={"Content-Encoding": content_encoding} if content_encoding else {})
+        return response
+    
+    def _authorized_request(self, method: str, url: str, headers: Dict[str, str] = None,
+                            **kwargs) -> requests.Response:
+        """携带认证 token 发送请求；遇到 401（token 过期）时重新登录并重试一次"""
+        token = self.auth_token
+        response = self._request(method, url, headers={**(headers or {}), "X-Tableau-Auth": token},
+                                 **kwargs)
+        if response.status_code != 401:
+            return response
+        
+        self._refresh_token(token)
+        return self._request(method, url, headers={**(headers or {}), "X-Tableau-Auth": self.auth_token},
+                             **kwargs)
+    
+    def _refresh_token(self, stale_token: Optional[str]):
+        """重新登录刷新 token
+        
+        持锁后若 token 已被其他线程刷新则直接复用，保证同一个过期 token 只重新登录一次。
+        """
+        with self._auth_lock:
+            if self.auth_token and self.auth_token != stale_token:
+                return
+            print("  🔑 认证 token 已过期，重新登录...")
+            if not self.sign_in():
+                raise RuntimeError("认证 token 已过期，且重新登录失败")
+            self.reauth_count += 1
     
     def sign_in(self) -> bool:
         """登录获取认证 token (支持用户名密码或 PAT)"""
@@ -39,7 +102,7 @@ class TableauMetadataClient:
                 "credentials": {
                     "personalAccessTokenName": self.pat_name,
                     "personalAccessTokenSecret": self.pat_secret,
-                    "site": {"contentUrl": ""}
+                    "site": {"contentUrl": self.site_content_url}
                 }
             }
             print(f"  使用 PAT 认证: {self.pat_name}")
@@ -49,7 +112,7 @@ class TableauMetadataClient:
                 "credentials": {
                     "name": self.username,
                     "password": self.password,
-                    "site": {"contentUrl": ""}
+                    "site": {"contentUrl": self.site_content_url}
                 }
             }
             print(f"  使用用户名密码认证: {self.username}")
@@ -60,14 +123,15 @@ class TableauMetadataClient:
         }
         
         try:
-            response = requests.post(signin_url, headers=headers, json=payload, timeout=30)
+            response = self._request("POST", signin_url, headers=headers, json=payload, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
                 credentials = data.get("credentials", {})
                 self.auth_token = credentials.get("token")
                 self.site_id = credentials.get("site", {}).get("id")
-                print(f"✅ 登录成功 (Token: {self.auth_token[:20]}...)")
+                site_label = f", 站点: {self.site_content_url}" if self.site_content_url else ""
+                print(f"✅ 登录成功 (Token: {self.auth_token[:20]}...{site_label})")
                 return True
             else:
                 print(f"❌ 登录失败: {response.text}")
@@ -85,7 +149,7 @@ class TableauMetadataClient:
         headers = {"X-Tableau-Auth": self.auth_token}
         
         try:
-            response = requests.post(signout_url, headers=headers, timeout=30)
+            response = self._request("POST", signout_url, headers=headers, timeout=30)
             if response.status_code == 204:
                 print("✅ 已登出")
         except Exception as e:
@@ -93,8 +157,8 @@ class TableauMetadataClient:
         finally:
             self.auth_token = None
     
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """执行 GraphQL 查询"""
+    def execute_query(self, query: str, variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """执行 GraphQL 查询；外部传入的取值通过 variables 传递，不拼入查询文本"""
         if not self.auth_token:
             raise RuntimeError("未登录，请先调用 sign_in()")
         
@@ -102,13 +166,17 @@ class TableauMetadataClient:
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
-            "X-Tableau-Auth": self.auth_token
         }
         
-        response = requests.post(url, headers=headers, json={"query": query}, timeout=60)
+        body = {"query": query}
+        if variables:
+            body["variables"] = variables
+        response = self._authorized_request("POST", url, headers=headers, json=body, timeout=60)
         
         if response.status_code == 200:
-            return response.json()
+            result = response.json()
+            self.graphql_error_count += len(result.get("errors") or [])
+            return result
         else:
             raise RuntimeError(f"GraphQL 查询失败: {response.status_code} - {response.text}")
     
@@ -129,7 +197,6 @@ class TableauMetadataClient:
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
-            "X-Tableau-Auth": self.auth_token
         }
         
         usage_map = {}
@@ -147,7 +214,7 @@ class TableauMetadataClient:
             }
             
             try:
-                response = requests.get(url, headers=headers, params=params, timeout=30)
+                response = self._authorized_request("GET", url, headers=headers, params=params, timeout=30)
                 
                 if response.status_code != 200:
                     print(f"  ❌ REST API 获取失败: {response.status_code} - {response.text}")
@@ -193,6 +260,57 @@ class TableauMetadataClient:
         
         print(f"  📌 构建 luid 映射: {len(luid_map)} 条 (用于回溯补充)")
         return usage_map, luid_map    
+
+    def fetch_change_markers(self) -> Dict[str, Dict[str, Optional[str]]]:
+        """获取工作簿与已发布数据源的 updatedAt，用于增量同步前判断是否有变化
+
+        返回:
+            {"workbook": {id: updatedAt}, "datasource": {id: updatedAt}}
+        """
+        query = """
+        {
+            workbooks {
+                id
+                updatedAt
+            }
+            publishedDatasources {
+                id
+                updatedAt
+            }
+        }
+        """
+        result = self.execute_query(query)
+        if "errors" in result and not result.get("data"):
+            raise RuntimeError(f"获取变更标记失败: {result['errors']}")
+
+        data = result.get("data") or {}
+        return {
+            "workbook": {
+                wb["id"]: wb.get("updatedAt") for wb in data.get("workbooks") or [] if wb
+            },
+            "datasource": {
+                ds["id"]: ds.get("updatedAt")
+                for ds in data.get("publishedDatasources") or []
+                if ds
+            },
+        }
+
+    def fetch_asset_id_by_luid(self, asset_type: str, luid: str) -> Optional[str]:
+        """按 REST LUID 查找工作簿/已发布数据源的 Metadata API ID（Webhook 只提供 LUID），不存在时返回 None"""
+        root = "workbooks" if asset_type == "workbook" else "publishedDatasources"
+        query = """
+        query assetByLuid($luid: String) {
+            %s(filter: {luid: $luid}) {
+                id
+            }
+        }
+        """ % root
+        result = self.execute_query(query, {"luid": luid})
+        if "errors" in result and not result.get("data"):
+            raise RuntimeError(f"按 LUID 查找资产失败: {result['errors']}")
+        found = (result.get("data") or {}).get(root) or []
+        return found[0]["id"] if found and found[0] else None
+
     def fetch_databases(self) -> List[Dict]:
         """获取所有数据库（增强版）"""
         query = """
@@ -334,11 +452,11 @@ class TableauMetadataClient:
             return ds_list[0]
         return None
 
-    def fetch_datasources(self) -> List[Dict]:
-        """获取所有已发布数据源（增强版）"""
+    def fetch_datasources(self, ds_id: str = None) -> List[Dict]:
+        """获取所有已发布数据源（增强版）；指定 ds_id 时仅获取该数据源"""
         query = """
         {
-            publishedDatasources {
+            %s {
                 id
                 luid
                 name
@@ -368,21 +486,27 @@ class TableauMetadataClient:
                 }
             }
         }
-        """
+        """ % self._datasource_selector(ds_id)
         result = self.execute_query(query)
         
         # 检查错误并回退
         if "errors" in result:
             print(f"  ⚠️ GraphQL 警告: {result['errors']}")
-            return self._fetch_datasources_fallback()
+            return self._fetch_datasources_fallback(ds_id)
         
         return result.get("data", {}).get("publishedDatasources", [])
     
-    def _fetch_datasources_fallback(self) -> List[Dict]:
+    @staticmethod
+    def _datasource_selector(ds_id: str = None) -> str:
+        if ds_id:
+            return 'publishedDatasources(filter: {id: "%s"})' % ds_id
+        return "publishedDatasources"
+    
+    def _fetch_datasources_fallback(self, ds_id: str = None) -> List[Dict]:
         """回退：使用简化查询获取数据源"""
         query = """
         {
-            publishedDatasources {
+            %s {
                 id
                 name
                 projectName
@@ -398,7 +522,7 @@ class TableauMetadataClient:
                 }
             }
         }
-        """
+        """ % self._datasource_selector(ds_id)
         result = self.execute_query(query)
         return result.get("data", {}).get("publishedDatasources", [])
     
@@ -545,9 +669,72 @@ class TableauMetadataClient:
             
             all_workbooks.append(wb_detail)
     
+    def fetch_workbook_detail(self, wb_id: str) -> Optional[Dict]:
+        """获取单个工作簿详情（结构与 fetch_workbooks 的元素相同），不存在时返回 None"""
+        found = []
+        try:
+            self._fetch_workbooks_chunk([{"id": wb_id}], found, include_owner=True)
+        except Exception:
+            print("  ⚠️ 工作簿详情查询失败，尝试降级重试 (不含 Owner)...")
+            self._fetch_workbooks_chunk([{"id": wb_id}], found, include_owner=False)
+        return found[0] if found else None
+    
     def fetch_fields(self) -> List[Dict]:
         all_fields = []
         
+        index = self._fetch_field_datasource_index()
+        if index is None:
+            return []
+        published, embedded, embedded_to_published = index
+
+        # 分别处理两种数据源
+        self._batch_fetch_fields(published, "publishedDatasources", all_fields)
+        self._batch_fetch_fields(embedded, "embeddedDatasources", all_fields, embedded_to_published)
+        
+        print(f"  ✅ 共采集到 {len(all_fields)} 个字段")
+        return all_fields
+
+    def fetch_fields_for_datasources(self, published_ids: List[str] = None,
+                                     embedded_datasources: List[Dict] = None) -> List[Dict]:
+        """获取指定数据源的字段（定向刷新用），返回结构与 fetch_fields 相同
+
+        参数:
+            published_ids: 已发布数据源 ID 列表
+            embedded_datasources: 工作簿详情中的 embeddedDatasources（含 upstreamDatasources，用于血缘穿透）
+        """
+        all_fields = []
+        published = [{"id": ds_id} for ds_id in published_ids or []]
+        embedded = [ds for ds in embedded_datasources or [] if ds and ds.get("id")]
+        embedded_to_published = {}
+        for ds in embedded:
+            upstreams = [up for up in ds.get("upstreamDatasources") or [] if up and up.get("id")]
+            if upstreams:
+                embedded_to_published[ds["id"]] = upstreams[0]["id"]
+
+        self._batch_fetch_fields(published, "publishedDatasources", all_fields)
+        self._batch_fetch_fields(embedded, "embeddedDatasources", all_fields, embedded_to_published)
+        return all_fields
+
+    def iter_fields(self):
+        """流式获取字段：按批次产出 (type_name, fields)，先发布式后嵌入式
+
+        与 fetch_fields 返回相同结构的字段数据，但不在内存中累积全量字段，
+        适用于字段规模较大时的有界内存同步。
+        """
+        index = self._fetch_field_datasource_index()
+        if index is None:
+            return
+        published, embedded, embedded_to_published = index
+
+        yield from self._iter_field_batches(published, "publishedDatasources")
+        yield from self._iter_field_batches(embedded, "embeddedDatasources", embedded_to_published)
+
+    def _fetch_field_datasource_index(self):
+        """获取字段同步所需的数据源列表及嵌入式到发布式的映射
+
+        返回:
+            tuple: (published, embedded, embedded_to_published)，查询失败返回 None
+        """
         # 1. 获取所有数据源 ID
         print(f"  正在获取数据源列表以同步字段...")
         ds_query = """
@@ -572,7 +759,7 @@ class TableauMetadataClient:
         ds_result = self.execute_query(ds_query)
         if "errors" in ds_result and not ds_result.get("data"):
             print(f"  ⚠️ 获取数据源失败: {ds_result['errors']}")
-            return []
+            return None
             
         published = ds_result.get("data", {}).get("publishedDatasources") or []
         embedded = ds_result.get("data", {}).get("embeddedDatasources") or []
@@ -590,17 +777,17 @@ class TableauMetadataClient:
                 # 我们将在 _batch_fetch_fields 中用到这个信息，但那里是重新查的
                 # 实际上 _batch_fetch_fields 也需要更新查询来获取 workbook
 
-
-        # 分别处理两种数据源
-        self._batch_fetch_fields(published, "publishedDatasources", all_fields)
-        self._batch_fetch_fields(embedded, "embeddedDatasources", all_fields, embedded_to_published)
-        
-        print(f"  ✅ 共采集到 {len(all_fields)} 个字段")
-        return all_fields
+        return published, embedded, embedded_to_published
 
     def _batch_fetch_fields(self, datasources: List[Dict], type_name: str, all_fields: List[Dict], 
                              embedded_to_published: Dict = None):
         """批量获取字段详情 (辅助方法)"""
+        for _, batch in self._iter_field_batches(datasources, type_name, embedded_to_published):
+            all_fields.extend(batch)
+
+    def _iter_field_batches(self, datasources: List[Dict], type_name: str,
+                            embedded_to_published: Dict = None):
+        """按 chunk 批量查询字段详情，每个批次产出 (type_name, fields)"""
         if not datasources:
             return
         
@@ -726,6 +913,7 @@ class TableauMetadataClient:
             
             full_query = "{" + "\n".join(query_parts) + "}"
             
+            batch_fields = []
             try:
                 result = self.execute_query(full_query)
                 if "errors" in result:
@@ -756,12 +944,15 @@ class TableauMetadataClient:
                             if ds_data.get("workbook"):
                                 field["workbook"] = ds_data["workbook"]
                                 
-                            all_fields.append(field)
+                            batch_fields.append(field)
                 
                 print(f"    - {type_name}: 已处理 {min(i+chunk_size, total)}/{total}")
                 
             except Exception as e:
                 print(f"  ❌ 批次查询异常: {e}")
+                continue
+
+            yield type_name, batch_fields
 
     def fetch_calculated_fields(self) -> List[Dict]:
         """获取所有计算字段"""
@@ -803,27 +994,34 @@ class TableauMetadataClient:
             
         return calc_fields
     
-    def fetch_views_with_fields(self) -> List[Dict]:
-        """获取视图及其使用的字段（迭代优化版：通过 Filter-ID 分页采集）"""
+    def fetch_views_with_fields(self, workbook_ids: List[str] = None) -> List[Dict]:
+        """获取视图及其使用的字段（迭代优化版：通过 Filter-ID 分页采集）
+
+        参数:
+            workbook_ids: 仅采集指定工作簿（定向刷新用），默认全部工作簿
+        """
         all_view_fields = []
         
         print(f"  正在获取视图字段关联(优化版)...")
         
-        # 1. 获取所有工作簿 ID
-        wb_query = """
-        {
-            workbooks {
-                id
-                name
+        if workbook_ids is not None:
+            workbooks = [{"id": wb_id} for wb_id in workbook_ids]
+        else:
+            # 1. 获取所有工作簿 ID
+            wb_query = """
+            {
+                workbooks {
+                    id
+                    name
+                }
             }
-        }
-        """
-        wb_result = self.execute_query(wb_query)
-        if "errors" in wb_result and not wb_result.get("data"):
-             print(f"  ⚠️ 获取工作簿列表失败: {wb_result['errors']}")
-             return []
-             
-        workbooks = wb_result.get("data", {}).get("workbooks") or []
+            """
+            wb_result = self.execute_query(wb_query)
+            if "errors" in wb_result and not wb_result.get("data"):
+                 print(f"  ⚠️ 获取工作簿列表失败: {wb_result['errors']}")
+                 return []
+                 
+            workbooks = wb_result.get("data", {}).get("workbooks") or []
         print(f"  需同步 {len(workbooks)} 个工作簿的视图关联...")
         
         # 2. 逐个工作簿查询 (或小批量)
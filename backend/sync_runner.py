@@ -0,0 +1,262 @@
+"""
+同步执行进程
+从 sync_jobs 表领取同步任务并执行，与 Web worker 进程隔离
+
+使用方式：
+    # 常驻模式（docker-compose 中的 sync-runner 服务）
+    python -m backend.sync_runner
+
+    # 单次模式：执行完队列中的任务后退出（Web worker 按需拉起时使用）
+    python -m backend.sync_runner --once
+
+    # 常驻模式 + 定时调度（全量/增量/仅使用统计，见 Config.SYNC_SCHEDULE_*）
+    python -m backend.sync_runner --schedule
+
+空闲时消费 Webhook 定向刷新队列（见 services/refresh_queue.py），按静默期与最小间隔限速登记刷新任务。
+
+SYNC_SHADOW_BUILD=true 时全量/增量任务写入影子库，完成后整库写回线上库（见 services/shadow_db.py）
+"""
+import json
+import os
+import sys
+import time
+import traceback
+from contextlib import nullcontext
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.config import Config
+from backend.models import get_engine, get_session, init_db
+from backend.services.sync_jobs import (
+    acquire_runner_lock,
+    claim_next_job,
+    finish_job,
+    JobProgressReporter,
+)
+from backend.services.refresh_queue import (
+    dispatch_due_refresh,
+    has_pending_refresh,
+    next_refresh_delay,
+)
+from backend.services.shadow_db import ShadowDatabase
+from backend.services.sites import (
+    configured_sites,
+    run_per_site,
+    site_database_path,
+    site_key,
+)
+
+
+def _has_queued_job(session) -> bool:
+    from backend.models import SyncJob
+
+    if session.query(SyncJob.id).filter(SyncJob.status == "queued").first() is not None:
+        return True
+    return has_pending_refresh(session)
+
+
+def _sync_site(job, params, db_path: str, site_content_url: str = "", progress_callback=None,
+               reporter=None):
+    """登录单个站点并同步到对应的库文件，返回该库中的 sync_run_id
+
+    reporter 为任务进度汇报器：影子库写回线上库期间暂停其心跳写入
+    """
+    from backend.services.tableau_client import TableauMetadataClient
+    from backend.services.sync_manager import MetadataSync, TARGETED_JOB_TYPES
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    # 影子库：全量/增量同步写入独立文件，成功后整库写回（任务进度仍写入线上库）
+    shadow = None
+    use_shadow = params.get("shadow", Config.SYNC_SHADOW_BUILD)
+    if use_shadow and job.job_type in ("full", "incremental"):
+        shadow = ShadowDatabase(db_path, seed=params.get("shadow_seed", Config.SYNC_SHADOW_SEED))
+
+    client = TableauMetadataClient(
+        base_url=Config.TABLEAU_BASE_URL,
+        pat_name=Config.TABLEAU_PAT_NAME,
+        pat_secret=Config.TABLEAU_PAT_SECRET,
+        site_content_url=site_content_url,
+    )
+    try:
+        if not client.sign_in():
+            raise RuntimeError(f"Tableau Server 登录失败 (站点: {site_key(site_content_url)})")
+
+        sync = MetadataSync(
+            client,
+            db_path=shadow.prepare() if shadow else db_path,
+            streaming_fields=params.get("streaming_fields"),
+            progress_callback=progress_callback,
+        )
+        try:
+            if job.job_type == "incremental":
+                run_id = sync.sync_incremental()
+            elif job.job_type == "usage":
+                run_id = sync.sync_usage()
+            elif job.job_type in TARGETED_JOB_TYPES:
+                # Webhook 只提供 REST LUID，需先解析为 Metadata API ID
+                asset_id = params.get("asset_id") or sync.resolve_asset_id(
+                    job.job_type, params["asset_luid"]
+                )
+                if asset_id is None:
+                    print(f"  ⚠️ 未找到 {job.job_type} (LUID: {params['asset_luid']})，跳过刷新")
+                    run_id = None
+                elif job.job_type == "workbook":
+                    run_id = sync.refresh_workbook(asset_id)
+                else:
+                    run_id = sync.refresh_datasource(asset_id)
+            else:
+                run_id = sync.sync_all()
+            stage_errors = dict(sync.stage_errors)
+        finally:
+            sync.close()
+            sync.engine.dispose()
+
+        if shadow:
+            if stage_errors:
+                raise RuntimeError(f"影子库同步未完整完成，保留线上库: {stage_errors}")
+            with reporter.paused() if reporter else nullcontext():
+                shadow.swap()
+            shadow = None
+        return run_id
+    finally:
+        if shadow:
+            shadow.discard()
+        client.sign_out()
+
+
+def execute_job(job, db_path: str):
+    """执行单个同步任务，返回 sync_run_id（多站点时为默认站点的运行 ID）"""
+    from backend.services.sync_manager import JOB_STAGES
+
+    if job.job_type not in JOB_STAGES:
+        raise ValueError(f"未知的同步任务类型: {job.job_type}")
+
+    params = json.loads(job.params) if job.params else {}
+    sites = params.get("sites") or configured_sites()
+
+    if sites == [""]:
+        reporter = JobProgressReporter(
+            job.id, db_path=db_path, stages=JOB_STAGES[job.job_type]
+        )
+        reporter.start_heartbeat()
+        try:
+            return _sync_site(job, params, db_path, progress_callback=reporter, reporter=reporter)
+        finally:
+            reporter.stop()
+
+    # 多站点：每个站点一个客户端与分区库并发同步，进度按站点粒度汇报
+    reporter = JobProgressReporter(
+        job.id,
+        db_path=db_path,
+        stages=[(f"site:{site_key(s)}", f"站点 {site_key(s)}") for s in sites],
+    )
+    reporter.start_heartbeat()
+
+    def sync_one(content_url: str):
+        stage = f"site:{site_key(content_url)}"
+        label = f"站点 {site_key(content_url)}"
+        reporter({"stage": stage, "label": label, "status": "running"})
+        site_db = db_path if not content_url else site_database_path(content_url)
+        run_id = _sync_site(job, params, site_db, site_content_url=content_url, reporter=reporter)
+        reporter({"stage": stage, "label": label, "status": "completed"})
+        return run_id
+
+    try:
+        print(f"🌐 多站点同步: {', '.join(site_key(s) for s in sites)}")
+        results = run_per_site(sites, sync_one)
+    finally:
+        reporter.stop()
+
+    failed = {site_key(s): str(r) for s, r in results.items() if isinstance(r, Exception)}
+    for site, error in failed.items():
+        print(f"❌ 站点 {site} 同步失败: {error}")
+    if failed:
+        raise RuntimeError(f"{len(failed)}/{len(sites)} 个站点同步失败: {failed}")
+    default_run = results.get("")
+    return default_run if isinstance(default_run, int) else None
+
+
+def run(once: bool = False, db_path: str = None, schedule: bool = False):
+    """执行进程主循环"""
+    db_path = db_path or Config.DATABASE_PATH
+    lock = acquire_runner_lock(db_path)
+    if lock is None:
+        print("ℹ️ 已有同步执行进程在运行，退出")
+        return
+
+    engine = get_engine(db_path)
+    init_db(engine)
+    session = get_session(engine)
+    print(f"🔄 同步执行进程已启动 (pid={os.getpid()}, 数据库: {db_path})")
+
+    scheduler = None
+    if schedule and not once:
+        from backend.services.sync_scheduler import SyncScheduler
+
+        scheduler = SyncScheduler(db_path=db_path)
+        scheduler.start()
+
+    try:
+        while True:
+            job = claim_next_job(session)
+            if job is None:
+                # 空闲时消费 Webhook 刷新队列（限速，到期才登记）
+                if dispatch_due_refresh(session) is not None:
+                    continue
+                delay = next_refresh_delay(session)
+                if not once or delay is not None:
+                    # 单次模式下队列中仍有待合并的事件时继续等待，避免事件无人消费
+                    wait = Config.SYNC_RUNNER_POLL_SECONDS
+                    time.sleep(min(wait, delay) if delay else wait)
+                    continue
+                # 先释放文件锁再复查队列：避免 worker 在我们退出前登记的任务无人领取
+                lock.close()
+                lock = None
+                if not _has_queued_job(session):
+                    break
+                lock = acquire_runner_lock(db_path)
+                if lock is None:
+                    break  # 已有新的执行进程接手
+                continue
+
+            print(f"\n▶️ 领取同步任务 #{job.id} ({job.job_type}, 来源: {job.requested_by})")
+            try:
+                run_id = execute_job(job, db_path)
+                # 影子库切换后，连接池中的连接仍指向旧文件
+                engine.dispose()
+                finish_job(session, job.id, sync_run_id=run_id)
+                print(f"✅ 同步任务 #{job.id} 完成")
+            except Exception as e:
+                traceback.print_exc()
+                session.rollback()
+                engine.dispose()
+                finish_job(session, job.id, error=str(e))
+                print(f"❌ 同步任务 #{job.id} 失败: {e}")
+    finally:
+        if scheduler is not None:
+            scheduler.stop()
+        session.close()
+        engine.dispose()
+        if lock is not None:
+            lock.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Tableau 元数据同步执行进程')
+    parser.add_argument('--once', action='store_true', help='执行完队列中的任务后退出')
+    parser.add_argument('--db-path', type=str, help='指定数据库路径')
+    parser.add_argument('--schedule', action='store_true',
+                        help='启用定时调度（同 SYNC_SCHEDULER_ENABLED=true，仅常驻模式）')
+    args = parser.parse_args()
+    run(
+        once=args.once,
+        db_path=args.db_path,
+        schedule=args.schedule or Config.SYNC_SCHEDULER_ENABLED,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from backend.services.tableau_client import TableauMetadataClient
 from backend.services.sync_manager import MetadataSync
 from backend.config import Config
+from backend.services.shadow_db import ShadowDatabase
+from backend.services.sites import resolve_site, site_database_path
 
 
 def main():
@@ -28,35 +30,101 @@ def main():
     parser.add_argument('--skip-usage', action='store_true', help='跳过使用统计同步（同 --skip-views）')
     parser.add_argument('--views-only', action='store_true', help='仅同步视图使用统计')
     parser.add_argument('--usage-only', action='store_true', help='仅同步使用统计（同 --views-only）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量同步：仅当工作簿/数据源有变化时执行全量拉取')
     parser.add_argument('--db-path', type=str, help='指定数据库路径')
+    parser.add_argument('--site', type=str,
+                        help='同步指定站点（contentUrl，需在 TABLEAU_SITES 中配置），写入该站点分区库')
+    parser.add_argument('--shadow', action='store_true',
+                        help='写入影子库，同步完成后整库写回线上库（同 SYNC_SHADOW_BUILD=true）')
+    parser.add_argument('--streaming-fields', action='store_true',
+                        help='字段同步使用流式有界内存模式（适用于大规模站点）')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='试运行：在临时库中执行全量同步并输出与线上库的差异，不修改线上库')
+    parser.add_argument('--dry-run-output', type=str, help='试运行差异另存为 JSON 文件')
+    parser.add_argument('--dry-run-samples', type=int, default=5, help='试运行每类变更输出的样例数')
     args = parser.parse_args()
 
-    db_path = args.db_path or Config.DATABASE_PATH
+    site_content_url = ""
+    if args.site is not None:
+        site_content_url = resolve_site(args.site)
+        if site_content_url is None:
+            parser.error(f"站点未在 TABLEAU_SITES 中配置: {args.site}")
+
+    db_path = args.db_path or site_database_path(site_content_url)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
     print(f"\n数据库路径: {db_path}")
     
     client = TableauMetadataClient(
         base_url=Config.TABLEAU_BASE_URL,
         pat_name=Config.TABLEAU_PAT_NAME,
-        pat_secret=Config.TABLEAU_PAT_SECRET
+        pat_secret=Config.TABLEAU_PAT_SECRET,
+        site_content_url=site_content_url,
     )
     
+    if args.dry_run:
+        _run_dry_run(client, db_path, args)
+        return
+
+    shadow = None
+    if (args.shadow or Config.SYNC_SHADOW_BUILD) and not (args.views_only or args.usage_only):
+        shadow = ShadowDatabase(db_path, seed=Config.SYNC_SHADOW_SEED)
+
     try:
         client.sign_in()
-        sync = MetadataSync(client, db_path=db_path)
+        sync = MetadataSync(
+            client,
+            db_path=shadow.prepare() if shadow else db_path,
+            streaming_fields=True if args.streaming_fields else None,
+        )
         
         if args.views_only or args.usage_only:
             print("\n[仅同步视图使用统计模式]")
             sync.sync_views_usage()
+        elif args.incremental:
+            print("\n[增量同步模式]")
+            sync.sync_incremental()
         else:
             sync.sync_all()
             if not (args.skip_views or args.skip_usage):
                 sync.sync_views_usage()
         
         sync.close()
+        sync.engine.dispose()
+        if shadow:
+            if sync.stage_errors:
+                raise RuntimeError(f"影子库同步未完整完成，保留线上库: {sync.stage_errors}")
+            shadow.swap()
+            shadow = None
         print("\n✅ 同步完成")
     finally:
+        if shadow:
+            shadow.discard()
         client.sign_out()
 
 
+def _run_dry_run(client, db_path: str, args):
+    """试运行：输出差异摘要，可选写入 JSON"""
+    import json
+    from backend.services.dry_run import dry_run_sync, format_dry_run
+
+    try:
+        client.sign_in()
+        result = dry_run_sync(
+            client,
+            db_path,
+            sample_size=args.dry_run_samples,
+            streaming_fields=True if args.streaming_fields else None,
+        )
+    finally:
+        client.sign_out()
+
+    print(format_dry_run(result))
+    if args.dry_run_output:
+        with open(args.dry_run_output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"📄 差异已写入: {args.dry_run_output}")
+
+
 if __name__ == "__main__":
     main()
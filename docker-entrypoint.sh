@@ -7,9 +7,10 @@ echo "=============================================="
 
 if [ ! -f /app/data/metadata.db ]; then
     echo "首次运行，正在初始化数据库..."
-    python -c "from backend.models import get_engine, init_db; from backend.config import Config; engine = get_engine(Config.DATABASE_PATH); init_db(engine)"
-    echo "数据库初始化完成"
 fi
+# 建表为幂等操作，已有数据库也会补齐新增的系统表（如 sync_jobs）
+python -c "from backend.models import get_engine, init_db; from backend.config import Config; engine = get_engine(Config.DATABASE_PATH); init_db(engine)"
+echo "数据库表结构检查完成"
 
 echo "数据库路径: /app/data/metadata.db"
 echo "API 端口: ${PORT:-8201}"
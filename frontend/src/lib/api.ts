@@ -352,6 +352,7 @@ export interface SyncStatus {
     is_running: boolean;
     started_at: string | null;
     progress: string | null;
+    percent?: number;
     error: string | null;
     last_completed: string | null;
 }
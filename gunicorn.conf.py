@@ -0,0 +1,17 @@
+"""
+gunicorn 配置（Dockerfile.backend 默认使用: gunicorn -c gunicorn.conf.py "backend:create_app()"）
+
+GUNICORN_PRELOAD=true 时在主进程中导入并创建应用，worker fork 后直接复用，启动更快、内存共享更多；
+fork 出的 worker 会丢弃继承的数据库连接池，各自建立连接（见 backend.models.get_engine）
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8201)}"
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+# 线程数不宜超过每个引擎的连接池容量 (SQLITE_POOL_SIZE + SQLITE_POOL_MAX_OVERFLOW)
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+accesslog = "-"
+errorlog = "-"
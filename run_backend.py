@@ -23,6 +23,9 @@ def main():
         engine = get_engine(Config.DATABASE_PATH)
         init_db(engine)
         print("✅ 数据库初始化完成")
+    else:
+        # 补齐新增的系统表（如 sync_jobs），建表为幂等操作
+        init_db(get_engine(Config.DATABASE_PATH))
     
     # 创建 Flask 应用
     app = create_app()
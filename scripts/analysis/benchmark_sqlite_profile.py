@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+SQLite 连接调优基准
+在临时库中生成合成元数据，分别以 SQLITE_TUNING=false / true 运行，对比:
+  1. 仅涉及数据库的同步阶段：分批写入字段（每批一次提交，与同步入库一致）与四表架构迁移
+  2. 并发写入时 GET /api/fields/catalog 的延迟（后台线程持续以小事务更新字段）
+
+用法:
+    python scripts/analysis/benchmark_sqlite_profile.py
+    python scripts/analysis/benchmark_sqlite_profile.py --fields 50000 --requests 300
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import text
+
+from backend.config import Config
+from backend.models import get_engine, init_db
+
+
+def seed_fields(db_path, field_count, batch_size):
+    """按批次写入数据源与字段，每批提交一次"""
+    engine = get_engine(db_path, profile="sync")
+    datasource_ids = [str(uuid.uuid4()) for _ in range(max(1, field_count // 40))]
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO datasources (id, name, is_embedded) VALUES (:id, :name, 0)"),
+                [{"id": ds_id, "name": f"DS {i}"} for i, ds_id in enumerate(datasource_ids)],
+            )
+        for start in range(0, field_count, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, field_count)):
+                is_calc = i % 5 == 0
+                rows.append({
+                    "id": str(uuid.uuid4()),
+                    "name": f"Field {i % 2000}",
+                    "data_type": "REAL" if i % 3 else "STRING",
+                    "role": "measure" if i % 3 else "dimension",
+                    "datasource_id": datasource_ids[i % len(datasource_ids)],
+                    "is_calculated": is_calc,
+                    "formula": f"SUM([Field {i % 2000}]) * {i % 7}" if is_calc else None,
+                    "usage_count": i % 11,
+                })
+            with engine.begin() as conn:
+                conn.execute(text("""
+                    INSERT INTO fields (id, name, data_type, role, datasource_id,
+                                        is_calculated, formula, usage_count)
+                    VALUES (:id, :name, :data_type, :role, :datasource_id,
+                            :is_calculated, :formula, :usage_count)
+                """), rows)
+    finally:
+        engine.dispose()
+
+
+def run_db_stages(db_path, field_count, batch_size):
+    from backend.migrations.split_fields_table_v5 import main as migrate_v5
+
+    timings = {}
+    start = time.perf_counter()
+    seed_fields(db_path, field_count, batch_size)
+    timings["seed_fields"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    migrate_v5(db_path)
+    timings["migrate_v5"] = time.perf_counter() - start
+    return timings
+
+
+def run_api_latency(db_path, request_count):
+    """并发写入下请求字段目录，返回 (延迟列表 ms, 请求错误数, 写入事务数, 写入错误数)"""
+    from backend import create_app
+
+    class BenchConfig(Config):
+        DATABASE_PATH = db_path
+        RESPONSE_CACHE_ENABLED = False  # 测量数据库查询本身
+
+    app = create_app(BenchConfig)
+    client = app.test_client()
+    stop = threading.Event()
+    writes = {"ok": 0, "errors": 0}
+
+    def writer():
+        engine = get_engine(db_path, profile="sync")
+        try:
+            while not stop.is_set():
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text("""
+                            UPDATE fields SET usage_count = usage_count + 1
+                            WHERE rowid IN (SELECT rowid FROM fields ORDER BY RANDOM() LIMIT 200)
+                        """))
+                    writes["ok"] += 1
+                except Exception:
+                    writes["errors"] += 1
+        finally:
+            engine.dispose()
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    latencies, errors = [], 0
+    try:
+        for i in range(request_count):
+            start = time.perf_counter()
+            resp = client.get(f"/api/fields/catalog?page={i % 5 + 1}&page_size=50")
+            latencies.append((time.perf_counter() - start) * 1000)
+            if resp.status_code != 200:
+                errors += 1
+    finally:
+        stop.set()
+        thread.join()
+        app.engine.dispose()
+        app.read_engine.dispose()
+    return latencies, errors, writes["ok"], writes["errors"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(tuning, args):
+    Config.SQLITE_TUNING = tuning
+    work_dir = tempfile.mkdtemp(prefix="sqlite-bench-")
+    db_path = os.path.join(work_dir, "metadata.db")
+    try:
+        engine = get_engine(db_path)
+        init_db(engine)
+        engine.dispose()
+        timings = run_db_stages(db_path, args.fields, args.batch_size)
+        latencies, errors, writes, write_errors = run_api_latency(db_path, args.requests)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "stages": timings,
+        "p50": statistics.median(latencies),
+        "p95": percentile(latencies, 95),
+        "errors": errors,
+        "writes": writes,
+        "write_errors": write_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 SQLite 调优开启/关闭时的同步与 API 性能")
+    parser.add_argument("--fields", type=int, default=20000, help="合成字段数量")
+    parser.add_argument("--batch-size", type=int, default=100, help="每次提交写入的字段数")
+    parser.add_argument("--requests", type=int, default=200, help="字段目录请求次数")
+    args = parser.parse_args()
+
+    results = {}
+    for label, tuning in (("默认", False), ("调优", True)):
+        print(f"\n▶ SQLITE_TUNING={str(tuning).lower()}")
+        results[label] = run(tuning, args)
+
+    print("\n" + "=" * 60)
+    print(f"{'指标':<24}{'默认':>14}{'调优':>14}")
+    print("-" * 60)
+    for stage in results["默认"]["stages"]:
+        print(
+            f"{stage + ' (s)':<24}"
+            f"{results['默认']['stages'][stage]:>14.2f}{results['调优']['stages'][stage]:>14.2f}"
+        )
+    for key, label in (("p50", "catalog p50 (ms)"), ("p95", "catalog p95 (ms)")):
+        print(f"{label:<24}{results['默认'][key]:>14.1f}{results['调优'][key]:>14.1f}")
+    for key, label in (("errors", "catalog 错误数"), ("writes", "并发写入事务数"), ("write_errors", "写入错误数")):
+        print(f"{label:<24}{results['默认'][key]:>14}{results['调优'][key]:>14}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
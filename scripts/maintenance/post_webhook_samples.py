@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Webhook 本地模拟器
+向 POST /api/sync/webhook 发送 Tableau Server 格式的示例事件，用于在没有 Tableau Webhook 的环境中验证刷新队列
+
+用法:
+    python scripts/maintenance/post_webhook_samples.py --workbook <luid> --datasource <luid>
+    python scripts/maintenance/post_webhook_samples.py --workbook <luid> --burst 5   # 验证同一资产的事件合并
+    python scripts/maintenance/post_webhook_samples.py --url http://localhost:8201 --site sales --token xxx --workbook <luid>
+"""
+
+import argparse
+import uuid
+from datetime import datetime, timezone
+
+import requests
+
+
+def sample_event(event_type: str, resource: str, luid: str, name: str) -> dict:
+    return {
+        "resource": resource,
+        "event_type": event_type,
+        "resource_name": name,
+        "site_luid": str(uuid.uuid4()),
+        "resource_luid": luid,
+        "created_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向本地 API 发送 Tableau Webhook 示例事件")
+    parser.add_argument("--url", default="http://localhost:8201", help="后端地址")
+    parser.add_argument("--site", help="站点 contentUrl（多站点部署）")
+    parser.add_argument("--token", help="WEBHOOK_TOKEN")
+    parser.add_argument("--workbook", action="append", default=[], help="工作簿 LUID（可重复）")
+    parser.add_argument("--datasource", action="append", default=[], help="数据源 LUID（可重复）")
+    parser.add_argument("--deleted", action="store_true", help="发送删除事件而非更新事件")
+    parser.add_argument("--burst", type=int, default=1, help="每个资产重复发送的次数")
+    args = parser.parse_args()
+
+    params = {}
+    if args.site:
+        params["site"] = args.site
+    if args.token:
+        params["token"] = args.token
+
+    action = "Deleted" if args.deleted else "Updated"
+    events = [
+        sample_event(f"Workbook{action}", "WORKBOOK", luid, f"Sample Workbook {luid[:8]}")
+        for luid in args.workbook
+    ] + [
+        sample_event(f"Datasource{action}", "DATASOURCE", luid, f"Sample Datasource {luid[:8]}")
+        for luid in args.datasource
+    ]
+    if not events:
+        parser.error("至少指定一个 --workbook 或 --datasource")
+
+    endpoint = f"{args.url.rstrip('/')}/api/sync/webhook"
+    for event in events:
+        for _ in range(max(1, args.burst)):
+            resp = requests.post(endpoint, params=params, json=event, timeout=10)
+            body = resp.json() if resp.headers.get("content-type", "").startswith("application/json") else resp.text
+            coalesced = " (已合并)" if isinstance(body, dict) and body.get("coalesced") else ""
+            print(f"{event['event_type']} {event['resource_luid']} -> {resp.status_code}{coalesced}")
+
+    queue = requests.get(
+        f"{args.url.rstrip('/')}/api/sync/refresh-queue",
+        params={"status": "pending", **({"site": args.site} if args.site else {})},
+        timeout=10,
+    )
+    if queue.ok:
+        print(f"待处理刷新: {queue.json().get('pending')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+查询计划回归检查
+在临时库中构造一套最小的合成资产图（并执行四表架构迁移），用测试客户端逐个请求 API 的 GET 路由，
+记录每条路由发出的 SELECT，并对其执行 EXPLAIN QUERY PLAN：
+
+- 大表出现在连接内层循环或相关子查询中的全表扫描（SCAN，含全索引扫描）→ 失败
+- 大表需要临时自动索引（AUTOMATIC INDEX，说明缺少索引）→ 失败
+- 大表作为最外层循环的全表扫描（列表/统计类查询）→ 仅提示；--strict 时同样视为失败
+- 路由返回 5xx → 失败（查询计划正常不代表接口可用）
+
+用法:
+    python scripts/validation/check_query_plans.py
+    python scripts/validation/check_query_plans.py --strict --route /api/fields
+退出码: 0 通过 / 1 存在失败
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import event, text
+
+from backend.config import Config
+from backend.models import get_engine, get_session, init_db
+from backend.services import search_index
+from backend.services.export import EXPORT_SOURCES
+
+# 行数随资产规模线性（或更快）增长的表
+LARGE_TABLES = {
+    "fields", "field_dependencies", "field_to_view", "field_full_lineage",
+    "regular_fields", "unique_regular_fields", "regular_field_to_view", "regular_field_full_lineage",
+    "calculated_fields", "unique_calculated_fields", "calc_field_to_view", "calc_field_full_lineage",
+    "calc_field_dependencies", "db_columns", "views", "view_usage_history", "sync_changes",
+}
+
+# 合成资产 ID（同时用于填充路由参数）
+IDS = {
+    "project": "proj-1",
+    "user": "user-1",
+    "database": "db-1",
+    "table": "tbl-1",
+    "column": "col-1",
+    "datasource": "ds-pub-1",
+    "embedded": "ds-emb-1",
+    "workbook": "wb-1",
+    "sheet": "view-sheet-1",
+    "dashboard": "view-dash-1",
+    "field": "fld-1",
+    "calc": "fld-calc-1",
+}
+
+ROUTE_ARGS = {
+    "column_id": IDS["column"],
+    "db_id": IDS["database"],
+    "ds_id": IDS["datasource"],
+    "field_id": IDS["field"],
+    "metric_id": IDS["calc"],
+    "project_id": IDS["project"],
+    "table_id": IDS["table"],
+    "user_id": IDS["user"],
+    "view_id": IDS["sheet"],
+    "wb_id": IDS["workbook"],
+    "workbook_id": IDS["workbook"],
+    "id": 1,
+    "run_id": 1,
+}
+
+# 需要查询参数才会执行 SQL 的路由（缺参数时直接 400）：路由 -> 各次请求的查询串
+ROUTE_QUERIES = {
+    "/api/search": ["q=Amount", "q=Am"],  # FTS5 索引 / 少于 3 个字符的 LIKE 回退
+    "/api/search/suggest": ["q=Amo"],
+    "/api/sites/search": ["q=Amount"],
+}
+
+LINEAGE_ITEMS = {
+    "field": IDS["field"],
+    "metric": IDS["calc"],
+    "table": IDS["table"],
+    "datasource": IDS["datasource"],
+    "workbook": IDS["workbook"],
+    "view": IDS["sheet"],
+}
+
+_ALIAS_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_SQL_KEYWORDS = {
+    "on", "where", "join", "left", "inner", "outer", "cross", "group", "order", "limit",
+    "union", "using", "natural", "as", "and", "or", "having", "window", "full", "right",
+}
+
+
+def seed(db_path):
+    """写入覆盖各类资产与关联的最小数据集，并生成四表架构"""
+    from backend.migrations.split_fields_table_v5 import main as migrate_v5
+
+    engine = get_engine(db_path)
+    init_db(engine)
+    statements = [
+        ("INSERT INTO projects (id, name) VALUES (:project, 'Project')", {}),
+        ("INSERT INTO tableau_users (id, name) VALUES (:user, 'owner')", {}),
+        ("INSERT INTO databases (id, name) VALUES (:database, 'DW')", {}),
+        ("INSERT INTO tables (id, name, database_id, is_embedded) VALUES (:table, 'ORDERS', :database, 0)", {}),
+        ("INSERT INTO db_columns (id, name, table_id) VALUES (:column, 'AMOUNT', :table)", {}),
+        ("INSERT INTO datasources (id, name, is_embedded) VALUES (:datasource, 'Orders', 0)", {}),
+        ("""INSERT INTO datasources (id, name, is_embedded, source_published_datasource_id)
+            VALUES (:embedded, 'Orders (embedded)', 1, :datasource)""", {}),
+        ("INSERT INTO workbooks (id, name, project_name, owner_id) VALUES (:workbook, 'Sales', 'Project', :user)", {}),
+        ("INSERT INTO views (id, name, view_type, workbook_id) VALUES (:sheet, 'Sheet', 'sheet', :workbook)", {}),
+        ("INSERT INTO views (id, name, view_type, workbook_id) VALUES (:dashboard, 'Dash', 'dashboard', :workbook)", {}),
+        ("INSERT INTO dashboard_to_sheet (dashboard_id, sheet_id) VALUES (:dashboard, :sheet)", {}),
+        ("INSERT INTO table_to_datasource (table_id, datasource_id) VALUES (:table, :datasource)", {}),
+        ("INSERT INTO datasource_to_workbook (datasource_id, workbook_id) VALUES (:datasource, :workbook)", {}),
+        ("INSERT INTO datasource_to_workbook (datasource_id, workbook_id) VALUES (:embedded, :workbook)", {}),
+        ("""INSERT INTO fields (id, name, role, table_id, datasource_id, upstream_column_id, is_calculated)
+            VALUES (:field, 'Amount', 'measure', :table, :datasource, :column, 0)""", {}),
+        ("""INSERT INTO fields (id, name, role, datasource_id, workbook_id, is_calculated, formula)
+            VALUES (:calc, 'Double Amount', 'measure', :embedded, :workbook, 1, '[Amount] * 2')""", {}),
+        ("""INSERT INTO field_dependencies (source_field_id, dependency_field_id, dependency_name)
+            VALUES (:calc, :field, 'Amount')""", {}),
+        ("INSERT INTO field_to_view (field_id, view_id) VALUES (:field, :sheet)", {}),
+        ("INSERT INTO field_to_view (field_id, view_id) VALUES (:calc, :sheet)", {}),
+        ("INSERT INTO glossary (id, term, definition) VALUES (1, 'Amount', 'Order amount')", {}),
+    ]
+    with engine.begin() as conn:
+        for sql, params in statements:
+            conn.execute(text(sql), {**IDS, **params})
+    engine.dispose()
+    migrate_v5(db_path)
+
+    # 全文搜索索引（/api/search 走 FTS5 路径）
+    engine = get_engine(db_path)
+    session = get_session(engine)
+    try:
+        search_index.rebuild_search_index(session)
+        session.commit()
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def iter_routes(app, only=None):
+    """展开 GET 路由（路径参数用合成 ID 填充）"""
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if "GET" not in rule.methods or not rule.rule.startswith("/api/"):
+            continue
+        if only and not rule.rule.startswith(only):
+            continue
+        if "item_type" in rule.arguments:
+            for item_type, item_id in LINEAGE_ITEMS.items():
+                yield rule.rule, rule.rule.replace("<item_type>", item_type).replace("<item_id>", item_id)
+            continue
+        if "entity" in rule.arguments:
+            for entity in EXPORT_SOURCES:
+                yield rule.rule, rule.rule.replace("<entity>", entity)
+            continue
+        if rule.rule in ROUTE_QUERIES:
+            for query in ROUTE_QUERIES[rule.rule]:
+                yield rule.rule, f"{rule.rule}?{query}"
+            continue
+        path = rule.rule
+        for arg in rule.arguments:
+            path = re.sub(rf"<(?:\w+:)?{arg}>", str(ROUTE_ARGS.get(arg, "missing")), path)
+        yield rule.rule, path
+
+
+def alias_map(statement):
+    aliases = {}
+    for table, alias in _ALIAS_RE.findall(statement):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def classify_plan(rows, aliases):
+    """返回 [(severity, detail)]，severity 为 fail / warn"""
+    children = defaultdict(list)
+    details = {}
+    for node_id, parent, _, detail in rows:
+        children[parent].append(node_id)
+        details[node_id] = (parent, detail)
+
+    def correlated(node_id):
+        parent = details[node_id][0]
+        while parent in details:
+            if details[parent][1].startswith("CORRELATED"):
+                return True
+            parent = details[parent][0]
+        return False
+
+    findings = []
+    for parent, node_ids in children.items():
+        loop_index = 0
+        for node_id in node_ids:
+            detail = details[node_id][1]
+            match = re.match(r"(SCAN|SEARCH) (\w+)", detail)
+            if not match:
+                continue
+            kind, name = match.groups()
+            table = aliases.get(name.lower(), name.lower())
+            table = re.sub(r"_\d+$", "", table)  # ORM 自动别名 fields_1
+            inner = loop_index > 0 or correlated(node_id)
+            loop_index += 1
+            if table not in LARGE_TABLES:
+                continue
+            if "AUTOMATIC" in detail:
+                findings.append(("fail", detail))
+            elif kind == "SCAN":
+                findings.append(("fail" if inner else "warn", detail))
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 查询计划回归检查（EXPLAIN QUERY PLAN）")
+    parser.add_argument("--strict", action="store_true", help="最外层全表扫描也视为失败")
+    parser.add_argument("--route", help="只检查以该前缀开头的路由")
+    parser.add_argument("--verbose", action="store_true", help="输出每条 SQL 的完整计划")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="query-plans-")
+    db_path = os.path.join(work_dir, "metadata.db")
+    try:
+        seed(db_path)
+
+        from backend import create_app
+
+        # 部分路由直接读取 Config.DATABASE_PATH，统一指向临时库
+        Config.DATABASE_PATH = db_path
+        Config.RESPONSE_CACHE_ENABLED = False  # 每个路由都要真正执行查询
+        app = create_app(Config)
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                captured.append((statement, parameters))
+
+        for engine in (app.engine, app.read_engine):
+            event.listen(engine, "before_cursor_execute", capture)
+
+        client = app.test_client()
+        plan_conn = sqlite3.connect(db_path)
+        failures, warnings, checked = 0, 0, 0
+        for rule, path in iter_routes(app, args.route):
+            captured.clear()
+            resp = client.get(path)
+            resp.get_data()  # 流式响应（导出接口）读完后才释放请求上下文
+            seen = set()
+            route_findings = []
+            for statement, parameters in captured:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                checked += 1
+                try:
+                    rows = plan_conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                except sqlite3.Error as e:
+                    route_findings.append(("warn", f"无法解析计划: {e}"))
+                    continue
+                if args.verbose:
+                    print(f"\n{statement.strip()}\n" + "\n".join(f"  {r[3]}" for r in rows))
+                for severity, detail in classify_plan(rows, alias_map(statement)):
+                    if args.strict and severity == "warn":
+                        severity = "fail"
+                    route_findings.append((severity, detail, " ".join(statement.split())[:160]))
+
+            if resp.status_code >= 500:
+                route_findings.append(("fail", f"接口返回 {resp.status_code}"))
+            route_fail = [f for f in route_findings if f[0] == "fail"]
+            route_warn = [f for f in route_findings if f[0] == "warn"]
+            failures += len(route_fail)
+            warnings += len(route_warn)
+            mark = "❌" if route_fail else ("⚠️ " if route_warn else "✅")
+            print(f"{mark} {path} [{resp.status_code}] {len(seen)} 条查询")
+            for finding in route_fail + route_warn:
+                print(f"     {finding[0].upper()}: {finding[1]}")
+                if len(finding) > 2:
+                    print(f"       ↳ {finding[2]}")
+
+        plan_conn.close()
+        app.engine.dispose()
+        app.read_engine.dispose()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\n" + "=" * 60)
+    print(f"检查 SQL {checked} 条: 失败 {failures}, 提示 {warnings}")
+    print("=" * 60)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()